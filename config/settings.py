@@ -13,9 +13,59 @@ class Settings:
     EMOTION_ANALYSIS_INTERVAL = 5  # Analyze emotion every N messages
     RECENT_MESSAGES_FOR_EMOTION = 5  # Number of recent messages to analyze
     
+    # Emotion time series: raw samples and minute rollups are pruned by HistoryMaintenance; hour rollups are kept
+    EMOTION_SAMPLE_RETENTION_DAYS = 7
+    EMOTION_MINUTE_ROLLUP_RETENTION_DAYS = 90
+    
     # Memory extraction settings
     MEMORY_EXTRACTION_INTERVAL = 10  # Extract memories every N messages
     
+    # Memory near-duplicate detection (MinHash/LSH over character shingles)
+    MEMORY_DEDUP_THRESHOLD = 0.75  # Estimated two-way containment at which two memories count as duplicates
+    MEMORY_DEDUP_MODE = "merge"  # "merge": refresh the stored memory, "reject": leave it untouched
+    
+    # Recent-message cache in front of Database.get_recent_messages
+    MESSAGE_CACHE_MAX_BYTES = 4 * 1024 * 1024
+    
+    # History retention (overridable per conversation via config.json "retention")
+    RETENTION_DEFAULT_MAX_AGE_DAYS = 180  # Archive messages older than this
+    RETENTION_DEFAULT_MAX_ROWS = 5000  # Keep at most this many messages per conversation in petchat.db
+    HISTORY_MAINTENANCE_INTERVAL = 30 * 60  # Seconds between archive/compaction passes
+    
+    # Users seen on the server; offline users without a conversation are dropped after this many days
+    USER_PRUNE_AFTER_DAYS = 30
+    
+    # Server-side AI request debounce: requests for a conversation within this window share one analysis
+    AI_DEBOUNCE_SECONDS = 0.3
+    
+    # Server-side AI scheduler (server_config.json "ai_scheduler" overrides)
+    AI_SCHEDULER_WORKERS = 3
+    AI_QUEUE_MAX = 64
+    AI_INTERACTIVE_DEADLINE_SECONDS = 30
+    AI_BACKGROUND_DEADLINE_SECONDS = 120
+    
+    # Emotion analysis (server_config.json ai_config "emotion_mode"/"emotion_min_confidence" override):
+    # "llm", "local" lexicon scorer, or "hybrid" (lexicon, model when below the confidence)
+    AI_EMOTION_MODE = "hybrid"
+    AI_EMOTION_MIN_CONFIDENCE = 0.2
+    
+    # Suggestion triggers (server_config.json "ai_triggers" overrides): intent -> keywords;
+    # a suggestion is generated while one of the last AI_TRIGGER_WINDOW messages matches
+    AI_TRIGGER_INTENTS = {
+        "time": ["明天", "下周", "周末"],
+        "plan": ["计划", "安排"],
+        "activity": ["出去玩", "聚餐", "学习"],
+    }
+    AI_TRIGGER_WINDOW = 5
+    
+    # Server-side AI reply cache (server_config.json "ai_cache" overrides)
+    AI_CACHE_TTL_SECONDS = 10 * 60
+    AI_CACHE_MAX_ENTRIES = 512
+    AI_CACHE_DB_PATH = "server_ai_cache.db"
+    
+    # Server-side chat history (server_config.json "history_db_path" overrides)
+    SERVER_HISTORY_DB_PATH = "server_messages.db"
+    
     # Suggestion settings
     SUGGESTION_CHECK_INTERVAL = 3  # Check for suggestions every N messages
     
@@ -0,0 +1,161 @@
+"""
+Content-addressed cache for AI model replies.
+Keys are a SHA-256 of (task, model, normalized prompt messages, temperature),
+so identical analysis requests - repeated /ai presses, or several users asking
+about the same conversation - are answered without another model call.
+Entries expire after a TTL; the in-memory tier is a size-bounded LRU and an
+optional SQLite tier keeps replies across server restarts.
+"""
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_messages(messages: List[Dict[str, str]]) -> List[Tuple[str, str]]:
+    """(role, content) pairs with whitespace runs collapsed"""
+    return [(m.get("role", ""), " ".join(str(m.get("content", "")).split())) for m in messages]
+
+
+def cache_key(task: str, model: str, messages: List[Dict[str, str]], temperature: float) -> str:
+    payload = json.dumps([task, model, normalize_messages(messages), round(float(temperature), 3)],
+                         ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def create_ai_cache(config: Dict[str, Any]) -> Optional["AIResultCache"]:
+    """
+    Build the cache from server_config.json "ai_cache":
+    {"enabled": true, "ttl_seconds": 600, "max_entries": 512, "disk": false, "db_path": "..."}
+    """
+    cache_cfg = config.get("ai_cache", {})
+    if not cache_cfg.get("enabled", True):
+        return None
+    return AIResultCache(
+        max_entries=cache_cfg.get("max_entries", Settings.AI_CACHE_MAX_ENTRIES),
+        ttl_seconds=cache_cfg.get("ttl_seconds", Settings.AI_CACHE_TTL_SECONDS),
+        db_path=cache_cfg.get("db_path", Settings.AI_CACHE_DB_PATH) if cache_cfg.get("disk") else None
+    )
+
+
+class AIResultCache:
+    """TTL + LRU reply cache with an optional on-disk SQLite tier"""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 600.0,
+                 db_path: Optional[str] = None, max_disk_entries: int = 10000):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.db_path = db_path
+        self.max_disk_entries = max_disk_entries
+
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()  # key -> (expires_at, reply)
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._disk_writes = 0
+
+        self._conn: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS ai_cache (
+                    key TEXT PRIMARY KEY,
+                    reply TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_cache_expires ON ai_cache(expires_at)")
+            self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._hits += 1
+                    return entry[1]
+                del self._entries[key]
+
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT reply, expires_at FROM ai_cache WHERE key = ? AND expires_at > ?", (key, now)
+                ).fetchone()
+                if row:
+                    self._store_locked(key, row[0], row[1])
+                    self._hits += 1
+                    self._disk_hits += 1
+                    return row[0]
+
+            self._misses += 1
+            return None
+
+    def put(self, key: str, reply: str):
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._store_locked(key, reply, expires_at)
+            if self._conn is not None:
+                try:
+                    with self._conn:
+                        self._conn.execute(
+                            "INSERT OR REPLACE INTO ai_cache (key, reply, expires_at) VALUES (?, ?, ?)",
+                            (key, reply, expires_at)
+                        )
+                        self._disk_writes += 1
+                        if self._disk_writes % 100 == 0:
+                            self._trim_disk_locked()
+                except sqlite3.Error as e:
+                    logger.warning(f"AI cache disk write failed: {e}")
+
+    def _store_locked(self, key: str, reply: str, expires_at: float):
+        self._entries[key] = (expires_at, reply)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def _trim_disk_locked(self):
+        """Drop expired rows, then the soonest-expiring rows beyond max_disk_entries"""
+        self._conn.execute("DELETE FROM ai_cache WHERE expires_at <= ?", (time.time(),))
+        self._conn.execute("""
+            DELETE FROM ai_cache WHERE key IN (
+                SELECT key FROM ai_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+            )
+        """, (self.max_disk_entries,))
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "disk_hits": self._disk_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+                "entries": len(self._entries),
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute("DELETE FROM ai_cache")
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
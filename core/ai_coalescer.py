@@ -0,0 +1,171 @@
+"""
+Per-conversation coalescing of AI analysis requests.
+Requests for a conversation that already has an analysis pending or running
+attach to that job instead of starting another model call: they share its
+Future, and every stage result is fanned out to all attached listeners
+(stages that finished before a listener attached are replayed to it).
+A new job waits debounce_seconds before starting, and a burst of requests in
+that window collapses into one call on the most recent payload (or on the
+payloads combined by merge).
+Jobs run on a private thread pool, or on an AIScheduler when one is given
+(the debounce then becomes the scheduler delay, so no worker sleeps).
+"""
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from core.ai_scheduler import PRIORITY_INTERACTIVE
+
+logger = logging.getLogger(__name__)
+
+
+StageListener = Callable[[Any], None]
+
+
+def merge_scopes(pending: tuple, payload: tuple) -> tuple:
+    """
+    merge for payloads whose last item is a tuple of memory scopes: the newer
+    payload, with the requesters of both
+    """
+    scopes = pending[-1] + tuple(scope for scope in payload[-1] if scope not in pending[-1])
+    return payload[:-1] + (scopes,)
+
+
+class _Job:
+    def __init__(self, payload: Any):
+        self.payload = payload
+        self.future: Future = Future()
+        self.listeners: List[StageListener] = []
+        self.stages: List[Any] = []
+        self.started = False
+        self.requests = 1
+
+
+class AIRequestCoalescer:
+    """In-flight dedup plus debounce, keyed by conversation"""
+
+    def __init__(self, run: Callable[[Any, StageListener], Any], debounce_seconds: float = 0.0,
+                 max_workers: int = 4, scheduler=None, merge: Optional[Callable[[Any, Any], Any]] = None):
+        """
+        Args:
+            run: run(payload, on_stage) -> result; executed on a worker thread
+            scheduler: optional AIScheduler; jobs are queued on it with the
+                key as their fairness flow
+            merge: merge(pending payload, new payload) -> payload for a request
+                that lands in a job's debounce window (default: the new one)
+        """
+        self.run = run
+        self.merge = merge
+        self.debounce_seconds = debounce_seconds
+        self.scheduler = scheduler
+        self._executor = None
+        if scheduler is None:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-coalesce")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, _Job] = {}
+        self._stats = {"requests": 0, "runs": 0, "debounced": 0, "joined_running": 0}
+
+    def submit(self, key: str, payload: Any, on_stage: Optional[StageListener] = None,
+               priority: int = PRIORITY_INTERACTIVE) -> Future:
+        """
+        Request an analysis for key. Returns the Future of the job this request
+        was merged into; on_stage receives every stage result of that job.
+        priority only applies to a new job (see AIScheduler).
+        """
+        created = False
+        with self._lock:
+            self._stats["requests"] += 1
+            job = self._jobs.get(key)
+            if job is None:
+                job = _Job(payload)
+                self._jobs[key] = job
+                created = True
+            else:
+                job.requests += 1
+                if job.started:
+                    self._stats["joined_running"] += 1
+                else:
+                    # Still in the debounce window: the latest context wins
+                    job.payload = self.merge(job.payload, payload) if self.merge else payload
+                    self._stats["debounced"] += 1
+            replay = list(job.stages)
+            if on_stage:
+                job.listeners.append(on_stage)
+
+        if created:
+            self._schedule(key, job, priority)
+        if on_stage:
+            for stage in replay:
+                self._call_listener(on_stage, stage)
+        return job.future
+
+    def _schedule(self, key: str, job: _Job, priority: int):
+        if self.scheduler is None:
+            self._executor.submit(self._run_job, key, job, self.debounce_seconds)
+            return
+        try:
+            scheduled = self.scheduler.submit(self._run_job, key, job, 0.0, flow=key, priority=priority,
+                                              delay=self.debounce_seconds)
+        except Exception as e:
+            self._fail(key, job, e)
+            return
+        # _run_job never raises, so an error here means the scheduler dropped the job
+        scheduled.add_done_callback(lambda f: self._on_scheduled_done(key, job, f))
+
+    def _on_scheduled_done(self, key: str, job: _Job, scheduled: Future):
+        if scheduled.cancelled():
+            self._finish(key, job)
+            job.future.cancel()
+        elif scheduled.exception() is not None:
+            self._fail(key, job, scheduled.exception())
+
+    def _fail(self, key: str, job: _Job, error: BaseException):
+        self._finish(key, job)
+        if not job.future.done():
+            job.future.set_exception(error)
+
+    def _run_job(self, key: str, job: _Job, debounce_seconds: float):
+        if debounce_seconds > 0:
+            time.sleep(debounce_seconds)
+        with self._lock:
+            job.started = True
+            payload = job.payload
+            self._stats["runs"] += 1
+        try:
+            result = self.run(payload, lambda stage: self._publish(job, stage))
+        except Exception as e:
+            self._finish(key, job)
+            job.future.set_exception(e)
+        else:
+            self._finish(key, job)
+            job.future.set_result(result)
+
+    def _publish(self, job: _Job, stage: Any):
+        with self._lock:
+            job.stages.append(stage)
+            listeners = list(job.listeners)
+        for listener in listeners:
+            self._call_listener(listener, stage)
+
+    def _finish(self, key: str, job: _Job):
+        with self._lock:
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
+
+    @staticmethod
+    def _call_listener(listener: StageListener, stage: Any):
+        try:
+            listener(stage)
+        except Exception as e:
+            logger.error(f"AI stage listener failed: {e}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, pending=len(self._jobs))
+
+    def shutdown(self):
+        """Stops the private pool; a shared scheduler is shut down by its owner"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
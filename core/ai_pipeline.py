@@ -0,0 +1,255 @@
+"""
+Concurrent AI analysis pipeline.
+The emotion, memory and suggestion calls for one request are independent, so
+they run in parallel on a shared thread pool and each result is handed to the
+caller as soon as its stage finishes. Per-stage latencies are recorded both
+as call duration and end-to-end (from request start), for the server UI/logs.
+The suggestion can also be streamed as SuggestionDelta events; its
+time-to-first-token is recorded alongside. With an AISessionManager, memories
+are mined incrementally: only messages past the conversation's high-water
+mark are sent, and the mark advances together with the memories found. A run
+shared by several requesters extracts memories once and reports them per
+requester (memory scope), each against its own mark.
+"""
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, replace
+from typing import Any, Callable, Deque, Dict, Iterable, List, Optional, Sequence
+
+from core.ai_session_manager import AISessionManager, MemoryDelta
+from core.protocol import AIEmotion, AIMemory, AISuggestion, AISuggestionDelta
+
+logger = logging.getLogger(__name__)
+
+
+STAGES = ("emotion", "memories", "suggestion")
+
+
+@dataclass
+class StageResult:
+    stage: str
+    value: Any
+    duration: float  # seconds spent in the model call
+    latency: float  # seconds from pipeline start to completion
+    error: Optional[str] = None
+    scope: Optional[str] = None  # memories: the memory scope (requester) this result is for
+
+
+@dataclass
+class SuggestionDelta:
+    title: str  # title so far
+    text: str  # content appended since the previous delta
+
+
+def stage_message(conversation_id: str, result) -> Optional[Dict]:
+    """
+    Protocol message for a finished stage or a SuggestionDelta
+    (None if the stage failed or found nothing)
+    """
+    if isinstance(result, SuggestionDelta):
+        return AISuggestionDelta(conversation_id, result.title, result.text).to_dict()
+    if result.error or not result.value:
+        return None
+    if result.stage == "emotion":
+        return AIEmotion(conversation_id, result.value).to_dict()
+    if result.stage == "memories":
+        return AIMemory(conversation_id, result.value).to_dict()
+    s = result.value
+    return AISuggestion(conversation_id, s.get("title", ""), s.get("content", ""), s.get("type", "suggestion")).to_dict()
+
+
+class StageMetrics:
+    """Rolling latency statistics per stage (last `window` samples)"""
+
+    def __init__(self, window: int = 200):
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, Deque[float]] = {stage: deque(maxlen=window) for stage in STAGES}
+        self._durations: Dict[str, Deque[float]] = {stage: deque(maxlen=window) for stage in STAGES}
+        self._errors: Dict[str, int] = {stage: 0 for stage in STAGES}
+        self._first_tokens: Dict[str, Deque[float]] = {stage: deque(maxlen=window) for stage in STAGES}
+
+    def record(self, result: StageResult):
+        with self._lock:
+            self._latencies[result.stage].append(result.latency)
+            self._durations[result.stage].append(result.duration)
+            if result.error:
+                self._errors[result.stage] += 1
+
+    def record_first_token(self, stage: str, latency: float):
+        """Seconds from pipeline start to the first streamed piece of a stage"""
+        with self._lock:
+            self._first_tokens[stage].append(latency)
+
+    @staticmethod
+    def _percentile(values: List[float], fraction: float) -> float:
+        if not values:
+            return 0.0
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """{stage: {count, errors, p50, p95, max, mean_duration, first_token_p50, first_token_p95}} in seconds"""
+        with self._lock:
+            stats = {}
+            for stage in STAGES:
+                latencies = list(self._latencies[stage])
+                durations = list(self._durations[stage])
+                first_tokens = list(self._first_tokens[stage])
+                stats[stage] = {
+                    "count": len(latencies),
+                    "errors": self._errors[stage],
+                    "p50": self._percentile(latencies, 0.5),
+                    "p95": self._percentile(latencies, 0.95),
+                    "max": max(latencies, default=0.0),
+                    "mean_duration": sum(durations) / len(durations) if durations else 0.0,
+                    "first_token_p50": self._percentile(first_tokens, 0.5),
+                    "first_token_p95": self._percentile(first_tokens, 0.95),
+                }
+            return stats
+
+    def summary(self) -> str:
+        return ", ".join(
+            f"{stage} p50={s['p50']:.2f}s p95={s['p95']:.2f}s"
+            + (f" first token p50={s['first_token_p50']:.2f}s" if s["first_token_p50"] else "")
+            for stage, s in self.snapshot().items() if s["count"]
+        )
+
+
+class AIPipeline:
+    """Runs the AIService stages for a context concurrently"""
+
+    def __init__(self, ai_service, max_workers: int = 9, sessions: Optional[AISessionManager] = None):
+        self.ai_service = ai_service
+        self.sessions = sessions
+        self.metrics = StageMetrics()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-stage")
+
+    def _stage_calls(self, stream_kwargs: Dict[str, Any],
+                     memory_delta: Optional[MemoryDelta] = None) -> Dict[str, Callable[[List[Dict]], Any]]:
+        memories = self.ai_service.extract_memories
+        if memory_delta is not None:
+            def memories(messages: List[Dict]) -> List[Dict]:
+                found = self.ai_service.extract_new_memories(memory_delta.new_messages, memory_delta.prior_memories)
+                if found is None:
+                    # Leave the high-water mark where it is so these messages are retried
+                    raise RuntimeError("memory extraction failed")
+                return found
+        return {
+            "emotion": self.ai_service.analyze_emotion,
+            "memories": memories,
+            "suggestion": lambda messages: self.ai_service.generate_suggestion(messages, **stream_kwargs),
+        }
+
+    def run(self, context_messages: List[Dict],
+            on_stage: Optional[Callable[[StageResult], None]] = None,
+            on_delta: Optional[Callable[[SuggestionDelta], None]] = None,
+            stages: Iterable[str] = STAGES,
+            conversation_id: Optional[str] = None,
+            memory_scopes: Sequence[str] = ()) -> Dict[str, StageResult]:
+        """
+        Run the given stages (all by default) and block until they finish.
+        on_stage is called on the calling thread in completion order, as each
+        stage finishes. A failing stage yields a StageResult with error set
+        and value None.
+        
+        When the service uses fused analysis, one analyze_all call answers every
+        stage it can; only the stages missing from its reply run separately.
+        
+        With on_delta the suggestion is streamed: on_delta receives a
+        SuggestionDelta (on a pool thread) as each piece of it arrives.
+        
+        With sessions and a conversation_id, the memories stage yields only
+        memories not reported for that conversation before. With
+        memory_scopes instead, one extraction (from the lowest high-water
+        mark) serves every scope, and on_stage gets one memories result per
+        scope, holding the memories new to it.
+        """
+        started = time.perf_counter()
+        results: Dict[str, StageResult] = {}
+        stream_kwargs: Dict[str, Any] = {}
+        if on_delta:
+            first_token = []
+            
+            def delta(title: str, text: str):
+                if not first_token:
+                    first_token.append(True)
+                    self.metrics.record_first_token("suggestion", time.perf_counter() - started)
+                on_delta(SuggestionDelta(title, text))
+            stream_kwargs["on_delta"] = delta
+
+        pending = [stage for stage in STAGES if stage in stages]
+        scopes = list(memory_scopes) or ([conversation_id] if conversation_id else [])
+        memory_deltas: Dict[str, MemoryDelta] = {}
+        if self.sessions is not None and scopes and "memories" in pending:
+            for scope in scopes:
+                delta = self.sessions.memory_delta(scope, context_messages)
+                if delta is None:
+                    # Messages without seq cannot be tracked for anyone
+                    memory_deltas = {}
+                    break
+                memory_deltas[scope] = delta
+        # The widest delta (lowest mark) covers what every scope has not mined yet
+        memory_delta = max(memory_deltas.values(), key=lambda d: len(d.new_messages), default=None)
+
+        def publish(result: StageResult):
+            results[result.stage] = result
+            if on_stage:
+                on_stage(result)
+
+        def finish(result: StageResult):
+            self.metrics.record(result)
+            if result.stage != "memories" or not memory_deltas:
+                publish(result)
+                return
+            for scope, delta in memory_deltas.items():
+                value = result.value
+                if not result.error:
+                    # A scope that had mined every message gets nothing from the others' delta
+                    accepted = self.sessions.commit_memories(scope, delta, result.value or []) if delta.new_messages else []
+                    value = accepted or []
+                publish(replace(result, value=value, scope=scope))
+
+        if memory_delta is not None and not memory_delta.new_messages:
+            # Every message was mined by an earlier run
+            finish(StageResult("memories", [], 0.0, time.perf_counter() - started))
+            pending.remove("memories")
+
+        if pending and getattr(self.ai_service, "use_fused_analysis", False):
+            fused_kwargs = dict(stream_kwargs)
+            if memory_delta is not None:
+                fused_kwargs.update(new_messages=memory_delta.new_messages if "memories" in pending else [],
+                                    prior_memories=memory_delta.prior_memories)
+            try:
+                fused = self.ai_service.analyze_all(context_messages, fallback=False, **fused_kwargs)
+            except Exception as e:
+                logger.error(f"Fused AI analysis failed: {e}")
+                fused = {}
+            elapsed = time.perf_counter() - started
+            for stage in pending:
+                if stage in fused:
+                    finish(StageResult(stage, fused[stage], elapsed, elapsed))
+            pending = [stage for stage in pending if stage not in fused]
+
+        def timed(call):
+            call_started = time.perf_counter()
+            value = call(context_messages)
+            return value, time.perf_counter() - call_started
+
+        calls = self._stage_calls(stream_kwargs, memory_delta)
+        futures = {self._executor.submit(timed, calls[stage]): stage for stage in pending}
+        for future in as_completed(futures):
+            stage = futures[future]
+            try:
+                value, duration = future.result()
+                finish(StageResult(stage, value, duration, time.perf_counter() - started))
+            except Exception as e:
+                logger.error(f"AI stage {stage} failed: {e}")
+                elapsed = time.perf_counter() - started
+                finish(StageResult(stage, None, elapsed, elapsed, error=str(e)))
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,290 @@
+"""
+Bounded, prioritized scheduler for AI analysis jobs (no Qt dependency).
+Jobs are tagged with a flow (user or conversation) and a priority class.
+Classes are served strictly in order - explicit /ai requests before
+background analysis - and flows within a class share the workers by
+self-clocked weighted fair queuing, so one busy room cannot starve the rest.
+The queue is bounded: when it is full a new job displaces the newest job of a
+lower class, or is rejected with QueueFullError. Jobs still queued when their
+deadline passes are dropped with DeadlineExpiredError instead of running late.
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from config.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "background": PRIORITY_BACKGROUND}
+
+
+class SchedulerError(RuntimeError):
+    """A job was not run by the scheduler"""
+
+
+class QueueFullError(SchedulerError):
+    pass
+
+
+class DeadlineExpiredError(SchedulerError):
+    pass
+
+
+def priority_of(name: Optional[str]) -> int:
+    """Protocol priority name -> priority class (unknown names are interactive)"""
+    return PRIORITIES.get(name or "interactive", PRIORITY_INTERACTIVE)
+
+
+def create_ai_scheduler(config: Dict[str, Any]) -> "AIScheduler":
+    """
+    Build the scheduler from server_config.json "ai_scheduler":
+    {"workers": 3, "max_queue": 64, "interactive_deadline_seconds": 30, "background_deadline_seconds": 120}
+    """
+    sched_cfg = config.get("ai_scheduler", {})
+    return AIScheduler(
+        max_workers=sched_cfg.get("workers", Settings.AI_SCHEDULER_WORKERS),
+        max_queue=sched_cfg.get("max_queue", Settings.AI_QUEUE_MAX),
+        deadlines={
+            PRIORITY_INTERACTIVE: sched_cfg.get("interactive_deadline_seconds",
+                                                Settings.AI_INTERACTIVE_DEADLINE_SECONDS),
+            PRIORITY_BACKGROUND: sched_cfg.get("background_deadline_seconds",
+                                               Settings.AI_BACKGROUND_DEADLINE_SECONDS),
+        }
+    )
+
+
+class _Job:
+    def __init__(self, fn: Callable, args: Tuple, flow: str, priority: int, weight: float,
+                 submitted_at: float, ready_at: float, deadline: Optional[float], seq: int):
+        self.fn = fn
+        self.args = args
+        self.flow = flow
+        self.priority = priority
+        self.weight = weight
+        self.submitted_at = submitted_at
+        self.ready_at = ready_at
+        self.deadline = deadline  # monotonic time, None = no deadline
+        self.seq = seq
+        self.finish_tag = 0.0
+        self.future: Future = Future()
+
+
+class AIScheduler:
+    """Fixed worker pool with a bounded, fair, prioritized queue"""
+
+    def __init__(self, max_workers: int = 3, max_queue: int = 64,
+                 deadlines: Optional[Dict[int, Optional[float]]] = None, wait_window: int = 500):
+        """
+        Args:
+            deadlines: default seconds a job of each priority class may wait
+                before it is dropped (None = no deadline)
+        """
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.deadlines = deadlines or {}
+
+        self._cond = threading.Condition()
+        self._ready: List[Tuple[int, float, int, _Job]] = []  # (priority, finish_tag, seq, job)
+        self._delayed: List[Tuple[float, int, _Job]] = []  # (ready_at, seq, job)
+        self._virtual_time: Dict[int, float] = {}  # per priority class
+        self._flow_finish: Dict[Tuple[int, str], float] = {}  # (priority, flow) -> last finish tag
+        self._seq = itertools.count()
+        self._dropped: List[Tuple[_Job, SchedulerError]] = []  # resolved outside the lock
+        self._running = 0
+        self._closed = False
+        self._waits: Deque[float] = deque(maxlen=wait_window)
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected": 0, "shed": 0,
+                       "expired": 0, "max_depth": 0}
+
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"ai-sched-{i}", daemon=True) for i in range(max_workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, fn: Callable, *args, flow: str = "", priority: int = PRIORITY_INTERACTIVE,
+               weight: float = 1.0, delay: float = 0.0, deadline_seconds: Optional[float] = None) -> Future:
+        """
+        Queue fn(*args). The job becomes eligible after delay seconds and is
+        dropped if it has not started deadline_seconds after submission
+        (default: the class deadline). Raises QueueFullError when the queue is
+        full of jobs of the same or a higher class.
+        """
+        now = time.monotonic()
+        if deadline_seconds is None:
+            deadline_seconds = self.deadlines.get(priority)
+        job = _Job(fn, args, flow, priority, max(weight, 1e-6), now, now + max(delay, 0.0),
+                   now + deadline_seconds if deadline_seconds is not None else None, next(self._seq))
+
+        try:
+            with self._cond:
+                if self._closed:
+                    raise SchedulerError("AI scheduler is shut down")
+                self._expire_queued_locked(now)
+                if self._depth_locked() >= self.max_queue:
+                    victim = self._lowest_queued_locked()
+                    if victim is None or victim.priority <= priority:
+                        self._stats["rejected"] += 1
+                        raise QueueFullError(f"AI queue full ({self.max_queue} jobs)")
+                    self._remove_locked(victim)
+                    self._stats["shed"] += 1
+                    self._dropped.append((victim, QueueFullError("Displaced by a higher-priority AI job")))
+
+                self._stats["submitted"] += 1
+                if job.ready_at > now:
+                    heapq.heappush(self._delayed, (job.ready_at, job.seq, job))
+                else:
+                    self._enqueue_ready_locked(job)
+                self._stats["max_depth"] = max(self._stats["max_depth"], self._depth_locked())
+                self._cond.notify()
+        finally:
+            self._resolve_dropped()
+        return job.future
+
+    def _depth_locked(self) -> int:
+        return len(self._ready) + len(self._delayed)
+
+    def _enqueue_ready_locked(self, job: _Job):
+        # SCFQ: a flow's next job starts at max(class virtual time, the flow's previous finish)
+        key = (job.priority, job.flow)
+        start = max(self._virtual_time.get(job.priority, 0.0), self._flow_finish.get(key, 0.0))
+        job.finish_tag = start + 1.0 / job.weight
+        self._flow_finish[key] = job.finish_tag
+        heapq.heappush(self._ready, (job.priority, job.finish_tag, job.seq, job))
+
+    def _lowest_queued_locked(self) -> Optional[_Job]:
+        """Newest job of the lowest class - the first to be shed"""
+        jobs = [entry[-1] for entry in self._ready] + [entry[-1] for entry in self._delayed]
+        return max(jobs, key=lambda j: (j.priority, j.seq), default=None)
+
+    def _remove_locked(self, job: _Job):
+        self._ready = [entry for entry in self._ready if entry[-1] is not job]
+        self._delayed = [entry for entry in self._delayed if entry[-1] is not job]
+        heapq.heapify(self._ready)
+        heapq.heapify(self._delayed)
+
+    def _expire_queued_locked(self, now: float):
+        expired = [entry[-1] for entry in self._ready + self._delayed
+                   if entry[-1].deadline is not None and entry[-1].deadline <= now]
+        for job in expired:
+            self._remove_locked(job)
+            self._expire(job)
+
+    def _expire(self, job: _Job):
+        self._stats["expired"] += 1
+        self._dropped.append((job, DeadlineExpiredError(
+            f"AI job for {job.flow or 'anonymous'} waited past its deadline"
+        )))
+
+    def _resolve_dropped(self):
+        # Futures run their done-callbacks synchronously, so fail them without holding the lock
+        with self._cond:
+            dropped, self._dropped = self._dropped, []
+        for job, error in dropped:
+            if job.future.set_running_or_notify_cancel():
+                job.future.set_exception(error)
+
+    def _next_job_locked(self) -> Optional[_Job]:
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            self._enqueue_ready_locked(heapq.heappop(self._delayed)[-1])
+        while self._ready:
+            job = heapq.heappop(self._ready)[-1]
+            self._virtual_time[job.priority] = job.finish_tag
+            if job.deadline is not None and job.deadline <= now:
+                self._expire(job)
+                continue
+            if len(self._flow_finish) > 4 * self.max_queue:
+                self._prune_flows_locked()
+            return job
+        return None
+
+    def _prune_flows_locked(self):
+        # Tags at or behind the class clock are equivalent to a fresh flow
+        self._flow_finish = {
+            key: tag for key, tag in self._flow_finish.items() if tag > self._virtual_time.get(key[0], 0.0)
+        }
+
+    def _wait_timeout_locked(self) -> Optional[float]:
+        if not self._delayed:
+            return None
+        return max(0.0, self._delayed[0][0] - time.monotonic())
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job = self._next_job_locked()
+                while job is None and not self._dropped:
+                    if self._closed:
+                        return
+                    self._cond.wait(self._wait_timeout_locked())
+                    job = self._next_job_locked()
+                if job is not None:
+                    self._running += 1
+                    self._waits.append(time.monotonic() - job.ready_at)
+            self._resolve_dropped()
+            if job is None:
+                continue
+            if not job.future.set_running_or_notify_cancel():
+                with self._cond:
+                    self._running -= 1
+                continue
+
+            try:
+                result = job.fn(*job.args)
+            except Exception as e:
+                logger.error(f"AI job for {job.flow or 'anonymous'} failed: {e}")
+                job.future.set_exception(e)
+                outcome = "failed"
+            else:
+                job.future.set_result(result)
+                outcome = "completed"
+            with self._cond:
+                self._running -= 1
+                self._stats[outcome] += 1
+
+    @staticmethod
+    def _percentile(ordered: List[float], fraction: float) -> float:
+        if not ordered:
+            return 0.0
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def stats(self) -> Dict[str, float]:
+        """Counters plus current depth and queue wait (seconds, recent jobs)"""
+        with self._cond:
+            waits = sorted(self._waits)
+            return dict(
+                self._stats,
+                queued=self._depth_locked(),
+                running=self._running,
+                wait_p50=self._percentile(waits, 0.5),
+                wait_p95=self._percentile(waits, 0.95),
+                wait_max=waits[-1] if waits else 0.0,
+            )
+
+    def summary(self) -> str:
+        s = self.stats()
+        return (f"queued={s['queued']} running={s['running']} wait p50={s['wait_p50']:.2f}s "
+                f"p95={s['wait_p95']:.2f}s rejected={s['rejected']} expired={s['expired']}")
+
+    def shutdown(self, wait: bool = False):
+        """Cancel queued jobs; running jobs finish"""
+        with self._cond:
+            self._closed = True
+            queued = [entry[-1] for entry in self._ready + self._delayed]
+            self._ready, self._delayed = [], []
+            self._cond.notify_all()
+        for job in queued:
+            job.future.cancel()
+        if wait:
+            for worker in self._workers:
+                worker.join()
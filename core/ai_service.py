@@ -4,22 +4,35 @@ Uses provider abstraction for compatibility with multiple AI backends (OpenAI, G
 import os
 import json
 import logging
-from typing import List, Dict, Optional
+import threading
+from typing import Any, Callable, List, Dict, Optional
 from dotenv import load_dotenv
 
-from core.providers import create_provider, AIProvider
+from core.ai_cache import AIResultCache, cache_key
+from core.ai_stream import StreamingJSONFields
+from core.emotion_lexicon import EmotionLexicon
+from core.trigger_engine import TriggerEngine
+from core.providers import create_provider, AIProvider, IncompleteStreamError
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+ANALYSIS_MODES = ("auto", "fused", "separate")
+EMOTION_MODES = ("llm", "local", "hybrid")
+EMOTION_TYPES = ("neutral", "happy", "tense", "negative")
+
 
 class AIService:
     """Handles all AI-related operations through unified provider interface"""
     
     def __init__(self, api_key: Optional[str] = None, api_base: Optional[str] = None, 
                  model: Optional[str] = None, timeout: float = 60.0,
-                 provider_type: str = "auto"):
+                 provider_type: str = "auto", analysis_mode: str = "auto",
+                 cache: Optional[AIResultCache] = None, http_pool_size: int = 10,
+                 fallbacks: Optional[List[Dict]] = None, resilience: Optional[Dict] = None,
+                 emotion_mode: str = "llm", emotion_min_confidence: float = 0.2,
+                 triggers: Optional[TriggerEngine] = None):
         self.api_key = api_key or os.getenv("OPENAI_API_KEY", "lm-studio")
         self.api_base = api_base or os.getenv("OPENAI_API_BASE", "http://127.0.0.1:1235/v1")
         self.model = model or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
@@ -32,14 +45,80 @@ class AIService:
             model=self.model,
             base_url=self.api_base,
             timeout=self.timeout,
-            provider_type=provider_type
+            provider_type=provider_type,
+            pool_size=http_pool_size,
+            fallbacks=fallbacks,
+            resilience=resilience
         )
         
+        # "fused": one analyze_all call per request, "separate": three calls, "auto": provider default
+        self.analysis_mode = analysis_mode if analysis_mode in ANALYSIS_MODES else "auto"
+        self.analysis_stats = {"fused_calls": 0, "fused_fallbacks": 0}
+        self._stats_lock = threading.Lock()
+        self.cache = cache
+        
+        # "llm": model call, "local": lexicon scorer only, "hybrid": lexicon first,
+        # model call when its confidence is below emotion_min_confidence
+        self.emotion_mode = emotion_mode if emotion_mode in EMOTION_MODES else "llm"
+        self.emotion_min_confidence = emotion_min_confidence
+        self.emotion_lexicon = EmotionLexicon() if self.emotion_mode != "llm" else None
+        self.emotion_stats = {"local": 0, "escalated": 0}
+        # Keywords that make a conversation worth a suggestion
+        self.triggers = triggers or TriggerEngine()
+        
         logger.info(f"[AIService] Initialized with provider: {type(self.provider).__name__}")
     
+    def close(self):
+        self.provider.close()
+    
+    @property
+    def use_fused_analysis(self) -> bool:
+        if self.analysis_mode == "auto":
+            return self.provider.supports_fused_analysis
+        return self.analysis_mode == "fused"
+    
     def _make_request(self, messages: List[Dict], temperature: float = 0.3, 
-                      max_tokens: int = 500) -> Optional[str]:
-        return self.provider.generate_content(messages, temperature, max_tokens)
+                      max_tokens: int = 500, task: str = "generic",
+                      on_chunk: Optional[Callable[[str], None]] = None) -> Optional[str]:
+        """
+        Model reply for messages (cached). With on_chunk the reply is streamed
+        and on_chunk receives each piece as it arrives; cached replies are
+        returned without chunks. A stream that breaks off returns None and is
+        not cached.
+        """
+        key = cache_key(task, self.model, messages, temperature) if self.cache is not None else None
+        if key is not None:
+            content = self.cache.get(key)
+            if content is not None:
+                return content
+        
+        if on_chunk is None:
+            content = self.provider.generate_content(messages, temperature, max_tokens)
+        else:
+            parts = []
+            try:
+                for chunk in self.provider.stream_content(messages, temperature, max_tokens):
+                    parts.append(chunk)
+                    on_chunk(chunk)
+            except IncompleteStreamError as e:
+                logger.warning(f"[AIService] Discarding incomplete {task} reply: {e}")
+                return None
+            content = "".join(parts).strip() or None
+        
+        if key is not None and content:
+            self.cache.put(key, content)
+        return content
+    
+    @staticmethod
+    def _suggestion_chunks(on_delta: Callable[[str, str], None], after: Optional[str] = None) -> Callable[[str], None]:
+        """on_chunk handler that reports (title so far, new content text) of a streamed suggestion"""
+        fields = StreamingJSONFields(("title", "content"), after=after)
+        
+        def on_chunk(chunk: str):
+            content = fields.feed(chunk).get("content")
+            if content:
+                on_delta(fields.values["title"], content)
+        return on_chunk
     
     def analyze_emotion(self, recent_messages: List[Dict]) -> Dict[str, float]:
         """
@@ -51,6 +130,10 @@ class AIService:
         if len(recent_messages) == 0:
             return {"neutral": 1.0}
         
+        local = self._local_emotion(recent_messages)
+        if local is not None:
+            return local
+        
         # Prepare conversation context
         context = "\n".join([f"{msg['sender']}: {msg['content']}" for msg in recent_messages])
         
@@ -75,22 +158,39 @@ class AIService:
             {"role": "user", "content": prompt}
         ]
         
-        content = self._make_request(messages, temperature=0.3, max_tokens=200)
+        content = self._make_request(messages, temperature=0.3, max_tokens=200, task="emotion")
         
         if content:
-            emotion_data = self._extract_json(content)
-            if emotion_data and isinstance(emotion_data, dict):
-                default_emotions = {"neutral": 0.0, "happy": 0.0, "tense": 0.0, "negative": 0.0}
-                default_emotions.update({k: float(v) for k, v in emotion_data.items() if k in default_emotions})
-                total = sum(default_emotions.values())
-                if total > 0:
-                    default_emotions = {k: v / total for k, v in default_emotions.items()}
-                else:
-                    default_emotions = {"neutral": 1.0}
-                return default_emotions
+            emotions = self._normalize_emotions(self._extract_json(content))
+            if emotions:
+                return emotions
         
         return {"neutral": 1.0}
     
+    def _local_emotion(self, recent_messages: List[Dict]) -> Optional[Dict[str, float]]:
+        """Lexicon scores when the emotion mode lets them replace the model call, else None"""
+        if self.emotion_lexicon is None:
+            return None
+        estimate = self.emotion_lexicon.score(recent_messages)
+        local = self.emotion_mode == "local" or estimate.confidence >= self.emotion_min_confidence
+        with self._stats_lock:
+            self.emotion_stats["local" if local else "escalated"] += 1
+        return estimate.scores if local else None
+    
+    def _normalize_emotions(self, emotion_data: Any) -> Optional[Dict[str, float]]:
+        """Scores for the known emotion types, normalized to sum to 1 (None if unusable)"""
+        if not emotion_data or not isinstance(emotion_data, dict):
+            return None
+        emotions = {k: 0.0 for k in EMOTION_TYPES}
+        try:
+            emotions.update({k: float(v) for k, v in emotion_data.items() if k in emotions})
+        except (TypeError, ValueError):
+            return None
+        total = sum(emotions.values())
+        if total > 0:
+            return {k: v / total for k, v in emotions.items()}
+        return {"neutral": 1.0}
+    
     def extract_memories(self, recent_messages: List[Dict]) -> List[Dict]:
         """
         Extract key information (memories) from conversation
@@ -100,7 +200,31 @@ class AIService:
         """
         if len(recent_messages) < 2:
             return []
+        return self._request_memories(recent_messages) or []
+    
+    def extract_new_memories(self, new_messages: List[Dict], prior_memories: List[Dict]) -> Optional[List[Dict]]:
+        """
+        Extract memories from messages not mined before; a summary of
+        prior_memories is sent along so they are not extracted again.
         
+        Returns:
+            List of memory dicts, or None if the model call failed
+        """
+        if not new_messages:
+            return []
+        return self._request_memories(new_messages, prior_memories)
+    
+    @staticmethod
+    def _memory_summary(memories: Optional[List[Dict]], limit: int = 20, width: int = 60) -> str:
+        """Compact prompt section listing known memories ("" when there are none)"""
+        if not memories:
+            return ""
+        lines = [f"- {str(m.get('content', ''))[:width]}" for m in memories[-limit:]]
+        return "已记录的记忆（不要重复提取）：\n" + "\n".join(lines) + "\n\n"
+    
+    def _request_memories(self, recent_messages: List[Dict],
+                          prior_memories: Optional[List[Dict]] = None) -> Optional[List[Dict]]:
+        """Memories the model extracts from recent_messages (None if the call failed)"""
         context = "\n".join([f"{msg['sender']}: {msg['content']}" for msg in recent_messages])
         
         prompt = f"""从以下对话中提取关键信息。关注：
@@ -108,7 +232,7 @@ class AIService:
 2. 已达成的明确约定
 3. 需要记住的长期话题
 
-对话内容：
+{self._memory_summary(prior_memories)}对话内容：
 {context}
 
 返回JSON数组格式，每个元素包含：
@@ -124,26 +248,29 @@ class AIService:
             {"role": "user", "content": prompt}
         ]
         
-        content = self._make_request(messages, temperature=0.3, max_tokens=500)
+        content = self._make_request(messages, temperature=0.3, max_tokens=500, task="memories")
         
         if content:
             memories = self._extract_json_array(content)
             return memories if isinstance(memories, list) else []
         
-        return []
+        return None
     
-    def generate_suggestion(self, recent_messages: List[Dict]) -> Optional[Dict]:
+    def generate_suggestion(self, recent_messages: List[Dict],
+                            on_delta: Optional[Callable[[str, str], None]] = None) -> Optional[Dict]:
         """
         Generate decision/planning suggestion if triggered
         
+        Args:
+            on_delta: streams the reply; called with (title so far, new content text)
+        
         Returns:
             Dict with 'title', 'content', and 'type' fields, or None if no suggestion
         """
         # Check if there are planning-related keywords
-        context = "\n".join([f"{msg['sender']}: {msg['content']}" for msg in recent_messages[-5:]])
+        context = "\n".join([f"{msg['sender']}: {msg['content']}" for msg in recent_messages[-self.triggers.window:]])
         
-        keywords = ['明天', '下周', '周末', '计划', '安排', '出去玩', '聚餐', '学习']
-        if not any(keyword in context for keyword in keywords):
+        if not self.triggers.triggered(context):
             return None
         
         prompt = f"""分析以下对话，如果涉及计划、安排或决策，请生成一个实用的建议。
@@ -165,7 +292,8 @@ class AIService:
             {"role": "user", "content": prompt}
         ]
         
-        content = self._make_request(messages, temperature=0.5, max_tokens=300)
+        on_chunk = self._suggestion_chunks(on_delta) if on_delta else None
+        content = self._make_request(messages, temperature=0.5, max_tokens=300, task="suggestion", on_chunk=on_chunk)
         
         if content:
             if content.lower() in ['null', 'none', '']:
@@ -175,6 +303,112 @@ class AIService:
         
         return None
     
+    def analyze_all(self, recent_messages: List[Dict], fallback: bool = True,
+                    on_delta: Optional[Callable[[str, str], None]] = None,
+                    new_messages: Optional[List[Dict]] = None,
+                    prior_memories: Optional[List[Dict]] = None) -> Dict[str, Any]:
+        """
+        Emotion, memories and suggestion from a single model call.
+        
+        Returns a dict with "emotion", "memories" and "suggestion" keys (same
+        shapes as the dedicated methods). Sections missing or malformed in the
+        reply are filled by the dedicated methods when fallback is True; with
+        fallback=False they are simply absent so the caller can run them itself.
+        on_delta streams the suggestion section as in generate_suggestion.
+        
+        With new_messages, memories are only extracted from those messages
+        (as in extract_new_memories); the rest of recent_messages is context.
+        """
+        if len(recent_messages) == 0:
+            return {"emotion": {"neutral": 1.0}, "memories": [], "suggestion": None}
+        
+        context = "\n".join([f"{msg['sender']}: {msg['content']}" for msg in recent_messages])
+        recent_context = "\n".join([f"{msg['sender']}: {msg['content']}" for msg in recent_messages[-self.triggers.window:]])
+        incremental = new_messages is not None
+        want_memories = bool(new_messages) if incremental else len(recent_messages) >= 2
+        want_suggestion = self.triggers.triggered(recent_context)
+        local_emotion = self._local_emotion(recent_messages)
+        if local_emotion is not None and not want_memories and not want_suggestion:
+            return {"emotion": local_emotion, "memories": [], "suggestion": None}
+        
+        # Confident local emotion scores are not asked of the model again
+        sections = []
+        emotion_note = "" if local_emotion else "\n注意：情绪分析的是整个对话环境，而不是某个人的情绪。\n"
+        if local_emotion is None:
+            sections.append('"emotion": 整体情绪氛围的概率分布，键为 neutral(平和/轻松)、happy(愉快/兴奋)、tense(紧张/焦躁)、negative(消极/冲突)，值在0-1之间且总和为1')
+        if want_memories and incremental:
+            sections.append('"memories": 仅从"新消息"中提取的关键信息数组（重要事件、明确约定、长期话题），每个元素含 content（摘要）和 category（event/agreement/topic等），不要重复已记录的记忆，没有则为 []')
+        elif want_memories:
+            sections.append('"memories": 关键信息数组（共同提到的重要事件、已达成的明确约定、需要记住的长期话题），每个元素含 content（摘要）和 category（event/agreement/topic等），没有则为 []')
+        new_section = ""
+        if want_memories and incremental:
+            new_context = "\n".join([f"{msg['sender']}: {msg['content']}" for msg in new_messages])
+            new_section = f"\n{self._memory_summary(prior_memories)}新消息（memories 只从这里提取）：\n{new_context}\n"
+        if want_suggestion:
+            sections.append('"suggestion": 若最近对话涉及计划、安排或决策，给出含 title、content、type(plan/schedule/checklist等) 的实用建议，否则为 null')
+        
+        prompt = f"""分析以下对话，一次性返回一个JSON对象，包含以下字段：
+{chr(10).join('- ' + s for s in sections)}
+{emotion_note}
+对话内容：
+{context}
+{new_section}
+只返回JSON对象，不要其他说明。"""
+
+        messages = [
+            {"role": "system", "content": "你是一个对话分析助手，同时负责情绪分析、信息提取和决策辅助。"},
+            {"role": "user", "content": prompt}
+        ]
+        
+        with self._stats_lock:
+            self.analysis_stats["fused_calls"] += 1
+        on_chunk = self._suggestion_chunks(on_delta, after='"suggestion"') if on_delta and want_suggestion else None
+        content = self._make_request(messages, temperature=0.3, max_tokens=900, task="fused", on_chunk=on_chunk)
+        result = self._parse_fused(content or "", want_memories, want_suggestion)
+        if local_emotion is not None:
+            result["emotion"] = local_emotion
+        
+        missing = [key for key in ("emotion", "memories", "suggestion") if key not in result]
+        if missing:
+            logger.warning(f"[AIService] Fused analysis reply missing {missing}")
+            with self._stats_lock:
+                self.analysis_stats["fused_fallbacks"] += 1
+            if fallback:
+                if "emotion" in missing:
+                    result["emotion"] = self.analyze_emotion(recent_messages)
+                if "memories" in missing:
+                    result["memories"] = (self.extract_new_memories(new_messages, prior_memories) or []
+                                          if incremental else self.extract_memories(recent_messages))
+                if "suggestion" in missing:
+                    result["suggestion"] = self.generate_suggestion(recent_messages, on_delta=on_delta)
+        return result
+    
+    def _parse_fused(self, content: str, want_memories: bool, want_suggestion: bool) -> Dict[str, Any]:
+        """Valid sections of a fused reply; sections that were not requested get their empty value"""
+        result: Dict[str, Any] = {}
+        if not want_memories:
+            result["memories"] = []
+        if not want_suggestion:
+            result["suggestion"] = None
+        
+        data = self._extract_json(content.replace("```json", "").replace("```", ""))
+        if not isinstance(data, dict):
+            return result
+        
+        emotions = self._normalize_emotions(data.get("emotion", data.get("emotions")))
+        if emotions:
+            result["emotion"] = emotions
+        
+        memories = data.get("memories", data.get("memory"))
+        if want_memories and isinstance(memories, list):
+            result["memories"] = [m for m in memories if isinstance(m, dict) and m.get("content")]
+        
+        if want_suggestion and "suggestion" in data:
+            suggestion = data["suggestion"]
+            if suggestion is None or (isinstance(suggestion, dict) and suggestion.get("content")):
+                result["suggestion"] = suggestion
+        return result
+    
     def _extract_json(self, text: str) -> Optional[Dict]:
         """Extract JSON object from text"""
         brace_count = 0
@@ -6,8 +6,28 @@ Handles history tracking, snapshot merging, and token usage tracking.
 from typing import Dict, List, Optional, Any
 import time
 import threading
+from dataclasses import dataclass
 from datetime import datetime
 
+
+@dataclass
+class MemoryDelta:
+    """Messages of a conversation not mined for memories yet"""
+    new_messages: List[Dict[str, Any]]
+    prior_memories: List[Dict[str, Any]]  # memories found by earlier extractions
+    base_seq: Optional[int]  # high-water mark the delta was taken at
+    seq: int  # high-water mark once new_messages are mined
+
+
+def memory_scope(user_id: str, conversation_id: str) -> str:
+    """
+    Key of one requester's memory state in a conversation. Memories are
+    stored in each client's own database, so the two sides of a DM (or the
+    members of a room) each need their own high-water mark.
+    """
+    return f"{user_id}@{conversation_id}"
+
+
 class AISessionManager:
     """
     Manages AI contexts for different conversations.
@@ -24,6 +44,11 @@ class AISessionManager:
         
         # Limit history size per session to avoid token overflow
         self.max_history_len = 50
+        
+        # Memory extraction state: {memory_scope: {"seq": high-water mark, "items": [memories]}}
+        # Kept when inactive sessions are cleaned up so old messages are not mined again
+        self.memories: Dict[str, Dict[str, Any]] = {}
+        self.max_memories = 100
     
     def get_context(self, conversation_id: str) -> List[Dict[str, Any]]:
         """Get current context for a conversation"""
@@ -91,6 +116,48 @@ class AISessionManager:
                 
             self.sessions[conversation_id]["last_active"] = time.time()
 
+    def memory_delta(self, conversation_id: str, messages: List[Dict[str, Any]]) -> Optional[MemoryDelta]:
+        """
+        Messages past the conversation's memory high-water mark, with the
+        memories found so far. None when the messages carry no "seq" (client
+        snapshots), since they cannot be tracked.
+        """
+        if not messages or any(msg.get("seq") is None for msg in messages):
+            return None
+        with self.lock:
+            state = self.memories.get(conversation_id, {"seq": None, "items": []})
+            mark = state["seq"]
+            new_messages = [msg for msg in messages if mark is None or msg["seq"] > mark]
+            newest = max(msg["seq"] for msg in messages)
+            return MemoryDelta(new_messages, list(state["items"]), mark,
+                               newest if mark is None else max(mark, newest))
+    
+    def commit_memories(self, conversation_id: str, delta: MemoryDelta,
+                        memories: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        Advance the high-water mark to delta.seq and keep the memories not
+        already known, in one step. Returns the memories kept, or None when
+        another extraction moved the mark since the delta was taken.
+        """
+        with self.lock:
+            state = self.memories.setdefault(conversation_id, {"seq": None, "items": []})
+            if state["seq"] != delta.base_seq:
+                return None
+            known = {self._memory_key(m) for m in state["items"]}
+            accepted = []
+            for memory in memories:
+                key = self._memory_key(memory)
+                if key and key not in known:
+                    known.add(key)
+                    accepted.append(memory)
+            state["items"] = (state["items"] + accepted)[-self.max_memories:]
+            state["seq"] = delta.seq
+            return accepted
+    
+    @staticmethod
+    def _memory_key(memory: Dict[str, Any]) -> str:
+        return "".join(str(memory.get("content", "")).split()).lower()
+    
     def track_usage(self, conversation_id: str, tokens: int):
         """Track token usage"""
         with self.lock:
@@ -0,0 +1,103 @@
+"""
+Incremental decoding of string fields from a streamed JSON reply.
+The model answers suggestions as a JSON object; while it is still arriving,
+StreamingJSONFields extracts the text of selected string fields so far, so
+the suggestion content can be shown before the object is complete.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+def _decode_partial(buffer: str, pos: int) -> Tuple[str, int, bool]:
+    """
+    Decode a JSON string body from pos up to its closing quote or the end of
+    the buffer. Returns (text, next_pos, closed); an escape sequence cut off
+    by the end of the buffer is left for the next call.
+    """
+    out: List[str] = []
+    i, n = pos, len(buffer)
+    while i < n:
+        c = buffer[i]
+        if c == '"':
+            return "".join(out), i + 1, True
+        if c != "\\":
+            out.append(c)
+            i += 1
+            continue
+        if i + 1 >= n:
+            break
+        escape = buffer[i + 1]
+        if escape != "u":
+            out.append(_ESCAPES.get(escape, escape))
+            i += 2
+            continue
+        if i + 6 > n:
+            break
+        try:
+            code = int(buffer[i + 2:i + 6], 16)
+        except ValueError:
+            i += 6
+            continue
+        if 0xD800 <= code < 0xDC00:
+            # High surrogate: wait for the low half and combine them
+            if i + 12 > n:
+                break
+            try:
+                low = int(buffer[i + 8:i + 12], 16) if buffer[i + 6:i + 8] == "\\u" else -1
+            except ValueError:
+                low = -1
+            if 0xDC00 <= low < 0xE000:
+                out.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                i += 12
+                continue
+        out.append(chr(code))
+        i += 6
+    return "".join(out), i, False
+
+
+class StreamingJSONFields:
+    """Text of selected string fields of a JSON object that is still streaming"""
+
+    def __init__(self, fields: Iterable[str], after: Optional[str] = None):
+        """
+        Args:
+            fields: names of the string fields to decode
+            after: only look for the fields after this marker (e.g. '"suggestion"'
+                to skip same-named fields of earlier sections)
+        """
+        self.fields = tuple(fields)
+        self.values: Dict[str, str] = {field: "" for field in self.fields}
+        self._patterns = {field: re.compile(r'"%s"\s*:\s*"' % re.escape(field)) for field in self.fields}
+        self._after = after
+        self._anchor: Optional[int] = None if after else 0
+        self._positions: Dict[str, int] = {}  # field -> next undecoded offset in the buffer
+        self._closed = set()
+        self._buffer = ""
+
+    def feed(self, chunk: str) -> Dict[str, str]:
+        """Add a chunk of the reply; returns the text appended to each field"""
+        self._buffer += chunk
+        if self._anchor is None:
+            index = self._buffer.find(self._after)
+            if index < 0:
+                return {}
+            self._anchor = index + len(self._after)
+
+        deltas = {}
+        for field in self.fields:
+            if field in self._closed:
+                continue
+            if field not in self._positions:
+                match = self._patterns[field].search(self._buffer, self._anchor)
+                if not match:
+                    continue
+                self._positions[field] = match.end()
+            text, self._positions[field], closed = _decode_partial(self._buffer, self._positions[field])
+            if closed:
+                self._closed.add(field)
+            if text:
+                self.values[field] += text
+                deltas[field] = text
+        return deltas
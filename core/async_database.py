@@ -0,0 +1,105 @@
+"""
+Non-blocking access to the client Database for the Qt GUI.
+A single worker thread owns the Database (including opening it and running
+migrations) and executes calls in submission order, so the GUI thread never
+touches SQLite. Each call returns a concurrent.futures.Future; an optional
+callback receives the result on the thread that owns the AsyncDatabase.
+"""
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PyQt6.QtCore import QObject, pyqtSignal
+
+from core.database import Database
+from core.migrations import ProgressCallback
+from core.retention import default_archive_path
+
+
+class AsyncDatabase(QObject):
+    """Runs Database methods on a worker thread and reports results via Qt signals"""
+
+    # Re-emitted Database conversation notifications (conversation_id, changed_fields)
+    conversation_changed = pyqtSignal(str, dict)
+    query_failed = pyqtSignal(str, str)  # method name, error
+    _completed = pyqtSignal(object, object)  # callback, result
+
+    def __init__(self, db_path: str = "petchat.db", archive_path: Optional[str] = None,
+                 migration_progress: Optional[ProgressCallback] = None):
+        super().__init__()
+        self.db_path = db_path
+        self.archive_path = archive_path or default_archive_path(db_path)
+
+        self._queue: "queue.Queue[Optional[Tuple]]" = queue.Queue()
+        self._closed = False
+        self._completed.connect(self._deliver)
+        self._worker = threading.Thread(
+            target=self._run, args=(migration_progress,), name="AsyncDatabase", daemon=True
+        )
+        self._worker.start()
+
+    def submit(self, method: str, *args, callback: Optional[Callable[[Any], None]] = None, **kwargs) -> Future:
+        """
+        Queue Database.<method>(*args, **kwargs). Calls run in submission order.
+        callback(result) is invoked on this object's thread once the call succeeds.
+        """
+        if self._closed:
+            raise RuntimeError("AsyncDatabase is closed")
+        future: Future = Future()
+        self._queue.put((future, method, args, kwargs, callback))
+        return future
+
+    def upsert_users_bulk(self, users: List[Dict], callback: Optional[Callable[[Any], None]] = None) -> Future:
+        return self.submit("upsert_users_bulk", users, callback=callback)
+
+    def add_memories_bulk(self, memories: List[Dict], session_id: str = 'default',
+                          callback: Optional[Callable[[List[int]], None]] = None) -> Future:
+        return self.submit("add_memories_bulk", memories, session_id, callback=callback)
+
+    def close(self, timeout: Optional[float] = None):
+        """Finish queued calls, then close the database"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._worker.join(timeout)
+
+    def _run(self, migration_progress: Optional[ProgressCallback]):
+        db = None
+        init_error = None
+        try:
+            db = Database(self.db_path, archive_path=self.archive_path, migration_progress=migration_progress)
+            db.add_conversation_listener(self.conversation_changed.emit)
+        except Exception as e:
+            print(f"[AsyncDatabase] Could not open {self.db_path}: {e}")
+            init_error = e
+
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            future, method, args, kwargs, callback = item
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                if db is None:
+                    raise RuntimeError(f"Database unavailable: {init_error}")
+                result = getattr(db, method)(*args, **kwargs)
+            except Exception as e:
+                print(f"[AsyncDatabase] {method} failed: {e}")
+                future.set_exception(e)
+                self.query_failed.emit(method, str(e))
+                continue
+            future.set_result(result)
+            if callback is not None:
+                self._completed.emit(callback, result)
+
+        if db is not None:
+            db.close()
+
+    def _deliver(self, callback: Callable[[Any], None], result: Any):
+        try:
+            callback(result)
+        except Exception as e:
+            print(f"[AsyncDatabase] Result callback failed: {e}")
@@ -1,9 +1,12 @@
 """Configuration manager for storing API keys and settings"""
 import json
 import os
-from typing import Optional
+from typing import Dict, Optional
 from pathlib import Path
 
+from config.settings import Settings
+from core.retention import RetentionPolicy
+
 
 class ConfigManager:
     """Manages application configuration"""
@@ -90,6 +93,22 @@ class ConfigManager:
             self.config['user_id'] = user_id
         self._save_config()
 
+    def get_retention_policies(self) -> Dict[str, RetentionPolicy]:
+        """
+        Retention policies keyed by conversation_id, from the "retention" section:
+        {"default": {"max_age_days": 180, "max_rows": 5000}, "<conversation_id>": {...}}
+        """
+        policies = {
+            "default": RetentionPolicy(
+                max_age_days=Settings.RETENTION_DEFAULT_MAX_AGE_DAYS,
+                max_rows=Settings.RETENTION_DEFAULT_MAX_ROWS
+            )
+        }
+        for conversation_id, data in self.config.get('retention', {}).items():
+            if isinstance(data, dict):
+                policies[conversation_id] = RetentionPolicy.from_dict(data)
+        return policies
+
     def reset(self):
         """Reset configuration to defaults"""
         self.config = {}
@@ -1,236 +1,347 @@
 """Database module for storing chat history and memories"""
 import sqlite3
-from datetime import datetime
-from typing import List, Dict, Optional
+import time
+from datetime import datetime, timedelta
+from typing import Callable, List, Dict, Optional, Tuple
 import os
 
+import numpy as np
+
+from config.settings import Settings
+from core.emotion_series import EMOTION_TYPES, ROLLUP_RESOLUTIONS, aggregate, scores_vector, trend_step
+from core.memory_index import MinHashLSH, MinHashSketch
+from core.message_cache import MessageCache
+from core.migrations import ProgressCallback, migrate
+from core.retention import ARCHIVE_SCHEMA, default_archive_path, ensure_archive_schema
+
 
 class Database:
     """SQLite database manager for chat records and memories"""
     
-    def __init__(self, db_path: str = "petchat.db"):
-        """Initialize database connection"""
+    _UPSERT_USER_SQL = """
+        INSERT INTO users (id, name, avatar, ip_address, port, last_seen, is_online)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(id) DO UPDATE SET
+            name = excluded.name,
+            avatar = excluded.avatar,
+            ip_address = excluded.ip_address,
+            port = excluded.port,
+            last_seen = excluded.last_seen,
+            is_online = excluded.is_online
+    """
+    
+    def __init__(self, db_path: str = "petchat.db", archive_path: Optional[str] = None,
+                 migration_progress: Optional[ProgressCallback] = None):
+        """
+        Initialize database connection
+        
+        Args:
+            migration_progress: Called as (description, done, total) while large tables are migrated
+        """
         self.db_path = db_path
+        self._migration_progress = migration_progress
+        self.archive_path = archive_path or default_archive_path(db_path)
+        self._archive_attached = False
         self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        # Exports and maintenance read on their own connections; in WAL mode they never block writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
         self.conn.row_factory = sqlite3.Row
+        # Near-duplicate memory indexes, built lazily per session
+        self._memory_indexes: Dict[str, MinHashLSH] = {}
+        self.message_cache = MessageCache(max_bytes=Settings.MESSAGE_CACHE_MAX_BYTES)
+        self._conversation_listeners: List[Callable[[str, Dict], None]] = []
         self._init_tables()
     
     def _init_tables(self):
-        """Create necessary tables if they don't exist"""
-        cursor = self.conn.cursor()
-        
-        # Check if users table exists and has correct schema
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='users'")
-        users_exists = cursor.fetchone() is not None
-        
-        if users_exists:
-            # Check schema
-            cursor.execute("PRAGMA table_info(users)")
-            user_columns = [col[1] for col in cursor.fetchall()]
-            
-            if 'id' not in user_columns:
-                # Old users table exists - need to migrate
-                # Drop old table (it's likely empty or has incompatible data)
-                cursor.execute("DROP TABLE users")
-                users_exists = False
-        
-        if not users_exists:
-            # Create new users table
-            cursor.execute("""
-                CREATE TABLE users (
-                    id TEXT PRIMARY KEY,
-                    name TEXT NOT NULL,
-                    avatar TEXT,
-                    ip_address TEXT,
-                    port INTEGER,
-                    last_seen TEXT,
-                    is_online INTEGER DEFAULT 0
-                )
-            """)
-        
-        # Check if conversations table exists and has correct schema
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='conversations'")
-        conv_exists = cursor.fetchone() is not None
-        
-        if conv_exists:
-            # Check schema
-            cursor.execute("PRAGMA table_info(conversations)")
-            conv_columns = [col[1] for col in cursor.fetchall()]
-            
-            if 'id' not in conv_columns or 'type' not in conv_columns:
-                # Old conversations table - drop and recreate
-                cursor.execute("DROP TABLE conversations")
-                conv_exists = False
-        
-        if not conv_exists:
-            # Create new conversations table
-            cursor.execute("""
-                CREATE TABLE conversations (
-                    id TEXT PRIMARY KEY,
-                    type TEXT NOT NULL,
-                    name TEXT NOT NULL,
-                    peer_user_id TEXT,
-                    created_at TEXT NOT NULL,
-                    updated_at TEXT NOT NULL,
-                    last_message TEXT,
-                    unread_count INTEGER DEFAULT 0,
-                    FOREIGN KEY (peer_user_id) REFERENCES users(id)
-                )
-            """)
-            
-            # Create default public chat room
-            timestamp = datetime.now().isoformat()
-            cursor.execute("""
-                INSERT OR IGNORE INTO conversations (id, type, name, created_at, updated_at)
-                VALUES ('public', 'group', '公共聊天室', ?, ?)
-            """, (timestamp, timestamp))
-            print("[DEBUG] Created/verified public chat room")
-        
-        # Check if messages table needs migration
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='messages'")
-        messages_exists = cursor.fetchone() is not None
-        
-        if messages_exists:
-            cursor.execute("PRAGMA table_info(messages)")
-            columns = [col[1] for col in cursor.fetchall()]
-            
-            if 'conversation_id' not in columns:
-                # Messages table needs migration from old schema
-                # Create new messages table with updated schema
-                cursor.execute("""
-                    CREATE TABLE messages_new (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        conversation_id TEXT NOT NULL,
-                        sender_id TEXT NOT NULL,
-                        sender TEXT NOT NULL,
-                        content TEXT NOT NULL,
-                        timestamp TEXT NOT NULL,
-                        FOREIGN KEY (conversation_id) REFERENCES conversations(id),
-                        FOREIGN KEY (sender_id) REFERENCES users(id)
-                    )
-                """)
-                
-                # Migrate old data to new table (map session_id -> conversation_id)
-                # Handle both old schema (with session_id) and very old schema (without it)
-                if 'session_id' in columns:
-                    cursor.execute("""
-                        INSERT INTO messages_new (conversation_id, sender_id, sender, content, timestamp)
-                        SELECT 
-                            COALESCE(session_id, 'default') as conversation_id,
-                            sender as sender_id,
-                            sender,
-                            content,
-                            timestamp
-                        FROM messages
-                    """)
-                else:
-                    # Very old schema without session_id
-                    cursor.execute("""
-                        INSERT INTO messages_new (conversation_id, sender_id, sender, content, timestamp)
-                        SELECT 
-                            'default' as conversation_id,
-                            sender as sender_id,
-                            sender,
-                            content,
-                            timestamp
-                        FROM messages
-                    """)
-                
-                # Drop old table and rename new one
-                cursor.execute("DROP TABLE messages")
-                cursor.execute("ALTER TABLE messages_new RENAME TO messages")
-        else:
-            # No messages table exists, create new one
-            cursor.execute("""
-                CREATE TABLE messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    conversation_id TEXT NOT NULL,
-                    sender_id TEXT NOT NULL,
-                    sender TEXT NOT NULL,
-                    content TEXT NOT NULL,
-                    timestamp TEXT NOT NULL,
-                    FOREIGN KEY (conversation_id) REFERENCES conversations(id),
-                    FOREIGN KEY (sender_id) REFERENCES users(id)
-                )
-            """)
-        
-        # Memories table (key information extracted from conversations)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS memories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                content TEXT NOT NULL,
-                category TEXT,
-                created_at TEXT NOT NULL,
-                session_id TEXT DEFAULT 'default'
-            )
-        """)
-        
-        # Emotions history table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS emotions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                emotion_type TEXT NOT NULL,
-                confidence REAL,
-                context TEXT,
-                timestamp TEXT NOT NULL,
-                session_id TEXT DEFAULT 'default'
-            )
-        """)
-        
-        self.conn.commit()
+        """Bring the schema up to date (a single user_version read when already current)"""
+        migrate(self.conn, self._migration_progress)
     
     
-    def add_message(self, sender: str, content: str, conversation_id: str, sender_id: str):
-        """Add a new message to the database"""
+    def add_message(self, sender: str, content: str, conversation_id: str, sender_id: str, unread: bool = False,
+                    timestamp: Optional[str] = None):
+        """
+        Add a new message to the database.
+        The conversation's last-message preview, updated_at and (if unread)
+        unread_count are updated in the same transaction.
+        timestamp should be the one the server stores (see import_history).
+        """
         cursor = self.conn.cursor()
-        timestamp = datetime.now().isoformat()
+        timestamp = timestamp or datetime.now().isoformat()
         cursor.execute(
             "INSERT INTO messages (conversation_id, sender_id, sender, content, timestamp) VALUES (?, ?, ?, ?, ?)",
             (conversation_id, sender_id, sender, content, timestamp)
         )
+        message_id = cursor.lastrowid
+        cursor.execute("""
+            UPDATE conversations
+            SET last_message = ?, updated_at = ?, unread_count = unread_count + ?
+            WHERE id = ?
+        """, (content[:50], timestamp, 1 if unread else 0, conversation_id))
+        conversation_updated = cursor.rowcount > 0
+        changes = None
+        if conversation_updated:
+            cursor.execute("SELECT unread_count FROM conversations WHERE id = ?", (conversation_id,))
+            changes = {"last_message": content[:50], "updated_at": timestamp, "unread_count": cursor.fetchone()[0]}
         self.conn.commit()
-        return cursor.lastrowid
+        
+        self.message_cache.append(conversation_id, {
+            "sender_id": sender_id,
+            "sender": sender,
+            "content": content,
+            "timestamp": timestamp
+        })
+        if changes:
+            self._notify_conversation_changed(conversation_id, changes)
+        return message_id
     
     
     def get_recent_messages(self, limit: int = 10, conversation_id: str = 'default') -> List[Dict]:
-        """Get recent messages for a conversation"""
+        """Get recent messages for a conversation (served from the LRU cache when hot)"""
+        cached = self.message_cache.get(conversation_id, limit)
+        if cached is not None:
+            return cached
+        
         cursor = self.conn.cursor()
         cursor.execute(
             "SELECT sender_id, sender, content, timestamp FROM messages WHERE conversation_id = ? ORDER BY timestamp DESC LIMIT ?",
             (conversation_id, limit)
         )
         rows = cursor.fetchall()
+        
+        # Scrolled past the hot window: continue into the archive (archived rows are always older)
+        if len(rows) < limit and self._attach_archive():
+            cursor.execute(
+                f"SELECT sender_id, sender, content, timestamp FROM {ARCHIVE_SCHEMA}.messages WHERE conversation_id = ? ORDER BY timestamp DESC LIMIT ?",
+                (conversation_id, limit - len(rows))
+            )
+            rows.extend(cursor.fetchall())
+        
         # Return in chronological order (oldest first)
-        return [dict(row) for row in reversed(rows)]
+        messages = [dict(row) for row in reversed(rows)]
+        self.message_cache.put(conversation_id, messages, complete=len(messages) < limit)
+        return messages
+    
+    def _attach_archive(self) -> bool:
+        """Attach the archive database if it exists. Returns whether it is available."""
+        if self._archive_attached:
+            return True
+        if not os.path.exists(self.archive_path):
+            return False
+        self.conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (self.archive_path,))
+        ensure_archive_schema(self.conn)
+        self.conn.commit()
+        self._archive_attached = True
+        return True
+    
+    def import_history(self, messages: List[Dict]) -> int:
+        """
+        Bulk-insert a page of server history in one transaction.
+        Messages carry conversation_id and the server's seq; rows already
+        imported are skipped. A message that arrived live (same sender,
+        timestamp and content, no server_seq yet) is stamped with its seq
+        instead of being inserted twice. Returns the number of new messages.
+        """
+        if not messages:
+            return 0
+        
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT id FROM conversations")
+        known = {row[0] for row in cursor.fetchall()}
+        now = datetime.now().isoformat()
+        new_conversations = {}
+        for msg in messages:
+            conv_id = msg["conversation_id"]
+            if conv_id in known:
+                continue
+            entry = new_conversations.setdefault(conv_id, {"name": conv_id})
+            if msg["sender_id"] == conv_id:
+                entry["name"] = msg["sender"]
+        
+        with self.conn:
+            cursor.executemany("""
+                INSERT INTO conversations (id, type, name, peer_user_id, created_at, updated_at)
+                VALUES (?, 'p2p', ?, ?, ?, ?)
+            """, [(cid, info["name"], cid, now, now) for cid, info in new_conversations.items()])
+            cursor.executemany("""
+                UPDATE messages SET server_seq = ?
+                WHERE id = (
+                    SELECT id FROM messages
+                    WHERE conversation_id = ? AND timestamp = ? AND sender_id = ? AND content = ? AND server_seq IS NULL
+                    LIMIT 1
+                )
+            """, [
+                (m["seq"], m["conversation_id"], m["timestamp"], m["sender_id"], m["content"])
+                for m in messages
+            ])
+            cursor.executemany("""
+                INSERT OR IGNORE INTO messages (conversation_id, sender_id, sender, content, timestamp, server_seq)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, [
+                (m["conversation_id"], m["sender_id"], m["sender"], m["content"], m["timestamp"], m["seq"])
+                for m in messages
+            ])
+            imported = cursor.rowcount
+            
+            # Preview/updated_at follow the newest message of each conversation if it is newer
+            latest = {}
+            for msg in messages:
+                latest[msg["conversation_id"]] = msg
+            cursor.executemany("""
+                UPDATE conversations SET last_message = ?, updated_at = ?
+                WHERE id = ? AND (last_message IS NULL OR updated_at < ?)
+            """, [(m["content"][:50], m["timestamp"], cid, m["timestamp"]) for cid, m in latest.items()])
+        
+        for cid in latest:
+            self.message_cache.invalidate(cid)
+            conv = self.get_conversation(cid)
+            if conv:
+                self._notify_conversation_changed(cid, conv)
+        return imported
+    
+    def get_max_server_seq(self) -> int:
+        """Highest server seq imported so far (resume point for history sync), archive included"""
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(server_seq), 0) FROM messages")
+        seq = cursor.fetchone()[0]
+        if self._attach_archive():
+            cursor.execute(f"SELECT COALESCE(MAX(server_seq), 0) FROM {ARCHIVE_SCHEMA}.messages")
+            seq = max(seq, cursor.fetchone()[0])
+        return seq
+    
+    def get_sync_state(self, key: str) -> Optional[str]:
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT value FROM sync_state WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        return row[0] if row else None
+    
+    def set_sync_state(self, key: str, value: str):
+        cursor = self.conn.cursor()
+        cursor.execute("INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)", (key, value))
+        self.conn.commit()
+    
+    def invalidate_message_cache(self, conversation_id: Optional[str] = None):
+        """Drop cached recent messages, e.g. after HistoryMaintenance archived some"""
+        self.message_cache.invalidate(conversation_id)
+    
+    def get_message_cache_stats(self) -> Dict:
+        """Hit/miss statistics of the recent-message cache"""
+        return self.message_cache.stats()
+    
+    def _get_memory_index(self, session_id: str) -> MinHashLSH:
+        """
+        Load the near-duplicate index for a session from memory_signatures,
+        backfilling signatures for memories stored before the index existed.
+        """
+        index = self._memory_indexes.get(session_id)
+        if index is not None:
+            return index
+        
+        index = MinHashLSH(threshold=Settings.MEMORY_DEDUP_THRESHOLD)
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT m.id, m.content, s.shingle_count, s.signature
+            FROM memories m LEFT JOIN memory_signatures s ON s.memory_id = m.id
+            WHERE m.session_id = ?
+        """, (session_id,))
+        
+        backfill = []
+        for row in cursor.fetchall():
+            blob = row["signature"]
+            if blob is not None and len(blob) == index.num_perm * 4:
+                sketch = MinHashSketch.from_blob(blob, row["shingle_count"])
+            else:
+                sketch = index.sketch(row["content"])
+                backfill.append((row["id"], session_id, sketch.size, sketch.to_blob()))
+            index.add(row["id"], sketch)
+        
+        if backfill:
+            cursor.executemany(
+                "INSERT OR REPLACE INTO memory_signatures (memory_id, session_id, shingle_count, signature) VALUES (?, ?, ?, ?)",
+                backfill
+            )
+            self.conn.commit()
+        
+        self._memory_indexes[session_id] = index
+        return index
     
     def add_memory(self, content: str, category: Optional[str] = None, session_id: str = 'default') -> Optional[int]:
         """
         Add a memory (extracted key information).
         Returns the memory ID if added, or None if it's a duplicate.
+        
+        Near-duplicates (paraphrases above Settings.MEMORY_DEDUP_THRESHOLD) are
+        not inserted; in "merge" mode the stored memory is refreshed instead
+        (its wording is never replaced, see _merge_memory).
+        """
+        memory_id = self._add_memory(content, category, session_id)
+        self.conn.commit()
+        return memory_id
+    
+    def add_memories_bulk(self, memories: List[Dict], session_id: str = 'default') -> List[int]:
         """
+        Add several memories ({"content", "category"} dicts) in one transaction,
+        with the same duplicate filtering as add_memory.
+        Returns the IDs of the memories actually inserted.
+        """
+        added = []
+        for memory in memories:
+            memory_id = self._add_memory(memory.get("content", ""), memory.get("category", "general"), session_id)
+            if memory_id is not None:
+                added.append(memory_id)
+        self.conn.commit()
+        return added
+    
+    def _add_memory(self, content: str, category: Optional[str], session_id: str) -> Optional[int]:
+        """add_memory without the commit"""
         if not content or not content.strip():
             return None
+        content = content.strip()
             
         cursor = self.conn.cursor()
         
         # Check for duplicate content (same content in same session)
         cursor.execute(
             "SELECT id FROM memories WHERE content = ? AND session_id = ?",
-            (content.strip(), session_id)
+            (content, session_id)
         )
         existing = cursor.fetchone()
         if existing:
             # Duplicate - don't insert
             return None
         
+        index = self._get_memory_index(session_id)
+        sketch = index.sketch(content)
+        match = index.query(sketch)
+        if match:
+            if Settings.MEMORY_DEDUP_MODE == "merge":
+                self._merge_memory(match[0], category)
+            return None
+        
         # Insert new memory
         timestamp = datetime.now().isoformat()
         cursor.execute(
             "INSERT INTO memories (content, category, created_at, session_id) VALUES (?, ?, ?, ?)",
-            (content.strip(), category, timestamp, session_id)
+            (content, category, timestamp, session_id)
+        )
+        memory_id = cursor.lastrowid
+        cursor.execute(
+            "INSERT OR REPLACE INTO memory_signatures (memory_id, session_id, shingle_count, signature) VALUES (?, ?, ?, ?)",
+            (memory_id, session_id, sketch.size, sketch.to_blob())
+        )
+        index.add(memory_id, sketch)
+        return memory_id
+    
+    def _merge_memory(self, memory_id: int, category: Optional[str]):
+        """
+        Fold a near-duplicate into the stored memory: it moves to the top of
+        get_memories and gains a category if it had none. The stored wording
+        is kept, since near-identical wordings can still state opposite facts.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "UPDATE memories SET created_at = ?, category = COALESCE(category, ?) WHERE id = ?",
+            (datetime.now().isoformat(), category, memory_id)
         )
-        self.conn.commit()
-        return cursor.lastrowid
     
     def get_memories(self, session_id: str = 'default') -> List[Dict]:
         """Get all memories"""
@@ -253,11 +364,90 @@ class Database:
         self.conn.commit()
         return cursor.lastrowid
     
+    def add_emotion_sample(self, conversation_id: str, scores: Dict[str, float], timestamp_ms: Optional[int] = None) -> bool:
+        """Record one AI_EMOTION score set (timestamp defaults to now). Returns False if already stored."""
+        if timestamp_ms is None:
+            timestamp_ms = int(time.time() * 1000)
+        return self.add_emotion_samples(conversation_id, [(timestamp_ms, scores)]) == 1
+    
+    def add_emotion_samples(self, conversation_id: str, samples: List[Tuple[int, Dict[str, float]]]) -> int:
+        """
+        Store (timestamp_ms, scores) samples and fold them into the minute and
+        hour rollups in the same transaction. Samples whose timestamp is already
+        stored are skipped. Returns the number stored.
+        """
+        cursor = self.conn.cursor()
+        stored = []
+        for timestamp_ms, scores in samples:
+            values = scores_vector(scores)
+            cursor.execute(
+                "INSERT OR IGNORE INTO emotion_samples (conversation_id, ts_ms, neutral, happy, tense, negative) VALUES (?, ?, ?, ?, ?, ?)",
+                (conversation_id, int(timestamp_ms), *values)
+            )
+            if cursor.rowcount > 0:
+                stored.append((int(timestamp_ms), values))
+        
+        if stored:
+            timestamps = np.array([ts for ts, _ in stored], dtype=np.int64)
+            sums = np.array([values for _, values in stored], dtype=np.float64)
+            counts = np.ones(len(stored), dtype=np.int64)
+            for resolution in ROLLUP_RESOLUTIONS:
+                buckets, bucket_counts, bucket_sums = aggregate(timestamps, counts, sums, resolution)
+                cursor.executemany("""
+                    INSERT INTO emotion_rollups (conversation_id, resolution_ms, bucket_ms, count, neutral, happy, tense, negative)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT(conversation_id, resolution_ms, bucket_ms) DO UPDATE SET
+                        count = count + excluded.count,
+                        neutral = neutral + excluded.neutral,
+                        happy = happy + excluded.happy,
+                        tense = tense + excluded.tense,
+                        negative = negative + excluded.negative
+                """, [
+                    (conversation_id, resolution, int(bucket), int(count), *map(float, row))
+                    for bucket, count, row in zip(buckets, bucket_counts, bucket_sums)
+                ])
+        self.conn.commit()
+        return len(stored)
+    
+    def get_emotion_trend(self, conversation_id: str, start_ms: int, end_ms: int, max_points: int = 120) -> Dict:
+        """
+        Mean emotion scores over [start_ms, end_ms) in at most ~max_points buckets,
+        read from the coarsest stored resolution that fits (raw, minute or hour).
+        
+        Returns {"step_ms", "timestamps", "counts", <emotion>: [means]} with one
+        entry per non-empty bucket, oldest first.
+        """
+        step, resolution = trend_step(start_ms, end_ms, max_points)
+        columns = ", ".join(EMOTION_TYPES)
+        cursor = self.conn.cursor()
+        if resolution == 0:
+            cursor.execute(
+                f"SELECT ts_ms, 1, {columns} FROM emotion_samples WHERE conversation_id = ? AND ts_ms >= ? AND ts_ms < ?",
+                (conversation_id, start_ms, end_ms)
+            )
+        else:
+            # A bucket is included when it starts inside the range
+            cursor.execute(
+                f"SELECT bucket_ms, count, {columns} FROM emotion_rollups "
+                f"WHERE conversation_id = ? AND resolution_ms = ? AND bucket_ms >= ? AND bucket_ms < ?",
+                (conversation_id, resolution, start_ms, end_ms)
+            )
+        rows = np.array(cursor.fetchall(), dtype=np.float64).reshape(-1, 2 + len(EMOTION_TYPES))
+        
+        buckets, counts, sums = aggregate(rows[:, 0].astype(np.int64), rows[:, 1].astype(np.int64), rows[:, 2:], step)
+        means = sums / np.maximum(counts, 1)[:, None]
+        trend = {"step_ms": step, "timestamps": buckets.tolist(), "counts": counts.tolist()}
+        for i, emotion in enumerate(EMOTION_TYPES):
+            trend[emotion] = means[:, i].tolist()
+        return trend
+    
     def clear_memories(self, session_id: str = 'default'):
         """Clear all memories for a session"""
         cursor = self.conn.cursor()
         cursor.execute("DELETE FROM memories WHERE session_id = ?", (session_id,))
+        cursor.execute("DELETE FROM memory_signatures WHERE session_id = ?", (session_id,))
         self.conn.commit()
+        self._memory_indexes.pop(session_id, None)
     
     def deduplicate_memories(self, session_id: str = 'default') -> int:
         """
@@ -279,6 +469,9 @@ class Database:
         """, (session_id, session_id))
         
         removed_count = cursor.rowcount
+        if removed_count:
+            cursor.execute("DELETE FROM memory_signatures WHERE memory_id NOT IN (SELECT id FROM memories)")
+            self._memory_indexes.pop(session_id, None)
         self.conn.commit()
         return removed_count
     
@@ -287,19 +480,56 @@ class Database:
         """Insert or update user information"""
         cursor = self.conn.cursor()
         last_seen = datetime.now().isoformat()
-        cursor.execute("""
-            INSERT INTO users (id, name, avatar, ip_address, port, last_seen, is_online)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(id) DO UPDATE SET
-                name = excluded.name,
-                avatar = excluded.avatar,
-                ip_address = excluded.ip_address,
-                port = excluded.port,
-                last_seen = excluded.last_seen,
-                is_online = excluded.is_online
-        """, (user_id, name, avatar, ip_address, port, last_seen, 1 if is_online else 0))
+        cursor.execute(self._UPSERT_USER_SQL, (user_id, name, avatar, ip_address, port, last_seen, 1 if is_online else 0))
         self.conn.commit()
     
+    def upsert_users_bulk(self, users: List[Dict]):
+        """
+        Insert or update many users in one transaction.
+        Each dict carries the upsert_user fields: id, name and optionally
+        avatar, ip_address, port, is_online.
+        """
+        last_seen = datetime.now().isoformat()
+        rows = [
+            (u["id"], u["name"], u.get("avatar", ""), u.get("ip_address", ""), u.get("port", 0),
+             last_seen, 1 if u.get("is_online") else 0)
+            for u in users
+        ]
+        with self.conn:
+            self.conn.executemany(self._UPSERT_USER_SQL, rows)
+    
+    def apply_online_snapshot(self, users: List[Dict], keep_online: Optional[str] = None):
+        """
+        Make the users table match a full online-users list from the server:
+        everyone else (except keep_online, the local user) is marked offline and
+        the listed users are upserted as online, in one transaction.
+        """
+        last_seen = datetime.now().isoformat()
+        rows = [
+            (u["id"], u["name"], u.get("avatar", ""), u.get("ip_address", ""), u.get("port", 0), last_seen, 1)
+            for u in users
+        ]
+        with self.conn:
+            self.conn.execute("UPDATE users SET is_online = 0 WHERE is_online = 1 AND id IS NOT ?", (keep_online,))
+            self.conn.executemany(self._UPSERT_USER_SQL, rows)
+    
+    def reset_online_status(self, prune_after_days: int = Settings.USER_PRUNE_AFTER_DAYS) -> int:
+        """
+        Startup cleanup: clear is_online flags left over from the last session and
+        delete offline users not seen for prune_after_days that have no private
+        conversation. Returns the number of users deleted.
+        """
+        cutoff = (datetime.now() - timedelta(days=prune_after_days)).isoformat()
+        with self.conn:
+            self.conn.execute("UPDATE users SET is_online = 0 WHERE is_online = 1")
+            cursor = self.conn.execute("""
+                DELETE FROM users
+                WHERE last_seen < ?
+                AND id NOT IN (SELECT id FROM conversations)
+                AND id NOT IN (SELECT peer_user_id FROM conversations WHERE peer_user_id IS NOT NULL)
+            """, (cutoff,))
+        return cursor.rowcount
+    
     def get_user(self, user_id: str) -> Optional[Dict]:
         """Get user by ID"""
         cursor = self.conn.cursor()
@@ -314,6 +544,15 @@ class Database:
         rows = cursor.fetchall()
         return [dict(row) for row in rows]
     
+    def get_online_users(self, exclude_user_id: Optional[str] = None) -> List[Dict]:
+        """Users currently online (served by idx_users_online)"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT * FROM users WHERE is_online = 1 AND id IS NOT ? ORDER BY last_seen DESC",
+            (exclude_user_id,)
+        )
+        return [dict(row) for row in cursor.fetchall()]
+    
     def set_user_online_status(self, user_id: str, is_online: bool):
         """Update user online status"""
         cursor = self.conn.cursor()
@@ -324,6 +563,25 @@ class Database:
         self.conn.commit()
     
     # Conversation management methods
+    def add_conversation_listener(self, callback: Callable[[str, Dict], None]):
+        """
+        Register a callback(conversation_id, changed_fields) invoked after a
+        conversation row is created or changed, so views can update one row
+        instead of reloading the whole list.
+        """
+        self._conversation_listeners.append(callback)
+    
+    def remove_conversation_listener(self, callback: Callable[[str, Dict], None]):
+        if callback in self._conversation_listeners:
+            self._conversation_listeners.remove(callback)
+    
+    def _notify_conversation_changed(self, conv_id: str, changes: Dict):
+        for callback in list(self._conversation_listeners):
+            try:
+                callback(conv_id, dict(changes))
+            except Exception as e:
+                print(f"[ERROR] Conversation listener failed: {e}")
+    
     def create_conversation(self, conv_id: str, conv_type: str, name: str, peer_user_id: Optional[str] = None):
         """Create a new conversation"""
         cursor = self.conn.cursor()
@@ -333,6 +591,16 @@ class Database:
             VALUES (?, ?, ?, ?, ?, ?)
         """, (conv_id, conv_type, name, peer_user_id, now, now))
         self.conn.commit()
+        self._notify_conversation_changed(conv_id, {
+            "id": conv_id,
+            "type": conv_type,
+            "name": name,
+            "peer_user_id": peer_user_id,
+            "created_at": now,
+            "updated_at": now,
+            "last_message": None,
+            "unread_count": 0
+        })
     
     def get_conversation(self, conv_id: str) -> Optional[Dict]:
         """Get conversation by ID"""
@@ -365,12 +633,28 @@ class Database:
     def update_conversation_last_message(self, conv_id: str, last_message: str):
         """Update the last message preview for a conversation"""
         cursor = self.conn.cursor()
+        now = datetime.now().isoformat()
         cursor.execute("""
             UPDATE conversations 
             SET last_message = ?, updated_at = ?
             WHERE id = ?
-        """, (last_message, datetime.now().isoformat(), conv_id))
+        """, (last_message, now, conv_id))
+        updated = cursor.rowcount > 0
+        self.conn.commit()
+        if updated:
+            self._notify_conversation_changed(conv_id, {"last_message": last_message, "updated_at": now})
+    
+    def mark_conversation_read(self, conv_id: str):
+        """Reset the unread counter of a conversation"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "UPDATE conversations SET unread_count = 0 WHERE id = ? AND unread_count != 0",
+            (conv_id,)
+        )
+        updated = cursor.rowcount > 0
         self.conn.commit()
+        if updated:
+            self._notify_conversation_changed(conv_id, {"unread_count": 0})
     
     def close(self):
         """Close database connection"""
@@ -0,0 +1,157 @@
+"""
+Local lexicon-based emotion scoring.
+Chinese/English sentiment terms, emoji and punctuation runs are matched in one
+regex pass per message; the sparse (message, term) counts are damped, weighted
+by recency and projected onto the four emotion types with one matrix product,
+so a conversation window is scored in microseconds without a model call.
+"""
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.emotion_series import EMOTION_TYPES
+
+# term -> (emotion, weight). Longer terms win over their substrings ("不开心"
+# before "开心"), which is how negated phrases are handled.
+LEXICON: Dict[str, Tuple[str, float]] = {
+    # happy
+    "开心": ("happy", 1.0), "高兴": ("happy", 1.0), "快乐": ("happy", 1.0), "哈哈": ("happy", 0.8),
+    "嘻嘻": ("happy", 0.8), "嘿嘿": ("happy", 0.6), "太好了": ("happy", 1.2), "好棒": ("happy", 1.0),
+    "真棒": ("happy", 1.0), "喜欢": ("happy", 0.8), "爱你": ("happy", 1.0), "谢谢": ("happy", 0.5),
+    "感谢": ("happy", 0.5), "期待": ("happy", 0.8), "好耶": ("happy", 1.0), "不错": ("happy", 0.6),
+    "好玩": ("happy", 0.8), "有趣": ("happy", 0.6), "满意": ("happy", 0.7), "幸福": ("happy", 1.0),
+    "兴奋": ("happy", 1.0), "恭喜": ("happy", 1.0), "厉害": ("happy", 0.6), "好吃": ("happy", 0.6),
+    "美滋滋": ("happy", 1.0), "nice": ("happy", 0.7), "happy": ("happy", 1.0), "glad": ("happy", 0.8),
+    "great": ("happy", 0.8), "awesome": ("happy", 1.0), "love": ("happy", 0.8), "thanks": ("happy", 0.5),
+    "thank you": ("happy", 0.5), "excited": ("happy", 1.0), "fun": ("happy", 0.6), "haha": ("happy", 0.8),
+    "lol": ("happy", 0.6), "yay": ("happy", 1.0), "congrats": ("happy", 1.0), "amazing": ("happy", 1.0),
+    "wonderful": ("happy", 1.0), "perfect": ("happy", 0.8),
+    "😀": ("happy", 1.0), "😁": ("happy", 1.0), "😂": ("happy", 0.8), "🤣": ("happy", 0.8),
+    "😄": ("happy", 1.0), "😊": ("happy", 1.0), "😍": ("happy", 1.0), "🥰": ("happy", 1.0),
+    "👍": ("happy", 0.6), "🎉": ("happy", 1.0), "❤": ("happy", 0.8), "🥳": ("happy", 1.0),
+    # tense
+    "着急": ("tense", 1.0), "急死": ("tense", 1.2), "赶紧": ("tense", 0.8), "快点": ("tense", 0.8),
+    "来不及": ("tense", 1.2), "紧张": ("tense", 1.0), "焦虑": ("tense", 1.2), "担心": ("tense", 0.8),
+    "怎么办": ("tense", 1.0), "压力": ("tense", 0.8), "截止": ("tense", 0.8), "慌": ("tense", 0.8),
+    "迟到": ("tense", 0.8), "完蛋": ("tense", 1.0), "糟了": ("tense", 1.0), "催": ("tense", 0.5),
+    "赶不上": ("tense", 1.0), "deadline": ("tense", 0.8), "hurry": ("tense", 1.0), "urgent": ("tense", 1.0),
+    "asap": ("tense", 1.0), "worried": ("tense", 1.0), "nervous": ("tense", 1.0), "anxious": ("tense", 1.0),
+    "stressed": ("tense", 1.0), "stress": ("tense", 0.8), "running late": ("tense", 1.0),
+    "😰": ("tense", 1.0), "😨": ("tense", 1.0), "😱": ("tense", 1.0), "😬": ("tense", 0.8), "⏰": ("tense", 0.6),
+    "??": ("tense", 0.5), "？？": ("tense", 0.5), "?!": ("tense", 0.6), "？！": ("tense", 0.6),
+    # negative
+    "生气": ("negative", 1.2), "讨厌": ("negative", 1.0), "难过": ("negative", 1.0), "伤心": ("negative", 1.0),
+    "失望": ("negative", 1.0), "烦死": ("negative", 1.2), "烦": ("negative", 0.6), "滚": ("negative", 1.2),
+    "闭嘴": ("negative", 1.2), "无语": ("negative", 0.8), "算了": ("negative", 0.6), "受够": ("negative", 1.2),
+    "郁闷": ("negative", 1.0), "委屈": ("negative", 1.0), "吵架": ("negative", 1.0), "分手": ("negative", 1.2),
+    "恶心": ("negative", 1.0), "气死": ("negative", 1.2), "不开心": ("negative", 1.0),
+    "不高兴": ("negative", 1.0), "不喜欢": ("negative", 0.8), "不想理": ("negative", 1.0),
+    "别烦": ("negative", 1.0), "没意思": ("negative", 0.8), "糟糕": ("negative", 0.8), "垃圾": ("negative", 1.0),
+    "sad": ("negative", 1.0), "angry": ("negative", 1.2), "hate": ("negative", 1.2), "upset": ("negative", 1.0),
+    "annoyed": ("negative", 1.0), "annoying": ("negative", 1.0), "terrible": ("negative", 1.0),
+    "awful": ("negative", 1.0), "disappointed": ("negative", 1.0), "shut up": ("negative", 1.2),
+    "not happy": ("negative", 1.0), "not good": ("negative", 0.8), "whatever": ("negative", 0.5),
+    "😢": ("negative", 1.0), "😭": ("negative", 1.0), "😡": ("negative", 1.2), "😠": ("negative", 1.2),
+    "💔": ("negative", 1.0), "😞": ("negative", 1.0), "😔": ("negative", 0.8), "🙄": ("negative", 0.8),
+    "...": ("negative", 0.3), "。。。": ("negative", 0.3), "……": ("negative", 0.3),
+    # neutral
+    "好的": ("neutral", 0.8), "嗯": ("neutral", 0.5), "收到": ("neutral", 0.8), "知道了": ("neutral", 0.8),
+    "可以": ("neutral", 0.5), "明白": ("neutral", 0.6), "在吗": ("neutral", 0.6), "吃饭": ("neutral", 0.4),
+    "没问题": ("neutral", 0.6), "ok": ("neutral", 0.6), "okay": ("neutral", 0.6), "sure": ("neutral", 0.6),
+    "got it": ("neutral", 0.6), "see you": ("neutral", 0.5),
+}
+
+
+_WORD = re.compile(r"[a-z]+")
+
+
+def _is_word(term: str) -> bool:
+    return term[0].isascii() and term[0].isalpha()
+
+
+@dataclass
+class EmotionEstimate:
+    scores: Dict[str, float]  # EMOTION_TYPES -> probability, sums to 1
+    confidence: float  # 0..1; low when evidence is thin or classes are close
+
+
+class EmotionLexicon:
+    """Vectorized lexicon scorer; one instance is safe to share between threads"""
+
+    def __init__(self, lexicon: Optional[Dict[str, Tuple[str, float]]] = None, recency_decay: float = 0.8,
+                 prior: Tuple[float, ...] = (0.5, 0.1, 0.1, 0.1)):
+        """
+        Args:
+            lexicon: term -> (emotion, weight); defaults to LEXICON
+            recency_decay: weight of each message relative to the one after it
+            prior: pseudo-evidence per emotion type, so no matches means neutral
+        """
+        lexicon = LEXICON if lexicon is None else lexicon
+        terms = sorted((term for term in lexicon if term), key=len, reverse=True)
+        self._index = {term.lower(): i for i, term in enumerate(terms)}
+        self._weights = np.zeros((len(terms), len(EMOTION_TYPES)))
+        for term, i in self._index.items():
+            emotion, weight = lexicon[terms[i]]
+            self._weights[i, EMOTION_TYPES.index(emotion)] = weight
+        # One alternation of literals (re skips ahead on the first character);
+        # English terms are looked up per word so they only match whole words.
+        # Without literals there is no pattern: an empty one would match everywhere.
+        literals = [re.escape(term) for term in self._index if not _is_word(term)]
+        self._pattern = re.compile("|".join(literals)) if literals else None
+        self.recency_decay = recency_decay
+        self._prior = np.asarray(prior, dtype=float)
+
+    def score_texts(self, texts: List[str]) -> EmotionEstimate:
+        """Overall emotion of a conversation window, oldest text first"""
+        n = len(texts)
+        rows, cols = [], []
+        for row, text in enumerate(texts):
+            text = text.lower()
+            for match in self._pattern.findall(text) if self._pattern is not None else ():
+                rows.append(row)
+                cols.append(self._index[match])
+            for col in self._word_terms(_WORD.findall(text)):
+                rows.append(row)
+                cols.append(col)
+
+        evidence = np.zeros(len(EMOTION_TYPES))
+        if rows:
+            # Sparse (message, term) counts; repeats add less and less
+            # ("哈哈哈哈哈哈" is not six times as happy)
+            pairs = Counter(zip(rows, cols))
+            msg_rows = np.fromiter((row for row, _ in pairs), dtype=float, count=len(pairs))
+            counts = np.fromiter(pairs.values(), dtype=float, count=len(pairs))
+            damped = (1.0 + np.log(counts)) * self.recency_decay ** (n - 1 - msg_rows)
+            evidence = damped @ self._weights[[col for _, col in pairs]]
+
+        totals = self._prior + evidence
+        probs = totals / totals.sum()
+        top, second = np.sort(probs)[-2:][::-1]
+        mass = evidence.sum()
+        confidence = float((top - second) * (1.0 - math.exp(-mass)))
+        return EmotionEstimate(dict(zip(EMOTION_TYPES, probs.tolist())), confidence)
+
+    def _word_terms(self, words: List[str]) -> List[int]:
+        """Lexicon indices of English words and two-word phrases ("not happy" over "happy")"""
+        found = []
+        i = 0
+        while i < len(words):
+            if i + 1 < len(words):
+                col = self._index.get(words[i] + " " + words[i + 1])
+                if col is not None:
+                    found.append(col)
+                    i += 2
+                    continue
+            col = self._index.get(words[i])
+            if col is not None:
+                found.append(col)
+            i += 1
+        return found
+
+    def score(self, messages: List[Dict]) -> EmotionEstimate:
+        """score_texts for chat message dicts with a "content" field"""
+        return self.score_texts([str(msg.get("content", "")) for msg in messages])
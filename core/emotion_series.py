@@ -0,0 +1,53 @@
+"""
+Emotion score time series helpers.
+Samples are (timestamp_ms, [neutral, happy, tense, negative]) rows. Rollups
+keep per-bucket counts and score sums so they can be merged incrementally and
+re-bucketed to any coarser step; means are derived only when queried.
+"""
+import math
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+EMOTION_TYPES = ("neutral", "happy", "tense", "negative")
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+ROLLUP_RESOLUTIONS = (MINUTE_MS, HOUR_MS)
+
+
+def scores_vector(scores: Dict[str, float]) -> List[float]:
+    """Scores dict -> values in EMOTION_TYPES order (missing types are 0)"""
+    return [float(scores.get(emotion, 0.0) or 0.0) for emotion in EMOTION_TYPES]
+
+
+def aggregate(timestamps: np.ndarray, counts: np.ndarray, sums: np.ndarray,
+              bucket_ms: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merge rows into epoch-aligned buckets of bucket_ms.
+    timestamps: (n,) int64, counts: (n,) int64, sums: (n, len(EMOTION_TYPES)).
+    Returns (bucket_starts, counts, sums) for the non-empty buckets, ascending.
+    """
+    if len(timestamps) == 0:
+        return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64),
+                np.empty((0, len(EMOTION_TYPES))))
+    buckets = timestamps - timestamps % bucket_ms
+    order = np.argsort(buckets, kind="stable")
+    buckets = buckets[order]
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    return (buckets[starts],
+            np.add.reduceat(counts[order], starts),
+            np.add.reduceat(sums[order], starts, axis=0))
+
+
+def trend_step(start_ms: int, end_ms: int, max_points: int) -> Tuple[int, int]:
+    """
+    Bucket width for a query and the stored resolution to read it from
+    (0 = raw samples). The step is a whole number of source buckets.
+    """
+    step = max(1, math.ceil((end_ms - start_ms) / max(1, max_points)))
+    for resolution in reversed(ROLLUP_RESOLUTIONS):
+        if step >= resolution:
+            return math.ceil(step / resolution) * resolution, resolution
+    return step, 0
@@ -0,0 +1,194 @@
+"""
+Streaming chat-history export.
+Rows are read through a cursor in fixed-size batches and written straight to
+disk, so memory stays constant regardless of history size. Archived messages
+(see core.retention) are exported first, followed by the live table; both
+are read inside one transaction, so rows archived mid-export are neither
+lost nor written twice. Both databases are in WAL mode, so that snapshot
+does not block messages written while the export runs.
+"""
+import csv
+import html
+import json
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from core.retention import ARCHIVE_SCHEMA, default_archive_path
+
+
+EXPORT_FORMATS = ("jsonl", "csv", "html", "txt")
+
+COLUMNS = ("timestamp", "sender_id", "sender", "content")
+
+
+class ExportCancelled(Exception):
+    """Raised when an export is cancelled; the partial file has been removed"""
+    pass
+
+
+def format_for_path(file_path: str) -> str:
+    """Pick the export format from the file extension (defaults to txt)"""
+    ext = os.path.splitext(file_path)[1].lower().lstrip(".")
+    if ext == "htm":
+        return "html"
+    return ext if ext in EXPORT_FORMATS else "txt"
+
+
+class HistoryExporter:
+    """Exports one conversation from petchat.db (+ archive) to JSONL, CSV, HTML or text"""
+
+    def __init__(self, db_path: str, archive_path: Optional[str] = None, batch_size: int = 1000):
+        self.db_path = db_path
+        self.archive_path = archive_path or default_archive_path(db_path)
+        self.batch_size = batch_size
+
+    def export(self, conversation_id: str, file_path: str, fmt: Optional[str] = None,
+               progress_callback: Optional[Callable[[int, int], None]] = None,
+               cancel_event: Optional[threading.Event] = None) -> int:
+        """
+        Export a conversation. Returns the number of messages written.
+
+        The file is written to <file_path>.part and renamed on success, so a
+        cancelled or failed export never leaves a truncated file behind.
+        """
+        fmt = fmt or format_for_path(file_path)
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+
+        tmp_path = file_path + ".part"
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        try:
+            tables = self._source_tables(conn)
+            # One read transaction over main and archive: a single snapshot of both
+            conn.execute("BEGIN")
+            total = sum(
+                conn.execute(f"SELECT COUNT(*) FROM {table} WHERE conversation_id = ?", (conversation_id,)).fetchone()[0]
+                for table in tables
+            )
+            if progress_callback:
+                progress_callback(0, total)
+
+            written = 0
+            newline = "" if fmt == "csv" else None
+            with open(tmp_path, "w", encoding="utf-8", newline=newline) as f:
+                writer = _WRITERS[fmt](f, conversation_id)
+                writer.begin()
+                for batch in self._iter_batches(conn, tables, conversation_id):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise ExportCancelled()
+                    writer.write_rows(batch)
+                    written += len(batch)
+                    if progress_callback:
+                        progress_callback(written, total)
+                writer.end()
+            conn.commit()
+
+            os.replace(tmp_path, file_path)
+            return written
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            conn.close()
+
+    def _source_tables(self, conn: sqlite3.Connection) -> List[str]:
+        tables = ["main.messages"]
+        if os.path.exists(self.archive_path):
+            conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (self.archive_path,))
+            exists = conn.execute(
+                f"SELECT 1 FROM {ARCHIVE_SCHEMA}.sqlite_master WHERE type = 'table' AND name = 'messages'"
+            ).fetchone()
+            if exists:
+                # Archived rows are always older than the live table
+                tables.insert(0, f"{ARCHIVE_SCHEMA}.messages")
+        return tables
+
+    def _iter_batches(self, conn: sqlite3.Connection, tables: List[str],
+                      conversation_id: str) -> Iterator[List[Tuple]]:
+        for table in tables:
+            cursor = conn.execute(
+                f"SELECT {', '.join(COLUMNS)} FROM {table} WHERE conversation_id = ? ORDER BY timestamp, id",
+                (conversation_id,)
+            )
+            while True:
+                batch = cursor.fetchmany(self.batch_size)
+                if not batch:
+                    break
+                yield batch
+
+
+class _Writer(ABC):
+    def __init__(self, f, conversation_id: str):
+        self.f = f
+        self.conversation_id = conversation_id
+
+    def begin(self):
+        pass
+
+    @abstractmethod
+    def write_rows(self, rows: List[Tuple]):
+        pass
+
+    def end(self):
+        pass
+
+
+class _JsonlWriter(_Writer):
+    def write_rows(self, rows: List[Tuple]):
+        self.f.writelines(
+            json.dumps(dict(zip(COLUMNS, row)), ensure_ascii=False) + "\n" for row in rows
+        )
+
+
+class _CsvWriter(_Writer):
+    def begin(self):
+        # BOM so spreadsheet apps detect UTF-8
+        self.f.write("\ufeff")
+        self.csv = csv.writer(self.f)
+        self.csv.writerow(COLUMNS)
+
+    def write_rows(self, rows: List[Tuple]):
+        self.csv.writerows(rows)
+
+
+class _HtmlWriter(_Writer):
+    def begin(self):
+        title = html.escape(f"pet-chat - {self.conversation_id}")
+        self.f.write(
+            "<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\">"
+            f"<title>{title}</title>"
+            "<style>body{font-family:sans-serif}td{padding:4px 8px;vertical-align:top}"
+            ".ts{color:#888;white-space:nowrap}.sender{font-weight:bold;white-space:nowrap}"
+            ".content{white-space:pre-wrap}</style>"
+            f"</head><body><h1>{title}</h1>\n<table>\n"
+        )
+
+    def write_rows(self, rows: List[Tuple]):
+        self.f.writelines(
+            f"<tr><td class=\"ts\">{html.escape(ts)}</td>"
+            f"<td class=\"sender\">{html.escape(sender)}</td>"
+            f"<td class=\"content\">{html.escape(content)}</td></tr>\n"
+            for ts, _sender_id, sender, content in rows
+        )
+
+    def end(self):
+        self.f.write("</table>\n</body></html>\n")
+
+
+class _TextWriter(_Writer):
+    def write_rows(self, rows: List[Tuple]):
+        self.f.writelines(
+            f"[{ts}] {sender}: {content}\n" for ts, _sender_id, sender, content in rows
+        )
+
+
+_WRITERS = {
+    "jsonl": _JsonlWriter,
+    "csv": _CsvWriter,
+    "html": _HtmlWriter,
+    "txt": _TextWriter,
+}
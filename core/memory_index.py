@@ -0,0 +1,198 @@
+"""
+Near-duplicate detection for extracted memories.
+MinHash signatures over character shingles, bucketed with LSH so that a
+candidate memory is compared only against the few stored memories that
+share a band with it.
+"""
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+@dataclass
+class MinHashSketch:
+    """MinHash signature plus the shingle-set size it was built from"""
+    signature: np.ndarray  # uint32[num_perm]
+    size: int
+
+    def to_blob(self) -> bytes:
+        return self.signature.astype("<u4").tobytes()
+
+    @classmethod
+    def from_blob(cls, blob: bytes, size: int) -> "MinHashSketch":
+        return cls(signature=np.frombuffer(blob, dtype="<u4").astype(np.uint32), size=size)
+
+
+class MinHashLSH:
+    """
+    In-process MinHash + LSH index keyed by integer ids (memory row ids).
+
+    Similarity is containment in both directions, |A∩B| / max(|A|, |B|) of
+    the two shingle sets, estimated from the MinHash Jaccard and the set
+    sizes. A one-sided measure would rate any short memory contained in a
+    longer one as a duplicate, including its negation ("喜欢猫" vs
+    "不喜欢猫"). Sets whose exact sizes differ by more than min_size_ratio
+    are never duplicates, whatever the (noisy) estimate says.
+    """
+
+    def __init__(self, num_perm: int = 48, threshold: float = 0.75,
+                 shingle_sizes: Tuple[int, ...] = (1, 2), rows_per_band: int = 3,
+                 seed: int = 20240521, min_size_ratio: float = 0.8):
+        if num_perm % rows_per_band != 0:
+            raise ValueError("num_perm must be a multiple of rows_per_band")
+        self.num_perm = num_perm
+        self.threshold = threshold
+        self.min_size_ratio = min_size_ratio
+        self.shingle_sizes = shingle_sizes
+        self.rows_per_band = rows_per_band
+        self.bands = num_perm // rows_per_band
+
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(self.bands)]
+        # Signatures live in one contiguous matrix so candidates are verified in a single vectorized compare
+        self._signatures = np.empty((64, num_perm), dtype=np.uint32)
+        self._sizes = np.empty(64, dtype=np.int64)
+        self._keys: List[int] = []
+        self._row_of: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: int) -> bool:
+        return key in self._row_of
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase and drop whitespace, punctuation and symbols"""
+        text = unicodedata.normalize("NFKC", text).lower()
+        return "".join(ch for ch in text if unicodedata.category(ch)[0] in ("L", "N"))
+
+    def shingles(self, text: str) -> set:
+        text = self.normalize(text)
+        result = set()
+        for k in self.shingle_sizes:
+            for i in range(len(text) - k + 1):
+                result.add(text[i:i + k])
+        return result
+
+    def sketch(self, text: str) -> MinHashSketch:
+        """Build the MinHash signature for a piece of text"""
+        shingles = self.shingles(text)
+        if not shingles:
+            return MinHashSketch(np.full(self.num_perm, 0xFFFFFFFF, dtype=np.uint32), 0)
+
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles),
+                             dtype=np.uint64, count=len(shingles))
+        # Multiply-shift hashing: top 32 bits of (a*x + b) mod 2^64
+        permuted = (np.outer(hashes, self._a) + self._b) >> np.uint64(32)
+        signature = permuted.min(axis=0).astype(np.uint32)
+        return MinHashSketch(signature, len(shingles))
+
+    def _band_keys(self, signature: np.ndarray) -> List[int]:
+        bands = signature.reshape(self.bands, self.rows_per_band).astype(np.uint64)
+        keys = bands[:, 0].copy()
+        for col in range(1, self.rows_per_band):
+            keys = keys * np.uint64(0x100000001B3) ^ bands[:, col]
+        return keys.tolist()
+
+    def similarity(self, left: MinHashSketch, right: MinHashSketch) -> float:
+        """Estimated two-way containment between two sketches"""
+        if left.size == 0 or right.size == 0:
+            return 0.0
+        matches = np.count_nonzero(left.signature == right.signature)
+        return float(self._containment(np.array([matches]), left.size, np.array([right.size]))[0])
+
+    def _containment(self, matches: np.ndarray, size: int, other_sizes: np.ndarray) -> np.ndarray:
+        jaccard = matches / self.num_perm
+        intersection = jaccard * (size + other_sizes) / (1.0 + jaccard)
+        larger = np.maximum(size, other_sizes)
+        scores = np.minimum(1.0, intersection / larger)
+        return np.where(np.minimum(size, other_sizes) >= self.min_size_ratio * larger, scores, 0.0)
+
+    def get(self, key: int) -> Optional[MinHashSketch]:
+        row = self._row_of.get(key)
+        if row is None:
+            return None
+        return MinHashSketch(self._signatures[row].copy(), int(self._sizes[row]))
+
+    def add(self, key: int, sketch: MinHashSketch):
+        """Index a sketch under key (replacing any previous entry)"""
+        if key in self._row_of:
+            self.remove(key)
+        if sketch.size == 0:
+            return
+
+        row = len(self._keys)
+        if row == len(self._sizes):
+            self._signatures = np.concatenate([self._signatures, np.empty_like(self._signatures)])
+            self._sizes = np.concatenate([self._sizes, np.empty_like(self._sizes)])
+        self._signatures[row] = sketch.signature
+        self._sizes[row] = sketch.size
+        self._keys.append(key)
+        self._row_of[key] = row
+
+        for band, band_key in enumerate(self._band_keys(sketch.signature)):
+            self._buckets[band].setdefault(band_key, []).append(key)
+
+    def remove(self, key: int):
+        row = self._row_of.pop(key, None)
+        if row is None:
+            return
+        for band, band_key in enumerate(self._band_keys(self._signatures[row])):
+            bucket = self._buckets[band].get(band_key)
+            if bucket is None:
+                continue
+            try:
+                bucket.remove(key)
+            except ValueError:
+                pass
+            if not bucket:
+                del self._buckets[band][band_key]
+
+        last = len(self._keys) - 1
+        if row != last:
+            moved_key = self._keys[last]
+            self._signatures[row] = self._signatures[last]
+            self._sizes[row] = self._sizes[last]
+            self._keys[row] = moved_key
+            self._row_of[moved_key] = row
+        self._keys.pop()
+
+    def clear(self):
+        self._buckets = [{} for _ in range(self.bands)]
+        self._keys.clear()
+        self._row_of.clear()
+
+    def candidates(self, sketch: MinHashSketch) -> set:
+        """Ids sharing at least one LSH band with the sketch"""
+        found = set()
+        for band, band_key in enumerate(self._band_keys(sketch.signature)):
+            bucket = self._buckets[band].get(band_key)
+            if bucket:
+                found.update(bucket)
+        return found
+
+    def query(self, sketch: MinHashSketch) -> Optional[Tuple[int, float]]:
+        """
+        Find the most similar indexed entry.
+        Returns (key, similarity) if it reaches the threshold, else None.
+        """
+        if sketch.size == 0:
+            return None
+        keys = list(self.candidates(sketch))
+        if not keys:
+            return None
+
+        rows = np.fromiter((self._row_of[k] for k in keys), dtype=np.int64, count=len(keys))
+        matches = np.count_nonzero(self._signatures[rows] == sketch.signature, axis=1)
+        scores = self._containment(matches, sketch.size, self._sizes[rows])
+        best = int(np.argmax(scores))
+        if scores[best] < self.threshold:
+            return None
+        return keys[best], float(scores[best])
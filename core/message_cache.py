@@ -0,0 +1,138 @@
+"""
+In-memory LRU cache of recent messages per conversation.
+Sits in front of Database.get_recent_messages so flipping between hot
+conversations is served from memory instead of SQLite.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+
+MESSAGE_OVERHEAD_BYTES = 64  # Rough per-message cost of the dict itself
+
+
+class _CacheEntry:
+    __slots__ = ("messages", "complete", "size")
+
+    def __init__(self, messages: List[Dict[str, Any]], complete: bool):
+        self.messages = messages
+        self.complete = complete  # True when no older messages exist in the database
+        self.size = sum(MessageCache.estimate_size(m) for m in messages)
+
+
+class MessageCache:
+    """
+    Byte-bounded LRU cache keyed by conversation id.
+    Each entry holds the newest window of a conversation in chronological order.
+    """
+
+    def __init__(self, max_bytes: int = 4 * 1024 * 1024, max_messages_per_entry: int = 500):
+        self.max_bytes = max_bytes
+        self.max_messages_per_entry = max_messages_per_entry
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def estimate_size(message: Dict[str, Any]) -> int:
+        size = MESSAGE_OVERHEAD_BYTES
+        for value in message.values():
+            if isinstance(value, str):
+                size += len(value.encode("utf-8"))
+            else:
+                size += 8
+        return size
+
+    def get(self, conversation_id: str, limit: int) -> Optional[List[Dict[str, Any]]]:
+        """Return the newest `limit` messages if the cached window covers them, else None"""
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None or (len(entry.messages) < limit and not entry.complete):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(conversation_id)
+            self.hits += 1
+            window = entry.messages[-limit:] if limit > 0 else []
+            return [dict(m) for m in window]
+
+    def put(self, conversation_id: str, messages: List[Dict[str, Any]], complete: bool):
+        """Cache the newest window of a conversation (chronological order)"""
+        trimmed = len(messages) > self.max_messages_per_entry
+        window = [dict(m) for m in messages[-self.max_messages_per_entry:]]
+        entry = _CacheEntry(window, complete and not trimmed)
+        with self._lock:
+            self._remove(conversation_id)
+            if entry.size > self.max_bytes:
+                return
+            self._entries[conversation_id] = entry
+            self._bytes += entry.size
+            self._evict()
+
+    def append(self, conversation_id: str, message: Dict[str, Any]):
+        """
+        Write-through for a newly stored message; no-op if the conversation isn't cached.
+        The message is placed by timestamp, as Database.get_recent_messages orders them;
+        one older than a partial window is left to the database.
+        """
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                return
+            messages = entry.messages
+            position = len(messages)
+            while position and messages[position - 1]["timestamp"] > message["timestamp"]:
+                position -= 1
+            if position == 0 and messages and not entry.complete:
+                return
+            message = dict(message)
+            messages.insert(position, message)
+            size = self.estimate_size(message)
+            entry.size += size
+            self._bytes += size
+
+            while len(entry.messages) > self.max_messages_per_entry:
+                dropped = entry.messages.pop(0)
+                dropped_size = self.estimate_size(dropped)
+                entry.size -= dropped_size
+                self._bytes -= dropped_size
+                entry.complete = False
+
+            self._entries.move_to_end(conversation_id)
+            self._evict()
+
+    def invalidate(self, conversation_id: Optional[str] = None):
+        """Drop one conversation, or everything when conversation_id is None"""
+        with self._lock:
+            if conversation_id is None:
+                self._entries.clear()
+                self._bytes = 0
+            else:
+                self._remove(conversation_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes
+            }
+
+    def _remove(self, conversation_id: str):
+        entry = self._entries.pop(conversation_id, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
+            self.evictions += 1
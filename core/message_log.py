@@ -0,0 +1,373 @@
+"""
+Segmented append-only message log for server-side history.
+Each record is a CHAT_MESSAGE frame in the wire format of core/protocol.py
+(8-byte length+CRC32 header, JSON payload) tagged with a global sequence
+number. Segments roll over at a size limit; every index_interval records a
+(seq, offset) entry is added to the segment's sparse index (.idx). A sealed
+segment also gets a .keys file (its conversation -> seqs lookup), so startup
+loads both instead of scanning; only the active segment is scanned. Sealed
+segments are read through one mmap each, the active one through a plain
+file handle. read_records serves pages as the stored JSON payloads, which
+pack_history_records puts on the wire without re-encoding.
+
+Drop-in alternative to MessageStore (same append/flush/get_page API).
+"""
+import bisect
+import heapq
+import itertools
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from array import array
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.protocol import (HEADER_SIZE, MessageType, history_record_to_message, is_visible_to, pack_message,
+                           unpack_header, verify_crc)
+
+logger = logging.getLogger(__name__)
+
+
+INDEX_ENTRY = struct.Struct(">QQ")  # seq, byte offset within segment
+
+
+class _Segment:
+    """One .log file plus its sparse index"""
+
+    def __init__(self, directory: str, base_seq: int):
+        self.base_seq = base_seq
+        self.path = os.path.join(directory, f"{base_seq:020d}.log")
+        self.index_path = os.path.join(directory, f"{base_seq:020d}.idx")
+        self.keys_path = os.path.join(directory, f"{base_seq:020d}.keys")
+        self.count = 0
+        self.size = 0
+        self.index_seqs = array("Q")
+        self.index_offsets = array("Q")
+        self.sealed = False  # no more appends; mapped once
+        self._mmap: Optional[mmap.mmap] = None
+        self._reader = None
+
+    @property
+    def next_seq(self) -> int:
+        return self.base_seq + self.count
+
+    def read(self, offset: int, length: int):
+        """
+        Bytes at offset: a view into the mapping of a sealed segment, or a
+        copy read from the active one (whose size keeps changing).
+        """
+        if self.sealed:
+            if self._mmap is None:
+                with open(self.path, "rb") as f:
+                    self._mmap = mmap.mmap(f.fileno(), self.size, access=mmap.ACCESS_READ)
+            return memoryview(self._mmap)[offset:offset + length]
+        if self._reader is None:
+            self._reader = open(self.path, "rb")
+        self._reader.seek(offset)
+        return self._reader.read(length)
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Views handed out are still alive; the mapping goes with them
+                pass
+            self._mmap = None
+
+    def offset_of(self, seq: int, hint: Optional[Tuple[int, int]] = None) -> int:
+        """
+        Byte offset of seq: nearest sparse index entry (or a closer known
+        (seq, offset) hint), then hop frame headers.
+        """
+        i = bisect.bisect_right(self.index_seqs, seq) - 1
+        current, offset = self.index_seqs[i], self.index_offsets[i]
+        if hint is not None and current <= hint[0] <= seq:
+            current, offset = hint
+        while current < seq:
+            length, _ = unpack_header(self.read(offset, HEADER_SIZE))
+            offset += HEADER_SIZE + length
+            current += 1
+        return offset
+
+    def frame(self, offset: int):
+        length, _ = unpack_header(self.read(offset, HEADER_SIZE))
+        return self.read(offset, HEADER_SIZE + length)
+
+
+class MessageLog:
+    """Segmented, length-prefixed history log with per-conversation lookup"""
+
+    def __init__(self, directory: str = "server_history", segment_max_bytes: int = 64 * 1024 * 1024,
+                 index_interval: int = 64, flush_every: int = 256):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.index_interval = index_interval
+        self.flush_every = flush_every
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._segments: List[_Segment] = []
+        self._segment_bases: List[int] = []
+        # conversation_key -> sequence numbers (ascending)
+        self._conversations: Dict[str, array] = {}
+        self._pending = 0
+
+        self._load_segments()
+        if not self._segments:
+            self._add_segment(1)
+        active = self._segments[-1]
+        self._log_file = open(active.path, "ab")
+        self._index_file = open(active.index_path, "ab")
+
+    # --- Startup ---
+
+    def _load_segments(self):
+        names = sorted(n for n in os.listdir(self.directory) if n.endswith(".log"))
+        for i, name in enumerate(names):
+            segment = _Segment(self.directory, int(name[:-4]))
+            if i < len(names) - 1:
+                segment.sealed = True
+                if not self._load_sealed(segment):
+                    self._scan_segment(segment)
+                    self._write_keys(segment)
+            else:
+                self._scan_segment(segment)
+            self._segments.append(segment)
+            self._segment_bases.append(segment.base_seq)
+
+    def _load_sealed(self, segment: _Segment) -> bool:
+        """Restore a sealed segment from its .idx and .keys files; False if they don't match the log"""
+        try:
+            with open(segment.keys_path, "r", encoding="utf-8") as f:
+                keys = json.load(f)
+            with open(segment.index_path, "rb") as f:
+                entries = list(INDEX_ENTRY.iter_unpack(f.read()))
+        except (OSError, ValueError, struct.error):
+            return False
+        if (keys.get("size") != os.path.getsize(segment.path) or not entries
+                or entries[0] != (segment.base_seq, 0) or entries[-1][1] >= keys["size"]):
+            return False
+        segment.size = keys["size"]
+        segment.count = keys["count"]
+        for seq, offset in entries:
+            segment.index_seqs.append(seq)
+            segment.index_offsets.append(offset)
+        for key, seqs in keys["conversations"].items():
+            self._conversations.setdefault(key, array("Q")).extend(seqs)
+        return True
+
+    def _write_keys(self, segment: _Segment):
+        """Persist a sealed segment's conversation lookup (the part _scan_segment would rebuild)"""
+        conversations = {}
+        for key, seqs in self._conversations.items():
+            start = bisect.bisect_left(seqs, segment.base_seq)
+            end = bisect.bisect_left(seqs, segment.next_seq)
+            if start < end:
+                conversations[key] = seqs[start:end].tolist()
+        tmp_path = segment.keys_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"size": segment.size, "count": segment.count, "conversations": conversations}, f)
+        os.replace(tmp_path, segment.keys_path)
+
+    def _scan_segment(self, segment: _Segment):
+        """Rebuild conversation lookup and sparse index; cut off a torn tail"""
+        file_size = os.path.getsize(segment.path)
+        offset = 0
+        if file_size:
+            with open(segment.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                while offset + HEADER_SIZE <= file_size:
+                    length, crc = unpack_header(view[offset:offset + HEADER_SIZE])
+                    end = offset + HEADER_SIZE + length
+                    if end > file_size or not verify_crc(view[offset + HEADER_SIZE:end], crc):
+                        break
+                    record = json.loads(view[offset + HEADER_SIZE:end])
+                    self._track(segment, record["seq"], record["conversation_key"], offset)
+                    offset = end
+        if offset != file_size:
+            logger.warning(f"Truncating torn tail of {segment.path} at {offset} (was {file_size})")
+            with open(segment.path, "r+b") as f:
+                f.truncate(offset)
+        segment.size = offset
+        self._rewrite_index(segment)
+
+    def _rewrite_index(self, segment: _Segment):
+        with open(segment.index_path, "wb") as f:
+            for seq, offset in zip(segment.index_seqs, segment.index_offsets):
+                f.write(INDEX_ENTRY.pack(seq, offset))
+
+    def _add_segment(self, base_seq: int) -> _Segment:
+        segment = _Segment(self.directory, base_seq)
+        open(segment.path, "ab").close()
+        self._segments.append(segment)
+        self._segment_bases.append(base_seq)
+        return segment
+
+    def _track(self, segment: _Segment, seq: int, key: str, offset: int) -> bool:
+        """Record a newly stored frame. Returns True if it got a sparse index entry."""
+        indexed = segment.count % self.index_interval == 0
+        if indexed:
+            segment.index_seqs.append(seq)
+            segment.index_offsets.append(offset)
+        segment.count += 1
+        self._conversations.setdefault(key, array("Q")).append(seq)
+        return indexed
+
+    # --- Writing ---
+
+    def append(self, conversation_key: str, sender_id: str, sender: str, content: str,
+               timestamp: Optional[str] = None) -> int:
+        """Append a message; returns its sequence number"""
+        with self._lock:
+            segment = self._segments[-1]
+            if segment.size >= self.segment_max_bytes:
+                segment = self._roll()
+            seq = segment.next_seq
+            frame = pack_message({
+                "type": MessageType.CHAT_MESSAGE.value,
+                "seq": seq,
+                "conversation_key": conversation_key,
+                "sender_id": sender_id,
+                "sender_name": sender,
+                "content": content,
+                "timestamp": timestamp or datetime.now().isoformat()
+            })
+            offset = segment.size
+            self._log_file.write(frame)
+            segment.size += len(frame)
+            if self._track(segment, seq, conversation_key, offset):
+                self._index_file.write(INDEX_ENTRY.pack(seq, offset))
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._flush_locked()
+            return seq
+
+    def _roll(self) -> _Segment:
+        self._flush_locked()
+        self._log_file.close()
+        self._index_file.close()
+        sealed = self._segments[-1]
+        sealed.close()
+        sealed.sealed = True
+        self._write_keys(sealed)
+        segment = self._add_segment(sealed.next_seq)
+        self._log_file = open(segment.path, "ab")
+        self._index_file = open(segment.index_path, "ab")
+        return segment
+
+    def _flush_locked(self):
+        if self._pending:
+            self._log_file.flush()
+            self._index_file.flush()
+            self._pending = 0
+
+    def write_ticket(self) -> int:
+        """Same contract as MessageStore.write_ticket (appends are written synchronously)"""
+        with self._lock:
+            return self._segments[-1].next_seq - 1
+
+    def flush(self, ticket: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+        """Make appended records visible to readers (and the OS); never needs to wait"""
+        with self._lock:
+            self._flush_locked()
+        return True
+
+    # --- Reading ---
+
+    def _frames_for(self, seqs) -> list:
+        """Frames for ascending seqs, reusing each lookup as a hint for the next"""
+        frames = []
+        hint_segment = None
+        hint = None
+        for seq in seqs:
+            segment = self._segments[bisect.bisect_right(self._segment_bases, seq) - 1]
+            offset = segment.offset_of(seq, hint if segment is hint_segment else None)
+            frames.append(segment.frame(offset))
+            hint_segment, hint = segment, (seq, offset)
+        return frames
+
+    def read_frames(self, conversation_key: str, before_seq: Optional[int] = None,
+                    limit: int = 50) -> Tuple[list, bool]:
+        """
+        Raw stored frames for a conversation page, oldest first.
+        Returns (frames, has_more); frames from sealed segments are views into their mapping.
+        """
+        with self._lock:
+            self._flush_locked()
+            seqs = self._conversations.get(conversation_key)
+            if not seqs:
+                return [], False
+            end = len(seqs) if before_seq is None else bisect.bisect_left(seqs, before_seq)
+            start = max(0, end - limit)
+            return self._frames_for(seqs[start:end]), start > 0
+
+    @staticmethod
+    def _join_payloads(frames) -> bytes:
+        """JSON array of the frames' payloads, spliced as stored"""
+        out = bytearray(b"[")
+        for i, frame in enumerate(frames):
+            if i:
+                out += b","
+            out += frame[HEADER_SIZE:]
+        out += b"]"
+        return bytes(out)
+
+    def read_records(self, conversation_key: str, before_seq: Optional[int] = None,
+                     limit: int = 50) -> Tuple[bytes, bool]:
+        """
+        A get_page page as a JSON array of the stored CHAT_MESSAGE records
+        (see core.protocol.pack_history_records). Returns (array, has_more).
+        """
+        frames, has_more = self.read_frames(conversation_key, before_seq, limit)
+        return self._join_payloads(frames), has_more
+
+    def get_page(self, conversation_key: str, before_seq: Optional[int] = None,
+                 limit: int = 50) -> Tuple[List[Dict[str, Any]], bool]:
+        """Same contract as MessageStore.get_page"""
+        frames, has_more = self.read_frames(conversation_key, before_seq, limit)
+        return [history_record_to_message(json.loads(bytes(frame[HEADER_SIZE:]))) for frame in frames], has_more
+
+    def get_recent(self, conversation_key: str, limit: int = 20) -> List[Dict[str, Any]]:
+        return self.get_page(conversation_key, limit=limit)[0]
+
+    def _sync_frames(self, user_id: str, after_seq: int, limit: int) -> Tuple[list, bool]:
+        """Frames with seq > after_seq from every conversation visible to user_id, in seq order"""
+        with self._lock:
+            self._flush_locked()
+            streams = [
+                seqs[bisect.bisect_right(seqs, after_seq):]
+                for key, seqs in self._conversations.items()
+                if is_visible_to(user_id, key)
+            ]
+            seqs = list(itertools.islice(heapq.merge(*streams), limit + 1))
+            return self._frames_for(seqs[:limit]), len(seqs) > limit
+
+    def read_sync_records(self, user_id: str, after_seq: int = 0, limit: int = 1000) -> Tuple[bytes, bool]:
+        """A get_sync_page page as stored records (each carries its conversation_key)"""
+        frames, has_more = self._sync_frames(user_id, after_seq, limit)
+        return self._join_payloads(frames), has_more
+
+    def get_sync_page(self, user_id: str, after_seq: int = 0,
+                      limit: int = 1000) -> Tuple[List[Dict[str, Any]], bool]:
+        """Same contract as MessageStore.get_sync_page"""
+        frames, has_more = self._sync_frames(user_id, after_seq, limit)
+        messages = []
+        for frame in frames:
+            record = json.loads(bytes(frame[HEADER_SIZE:]))
+            messages.append(history_record_to_message(record))
+            messages[-1]["conversation_key"] = record["conversation_key"]
+        return messages, has_more
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._log_file.close()
+            self._index_file.close()
+            for segment in self._segments:
+                segment.close()
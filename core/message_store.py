@@ -0,0 +1,183 @@
+"""
+Server-side persistent message store.
+Append-only SQLite table in WAL mode. Writes from the routing path are
+queued and committed in batches by a single writer thread, so relaying a
+chat message never waits on disk. Reads use their own connection and are
+served by the (conversation_key, seq) index.
+"""
+import logging
+import os
+import queue
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.protocol import PUBLIC_CONVERSATION, is_visible_to
+
+logger = logging.getLogger(__name__)
+
+
+def create_message_store(config: Dict[str, Any], default_path: str):
+    """
+    Build the history store selected by server_config.json:
+    "history_backend": "sqlite" (default) or "log" (segmented MessageLog).
+    """
+    path = config.get("history_db_path", default_path)
+    if config.get("history_backend") == "log":
+        from core.message_log import MessageLog
+        return MessageLog(config.get("history_log_dir", os.path.splitext(path)[0] + "_log"))
+    return MessageStore(path)
+
+
+class MessageStore:
+    """Append-only chat history with batched writes"""
+
+    def __init__(self, db_path: str = "server_messages.db", batch_size: int = 256):
+        self.db_path = db_path
+        self.batch_size = batch_size
+
+        self._write_conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._write_conn.execute("PRAGMA journal_mode=WAL")
+        self._write_conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_tables()
+
+        self._read_conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._read_conn.row_factory = sqlite3.Row
+        self._read_lock = threading.Lock()
+
+        self._queue: "queue.Queue[Optional[Tuple]]" = queue.Queue()
+        # Every append gets a ticket; flush(ticket) waits for that write only, not for later traffic
+        self._append_lock = threading.Lock()
+        self._last_ticket = 0
+        self._committed_ticket = 0
+        self._committed = threading.Condition()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _init_tables(self):
+        self._write_conn.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                conversation_key TEXT NOT NULL,
+                sender_id TEXT NOT NULL,
+                sender TEXT NOT NULL,
+                content TEXT NOT NULL,
+                timestamp TEXT NOT NULL
+            )
+        """)
+        self._write_conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_messages_conversation_seq ON messages(conversation_key, seq)"
+        )
+        self._write_conn.commit()
+
+    def append(self, conversation_key: str, sender_id: str, sender: str, content: str,
+               timestamp: Optional[str] = None) -> int:
+        """Queue a message for persistence (non-blocking). Returns its write ticket."""
+        row = (conversation_key, sender_id, sender, content, timestamp or datetime.now().isoformat())
+        with self._append_lock:
+            self._last_ticket += 1
+            self._queue.put((self._last_ticket, row))
+            return self._last_ticket
+
+    def write_ticket(self) -> int:
+        """Ticket of the latest append; flush(ticket) waits for it and everything before"""
+        with self._append_lock:
+            return self._last_ticket
+
+    def flush(self, ticket: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+        """
+        Block until the messages appended up to ticket (default: before this
+        call) are committed. Messages appended meanwhile are not waited for.
+        Returns False if timeout expired first.
+        """
+        if ticket is None:
+            ticket = self.write_ticket()
+        with self._committed:
+            return self._committed.wait_for(lambda: self._committed_ticket >= ticket, timeout)
+
+    def _write_loop(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            # Drain whatever else is already queued into the same transaction
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            items = [item for item in batch if item is not None]
+            try:
+                if items:
+                    with self._write_conn:
+                        self._write_conn.executemany(
+                            "INSERT INTO messages (conversation_key, sender_id, sender, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                            [row for _, row in items]
+                        )
+            except sqlite3.Error as e:
+                logger.error(f"Failed to persist {len(items)} messages: {e}")
+            finally:
+                if items:
+                    # Failed rows are logged and released too, so flush() never waits on them forever
+                    with self._committed:
+                        self._committed_ticket = items[-1][0]
+                        self._committed.notify_all()
+
+            if len(items) < len(batch):
+                return
+
+    def get_page(self, conversation_key: str, before_seq: Optional[int] = None,
+                 limit: int = 50) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Messages older than before_seq (newest page when None), oldest first.
+        Returns (messages, has_more).
+        """
+        query = "SELECT seq, sender_id, sender, content, timestamp FROM messages WHERE conversation_key = ?"
+        params: list = [conversation_key]
+        if before_seq is not None:
+            query += " AND seq < ?"
+            params.append(before_seq)
+        query += " ORDER BY seq DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self._read_lock:
+            rows = self._read_conn.execute(query, params).fetchall()
+        has_more = len(rows) > limit
+        return [dict(row) for row in reversed(rows[:limit])], has_more
+
+    def get_recent(self, conversation_key: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Most recent messages, oldest first (AI context)"""
+        return self.get_page(conversation_key, limit=limit)[0]
+
+    def get_sync_page(self, user_id: str, after_seq: int = 0,
+                      limit: int = 1000) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Messages with seq > after_seq from every conversation visible to user_id,
+        in seq order, each tagged with its conversation_key. Returns (messages, has_more).
+        """
+        escaped = user_id.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        with self._read_lock:
+            cursor = self._read_conn.execute("""
+                SELECT seq, conversation_key, sender_id, sender, content, timestamp FROM messages
+                WHERE seq > ? AND (conversation_key = ?
+                    OR conversation_key LIKE ? ESCAPE '\\' OR conversation_key LIKE ? ESCAPE '\\')
+                ORDER BY seq
+            """, (after_seq, PUBLIC_CONVERSATION, f"dm:{escaped}:%", f"dm:%:{escaped}"))
+            messages = []
+            for row in cursor:
+                if not is_visible_to(user_id, row["conversation_key"]):
+                    continue
+                if len(messages) == limit:
+                    return messages, True
+                messages.append(dict(row))
+        return messages, False
+
+    def close(self):
+        """Flush pending writes and close connections"""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+        self._write_conn.close()
+        with self._read_lock:
+            self._read_conn.close()
@@ -0,0 +1,273 @@
+"""
+Schema migrations for the client database, keyed on PRAGMA user_version.
+On an up-to-date database startup costs a single integer read; otherwise the
+pending migrations run in order and user_version is bumped after each one.
+Migrations are idempotent, so an interrupted upgrade resumes on next launch.
+"""
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, List, Optional
+
+
+ProgressCallback = Callable[[str, int, int], None]  # description, done, total
+
+MESSAGE_COPY_BATCH = 5000
+
+
+@dataclass
+class Migration:
+    version: int
+    description: str
+    apply: Callable[[sqlite3.Connection, Optional[ProgressCallback]], None]
+
+
+def _table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _preserve_legacy_table(conn: sqlite3.Connection, table: str):
+    """Move an incompatible table out of the way instead of dropping its data"""
+    legacy = f"{table}_legacy"
+    suffix = 1
+    while conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (legacy,)).fetchone():
+        suffix += 1
+        legacy = f"{table}_legacy{suffix}"
+    conn.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+    print(f"[Database] Kept incompatible {table} table as {legacy}")
+
+
+def _create_users(conn: sqlite3.Connection, progress: Optional[ProgressCallback]):
+    columns = _table_columns(conn, "users")
+    if columns and 'id' not in columns:
+        _preserve_legacy_table(conn, "users")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            avatar TEXT,
+            ip_address TEXT,
+            port INTEGER,
+            last_seen TEXT,
+            is_online INTEGER DEFAULT 0
+        )
+    """)
+
+
+def _create_conversations(conn: sqlite3.Connection, progress: Optional[ProgressCallback]):
+    columns = _table_columns(conn, "conversations")
+    if columns and ('id' not in columns or 'type' not in columns):
+        _preserve_legacy_table(conn, "conversations")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            name TEXT NOT NULL,
+            peer_user_id TEXT,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL,
+            last_message TEXT,
+            unread_count INTEGER DEFAULT 0,
+            FOREIGN KEY (peer_user_id) REFERENCES users(id)
+        )
+    """)
+    timestamp = datetime.now().isoformat()
+    conn.execute("""
+        INSERT OR IGNORE INTO conversations (id, type, name, created_at, updated_at)
+        VALUES ('public', 'group', '公共聊天室', ?, ?)
+    """, (timestamp, timestamp))
+    conn.commit()
+
+
+MESSAGES_DDL = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        conversation_id TEXT NOT NULL,
+        sender_id TEXT NOT NULL,
+        sender TEXT NOT NULL,
+        content TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        FOREIGN KEY (conversation_id) REFERENCES conversations(id),
+        FOREIGN KEY (sender_id) REFERENCES users(id)
+    )
+"""
+
+
+def _create_messages(conn: sqlite3.Connection, progress: Optional[ProgressCallback]):
+    columns = _table_columns(conn, "messages")
+    if not columns:
+        conn.execute(MESSAGES_DDL.format(name="messages"))
+        return
+    if 'conversation_id' in columns:
+        return
+
+    # Pre-conversation schema: copy into messages_new in batches keyed on rowid.
+    # Each batch commits on its own, and a restart resumes after MAX(id).
+    conn.execute(MESSAGES_DDL.format(name="messages_new"))
+    conversation_expr = "COALESCE(session_id, 'default')" if 'session_id' in columns else "'default'"
+    (total,) = conn.execute("SELECT COUNT(*) FROM messages").fetchone()
+    (last_id,) = conn.execute("SELECT COALESCE(MAX(id), 0) FROM messages_new").fetchone()
+    (done,) = conn.execute("SELECT COUNT(*) FROM messages_new").fetchone()
+
+    while True:
+        with conn:
+            cursor = conn.execute(f"""
+                INSERT INTO messages_new (id, conversation_id, sender_id, sender, content, timestamp)
+                SELECT rowid, {conversation_expr}, sender, sender, content, timestamp
+                FROM messages WHERE rowid > ? ORDER BY rowid LIMIT ?
+            """, (last_id, MESSAGE_COPY_BATCH))
+            copied = cursor.rowcount
+        if copied <= 0:
+            break
+        done += copied
+        (last_id,) = conn.execute("SELECT MAX(id) FROM messages_new").fetchone()
+        if progress:
+            progress("Migrating messages", done, total)
+
+    with conn:
+        conn.execute("DROP TABLE messages")
+        conn.execute("ALTER TABLE messages_new RENAME TO messages")
+
+
+def _v1_base_schema(conn: sqlite3.Connection, progress: Optional[ProgressCallback]):
+    _create_users(conn, progress)
+    _create_conversations(conn, progress)
+    _create_messages(conn, progress)
+    # Memories table (key information extracted from conversations)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS memories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            content TEXT NOT NULL,
+            category TEXT,
+            created_at TEXT NOT NULL,
+            session_id TEXT DEFAULT 'default'
+        )
+    """)
+    # Emotions history table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS emotions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            emotion_type TEXT NOT NULL,
+            confidence REAL,
+            context TEXT,
+            timestamp TEXT NOT NULL,
+            session_id TEXT DEFAULT 'default'
+        )
+    """)
+
+
+def _v2_memory_signatures(conn: sqlite3.Connection, progress: Optional[ProgressCallback]):
+    # MinHash signatures backing the memory near-duplicate index
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS memory_signatures (
+            memory_id INTEGER PRIMARY KEY,
+            session_id TEXT NOT NULL,
+            shingle_count INTEGER NOT NULL,
+            signature BLOB NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_memory_signatures_session ON memory_signatures(session_id)")
+
+
+def _v3_messages_conversation_index(conn: sqlite3.Connection, progress: Optional[ProgressCallback]):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_messages_conversation_timestamp ON messages(conversation_id, timestamp)")
+
+
+def _v4_history_sync(conn: sqlite3.Connection, progress: Optional[ProgressCallback]):
+    if 'server_seq' not in _table_columns(conn, "messages"):
+        conn.execute("ALTER TABLE messages ADD COLUMN server_seq INTEGER")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_messages_server_seq ON messages(server_seq)")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sync_state (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """)
+    # Existing installs already hold their history locally; only fresh databases sync from the server
+    if conn.execute("SELECT 1 FROM messages LIMIT 1").fetchone():
+        conn.execute("INSERT OR IGNORE INTO sync_state (key, value) VALUES ('history_synced', '1')")
+
+
+def _v5_online_users_index(conn: sqlite3.Connection, progress: Optional[ProgressCallback]):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_users_online ON users(is_online, last_seen)")
+
+
+def _v6_emotion_series(conn: sqlite3.Connection, progress: Optional[ProgressCallback]):
+    # Raw AI_EMOTION scores plus incrementally maintained minute/hour rollups (count + score sums)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS emotion_samples (
+            conversation_id TEXT NOT NULL,
+            ts_ms INTEGER NOT NULL,
+            neutral REAL NOT NULL,
+            happy REAL NOT NULL,
+            tense REAL NOT NULL,
+            negative REAL NOT NULL,
+            PRIMARY KEY (conversation_id, ts_ms)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS emotion_rollups (
+            conversation_id TEXT NOT NULL,
+            resolution_ms INTEGER NOT NULL,
+            bucket_ms INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            neutral REAL NOT NULL,
+            happy REAL NOT NULL,
+            tense REAL NOT NULL,
+            negative REAL NOT NULL,
+            PRIMARY KEY (conversation_id, resolution_ms, bucket_ms)
+        ) WITHOUT ROWID
+    """)
+
+
+def _v7_incremental_vacuum(conn: sqlite3.Connection, progress: Optional[ProgressCallback]):
+    # Databases created before incremental auto_vacuum need one full VACUUM to switch modes.
+    # It runs here, at startup, before any other connection (GUI, maintenance) is open.
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        return
+    conn.commit()
+    if progress:
+        progress("Compacting database", 0, 1)
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
+    if progress:
+        progress("Compacting database", 1, 1)
+
+
+MIGRATIONS: List[Migration] = [
+    Migration(1, "base schema (users, conversations, messages, memories, emotions)", _v1_base_schema),
+    Migration(2, "memory near-duplicate signatures", _v2_memory_signatures),
+    Migration(3, "messages (conversation_id, timestamp) index", _v3_messages_conversation_index),
+    Migration(4, "server history sync (server_seq, sync_state)", _v4_history_sync),
+    Migration(5, "users (is_online, last_seen) index", _v5_online_users_index),
+    Migration(6, "emotion time series (samples, minute/hour rollups)", _v6_emotion_series),
+    Migration(7, "incremental auto_vacuum", _v7_incremental_vacuum),
+]
+
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn: sqlite3.Connection, progress: Optional[ProgressCallback] = None) -> int:
+    """Apply pending migrations in order. Returns the number applied."""
+    current = get_schema_version(conn)
+    if current >= SCHEMA_VERSION:
+        return 0
+
+    if current == 0 and not conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchone():
+        # auto_vacuum can only be chosen before the first table is created
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+    applied = 0
+    for migration in MIGRATIONS:
+        if migration.version <= current:
+            continue
+        print(f"[Database] Applying migration {migration.version}: {migration.description}")
+        migration.apply(conn, progress)
+        conn.execute(f"PRAGMA user_version = {migration.version}")
+        conn.commit()
+        applied += 1
+    return applied
@@ -14,7 +14,7 @@ from PyQt6.QtCore import QObject, pyqtSignal
 from core.protocol import (
     Protocol, MessageType, HEADER_SIZE,
     pack_message, unpack_header, verify_crc,
-    AIAnalysisRequest
+    AIAnalysisRequest, HistoryRequest, decode_history_messages
 )
 
 class NetworkManager(QObject):
@@ -30,7 +30,7 @@ class NetworkManager(QObject):
     reconnection_status = pyqtSignal(str) # Status message for UI
     
     # Message signal: sender_id, sender_name, content, target, sender_avatar
-    message_received = pyqtSignal(str, str, str, str, str)
+    message_received = pyqtSignal(str, str, str, str, str, str)
     
     # User presence signals
     user_joined = pyqtSignal(str, str, str)  # user_id, user_name, avatar
@@ -42,8 +42,13 @@ class NetworkManager(QObject):
     
     # AI signals - server sends AI results to client
     ai_suggestion_received = pyqtSignal(str, dict)  # conversation_id, suggestion dict
+    ai_suggestion_delta_received = pyqtSignal(str, str, str)  # conversation_id, title so far, content delta
     ai_emotion_received = pyqtSignal(str, dict)  # conversation_id, emotion scores
     ai_memory_received = pyqtSignal(str, list)  # conversation_id, memories list
+    
+    # History signal - a page of server-side history (oldest first)
+    # conversation_id is "" for full-sync pages; each message then carries its own
+    history_page_received = pyqtSignal(str, list, bool)  # conversation_id, messages, has_more
 
     def __init__(self):
         super().__init__()
@@ -160,15 +165,18 @@ class NetworkManager(QObject):
         """Stop network manager completely"""
         self.disconnect()
 
-    def send_chat_message(self, target: str, content: str):
-        self._send_message_async({
+    def send_chat_message(self, target: str, content: str, timestamp: Optional[str] = None):
+        message = {
             "type": MessageType.CHAT_MESSAGE.value,
             "sender_id": self.user_id,
             "sender_name": self.user_name,
             "sender_avatar": self.avatar,
             "target": target,
             "content": content
-        })
+        }
+        if timestamp:
+            message["timestamp"] = timestamp
+        self._send_message_async(message)
 
     def send_typing_status(self, is_typing: bool):
         self._send_message_async({
@@ -179,15 +187,22 @@ class NetworkManager(QObject):
             "is_typing": is_typing
         })
 
-    def send_ai_analysis_request(self, conversation_id: str, context_snapshot: List[Dict[str, Any]] = None):
+    def send_ai_analysis_request(self, conversation_id: str, context_snapshot: List[Dict[str, Any]] = None,
+                                 priority: str = "interactive"):
         request = AIAnalysisRequest(
             conversation_id=conversation_id,
             sender_id=self.user_id,
             sender_name=self.user_name,
-            context_snapshot=context_snapshot
+            context_snapshot=context_snapshot,
+            priority=priority
         )
         self._send_message_async(request.to_dict())
 
+    def request_history_sync(self, after_seq: int = 0, limit: int = 2000):
+        """Ask for the next full-sync page (all conversations) after after_seq"""
+        request = HistoryRequest(after_seq=after_seq, limit=limit)
+        self._send_message_async(request.to_dict())
+
     def _send_message_async(self, message: dict):
         """Send message without blocking main thread excessively"""
         if not self.socket or not self.running:
@@ -284,7 +299,8 @@ class NetworkManager(QObject):
                 message.get("sender_name", "Unknown"),
                 message.get("content", ""),
                 message.get("target", "public"),
-                message.get("sender_avatar", "")
+                message.get("sender_avatar", ""),
+                message.get("timestamp", "")
             )
             
         elif msg_type == MessageType.USER_JOINED.value:
@@ -321,6 +337,13 @@ class NetworkManager(QObject):
                 }
             )
         
+        elif msg_type == MessageType.AI_SUGGESTION_DELTA.value:
+            self.ai_suggestion_delta_received.emit(
+                message.get("conversation_id", ""),
+                message.get("title", ""),
+                message.get("delta", "")
+            )
+        
         elif msg_type == MessageType.AI_EMOTION.value:
             self.ai_emotion_received.emit(
                 message.get("conversation_id", ""),
@@ -332,3 +355,10 @@ class NetworkManager(QObject):
                 message.get("conversation_id", ""),
                 message.get("memories", [])
             )
+        
+        elif msg_type == MessageType.HISTORY_PAGE.value:
+            self.history_page_received.emit(
+                message.get("conversation_id", ""),
+                decode_history_messages(message, self.user_id),
+                message.get("has_more", False)
+            )
@@ -3,6 +3,7 @@ Shared Protocol Module for PetChat
 Defines message types, pack/unpack functions, and protocol constants.
 Used by both server and client for consistent communication.
 """
+import base64
 import json
 import struct
 import zlib
@@ -15,6 +16,36 @@ from enum import Enum
 HEADER_SIZE = 8  # 4 bytes length + 4 bytes CRC32
 
 
+# Conversation addressing: clients use peer ids, the server's history stores canonical keys
+PUBLIC_CONVERSATION = "public"
+
+
+def conversation_key(user_id: str, conversation_id: str) -> str:
+    """
+    Server-side key for a conversation as seen by user_id.
+    Clients address a private chat by the peer's user id, so both sides of a
+    DM map to the same canonical "dm:<a>:<b>" key.
+    """
+    if conversation_id == PUBLIC_CONVERSATION:
+        return PUBLIC_CONVERSATION
+    a, b = sorted((user_id, conversation_id))
+    return f"dm:{a}:{b}"
+
+
+def client_conversation_id(user_id: str, key: str) -> str:
+    """Inverse of conversation_key: how user_id addresses the conversation"""
+    if key == PUBLIC_CONVERSATION:
+        return PUBLIC_CONVERSATION
+    a, b = key[3:].split(":", 1)
+    return b if a == user_id else a
+
+
+def is_visible_to(user_id: str, key: str) -> bool:
+    if key == PUBLIC_CONVERSATION:
+        return True
+    return key.startswith("dm:") and user_id in key[3:].split(":", 1)
+
+
 class MessageType(str, Enum):
     """All supported message types in the protocol"""
     # Connection & Registration
@@ -30,9 +61,14 @@ class MessageType(str, Enum):
     # AI - Server-side processing
     AI_ANALYSIS_REQUEST = "ai_analysis_request"
     AI_SUGGESTION = "ai_suggestion"
+    AI_SUGGESTION_DELTA = "ai_suggestion_delta"  # streamed suggestion text, followed by AI_SUGGESTION
     AI_EMOTION = "ai_emotion"
     AI_MEMORY = "ai_memory"
     
+    # History - served from the server-side message store
+    HISTORY_REQUEST = "history_request"
+    HISTORY_PAGE = "history_page"
+    
     # Legacy AI - for backward compatibility
     AI_REQUEST = "ai_request"  # Old client request format
 
@@ -53,6 +89,8 @@ class AIAnalysisRequest:
     # Context snapshot: recent messages for cold-start recovery
     # Server uses this if its session is empty or stale
     context_snapshot: Optional[List[Dict[str, Any]]] = None
+    # "interactive" (explicit /ai) is scheduled ahead of "background" analysis
+    priority: str = "interactive"
     
     def to_dict(self) -> Dict:
         return {
@@ -60,7 +98,8 @@ class AIAnalysisRequest:
             "conversation_id": self.conversation_id,
             "sender_id": self.sender_id,
             "sender_name": self.sender_name,
-            "context_snapshot": self.context_snapshot or []
+            "context_snapshot": self.context_snapshot or [],
+            "priority": self.priority
         }
 
 
@@ -82,6 +121,22 @@ class AISuggestion:
         }
 
 
+@dataclass
+class AISuggestionDelta:
+    """Next piece of a suggestion that is still being generated"""
+    conversation_id: str
+    title: str  # title so far
+    delta: str  # content text to append
+    
+    def to_dict(self) -> Dict:
+        return {
+            "type": MessageType.AI_SUGGESTION_DELTA.value,
+            "conversation_id": self.conversation_id,
+            "title": self.title,
+            "delta": self.delta
+        }
+
+
 @dataclass
 class AIEmotion:
     """Server response with emotion analysis"""
@@ -110,6 +165,115 @@ class AIMemory:
         }
 
 
+@dataclass
+class HistoryRequest:
+    """
+    Client request for a page of stored history.
+    With a conversation_id, before_seq pages backwards (None = newest page).
+    Without one, after_seq pages forwards through every conversation the
+    user can see (full sync for a new device or reinstall).
+    """
+    conversation_id: Optional[str] = None
+    before_seq: Optional[int] = None
+    after_seq: Optional[int] = None
+    limit: int = 50
+    compress: bool = True
+    
+    def to_dict(self) -> Dict:
+        return {
+            "type": MessageType.HISTORY_REQUEST.value,
+            "conversation_id": self.conversation_id,
+            "before_seq": self.before_seq,
+            "after_seq": self.after_seq,
+            "limit": self.limit,
+            "compress": self.compress
+        }
+
+
+@dataclass
+class HistoryPage:
+    """
+    Server response with a page of history (oldest first).
+    When compressed, messages travel as base64(zlib(JSON)) in "data".
+    """
+    conversation_id: str  # "" for a full-sync page (each message carries its own)
+    messages: List[Dict[str, Any]]  # [{"seq", "sender_id", "sender", "content", "timestamp"}]
+    has_more: bool = False
+    compress: bool = False
+    
+    def to_dict(self) -> Dict:
+        data = {
+            "type": MessageType.HISTORY_PAGE.value,
+            "conversation_id": self.conversation_id,
+            "has_more": self.has_more
+        }
+        if self.compress:
+            raw = json.dumps(self.messages, ensure_ascii=False).encode('utf-8')
+            data["encoding"] = "zlib"
+            data["data"] = base64.b64encode(zlib.compress(raw, 6)).decode('ascii')
+        else:
+            data["messages"] = self.messages
+        return data
+
+
+def pack_history_records(conversation_id: str, records: bytes, has_more: bool = False,
+                         compress: bool = False) -> bytes:
+    """
+    Packed HISTORY_PAGE whose messages are stored CHAT_MESSAGE records, given
+    as an already encoded JSON array (MessageLog.read_records). The array is
+    spliced into the frame, or compressed, as is: it is never decoded and
+    re-encoded. Clients read it with decode_history_messages.
+    """
+    head = {
+        "type": MessageType.HISTORY_PAGE.value,
+        "conversation_id": conversation_id,
+        "has_more": has_more
+    }
+    if compress:
+        head["encoding"] = "zlib"
+        head["data_format"] = "records"
+        head["data"] = base64.b64encode(zlib.compress(records, 6)).decode('ascii')
+        return pack_message(head)
+    head_json = json.dumps(head, ensure_ascii=False).encode('utf-8')
+    return Protocol.pack_payload(head_json[:-1] + b', "records": ' + records + b'}')
+
+
+def history_record_to_message(record: Dict[str, Any]) -> Dict[str, Any]:
+    """HistoryPage message dict for a stored CHAT_MESSAGE record"""
+    return {
+        "seq": record["seq"],
+        "sender_id": record["sender_id"],
+        "sender": record["sender_name"],
+        "content": record["content"],
+        "timestamp": record["timestamp"]
+    }
+
+
+def decode_history_messages(message: Dict, user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Messages of a HISTORY_PAGE dict, decompressing if needed. Pages of stored
+    records are converted too; their conversation keys become the
+    conversation_id user_id addresses them by (needed for full-sync pages).
+    """
+    if message.get("encoding") == "zlib":
+        raw = json.loads(zlib.decompress(base64.b64decode(message.get("data", ""))).decode('utf-8'))
+        if message.get("data_format") != "records":
+            return raw
+        records = raw
+    elif "records" in message:
+        records = message["records"]
+    else:
+        return message.get("messages", [])
+    
+    messages = []
+    for record in records:
+        msg = history_record_to_message(record)
+        if user_id is not None:
+            msg["conversation_id"] = client_conversation_id(user_id, record["conversation_key"])
+        messages.append(msg)
+    return messages
+
+
 class Protocol:
     """Protocol utilities for packing/unpacking messages"""
     
@@ -118,7 +282,11 @@ class Protocol:
     @staticmethod
     def pack(data: Dict) -> bytes:
         """Pack a message dict with length header and CRC32 checksum"""
-        payload = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        return Protocol.pack_payload(json.dumps(data, ensure_ascii=False).encode('utf-8'))
+    
+    @staticmethod
+    def pack_payload(payload: bytes) -> bytes:
+        """Frame an already encoded JSON payload"""
         length = len(payload)
         checksum = zlib.crc32(payload) & 0xFFFFFFFF
         header = struct.pack('>II', length, checksum)
@@ -1,4 +1,5 @@
-from .base import AIProvider
+from .base import AIProvider, IncompleteStreamError
 from .openai_provider import OpenAIProvider
 from .gemini_provider import GeminiProvider
+from .resilient import CircuitBreaker, ResilientProvider
 from .factory import create_provider
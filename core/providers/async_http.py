@@ -0,0 +1,157 @@
+"""
+Minimal asyncio HTTP/1.1 client for JSON APIs.
+Only what the providers need: POST a JSON body and read a JSON reply
+(Content-Length, chunked, or until the server closes), with keep-alive
+connections pooled per host so many concurrent requests share one event loop
+and a bounded set of sockets. A request on a pooled connection is only resent
+if that connection failed before any byte of the reply arrived.
+"""
+import asyncio
+import json
+import logging
+import ssl
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncHTTPError(Exception):
+    def __init__(self, status: int, body: bytes):
+        super().__init__(f"HTTP {status}: {body[:200].decode('utf-8', 'replace')}")
+        self.status = status
+        self.body = body
+
+
+class _NoResponse(ConnectionError):
+    """The connection failed before any byte of the reply arrived"""
+
+
+_Connection = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+# Replies that never carry a body, whatever their headers say
+_NO_BODY_STATUSES = (204, 304)
+
+
+class AsyncHTTPClient:
+    """Keep-alive connection pool; bound to the event loop it is first used on"""
+
+    def __init__(self, max_connections: int = 100):
+        self.max_connections = max_connections
+        self._idle: Dict[Tuple[str, str, int], List[_Connection]] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._ssl_context: Optional[ssl.SSLContext] = None
+        self.stats = {"requests": 0, "connections_opened": 0}
+
+    async def post_json(self, url: str, payload: Any, headers: Optional[Dict[str, str]] = None,
+                        timeout: Optional[float] = None) -> Any:
+        """POST payload as JSON and return the decoded reply; raises AsyncHTTPError for 4xx/5xx"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_connections)
+        async with self._slots:
+            status, body = await asyncio.wait_for(self._request(url, payload, headers or {}), timeout)
+        if status >= 400:
+            raise AsyncHTTPError(status, body)
+        return json.loads(body) if body else None
+
+    async def _request(self, url: str, payload: Any, headers: Dict[str, str]) -> Tuple[int, bytes]:
+        parts = urlsplit(url)
+        scheme = parts.scheme or "http"
+        port = parts.port or (443 if scheme == "https" else 80)
+        key = (scheme, parts.hostname, port)
+        path = parts.path or "/"
+        if parts.query:
+            path += "?" + parts.query
+
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        head = [f"POST {path} HTTP/1.1", f"Host: {parts.netloc}", "Content-Type: application/json",
+                f"Content-Length: {len(body)}", "Connection: keep-alive"]
+        head += [f"{name}: {value}" for name, value in headers.items() if name.lower() != "content-type"]
+        request = ("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body
+        self.stats["requests"] += 1
+
+        idle = self._idle.setdefault(key, [])
+        while idle:
+            conn = idle.pop()
+            try:
+                return await self._exchange(key, conn, request)
+            except _NoResponse:
+                # The server closed the idle connection before answering; try the next one.
+                # A reply cut off part way is not resent: the POST may have been processed.
+                pass
+        return await self._exchange(key, await self._connect(key), request)
+
+    async def _connect(self, key: Tuple[str, str, int]) -> _Connection:
+        scheme, host, port = key
+        context = None
+        if scheme == "https":
+            if self._ssl_context is None:
+                self._ssl_context = ssl.create_default_context()
+            context = self._ssl_context
+        conn = await asyncio.open_connection(host, port, ssl=context)
+        self.stats["connections_opened"] += 1
+        return conn
+
+    async def _exchange(self, key: Tuple[str, str, int], conn: _Connection, request: bytes) -> Tuple[int, bytes]:
+        reader, writer = conn
+        received = False
+        try:
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+            if not status_line:
+                raise _NoResponse("Connection closed before response")
+            received = True
+            status, headers = await self._read_head(reader, status_line)
+            if status in _NO_BODY_STATUSES:
+                body = b""
+            elif headers.get("transfer-encoding", "").lower() == "chunked":
+                body = await self._read_chunked(reader)
+            elif "content-length" in headers:
+                body = await reader.readexactly(int(headers["content-length"]))
+            else:
+                # No framing: the body ends when the server closes, so the connection cannot be reused
+                body = await reader.read()
+                headers["connection"] = "close"
+        except BaseException as e:
+            writer.close()
+            if isinstance(e, ConnectionError) and not received and not isinstance(e, _NoResponse):
+                raise _NoResponse(str(e)) from e
+            raise
+
+        if headers.get("connection", "").lower() == "close":
+            writer.close()
+        else:
+            self._idle.setdefault(key, []).append(conn)
+        return status, body
+
+    @staticmethod
+    async def _read_head(reader: asyncio.StreamReader, status_line: bytes) -> Tuple[int, Dict[str, str]]:
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    @staticmethod
+    async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0].strip() or b"0", 16)
+            if size == 0:
+                # Trailer section ends with an empty line
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                return b"".join(chunks)
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+
+    async def aclose(self):
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
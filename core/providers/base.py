@@ -1,13 +1,49 @@
+import asyncio
 from abc import ABC, abstractmethod
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
+
+
+class IncompleteStreamError(Exception):
+    """A streamed reply broke off after some chunks had been yielded"""
+
 
 class AIProvider(ABC):
+    # Whether AIService's "auto" analysis mode sends the single fused analyze_all prompt
+    supports_fused_analysis: bool = False
+    # Attempts per call (retry_with_backoff); providers inside a failover chain use fewer
+    max_attempts: int = 3
+
     def __init__(self, api_key: str, model: str, base_url: Optional[str] = None, timeout: float = 60.0):
         self.api_key = api_key
         self.model = model
         self.base_url = base_url
         self.timeout = timeout
 
+    def close(self):
+        """Release pooled connections or clients held by the provider"""
+        pass
+
     @abstractmethod
     def generate_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Optional[str]:
         pass
+
+    async def agenerate_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Optional[str]:
+        """
+        Coroutine version of generate_content. Providers with a native async
+        client override this; the default runs the blocking call in a thread.
+        """
+        return await asyncio.to_thread(self.generate_content, messages, temperature, max_tokens)
+
+    async def aclose(self):
+        """Release async connections held by the provider"""
+        pass
+
+    def stream_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Iterator[str]:
+        """
+        Yield the reply in chunks as the model produces them. Providers without
+        streaming support yield the whole reply once; nothing is yielded on failure.
+        A stream that ends before the reply is complete raises IncompleteStreamError.
+        """
+        content = self.generate_content(messages, temperature, max_tokens)
+        if content:
+            yield content
@@ -1,8 +1,9 @@
 import logging
-from typing import Optional
+from typing import Any, Dict, List, Optional
 from .base import AIProvider
 from .openai_provider import OpenAIProvider
 from .gemini_provider import GeminiProvider
+from .resilient import ResilientProvider
 
 logger = logging.getLogger(__name__)
 
@@ -14,7 +15,48 @@ def create_provider(
     model: str,
     base_url: Optional[str] = None,
     timeout: float = 60.0,
-    provider_type: str = "auto"
+    provider_type: str = "auto",
+    pool_size: int = 10,
+    fallbacks: Optional[List[Dict[str, Any]]] = None,
+    resilience: Optional[Dict[str, Any]] = None
+) -> AIProvider:
+    """
+    Build the provider for a model. With fallbacks (server_config.json
+    ai_config.fallbacks: [{"model", "base_url", "api_key", "provider_type"}])
+    or resilience settings (ai_config.resilience), the primary and fallbacks
+    are wrapped in a ResilientProvider in that failover order.
+    """
+    primary = _create_single(api_key, model, base_url, timeout, provider_type, pool_size)
+    if not fallbacks and not resilience:
+        return primary
+    
+    resilience = dict(resilience or {})
+    chain = [primary] + [
+        _create_single(
+            api_key=fallback.get("api_key", api_key),
+            model=fallback.get("model", model),
+            base_url=fallback.get("base_url"),
+            timeout=fallback.get("timeout", timeout),
+            provider_type=fallback.get("provider_type", "auto"),
+            pool_size=pool_size
+        )
+        for fallback in fallbacks or []
+    ]
+    # The chain fails over instead of retrying a struggling endpoint
+    max_attempts = resilience.pop("max_attempts", 1)
+    for provider in chain:
+        provider.max_attempts = max_attempts
+    logger.info(f"[Factory] Failover chain: {' -> '.join(p.model for p in chain)}")
+    return ResilientProvider(chain, **resilience)
+
+
+def _create_single(
+    api_key: str,
+    model: str,
+    base_url: Optional[str],
+    timeout: float,
+    provider_type: str,
+    pool_size: int
 ) -> AIProvider:
     provider_type = provider_type.lower().strip()
     
@@ -26,7 +68,8 @@ def create_provider(
         return GeminiProvider(api_key=api_key, model=model, base_url=base_url, timeout=timeout)
     
     logger.info(f"[Factory] Creating OpenAIProvider for model={model}, base_url={base_url}")
-    return OpenAIProvider(api_key=api_key, model=model, base_url=base_url or "http://127.0.0.1:1235/v1", timeout=timeout)
+    return OpenAIProvider(api_key=api_key, model=model, base_url=base_url or "http://127.0.0.1:1235/v1",
+                          timeout=timeout, pool_size=pool_size)
 
 
 def _detect_provider(model: str, base_url: Optional[str]) -> str:
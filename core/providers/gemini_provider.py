@@ -1,20 +1,55 @@
 import logging
+import threading
 import time
+from collections import OrderedDict
 import google.generativeai as genai
 from google.api_core import exceptions as google_exceptions
-from typing import List, Dict, Optional
-from .base import AIProvider
-from .retry import retry_with_backoff, RetryError
+from typing import Iterator, List, Dict, Optional, Tuple
+from .base import AIProvider, IncompleteStreamError
+from .retry import async_retry_with_backoff, retry_with_backoff, RetryError
 
 logger = logging.getLogger(__name__)
 
+RETRYABLE_EXCEPTIONS = (
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    google_exceptions.ResourceExhausted,
+    ConnectionError,
+    TimeoutError
+)
+
 
 class GeminiProvider(AIProvider):
-    def __init__(self, api_key: str, model: str, base_url: Optional[str] = None, timeout: float = 60.0):
+    supports_fused_analysis = True
+
+    def __init__(self, api_key: str, model: str, base_url: Optional[str] = None, timeout: float = 60.0,
+                 model_cache_size: int = 16):
         super().__init__(api_key, model, base_url, timeout)
         genai.configure(api_key=api_key)
+        # GenerativeModel objects are reusable across calls; AIService only uses a
+        # handful of system prompts, so a small LRU keyed by prompt avoids rebuilding them
+        self.model_cache_size = model_cache_size
+        self._models: "OrderedDict[Tuple[str, str], genai.GenerativeModel]" = OrderedDict()
+        self._models_lock = threading.Lock()
 
-    def generate_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Optional[str]:
+    def _get_model(self, system_instruction: str) -> "genai.GenerativeModel":
+        key = (self.model, system_instruction)
+        with self._models_lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                return model
+            model = genai.GenerativeModel(
+                model_name=self.model,
+                system_instruction=system_instruction if system_instruction else None
+            )
+            self._models[key] = model
+            if len(self._models) > self.model_cache_size:
+                self._models.popitem(last=False)
+            return model
+
+    def _prepare(self, messages: List[Dict[str, str]]) -> Optional[Tuple["genai.GenerativeModel", List[Dict]]]:
+        """Cached model for the system prompt, and the turns as Gemini contents"""
         gemini_history = []
         system_instruction = ""
         
@@ -32,53 +67,123 @@ class GeminiProvider(AIProvider):
         if not gemini_history:
             return None
             
-        last_message = gemini_history.pop()
-        if last_message["role"] != "user":
+        if gemini_history[-1]["role"] != "user":
             return None
+        
+        # History plus the new turn go out as one contents list; no chat session is needed
+        return self._get_model(system_instruction), gemini_history
+
+    def generate_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Optional[str]:
+        prepared = self._prepare(messages)
+        if prepared is None:
+            return None
+        model, gemini_history = prepared
+        config = {"temperature": temperature, "max_output_tokens": max_tokens}
 
         @retry_with_backoff(
-            max_attempts=3,
+            max_attempts=self.max_attempts,
             base_delay=1.0,
             max_delay=30.0,
-            retryable_exceptions=(
-                google_exceptions.ServiceUnavailable,
-                google_exceptions.DeadlineExceeded,
-                google_exceptions.ResourceExhausted,
-                ConnectionError,
-                TimeoutError
-            )
+            retryable_exceptions=RETRYABLE_EXCEPTIONS
         )
         def _do_request() -> str:
             start_time = time.perf_counter()
             
-            model = genai.GenerativeModel(
-                model_name=self.model,
-                system_instruction=system_instruction if system_instruction else None
+            response = model.generate_content(
+                gemini_history,
+                generation_config=config,
+                request_options={"timeout": self.timeout}
             )
             
-            chat = model.start_chat(history=gemini_history)
+            latency_ms = int((time.perf_counter() - start_time) * 1000)
+            logger.info(f"[Gemini] Request completed: model={self.model}, latency={latency_ms}ms")
             
-            config = genai.types.GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=max_tokens
-            )
+            return response.text.strip()
+        
+        try:
+            return _do_request()
+        except RetryError as e:
+            logger.error(f"[Gemini] All retries exhausted: {e.last_exception}")
+            return None
+        except Exception as e:
+            logger.error(f"[Gemini] Request failed: {e}")
+            return None
+
+    async def agenerate_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Optional[str]:
+        prepared = self._prepare(messages)
+        if prepared is None:
+            return None
+        model, gemini_history = prepared
+        config = {"temperature": temperature, "max_output_tokens": max_tokens}
+
+        @async_retry_with_backoff(
+            max_attempts=self.max_attempts,
+            base_delay=1.0,
+            max_delay=30.0,
+            retryable_exceptions=RETRYABLE_EXCEPTIONS
+        )
+        async def _do_request() -> str:
+            start_time = time.perf_counter()
             
-            response = chat.send_message(
-                last_message["parts"][0],
+            response = await model.generate_content_async(
+                gemini_history,
                 generation_config=config,
                 request_options={"timeout": self.timeout}
             )
             
             latency_ms = int((time.perf_counter() - start_time) * 1000)
-            logger.info(f"[Gemini] Request completed: model={self.model}, latency={latency_ms}ms")
+            logger.info(f"[Gemini] Async request completed: model={self.model}, latency={latency_ms}ms")
             
             return response.text.strip()
         
         try:
-            return _do_request()
+            return await _do_request()
         except RetryError as e:
             logger.error(f"[Gemini] All retries exhausted: {e.last_exception}")
             return None
         except Exception as e:
             logger.error(f"[Gemini] Request failed: {e}")
             return None
+
+    def stream_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Iterator[str]:
+        """Streamed chunks (stream=True); only opening the stream is retried"""
+        prepared = self._prepare(messages)
+        if prepared is None:
+            return
+        model, gemini_history = prepared
+        config = {"temperature": temperature, "max_output_tokens": max_tokens}
+
+        @retry_with_backoff(
+            max_attempts=self.max_attempts,
+            base_delay=1.0,
+            max_delay=30.0,
+            retryable_exceptions=RETRYABLE_EXCEPTIONS
+        )
+        def _open_stream():
+            return model.generate_content(
+                gemini_history,
+                generation_config=config,
+                request_options={"timeout": self.timeout},
+                stream=True
+            )
+
+        start_time = time.perf_counter()
+        first_token_ms = None
+        try:
+            for chunk in _open_stream():
+                text = chunk.text
+                if text:
+                    if first_token_ms is None:
+                        first_token_ms = int((time.perf_counter() - start_time) * 1000)
+                    yield text
+        except RetryError as e:
+            logger.error(f"[Gemini] All retries exhausted: {e.last_exception}")
+            return
+        except Exception as e:
+            logger.error(f"[Gemini] Stream failed: {e}")
+            if first_token_ms is not None:
+                raise IncompleteStreamError(f"stream interrupted: {e}") from e
+            return
+
+        latency_ms = int((time.perf_counter() - start_time) * 1000)
+        logger.info(f"[Gemini] Stream completed: model={self.model}, first token={first_token_ms}ms, latency={latency_ms}ms")
@@ -1,19 +1,80 @@
 import requests
+from requests.adapters import HTTPAdapter
+import asyncio
+import json
 import logging
+import threading
 import time
-from typing import List, Dict, Optional
-from .base import AIProvider
-from .retry import retry_with_backoff, RetryError
+from typing import Iterator, List, Dict, Optional
+from .async_http import AsyncHTTPClient, AsyncHTTPError
+from .base import AIProvider, IncompleteStreamError
+from .retry import async_retry_with_backoff, retry_with_backoff, RetryError
 
 logger = logging.getLogger(__name__)
 
 
 class OpenAIProvider(AIProvider):
-    def __init__(self, api_key: str, model: str, base_url: str = "http://127.0.0.1:1235/v1", timeout: float = 60.0):
+    def __init__(self, api_key: str, model: str, base_url: str = "http://127.0.0.1:1235/v1", timeout: float = 60.0,
+                 pool_size: int = 10, async_pool_size: int = 100):
         super().__init__(api_key, model, base_url, timeout)
         self.base_url = self.base_url.rstrip('/')
+        self.pool_size = pool_size
+        
+        # One keep-alive session per provider: concurrent AI stages reuse up to
+        # pool_size open connections instead of a new TCP/TLS handshake per call.
+        # Retries are handled by retry_with_backoff, not the adapter.
+        self._adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount("http://", self._adapter)
+        self.session.mount("https://", self._adapter)
+        self.session.headers.update({
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}",
+            "Connection": "keep-alive"
+        })
+        self._requests_sent = 0
+        self._stats_lock = threading.Lock()
+        
+        # agenerate_content: keep-alive pool on the caller's event loop
+        self.async_pool_size = async_pool_size
+        self._async_client: Optional[AsyncHTTPClient] = None
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
 
-    def generate_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Optional[str]:
+    def connection_stats(self) -> Dict[str, float]:
+        """Requests sent vs. TCP connections opened by the pool"""
+        opened = 0
+        pools = self._adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                opened += pool.num_connections
+        requests_sent = self._requests_sent
+        reused = max(0, requests_sent - opened)
+        return {
+            "requests": requests_sent,
+            "connections_opened": opened,
+            "reused": reused,
+            "reuse_rate": reused / requests_sent if requests_sent else 0.0,
+        }
+
+    def close(self):
+        self.session.close()
+
+    def _get_async_client(self) -> AsyncHTTPClient:
+        # Connections belong to one event loop; a new loop gets a new pool
+        loop = asyncio.get_running_loop()
+        if self._async_client is None or self._async_loop is not loop:
+            self._async_client = AsyncHTTPClient(max_connections=self.async_pool_size)
+            self._async_loop = loop
+        return self._async_client
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+            self._async_loop = None
+
+    async def agenerate_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Optional[str]:
         url = f"{self.base_url}/chat/completions"
         
         payload = {
@@ -22,24 +83,60 @@ class OpenAIProvider(AIProvider):
             "temperature": temperature,
             "max_tokens": max_tokens
         }
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        client = self._get_async_client()
         
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
+        @async_retry_with_backoff(
+            max_attempts=self.max_attempts,
+            base_delay=1.0,
+            max_delay=30.0,
+            retryable_exceptions=(asyncio.TimeoutError, asyncio.IncompleteReadError, OSError)
+        )
+        async def _do_request() -> str:
+            start_time = time.perf_counter()
+            data = await client.post_json(url, payload, headers=headers, timeout=self.timeout)
+            latency_ms = int((time.perf_counter() - start_time) * 1000)
+            
+            content = data["choices"][0]["message"]["content"].strip()
+            
+            logger.info(f"[OpenAI] Async request completed: model={self.model}, latency={latency_ms}ms")
+            return content
+        
+        try:
+            return await _do_request()
+        except RetryError as e:
+            logger.error(f"[OpenAI] All retries exhausted: {e.last_exception}")
+            return None
+        except AsyncHTTPError as e:
+            logger.error(f"[OpenAI] HTTP error (not retried): {e}")
+            return None
+        except (KeyError, IndexError, ValueError) as e:
+            logger.error(f"[OpenAI] Failed to parse response: {e}")
+            return None
+
+    def generate_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Optional[str]:
+        url = f"{self.base_url}/chat/completions"
+        
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens
         }
         
         @retry_with_backoff(
-            max_attempts=3,
+            max_attempts=self.max_attempts,
             base_delay=1.0,
             max_delay=30.0,
             retryable_exceptions=(requests.Timeout, requests.ConnectionError, ConnectionError)
         )
         def _do_request() -> str:
             start_time = time.perf_counter()
-            response = requests.post(
+            with self._stats_lock:
+                self._requests_sent += 1
+            response = self.session.post(
                 url,
                 json=payload,
-                headers=headers,
                 timeout=self.timeout
             )
             latency_ms = int((time.perf_counter() - start_time) * 1000)
@@ -63,3 +160,69 @@ class OpenAIProvider(AIProvider):
         except (KeyError, IndexError) as e:
             logger.error(f"[OpenAI] Failed to parse response: {e}")
             return None
+
+    def stream_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Iterator[str]:
+        """Server-sent events ("stream": true); only opening the stream is retried"""
+        url = f"{self.base_url}/chat/completions"
+        
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+        
+        @retry_with_backoff(
+            max_attempts=self.max_attempts,
+            base_delay=1.0,
+            max_delay=30.0,
+            retryable_exceptions=(requests.Timeout, requests.ConnectionError, ConnectionError)
+        )
+        def _open_stream() -> requests.Response:
+            with self._stats_lock:
+                self._requests_sent += 1
+            response = self.session.post(url, json=payload, timeout=self.timeout, stream=True)
+            response.raise_for_status()
+            return response
+        
+        start_time = time.perf_counter()
+        try:
+            response = _open_stream()
+        except RetryError as e:
+            logger.error(f"[OpenAI] All retries exhausted: {e.last_exception}")
+            return
+        except requests.HTTPError as e:
+            logger.error(f"[OpenAI] HTTP error (not retried): {e}")
+            return
+        
+        first_token_ms = None
+        done = False
+        try:
+            with response:
+                # Read to the end of the body (past [DONE]) so the connection goes back to the pool
+                for line in response.iter_lines():
+                    if not line.startswith(b"data:"):
+                        continue
+                    data = line[5:].strip()
+                    if data == b"[DONE]":
+                        done = True
+                        continue
+                    try:
+                        delta = json.loads(data)["choices"][0].get("delta", {}).get("content")
+                    except (ValueError, KeyError, IndexError) as e:
+                        logger.warning(f"[OpenAI] Skipping malformed stream event: {e}")
+                        continue
+                    if delta:
+                        if first_token_ms is None:
+                            first_token_ms = int((time.perf_counter() - start_time) * 1000)
+                        yield delta
+        except requests.RequestException as e:
+            logger.error(f"[OpenAI] Stream interrupted: {e}")
+            raise IncompleteStreamError(f"stream interrupted: {e}") from e
+        if not done:
+            logger.error("[OpenAI] Stream ended without [DONE]")
+            raise IncompleteStreamError("stream ended without [DONE]")
+        
+        latency_ms = int((time.perf_counter() - start_time) * 1000)
+        logger.info(f"[OpenAI] Stream completed: model={self.model}, first token={first_token_ms}ms, latency={latency_ms}ms")
@@ -0,0 +1,359 @@
+"""
+Failover chain over several providers.
+Each provider gets a circuit breaker on its rolling error rate, so a degraded
+endpoint is skipped instead of burning retries on every request. Calls go to
+the first provider whose breaker admits them and fail over down the list; with
+hedging on, a call still running after the primary's latency percentile is
+also sent to the next provider and the first usable reply wins.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional
+
+from .base import AIProvider, IncompleteStreamError
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """Rolling-window error-rate breaker: closed -> open -> half-open probe -> closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, error_rate: float = 0.5, window_seconds: float = 60.0, min_requests: int = 5,
+                 cooldown_seconds: float = 30.0, clock=time.monotonic):
+        """
+        Args:
+            error_rate: failure ratio within the window that opens the breaker
+            window_seconds: how far back outcomes count
+            min_requests: outcomes needed in the window before the rate is trusted
+            cooldown_seconds: time open before a single probe call is let through
+        """
+        self.error_rate = error_rate
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.cooldown_seconds = cooldown_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._outcomes = deque()  # (timestamp, ok)
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probing = False
+        self.times_opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.cooldown_seconds:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        """Whether a call may go out now; in half-open only one probe is admitted"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if self._clock() - self._opened_at < self.cooldown_seconds:
+                    return False
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record(self, ok: bool):
+        with self._lock:
+            now = self._clock()
+            if self._state == self.HALF_OPEN:
+                self._probing = False
+                if ok:
+                    self._state = self.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self._open(now)
+                return
+            if self._state == self.OPEN:
+                # Late result of a call admitted before the breaker opened
+                return
+
+            self._outcomes.append((now, ok))
+            while self._outcomes and now - self._outcomes[0][0] > self.window_seconds:
+                self._outcomes.popleft()
+            failures = sum(1 for _, success in self._outcomes if not success)
+            if len(self._outcomes) >= self.min_requests and failures / len(self._outcomes) >= self.error_rate:
+                self._open(now)
+
+    def _open(self, now: float):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._outcomes.clear()
+        self.times_opened += 1
+
+    def current_error_rate(self) -> float:
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return sum(1 for _, ok in self._outcomes if not ok) / len(self._outcomes)
+
+
+class _Member:
+    """A provider in the chain with its breaker and recent successful latencies"""
+
+    def __init__(self, provider: AIProvider, breaker: CircuitBreaker, latency_samples: int):
+        self.provider = provider
+        self.breaker = breaker
+        self.name = f"{type(provider).__name__}:{provider.model}"
+        self._latencies = deque(maxlen=latency_samples)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+
+    def record(self, ok: bool, latency: float):
+        self.breaker.record(ok)
+        with self._lock:
+            self.calls += 1
+            if ok:
+                self._latencies.append(latency)
+            else:
+                self.failures += 1
+
+    def latency_percentile(self, percentile: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            if len(self._latencies) < min_samples:
+                return None
+            ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100))]
+
+
+class ResilientProvider(AIProvider):
+    """Ordered failover over providers with per-provider circuit breakers and optional hedging"""
+
+    def __init__(self, providers: List[AIProvider], breaker: Optional[Dict[str, Any]] = None,
+                 hedge: bool = False, hedge_percentile: float = 95, hedge_min_samples: int = 20,
+                 hedge_delay_seconds: float = 5.0, hedge_min_delay_seconds: float = 0.2,
+                 max_workers: int = 32):
+        """
+        Args:
+            providers: failover order, primary first
+            breaker: CircuitBreaker keyword arguments shared by every provider
+            hedge: send a second copy of slow calls to the next provider
+            hedge_percentile: primary latency percentile after which a call is hedged
+            hedge_min_samples: latencies needed before the percentile is used
+            hedge_delay_seconds: hedge delay until enough latencies are known
+            hedge_min_delay_seconds: lower bound on the hedge delay
+        """
+        if not providers:
+            raise ValueError("ResilientProvider needs at least one provider")
+        primary = providers[0]
+        super().__init__(primary.api_key, primary.model, primary.base_url, primary.timeout)
+        self.supports_fused_analysis = primary.supports_fused_analysis
+        self.members = [_Member(p, CircuitBreaker(**(breaker or {})), latency_samples=200) for p in providers]
+        self.hedge = hedge and len(providers) > 1
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_delay_seconds = hedge_delay_seconds
+        self.hedge_min_delay_seconds = hedge_min_delay_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="ai-hedge") if self.hedge else None
+        self._stats_lock = threading.Lock()
+        self._stats = {"calls": 0, "failovers": 0, "hedges": 0, "hedge_wins": 0, "rejected": 0}
+
+    @property
+    def providers(self) -> List[AIProvider]:
+        return [m.provider for m in self.members]
+
+    def _count(self, key: str):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def _next_member(self, members: Iterator[_Member]) -> Optional[_Member]:
+        """Next provider in failover order whose breaker admits a call"""
+        for member in members:
+            if member.breaker.allow():
+                return member
+        return None
+
+    def _hedge_delay(self, member: _Member) -> float:
+        latency = member.latency_percentile(self.hedge_percentile, self.hedge_min_samples)
+        if latency is None:
+            return self.hedge_delay_seconds
+        return max(self.hedge_min_delay_seconds, latency)
+
+    def _call(self, member: _Member, messages, temperature, max_tokens) -> Optional[str]:
+        start = time.perf_counter()
+        try:
+            content = member.provider.generate_content(messages, temperature, max_tokens)
+        except Exception as e:
+            logger.error(f"[Resilient] {member.name} raised: {e}")
+            content = None
+        member.record(content is not None, time.perf_counter() - start)
+        return content
+
+    def generate_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Optional[str]:
+        self._count("calls")
+        members = iter(self.members)
+        member = self._next_member(members)
+        if member is None:
+            self._count("rejected")
+            logger.warning("[Resilient] All provider circuits open; failing fast")
+            return None
+
+        if not self.hedge:
+            while member is not None:
+                content = self._call(member, messages, temperature, max_tokens)
+                if content is not None:
+                    return content
+                member = self._next_member(members)
+                if member is not None:
+                    self._count("failovers")
+                    logger.warning(f"[Resilient] Failing over to {member.name}")
+            return None
+
+        primary = member
+        pending = {self._executor.submit(self._call, member, messages, temperature, max_tokens): member}
+        hedge_at = self._hedge_delay(member)
+        while pending:
+            done, _ = wait(pending, timeout=hedge_at, return_when=FIRST_COMPLETED)
+            if not done:
+                # Primary is slower than usual: race the next provider against it
+                hedge_at = None
+                member = self._next_member(members)
+                if member is not None:
+                    self._count("hedges")
+                    pending[self._executor.submit(self._call, member, messages, temperature, max_tokens)] = member
+                continue
+            for future in done:
+                winner = pending.pop(future)
+                content = future.result()
+                if content is not None:
+                    if winner is not primary:
+                        self._count("hedge_wins")
+                    return content
+            if not pending:
+                hedge_at = None
+                member = self._next_member(members)
+                if member is not None:
+                    self._count("failovers")
+                    logger.warning(f"[Resilient] Failing over to {member.name}")
+                    pending[self._executor.submit(self._call, member, messages, temperature, max_tokens)] = member
+        return None
+
+    async def _acall(self, member: _Member, messages, temperature, max_tokens) -> Optional[str]:
+        start = time.perf_counter()
+        try:
+            content = await member.provider.agenerate_content(messages, temperature, max_tokens)
+        except Exception as e:
+            logger.error(f"[Resilient] {member.name} raised: {e}")
+            content = None
+        member.record(content is not None, time.perf_counter() - start)
+        return content
+
+    async def agenerate_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Optional[str]:
+        self._count("calls")
+        members = iter(self.members)
+        member = self._next_member(members)
+        if member is None:
+            self._count("rejected")
+            logger.warning("[Resilient] All provider circuits open; failing fast")
+            return None
+
+        primary = member
+        pending = {asyncio.ensure_future(self._acall(member, messages, temperature, max_tokens)): member}
+        hedge_at = self._hedge_delay(member) if self.hedge else None
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=hedge_at, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedge_at = None
+                    member = self._next_member(members)
+                    if member is not None:
+                        self._count("hedges")
+                        pending[asyncio.ensure_future(self._acall(member, messages, temperature, max_tokens))] = member
+                    continue
+                for task in done:
+                    winner = pending.pop(task)
+                    content = task.result()
+                    if content is not None:
+                        if winner is not primary:
+                            self._count("hedge_wins")
+                        return content
+                if not pending:
+                    hedge_at = None
+                    member = self._next_member(members)
+                    if member is not None:
+                        self._count("failovers")
+                        logger.warning(f"[Resilient] Failing over to {member.name}")
+                        pending[asyncio.ensure_future(self._acall(member, messages, temperature, max_tokens))] = member
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stream_content(self, messages: List[Dict[str, str]], temperature: float = 0.7, max_tokens: int = 500) -> Iterator[str]:
+        """
+        Fails over only until the first chunk; a reply cut off mid-stream is not
+        restarted but counted as a failure and raised as IncompleteStreamError.
+        """
+        self._count("calls")
+        members = iter(self.members)
+        member = self._next_member(members)
+        if member is None:
+            self._count("rejected")
+            logger.warning("[Resilient] All provider circuits open; failing fast")
+        while member is not None:
+            start = time.perf_counter()
+            streamed = False
+            failed = False
+            try:
+                for chunk in member.provider.stream_content(messages, temperature, max_tokens):
+                    streamed = True
+                    yield chunk
+            except Exception as e:
+                failed = True
+                logger.error(f"[Resilient] {member.name} stream raised: {e}")
+                if streamed:
+                    if isinstance(e, IncompleteStreamError):
+                        raise
+                    raise IncompleteStreamError(f"{member.name} stream raised: {e}") from e
+            finally:
+                member.record(streamed and not failed, time.perf_counter() - start)
+            if streamed:
+                return
+            member = self._next_member(members)
+            if member is not None:
+                self._count("failovers")
+                logger.warning(f"[Resilient] Failing over to {member.name}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats["providers"] = [
+            {
+                "name": m.name,
+                "state": m.breaker.state,
+                "error_rate": round(m.breaker.current_error_rate(), 3),
+                "calls": m.calls,
+                "failures": m.failures,
+                "times_opened": m.breaker.times_opened,
+                "latency_p95": m.latency_percentile(95, 1),
+            }
+            for m in self.members
+        ]
+        return stats
+
+    def close(self):
+        if self._executor:
+            self._executor.shutdown(wait=False)
+        for member in self.members:
+            member.provider.close()
+
+    async def aclose(self):
+        for member in self.members:
+            await member.provider.aclose()
@@ -1,3 +1,4 @@
+import asyncio
 import time
 import logging
 import functools
@@ -53,3 +54,43 @@ def retry_with_backoff(
         
         return wrapper
     return decorator
+
+
+def async_retry_with_backoff(
+    max_attempts: int = 3,
+    base_delay: float = 1.0,
+    max_delay: float = 30.0,
+    exponential_base: float = 2.0,
+    retryable_exceptions: Tuple[Type[Exception], ...] = (Exception,)
+) -> Callable:
+    """retry_with_backoff for coroutines: waits with asyncio.sleep, so no thread is held during backoff"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            for attempt in range(1, max_attempts + 1):
+                try:
+                    return await func(*args, **kwargs)
+                except retryable_exceptions as e:
+                    if attempt == max_attempts:
+                        logger.error(
+                            f"[Retry] {func.__name__} failed after {max_attempts} attempts. "
+                            f"Last error: {e}"
+                        )
+                        raise RetryError(
+                            f"Max retries ({max_attempts}) exceeded for {func.__name__}",
+                            last_exception=e
+                        ) from e
+                    
+                    delay = min(max_delay, base_delay * (exponential_base ** (attempt - 1)))
+                    
+                    logger.warning(
+                        f"[Retry] {func.__name__} attempt {attempt}/{max_attempts} failed: {e}. "
+                        f"Retrying in {delay:.1f}s..."
+                    )
+                    
+                    await asyncio.sleep(delay)
+            
+            return None
+        
+        return wrapper
+    return decorator
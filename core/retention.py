@@ -0,0 +1,240 @@
+"""
+History retention, archival and compaction for the client database.
+Cold messages are moved from petchat.db into an archive database file in
+small batched transactions, and freed pages are returned with incremental
+VACUUM. Runs on its own thread and its own SQLite connection so the GUI
+thread never waits on maintenance work.
+"""
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from core.emotion_series import MINUTE_MS
+
+
+ARCHIVE_SCHEMA = "archive"
+DAY_MS = 24 * 60 * 60 * 1000
+
+
+@dataclass
+class RetentionPolicy:
+    """Per-conversation retention limits (None = unlimited)"""
+    max_age_days: Optional[int] = None
+    max_rows: Optional[int] = None
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RetentionPolicy":
+        return cls(
+            max_age_days=data.get("max_age_days"),
+            max_rows=data.get("max_rows")
+        )
+
+
+def default_archive_path(db_path: str) -> str:
+    """petchat.db -> petchat_archive.db"""
+    root, ext = os.path.splitext(db_path)
+    return f"{root}_archive{ext or '.db'}"
+
+
+def ensure_archive_schema(conn: sqlite3.Connection, schema: str = ARCHIVE_SCHEMA):
+    """Create the archive tables inside an attached database (WAL, like the main one)"""
+    conn.execute(f"PRAGMA {schema}.journal_mode=WAL")
+    conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {schema}.messages (
+            id INTEGER PRIMARY KEY,
+            conversation_id TEXT NOT NULL,
+            sender_id TEXT NOT NULL,
+            sender TEXT NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TEXT NOT NULL,
+            server_seq INTEGER
+        )
+    """)
+    # Archives created before history sync lack server_seq
+    if 'server_seq' not in [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info(messages)")]:
+        conn.execute(f"ALTER TABLE {schema}.messages ADD COLUMN server_seq INTEGER")
+    conn.execute(
+        f"CREATE INDEX IF NOT EXISTS {schema}.idx_archive_messages_conversation_timestamp "
+        f"ON messages(conversation_id, timestamp)"
+    )
+
+
+class HistoryMaintenance:
+    """
+    Applies retention policies and incremental VACUUM on a background thread.
+
+    policies maps conversation_id -> RetentionPolicy; the "default" entry
+    applies to conversations without their own policy.
+    """
+
+    def __init__(self, db_path: str, archive_path: Optional[str] = None,
+                 policies: Optional[Dict[str, RetentionPolicy]] = None,
+                 batch_size: int = 500, vacuum_pages: int = 512,
+                 on_archived: Optional[Callable[[str, int], None]] = None,
+                 emotion_sample_days: Optional[int] = None,
+                 emotion_minute_rollup_days: Optional[int] = None):
+        self.db_path = db_path
+        self.archive_path = archive_path or default_archive_path(db_path)
+        self.policies = policies or {}
+        self.batch_size = batch_size
+        self.vacuum_pages = vacuum_pages
+        self.on_archived = on_archived
+        # Raw emotion samples and minute rollups expire; hour rollups are kept for long-range trends
+        self.emotion_sample_days = emotion_sample_days
+        self.emotion_minute_rollup_days = emotion_minute_rollup_days
+
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def policy_for(self, conversation_id: str) -> RetentionPolicy:
+        return self.policies.get(conversation_id) or self.policies.get("default") or RetentionPolicy()
+
+    def start(self, interval_seconds: float, initial_delay: float = 60.0):
+        """Run maintenance every interval_seconds on a daemon thread"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._loop, args=(interval_seconds, initial_delay), daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _loop(self, interval_seconds: float, initial_delay: float):
+        if self._stop_event.wait(initial_delay):
+            return
+        while not self._stop_event.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"[Retention] Maintenance failed: {e}")
+            if self._stop_event.wait(interval_seconds):
+                return
+
+    def run_once(self) -> Dict[str, int]:
+        """Archive cold messages for every conversation, then compact. Returns archived counts."""
+        conn = sqlite3.connect(self.db_path, timeout=10.0)
+        try:
+            conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (self.archive_path,))
+            ensure_archive_schema(conn)
+            conn.commit()
+
+            archived: Dict[str, int] = {}
+            conversation_ids = [row[0] for row in conn.execute("SELECT DISTINCT conversation_id FROM messages")]
+            for conversation_id in conversation_ids:
+                if self._stop_event.is_set():
+                    break
+                count = self._archive_conversation(conn, conversation_id, self.policy_for(conversation_id))
+                if count:
+                    archived[conversation_id] = count
+                    if self.on_archived:
+                        self.on_archived(conversation_id, count)
+
+            self._prune_emotions(conn)
+            self._prune_emotion_series(conn)
+            self._incremental_vacuum(conn)
+            if archived:
+                print(f"[Retention] Archived {sum(archived.values())} messages from {len(archived)} conversations")
+            return archived
+        finally:
+            conn.close()
+
+    def _archive_conversation(self, conn: sqlite3.Connection, conversation_id: str,
+                              policy: RetentionPolicy) -> int:
+        total = 0
+        cutoff = None
+        if policy.max_age_days is not None:
+            cutoff = (datetime.now() - timedelta(days=policy.max_age_days)).isoformat()
+
+        while not self._stop_event.is_set():
+            ids = self._select_cold_ids(conn, conversation_id, policy, cutoff)
+            if not ids:
+                break
+            self._move_batch(conn, ids)
+            total += len(ids)
+            if len(ids) < self.batch_size:
+                break
+        return total
+
+    def _select_cold_ids(self, conn: sqlite3.Connection, conversation_id: str,
+                         policy: RetentionPolicy, cutoff: Optional[str]) -> List[int]:
+        ids: List[int] = []
+        if cutoff is not None:
+            ids = [row[0] for row in conn.execute(
+                "SELECT id FROM messages WHERE conversation_id = ? AND timestamp < ? ORDER BY timestamp LIMIT ?",
+                (conversation_id, cutoff, self.batch_size)
+            )]
+        if not ids and policy.max_rows is not None:
+            (count,) = conn.execute(
+                "SELECT COUNT(*) FROM messages WHERE conversation_id = ?", (conversation_id,)
+            ).fetchone()
+            excess = min(count - policy.max_rows, self.batch_size)
+            if excess > 0:
+                ids = [row[0] for row in conn.execute(
+                    "SELECT id FROM messages WHERE conversation_id = ? ORDER BY timestamp LIMIT ?",
+                    (conversation_id, excess)
+                )]
+        return ids
+
+    def _move_batch(self, conn: sqlite3.Connection, ids: List[int]):
+        placeholders = ",".join("?" * len(ids))
+        with conn:
+            conn.execute(f"""
+                INSERT OR IGNORE INTO {ARCHIVE_SCHEMA}.messages (id, conversation_id, sender_id, sender, content, timestamp, server_seq)
+                SELECT id, conversation_id, sender_id, sender, content, timestamp, server_seq
+                FROM main.messages WHERE id IN ({placeholders})
+            """, ids)
+            conn.execute(f"DELETE FROM main.messages WHERE id IN ({placeholders})", ids)
+
+    def _prune_emotions(self, conn: sqlite3.Connection):
+        policy = self.policies.get("default")
+        if not policy or policy.max_age_days is None:
+            return
+        cutoff = (datetime.now() - timedelta(days=policy.max_age_days)).isoformat()
+        while not self._stop_event.is_set():
+            with conn:
+                cursor = conn.execute(
+                    "DELETE FROM emotions WHERE id IN (SELECT id FROM emotions WHERE timestamp < ? LIMIT ?)",
+                    (cutoff, self.batch_size)
+                )
+            if cursor.rowcount < self.batch_size:
+                break
+
+    def _prune_emotion_series(self, conn: sqlite3.Connection):
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='emotion_samples'").fetchone():
+            return
+        now_ms = int(time.time() * 1000)
+        conversation_ids = [row[0] for row in conn.execute("SELECT DISTINCT conversation_id FROM emotion_rollups")]
+        for conversation_id in conversation_ids:
+            if self._stop_event.is_set():
+                return
+            # One short transaction per conversation; both deletes are primary-key range scans
+            with conn:
+                if self.emotion_sample_days is not None:
+                    conn.execute(
+                        "DELETE FROM emotion_samples WHERE conversation_id = ? AND ts_ms < ?",
+                        (conversation_id, now_ms - self.emotion_sample_days * DAY_MS)
+                    )
+                if self.emotion_minute_rollup_days is not None:
+                    conn.execute(
+                        "DELETE FROM emotion_rollups WHERE conversation_id = ? AND resolution_ms = ? AND bucket_ms < ?",
+                        (conversation_id, MINUTE_MS, now_ms - self.emotion_minute_rollup_days * DAY_MS)
+                    )
+
+    def _incremental_vacuum(self, conn: sqlite3.Connection):
+        (mode,) = conn.execute("PRAGMA main.auto_vacuum").fetchone()
+        if mode != 2:
+            # The switch needs a full VACUUM, which the startup migration does while nothing else
+            # is connected; running it here would lock out the GUI for the whole rewrite
+            return
+        conn.execute(f"PRAGMA main.incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+        conn.commit()
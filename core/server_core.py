@@ -21,12 +21,16 @@ import threading
 import json
 import time
 import logging
+from datetime import datetime
 from typing import Dict, Optional, List, Any, Callable
 
 from core.protocol import (
     MessageType, HEADER_SIZE,
-    pack_message, unpack_header, verify_crc
+    pack_message, unpack_header, verify_crc,
+    HistoryPage, pack_history_records, conversation_key, client_conversation_id
 )
+from core.message_store import MessageStore
+from core.trigger_engine import TriggerEngine
 
 class ServerCallbacks:
     """Interface for server callbacks"""
@@ -43,10 +47,17 @@ class PetChatServer:
     Manages socket connections and protocol handling.
     """
     
-    def __init__(self, host: str = "0.0.0.0", port: int = 8888, callbacks: ServerCallbacks = None):
+    MAX_HISTORY_PAGE = 200
+    MAX_SYNC_PAGE = 2000
+    
+    def __init__(self, host: str = "0.0.0.0", port: int = 8888, callbacks: ServerCallbacks = None,
+                 message_store: Optional[MessageStore] = None, trigger_engine: Optional[TriggerEngine] = None):
         self.host = host
         self.port = port
         self.callbacks = callbacks or ServerCallbacks()
+        self.message_store = message_store
+        # Sees every routed chat message to track which conversations need a suggestion
+        self.trigger_engine = trigger_engine
         
         self.running = False
         self.server_socket: Optional[socket.socket] = None
@@ -193,6 +204,11 @@ class PetChatServer:
                             self.callbacks.on_stats_update(self.msg_count, self.ai_req_count)
                             self.callbacks.on_ai_request(user_id, message)
                 
+                # Handle History
+                elif msg_type == MessageType.HISTORY_REQUEST.value:
+                    if user_id:
+                        self._handle_history_request(sock, user_id, message)
+                
                 # Handle Heartbeat
                 elif msg_type == MessageType.PING.value:
                     self._send_raw(sock, {"type": MessageType.PONG.value})
@@ -223,8 +239,10 @@ class PetChatServer:
         return data
 
     def _send_raw(self, sock, message):
+        self._send_packet(sock, pack_message(message))
+
+    def _send_packet(self, sock, packet: bytes):
         try:
-            packet = pack_message(message)
             sock.sendall(packet)
         except:
             pass
@@ -284,6 +302,21 @@ class PetChatServer:
     def _handle_chat(self, message):
         target = message.get("target", "public")
         sender = message.get("sender_id")
+        # Stored and routed with the same timestamp, so clients can match their
+        # live copy against the one a later history sync returns
+        timestamp = message.get("timestamp") or datetime.now().isoformat()
+        message["timestamp"] = timestamp
+        
+        if self.message_store and sender:
+            self.message_store.append(
+                conversation_key(sender, target),
+                sender,
+                message.get("sender_name", "Unknown"),
+                message.get("content", ""),
+                timestamp
+            )
+        if self.trigger_engine and sender:
+            self.trigger_engine.observe(conversation_key(sender, target), message.get("content", ""))
         
         if target == "public":
             self._broadcast(message, exclude=sender)
@@ -293,6 +326,37 @@ class PetChatServer:
                 if client:
                     self._send_raw(client["socket"], message)
 
+    def _handle_history_request(self, sock, user_id, message):
+        conversation_id = message.get("conversation_id")
+        compress = bool(message.get("compress", False))
+        if not self.message_store:
+            self._send_raw(sock, HistoryPage(conversation_id or "", []).to_dict())
+            return
+        
+        if conversation_id is None:
+            # Full sync: page forwards through everything this user can see
+            limit = max(1, min(int(message.get("limit") or self.MAX_SYNC_PAGE), self.MAX_SYNC_PAGE))
+            after_seq = message.get("after_seq") or 0
+            if hasattr(self.message_store, "read_sync_records"):
+                # Segmented log: stored records go out as they are; the client maps their conversation keys
+                records, has_more = self.message_store.read_sync_records(user_id, after_seq=after_seq, limit=limit)
+                self._send_packet(sock, pack_history_records("", records, has_more, compress=compress))
+                return
+            rows, has_more = self.message_store.get_sync_page(user_id, after_seq=after_seq, limit=limit)
+            for row in rows:
+                row["conversation_id"] = client_conversation_id(user_id, row.pop("conversation_key"))
+            self._send_raw(sock, HistoryPage("", rows, has_more, compress=compress).to_dict())
+            return
+        
+        limit = max(1, min(int(message.get("limit") or 50), self.MAX_HISTORY_PAGE))
+        key = conversation_key(user_id, conversation_id)
+        if hasattr(self.message_store, "read_records"):
+            records, has_more = self.message_store.read_records(key, before_seq=message.get("before_seq"), limit=limit)
+            self._send_packet(sock, pack_history_records(conversation_id, records, has_more, compress=compress))
+            return
+        messages, has_more = self.message_store.get_page(key, before_seq=message.get("before_seq"), limit=limit)
+        self._send_raw(sock, HistoryPage(conversation_id, messages, has_more, compress=compress).to_dict())
+
     def _broadcast(self, message, exclude=None):
         with self.clients_lock:
             for uid, client in self.clients.items():
@@ -0,0 +1,153 @@
+"""
+Keyword triggers for AI suggestions (no Qt dependency).
+An Aho-Corasick automaton is built once from an intent -> keywords dictionary
+(server_config.json "ai_triggers"), so every keyword is matched in a single
+pass over a message however large the dictionary grows. The server feeds each
+routed chat message through observe(); conversations without a trigger among
+their last `window` messages do not need a suggestion at all.
+"""
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from config.settings import Settings
+
+logger = logging.getLogger(__name__)
+
+
+class AhoCorasick:
+    """Multi-pattern matcher; patterns map to arbitrary payloads"""
+
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[Tuple[str, Any]]] = [[]]
+        for pattern, payload in patterns:
+            if pattern:
+                self._add(pattern, payload)
+        self._link()
+
+    def _add(self, pattern: str, payload: Any):
+        state = 0
+        for char in pattern:
+            nxt = self._goto[state].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((pattern, payload))
+
+    def _link(self):
+        """Breadth-first failure links; each state also emits its fallback's matches"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def __len__(self) -> int:
+        return len(self._goto)
+
+    def finditer(self, text: str) -> Iterator[Tuple[int, str, Any]]:
+        """(end offset, pattern, payload) for every occurrence, overlapping ones included"""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if out[state]:
+                for pattern, payload in out[state]:
+                    yield i + 1, pattern, payload
+
+    def search(self, text: str) -> bool:
+        """Whether any pattern occurs; stops at the first match"""
+        for _ in self.finditer(text):
+            return True
+        return False
+
+
+def create_trigger_engine(config: Dict[str, Any]) -> "TriggerEngine":
+    """
+    Build the engine from server_config.json "ai_triggers":
+    {"intents": {"time": ["明天", ...], "plan": [...]}, "window": 5}
+    """
+    trigger_cfg = config.get("ai_triggers", {})
+    return TriggerEngine(
+        intents=trigger_cfg.get("intents", Settings.AI_TRIGGER_INTENTS),
+        window=trigger_cfg.get("window", Settings.AI_TRIGGER_WINDOW)
+    )
+
+
+class TriggerEngine:
+    """Intent keyword matching plus per-conversation trigger tracking"""
+
+    def __init__(self, intents: Optional[Dict[str, Iterable[str]]] = None, window: int = 5,
+                 max_conversations: int = 10000):
+        """
+        Args:
+            intents: intent -> keywords (matched case-insensitively)
+            window: a conversation needs a suggestion while one of its last
+                `window` messages matched a keyword
+            max_conversations: tracked conversations (least recently active are forgotten)
+        """
+        self.intents = {intent: list(keywords) for intent, keywords in
+                        (intents if intents is not None else Settings.AI_TRIGGER_INTENTS).items()}
+        self.window = window
+        self.max_conversations = max_conversations
+        self._automaton = AhoCorasick(
+            (keyword.lower(), intent) for intent, keywords in self.intents.items() for keyword in keywords
+        )
+        self._lock = threading.Lock()
+        # conversation -> (messages observed, message number of the last trigger or None)
+        self._conversations: "OrderedDict[str, Tuple[int, Optional[int]]]" = OrderedDict()
+        self.stats = {"observed": 0, "triggered": 0}
+
+    def match(self, text: str) -> Dict[str, List[str]]:
+        """intent -> keywords found in text, in order of appearance"""
+        found: Dict[str, List[str]] = {}
+        for _, keyword, intent in self._automaton.finditer(text.lower()):
+            keywords = found.setdefault(intent, [])
+            if keyword not in keywords:
+                keywords.append(keyword)
+        return found
+
+    def triggered(self, text: str) -> bool:
+        return self._automaton.search(text.lower())
+
+    def observe(self, conversation: str, text: str) -> bool:
+        """Record a routed chat message; returns whether it matched a trigger"""
+        hit = self.triggered(text)
+        with self._lock:
+            count, last_hit = self._conversations.pop(conversation, (0, None))
+            count += 1
+            self._conversations[conversation] = (count, count if hit else last_hit)
+            if len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+            self.stats["observed"] += 1
+            if hit:
+                self.stats["triggered"] += 1
+        return hit
+
+    def needs_suggestion(self, conversation: str) -> bool:
+        """
+        Whether a keyword occurred in the conversation's last `window` observed
+        messages. Conversations not observed yet (e.g. after a restart) are
+        assumed to need one, so the caller falls back to checking the context.
+        """
+        with self._lock:
+            state = self._conversations.get(conversation)
+        if state is None:
+            return True
+        count, last_hit = state
+        return last_hit is not None and count - last_hit < self.window
@@ -14,11 +14,15 @@
 import sys
 import argparse
 import socket
-from PyQt6.QtWidgets import QApplication, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QRadioButton, QButtonGroup, QMessageBox
-from PyQt6.QtCore import Qt, QTimer, QObject
+import threading
+from datetime import datetime
+from PyQt6.QtWidgets import QApplication, QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton, QRadioButton, QButtonGroup, QMessageBox, QProgressDialog
+from PyQt6.QtCore import Qt, QTimer, QObject, QThread, pyqtSignal
 from core.network import NetworkManager
 from core.crash_reporter import CrashReporter
-from core.database import Database
+from core.async_database import AsyncDatabase
+from core.retention import HistoryMaintenance
+from core.history_export import HistoryExporter, ExportCancelled
 # Note: AIService removed - AI is now server-side only
 from core.config_manager import ConfigManager
 from core.window_manager import window_manager
@@ -29,6 +33,38 @@ from config.settings import Settings
 from ui.theme import Theme
 
 
+class HistoryExportThread(QThread):
+    """Runs HistoryExporter off the GUI thread"""
+    progress = pyqtSignal(int, int)  # written, total
+    completed = pyqtSignal(str, int)  # file path, message count
+    failed = pyqtSignal(str)
+    cancelled = pyqtSignal()
+    
+    def __init__(self, exporter: HistoryExporter, conversation_id: str, file_path: str):
+        super().__init__()
+        self.exporter = exporter
+        self.conversation_id = conversation_id
+        self.file_path = file_path
+        self._cancel_event = threading.Event()
+    
+    def cancel(self):
+        self._cancel_event.set()
+    
+    def run(self):
+        try:
+            count = self.exporter.export(
+                self.conversation_id,
+                self.file_path,
+                progress_callback=self.progress.emit,
+                cancel_event=self._cancel_event
+            )
+            self.completed.emit(self.file_path, count)
+        except ExportCancelled:
+            self.cancelled.emit()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+
 class PetChatApp(QObject):
     """Main application controller"""
     
@@ -67,16 +103,21 @@ class PetChatApp(QObject):
         print(f"[DEBUG] User profile: id={self.current_user_id}, name={self.current_user_name}, avatar={self.current_user_avatar}")
         
         print("[DEBUG] Creating Database...")
-        self.db = Database()
+        # All SQLite access runs on the AsyncDatabase worker thread; results come back via callbacks
+        self.db = AsyncDatabase(
+            migration_progress=lambda what, done, total: print(f"[DEBUG] {what}: {done}/{total}")
+        )
+        self.app.aboutToQuit.connect(self.db.close)
         print("[DEBUG] Database created")
         
         # Clean up any duplicate memories from previous sessions
-        removed = self.db.deduplicate_memories()
-        if removed > 0:
-            print(f"[DEBUG] Cleaned up {removed} duplicate memories")
+        self.db.submit("deduplicate_memories", callback=self._on_memories_deduplicated)
+        
+        # Clear online flags left over from the last session and drop long-gone users
+        self.db.submit("reset_online_status", callback=self._on_online_status_reset)
         
         # Register local user in database
-        self.db.upsert_user(self.current_user_id, self.current_user_name, self.current_user_avatar, is_online=True)
+        self.db.submit("upsert_user", self.current_user_id, self.current_user_name, self.current_user_avatar, is_online=True)
         
         self.current_conversation_id = "default"
         self.loaded_message_limit = 50
@@ -93,10 +134,38 @@ class PetChatApp(QObject):
         print(f"[DEBUG] Window registered with ID: {self.window_id}")
         
         self.app.aboutToQuit.connect(lambda: window_manager().unregister_window(self.window_id))
+        
+        # Archive cold history and compact petchat.db in the background
+        self.history_maintenance = HistoryMaintenance(
+            self.db.db_path,
+            archive_path=self.db.archive_path,
+            policies=self.config_manager.get_retention_policies(),
+            emotion_sample_days=Settings.EMOTION_SAMPLE_RETENTION_DAYS,
+            emotion_minute_rollup_days=Settings.EMOTION_MINUTE_ROLLUP_RETENTION_DAYS,
+            on_archived=self._on_history_archived
+        )
+        self.history_maintenance.start(Settings.HISTORY_MAINTENANCE_INTERVAL)
+        self.app.aboutToQuit.connect(self.history_maintenance.stop)
+        self._export_thread = None
+        self.app.aboutToQuit.connect(self._stop_export)
+        self._history_sync_imported = 0
         self.message_count = 0
         print("[DEBUG] PetChatApp.__init__ completed")
         self._load_messages(reset=True)
         self._load_conversations_list()
+        self.db.conversation_changed.connect(self._on_conversation_changed)
+
+    def _on_memories_deduplicated(self, removed: int):
+        if removed > 0:
+            print(f"[DEBUG] Cleaned up {removed} duplicate memories")
+
+    def _on_history_archived(self, conversation_id: str, count: int):
+        # Called on the maintenance thread; the cached window may still hold the archived rows
+        self.db.submit("invalidate_message_cache", conversation_id)
+
+    def _on_online_status_reset(self, pruned: int):
+        if pruned > 0:
+            print(f"[DEBUG] Pruned {pruned} stale users")
 
     def _ensure_user_profile(self):
         """Ensure user profile exists with persistent UUID"""
@@ -130,8 +199,16 @@ class PetChatApp(QObject):
     def _load_messages(self, reset: bool = False):
         if reset:
             self.loaded_message_limit = 50
+        conversation_id = self.current_conversation_id
+        self.db.submit(
+            "get_recent_messages", self.loaded_message_limit, conversation_id=conversation_id,
+            callback=lambda messages: self._show_messages(conversation_id, messages)
+        )
+    
+    def _show_messages(self, conversation_id: str, messages: list):
+        if conversation_id != self.current_conversation_id:
+            return  # Switched conversations while the query was running
         try:
-            messages = self.db.get_recent_messages(self.loaded_message_limit, conversation_id=self.current_conversation_id)
             self.window.clear_messages()
             for msg in messages:
                 ts = msg.get("timestamp", "")
@@ -143,12 +220,12 @@ class PetChatApp(QObject):
             print(f"Error loading message history: {e}")
     
     def _load_conversations_list(self):
-        """Load conversations from database into sidebar"""
-        try:
-            conversations = self.db.get_conversations()
-            self.window.load_conversations(conversations)
-        except Exception as e:
-            print(f"Error loading conversations: {e}")
+        """Load conversations from database into sidebar (initial load only; later changes arrive incrementally)"""
+        self.db.submit("get_conversations", callback=self.window.load_conversations)
+    
+    def _on_conversation_changed(self, conversation_id: str, changes: dict):
+        """Apply a conversation change notification from the database to the sidebar"""
+        self.window.update_conversation(conversation_id, changes)
     
     
     def _setup_connections(self):
@@ -165,10 +242,11 @@ class PetChatApp(QObject):
         
         # AI signals from server
         self.network.ai_suggestion_received.connect(self._on_server_ai_suggestion)
-        self.network.ai_emotion_received.connect(self._on_server_ai_emotion)
+        self.network.ai_suggestion_delta_received.connect(self._on_server_ai_suggestion_delta)
         self.network.ai_emotion_received.connect(self._on_server_ai_emotion)
         self.network.ai_memory_received.connect(self._on_server_ai_memory)
         self.network.reconnection_status.connect(self._on_reconnection_status)
+        self.network.history_page_received.connect(self._on_history_page)
         
         # Window signals
         self.window.message_sent.connect(self._on_message_sent)
@@ -178,6 +256,7 @@ class PetChatApp(QObject):
         self.window.typing_changed.connect(self._on_local_typing_changed)
         self.window.reset_user_requested.connect(self._on_reset_user)
         self.window.user_selected.connect(self._on_user_selected_for_chat)
+        self.window.export_history_requested.connect(self._on_export_history_requested)
         
         # Note: api_config_changed and api_config_reset signals no longer connected
         # API configuration is now handled by the server
@@ -190,6 +269,38 @@ class PetChatApp(QObject):
         """Handle successful connection"""
         self.window.update_status(f"已连接到服务器 {self.network.server_ip}")
         self.window.add_message("System", "✅ 已连接到服务器")
+        
+        # New device or reinstall: restore history from the server (resumes after the last imported seq)
+        self.db.submit("get_sync_state", "history_synced", callback=self._start_history_sync)
+    
+    def _start_history_sync(self, synced: str):
+        if synced == "1":
+            return
+        self._history_sync_imported = 0
+        self.db.submit("get_max_server_seq", callback=lambda seq: self.network.request_history_sync(after_seq=seq))
+    
+    def _on_history_page(self, conversation_id: str, messages: list, has_more: bool):
+        """Import a page of full-sync history and request the next one"""
+        if conversation_id:
+            return  # Only full-sync pages are requested; the full sync already restores every conversation
+        
+        self.db.submit(
+            "import_history", messages,
+            callback=lambda imported: self._on_history_page_imported(imported, messages, has_more)
+        )
+    
+    def _on_history_page_imported(self, imported: int, messages: list, has_more: bool):
+        self._history_sync_imported += imported
+        if has_more and messages:
+            self.window.update_status(f"正在同步历史消息... ({self._history_sync_imported})")
+            self.network.request_history_sync(after_seq=messages[-1]["seq"])
+            return
+        
+        self.db.submit("set_sync_state", "history_synced", "1")
+        if self._history_sync_imported:
+            self._load_messages(reset=True)
+            self.window.add_message("System", f"📥 已从服务器同步 {self._history_sync_imported} 条历史消息")
+        self.window.update_status(f"已连接到服务器 {self.network.server_ip}")
     
     def _on_disconnected(self):
         """Handle disconnection"""
@@ -221,6 +332,7 @@ class PetChatApp(QObject):
 
     def _on_conversation_selected(self, conversation_id: str):
         self.current_conversation_id = conversation_id or "default"
+        self.db.submit("mark_conversation_read", self.current_conversation_id)
         self._load_messages(reset=True)
         # Clear AI panels when switching conversations
         self.window.clear_ai_panels()
@@ -229,6 +341,50 @@ class PetChatApp(QObject):
         self.loaded_message_limit += 50
         self._load_messages(reset=True)
 
+    def _on_export_history_requested(self, file_path: str):
+        """Stream the current conversation (including archived history) to file_path"""
+        if self._export_thread and self._export_thread.isRunning():
+            self.window.statusBar().showMessage("已有导出任务正在进行", 3000)
+            return
+        
+        exporter = HistoryExporter(self.db.db_path, archive_path=self.db.archive_path)
+        thread = HistoryExportThread(exporter, self.current_conversation_id, file_path)
+        
+        dialog = QProgressDialog("正在导出聊天记录...", "取消", 0, 0, self.window)
+        dialog.setWindowTitle("导出聊天记录")
+        dialog.setWindowModality(Qt.WindowModality.WindowModal)
+        dialog.setMinimumDuration(500)
+        dialog.canceled.connect(thread.cancel)
+        
+        def on_progress(written: int, total: int):
+            dialog.setMaximum(max(total, 1))
+            dialog.setValue(written)
+        
+        def on_completed(path: str, count: int):
+            dialog.reset()
+            self.window.statusBar().showMessage(f"已导出 {count} 条聊天记录到: {path}", 5000)
+        
+        def on_failed(error: str):
+            dialog.reset()
+            QMessageBox.critical(self.window, "导出失败", f"无法导出聊天记录: {error}")
+        
+        def on_cancelled():
+            dialog.reset()
+            self.window.statusBar().showMessage("导出已取消", 3000)
+        
+        thread.progress.connect(on_progress)
+        thread.completed.connect(on_completed)
+        thread.failed.connect(on_failed)
+        thread.cancelled.connect(on_cancelled)
+        thread.finished.connect(dialog.deleteLater)
+        self._export_thread = thread
+        thread.start()
+    
+    def _stop_export(self):
+        if self._export_thread and self._export_thread.isRunning():
+            self._export_thread.cancel()
+            self._export_thread.wait(5000)
+    
     def _on_local_typing_changed(self, is_typing: bool):
         if self.network:
             self.network.send_typing_status(is_typing)
@@ -238,7 +394,7 @@ class PetChatApp(QObject):
         print(f"[DEBUG] User joined: {user_name} ({user_id})")
         
         # Add/update user in database
-        self.db.upsert_user(user_id, user_name, avatar, is_online=True)
+        self.db.submit("upsert_user", user_id, user_name, avatar, is_online=True)
         
         # Update UI online user list
         self._load_online_users()
@@ -251,33 +407,30 @@ class PetChatApp(QObject):
         print(f"[DEBUG] User left: {user_id}")
         
         # Mark user as offline
-        self.db.set_user_online_status(user_id, False)
+        self.db.submit("set_user_online_status", user_id, False)
         
         # Update UI
         self._load_online_users()
     
     def _load_online_users(self):
         """Load online users into sidebar"""
+        self.db.submit("get_online_users", self.current_user_id, callback=self._show_online_users)
+    
+    def _show_online_users(self, online_users: list):
         try:
-            users = self.db.get_all_users()
-            online_users = [u for u in users if u.get("is_online") and u.get("id") != self.current_user_id]
             self.window.load_online_users(online_users)
             print(f"[DEBUG] Loaded {len(online_users)} online users to UI")
         except Exception as e:
             print(f"Error loading online users: {e}")
     
     def _on_online_users_received(self, users: list):
-        """Handle online users list from server"""
+        """Handle online users list from server (a full snapshot: anyone missing is offline)"""
         print(f"[DEBUG] Received online users list: {len(users)} users")
-        for user in users:
-            user_id = user.get("user_id")
-            if user_id and user_id != self.current_user_id:
-                self.db.upsert_user(
-                    user_id, 
-                    user.get("user_name", "Unknown"), 
-                    user.get("avatar", ""),
-                    is_online=True
-                )
+        self.db.submit("apply_online_snapshot", [
+            {"id": user["user_id"], "name": user.get("user_name", "Unknown"), "avatar": user.get("avatar", "")}
+            for user in users
+            if user.get("user_id") and user.get("user_id") != self.current_user_id
+        ], keep_online=self.current_user_id)
         self._load_online_users()
     
     def _on_user_selected_for_chat(self, peer_user_id: str, peer_user_name: str):
@@ -289,20 +442,12 @@ class PetChatApp(QObject):
         # In a real app, this should be a unique UUID for the conversation
         conversation_id = peer_user_id 
         
-        # Ensure conversation exists in DB
-        self.db.get_or_create_conversation(conversation_id, "p2p", peer_user_name)
-        
-        # Switch to this conversation
-        self.current_conversation_id = conversation_id
-        
-        # Reload conversations list in sidebar to show the new one
-        self._load_conversations_list()
-        
-        # Select it in UI
-        # TODO: Select the item in sidebar (requires mapping conversation_id to row)
-        
-        # Load messages for this conversation
-        self._load_messages(reset=True)
+        # Ensure conversation exists in DB (a new one reaches the sidebar via change notification,
+        # which is delivered before this callback)
+        self.db.submit(
+            "get_or_create_conversation", conversation_id, "p2p", peer_user_name,
+            callback=lambda _: self._open_conversation(conversation_id)
+        )
         
         # Update window title or header?
         self.window.setWindowTitle(f"pet-chat - 与 {peer_user_name} 聊天中")
@@ -311,6 +456,12 @@ class PetChatApp(QObject):
         self.window.update_status(f"开始与 {peer_user_name} 的对话")
       
       
+    def _open_conversation(self, conversation_id: str):
+        # Select it in the sidebar, which switches to it and loads its messages
+        if not self.window.select_conversation(conversation_id):
+            self.current_conversation_id = conversation_id
+            self._load_messages(reset=True)
+      
     def _on_remote_emotion(self, emotion_scores: dict):
         """Handle emotion scores sent from peer"""
         self.window.update_emotion(emotion_scores)
@@ -330,8 +481,10 @@ class PetChatApp(QObject):
     
     def _update_memories_display(self):
         """Update memories display in UI"""
+        self.db.submit("get_memories", callback=self._show_memories)
+    
+    def _show_memories(self, memories: list):
         try:
-            memories = self.db.get_memories()
             self.window.update_memories(memories)
         except RuntimeError as e:
             # Handle case where Qt widget has been deleted
@@ -341,7 +494,7 @@ class PetChatApp(QObject):
     
     def _on_clear_memories(self):
         """Handle clear memories request"""
-        self.db.clear_memories()
+        self.db.submit("clear_memories")
         self._update_memories_display()
         self.window.add_message("System", "📝 已清空所有记忆")
     
@@ -363,28 +516,32 @@ class PetChatApp(QObject):
                 print("[DEBUG] Stopping discovery service...")
                 self.discovery_service.stop()
             
+            if hasattr(self, 'history_maintenance') and self.history_maintenance:
+                print("[DEBUG] Stopping history maintenance...")
+                self.history_maintenance.stop()
+            
             # Mark user as offline in database
             try:
-                self.db.set_user_online_status(self.current_user_id, False)
+                self.db.submit("set_user_online_status", self.current_user_id, False)
                 print("[DEBUG] Marked user as offline")
             except Exception as e:
                 print(f"[WARN] Could not mark user offline: {e}")
             
-            # Close database connection
+            # Close database connection (waits for queued writes)
             try:
                 self.db.close()
                 print("[DEBUG] Database closed")
             except Exception as e:
                 print(f"[WARN] Could not close database: {e}")
             
-            # Delete database file
-            db_file = "petchat.db"
-            try:
-                if os.path.exists(db_file):
-                    os.remove(db_file)
-                    print(f"[DEBUG] Deleted database file: {db_file}")
-            except Exception as e:
-                print(f"[ERROR] Could not delete database: {e}")
+            # Delete database and archive files
+            for db_file in (self.db.db_path, self.db.archive_path):
+                try:
+                    if os.path.exists(db_file):
+                        os.remove(db_file)
+                        print(f"[DEBUG] Deleted database file: {db_file}")
+                except Exception as e:
+                    print(f"[ERROR] Could not delete database: {e}")
             
             # Clear user data from config
             try:
@@ -411,7 +568,8 @@ class PetChatApp(QObject):
             print(f"[ERROR] Failed to reset user: {e}")
             self.window.add_message("System", f"❌ 重置用户失败: {e}")
     
-    def _on_message_received(self, sender_id: str, sender_name: str, content: str, target: str, sender_avatar: str = ""):
+    def _on_message_received(self, sender_id: str, sender_name: str, content: str, target: str, sender_avatar: str = "",
+                             timestamp: str = ""):
         """Handle received message"""
         # Determine conversation ID
         if target == "public":
@@ -421,18 +579,18 @@ class PetChatApp(QObject):
             # Private message: conversation with the sender
             conversation_id = sender_id
             # Ensure conversation exists
-            self.db.get_or_create_conversation(conversation_id, "p2p", sender_name)
+            self.db.submit("get_or_create_conversation", conversation_id, "p2p", sender_name)
             
         target_conversation = conversation_id
+        is_viewing = target_conversation == self.current_conversation_id
         
-        # Save to database
-        self.db.add_message(sender_name, content, target_conversation, sender_id)
-        
-        # Update conversation last message
-        self.db.update_conversation_last_message(target_conversation, content[:50])
+        # Save to database (also updates preview and unread count)
+        # The server's timestamp lets a later history sync recognise this copy
+        self.db.submit("add_message", sender_name, content, target_conversation, sender_id,
+                       unread=not is_viewing, timestamp=timestamp or None)
         
         # If currently viewing this conversation, add to UI
-        if target_conversation == self.current_conversation_id:
+        if is_viewing:
             self.window.add_message(sender_name, content, is_me=False, sender_avatar=sender_avatar)
         else:
             print(f"[DEBUG] Message received for conversation '{target_conversation}' but currently viewing '{self.current_conversation_id}'")
@@ -445,11 +603,11 @@ class PetChatApp(QObject):
         """Handle sent message"""
         print(f"[DEBUG] _on_message_sent called: sender={sender}, content={content[:30]}")
         
-        # Store with current user's ID
-        self.db.add_message(sender, content, self.current_conversation_id, self.current_user_id)
-        
-        # Update conversation last message
-        self.db.update_conversation_last_message(self.current_conversation_id, content[:50])
+        # Store with current user's ID (also updates the conversation preview).
+        # The server stores the same timestamp, so a history sync matches this copy.
+        timestamp = datetime.now().isoformat()
+        self.db.submit("add_message", sender, content, self.current_conversation_id, self.current_user_id,
+                       timestamp=timestamp)
         
         # Send via network
         target = "public"
@@ -460,7 +618,7 @@ class PetChatApp(QObject):
         
         if self.network:
             print(f"[DEBUG] Sending message to {target}: {content[:30]}")
-            self.network.send_chat_message(target, content)
+            self.network.send_chat_message(target, content, timestamp)
         else:
             print("[DEBUG] Network not available!")
 
@@ -473,31 +631,31 @@ class PetChatApp(QObject):
         if conversation_id == self.current_conversation_id or not conversation_id:
             self.window.show_suggestion(suggestion)
             
+    def _on_server_ai_suggestion_delta(self, conversation_id: str, title: str, delta: str):
+        """Append streamed suggestion text; the final AI_SUGGESTION replaces it"""
+        if conversation_id == self.current_conversation_id or not conversation_id:
+            self.window.append_suggestion_delta(title, delta)
+            
     def _on_server_ai_emotion(self, conversation_id: str, emotion_scores: dict):
         """Handle AI emotion analysis received from server"""
+        # Keep every result as a time-series sample (drives mood trends)
+        self.db.submit("add_emotion_sample", conversation_id or self.current_conversation_id, emotion_scores)
         if conversation_id == self.current_conversation_id or not conversation_id:
             self.window.update_emotion(emotion_scores)
             
     def _on_server_ai_memory(self, conversation_id: str, memories: list):
         """Handle AI memories received from server"""
-        # Save new memories to local DB (duplicate checking is done in add_memory)
-        added_count = 0
+        # Save new memories to local DB in one transaction (duplicates are skipped)
         if memories:
-            for memory in memories:
-                content = memory.get('content', '')
-                category = memory.get('category', 'general')
-                
-                # add_memory returns None if duplicate, ID if added
-                result = self.db.add_memory(content=content, category=category)
-                if result is not None:
-                    added_count += 1
-            
-            # Only show message if new memories were actually added
-            if added_count > 0:
-                self.window.add_message("System", f"🧠 提取了 {added_count} 条新记忆")
+            self.db.add_memories_bulk(memories, callback=self._on_memories_added)
             
         # Update UI from local DB
         self._update_memories_display() 
+    
+    def _on_memories_added(self, added_ids: list):
+        # Only show message if new memories were actually added
+        if added_ids:
+            self.window.add_message("System", f"🧠 提取了 {len(added_ids)} 条新记忆")
 
     def _on_ai_requested(self):
         """Handle explicit AI request (/ai command)"""
@@ -511,14 +669,14 @@ class PetChatApp(QObject):
         # 1. Show loading state
         self.window.show_ai_loading()
         
-        # 2. Collect context snapshot for cold-start recovery
-        # (Recent 20 messages from current conversation)
-        recent_messages = self.db.get_recent_messages(20)
-        
-        # 3. Send request to server
-        self.network.send_ai_analysis_request(
-            conversation_id=self.current_conversation_id,
-            context_snapshot=recent_messages
+        # 2. Send request to server. The server builds the context from its message store;
+        # the local snapshot covers conversations it has no history for (older than the store)
+        conversation_id = self.current_conversation_id
+        self.db.submit(
+            "get_recent_messages", 20, conversation_id,
+            callback=lambda recent: self.network.send_ai_analysis_request(
+                conversation_id=conversation_id, context_snapshot=recent
+            )
         )
     
     
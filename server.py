@@ -29,11 +29,19 @@ from PyQt6.QtCore import QObject, pyqtSignal, QThread, QRunnable, QThreadPool, p
 from ui.server_window import ServerMainWindow
 from core.protocol import (
     Protocol, MessageType, HEADER_SIZE,
-    AIAnalysisRequest, AISuggestion, AIEmotion, AIMemory,
+    AIAnalysisRequest, AISuggestion, conversation_key,
     pack_message, unpack_header, verify_crc
 )
-from core.ai_session_manager import AISessionManager
+from core.ai_cache import create_ai_cache
+from core.ai_coalescer import AIRequestCoalescer, merge_scopes
+from core.ai_pipeline import AIPipeline, StageResult, STAGES, stage_message
+from core.ai_scheduler import SchedulerError, create_ai_scheduler, priority_of
+from core.ai_session_manager import AISessionManager, memory_scope
+from core.message_store import create_message_store
+from core.providers import ResilientProvider
 from core.server_core import PetChatServer, ServerCallbacks
+from core.trigger_engine import create_trigger_engine
+from config.settings import Settings
 
 # Global thread pool
 thread_pool = None
@@ -42,6 +50,8 @@ class WorkerSignals(QObject):
     """Signals for AI Worker"""
     result = pyqtSignal(object)
     error = pyqtSignal(str)
+    stage = pyqtSignal(object)  # StageResult as each AI stage finishes, or a SuggestionDelta
+    rejected = pyqtSignal(str)  # the AI scheduler dropped the job (queue full / deadline)
 
 class AIWorker(QRunnable):
     """Worker for executing AI tasks in background"""
@@ -96,10 +106,11 @@ class ServerThread(QThread):
     client_disconnected = pyqtSignal(str)
     ai_request_received = pyqtSignal(str, dict) # client_id, request_dict
     
-    def __init__(self, host="0.0.0.0", port=8888):
+    def __init__(self, host="0.0.0.0", port=8888, message_store=None, trigger_engine=None):
         super().__init__()
         self.callbacks = PyQtServerCallbacks(self)
-        self.core_server = PetChatServer(host, port, self.callbacks)
+        self.core_server = PetChatServer(host, port, self.callbacks, message_store=message_store,
+                                         trigger_engine=trigger_engine)
         
     def run(self):
         """Main server loop"""
@@ -146,7 +157,19 @@ class ServerController(QObject):
         self.window = window
         self.server_thread: Optional[ServerThread] = None
         self.session_manager = AISessionManager()
+        self.message_store = None
         self.ai_service = None
+        self.ai_pipeline: Optional[AIPipeline] = None
+        self.analysis_mode = "auto"  # server_config.json ai_config.analysis_mode: auto/fused/separate
+        self.ai_fallbacks = []  # ai_config.fallbacks: providers tried after the primary, in order
+        self.ai_resilience = None  # ai_config.resilience: circuit breaker and hedging settings
+        self.emotion_mode = Settings.AI_EMOTION_MODE  # ai_config.emotion_mode: llm/local/hybrid
+        self.emotion_min_confidence = Settings.AI_EMOTION_MIN_CONFIDENCE
+        self.ai_cache = None
+        self.trigger_engine = None
+        self.ai_scheduler = None
+        self.ai_coalescer = None
+        self._ai_requests = set()  # WorkerSignals of requests still waiting for their result
         self.persist_token_usage = True
         
         self._init_connections()
@@ -185,8 +208,25 @@ class ServerController(QObject):
             self.window.log_message(f"Failed to load config: {e}")
             config = {"server_port": 8888, "ai_config": {}}
         
+        self.message_store = create_message_store(config, Settings.SERVER_HISTORY_DB_PATH)
+        self.ai_cache = create_ai_cache(config)
+        self.trigger_engine = create_trigger_engine(config)
+        # Bounded, prioritized queue; one analysis per conversation at a time,
+        # and bursts within the debounce window are merged
+        self.ai_scheduler = create_ai_scheduler(config)
+        self.ai_coalescer = AIRequestCoalescer(
+            lambda payload, on_stage: self._process_ai(*payload, on_stage=on_stage),
+            debounce_seconds=config.get("ai_debounce_seconds", Settings.AI_DEBOUNCE_SECONDS),
+            scheduler=self.ai_scheduler, merge=merge_scopes
+        )
+        
         # Populate UI
         ai_cfg = config.get("ai_config", {})
+        self.analysis_mode = ai_cfg.get("analysis_mode", "auto")
+        self.ai_fallbacks = ai_cfg.get("fallbacks", [])
+        self.ai_resilience = ai_cfg.get("resilience")
+        self.emotion_mode = ai_cfg.get("emotion_mode", Settings.AI_EMOTION_MODE)
+        self.emotion_min_confidence = ai_cfg.get("emotion_min_confidence", Settings.AI_EMOTION_MIN_CONFIDENCE)
         self.window.port_input.setText(str(config.get("server_port", 8888)))
         self.window.api_key_input.setText(ai_cfg.get("api_key", ""))
         self.window.api_base_input.setText(ai_cfg.get("base_url", ""))
@@ -217,8 +257,15 @@ class ServerController(QObject):
         config["ai_config"] = {
             "api_key": key,
             "base_url": base,
-            "model": model
+            "model": model,
+            "analysis_mode": self.analysis_mode,
+            "emotion_mode": self.emotion_mode,
+            "emotion_min_confidence": self.emotion_min_confidence
         }
+        if self.ai_fallbacks:
+            config["ai_config"]["fallbacks"] = self.ai_fallbacks
+        if self.ai_resilience:
+            config["ai_config"]["resilience"] = self.ai_resilience
         
         with open(config_path, 'w', encoding='utf-8') as f:
             json.dump(config, f, indent=4, ensure_ascii=False)
@@ -229,7 +276,8 @@ class ServerController(QObject):
         if self.server_thread and self.server_thread.isRunning():
             return
             
-        self.server_thread = ServerThread(port=port)
+        self.server_thread = ServerThread(port=port, message_store=self.message_store,
+                                          trigger_engine=self.trigger_engine)
         self.server_thread.log_signal.connect(self.window.log_message)
         # self.server_thread.stats_signal.connect(self.window.update_stats) # Handled by timer now
         self.server_thread.client_connected.connect(self.window.add_client)
@@ -253,9 +301,22 @@ class ServerController(QObject):
     def update_ai_config(self, key, base, model):
         try:
             from core.ai_service import AIService
+            if self.ai_service:
+                self.ai_service.close()
             # Use 60s timeout for production, 30s for testing
-            self.ai_service = AIService(api_key=key, api_base=base, model=model, timeout=60.0)
-            self.window.log_message(f"AI Service configured: {model}")
+            # One pooled connection per concurrently running stage
+            self.ai_service = AIService(api_key=key, api_base=base, model=model, timeout=60.0,
+                                        analysis_mode=self.analysis_mode, cache=self.ai_cache,
+                                        http_pool_size=self.ai_scheduler.max_workers * len(STAGES),
+                                        fallbacks=self.ai_fallbacks, resilience=self.ai_resilience,
+                                        emotion_mode=self.emotion_mode,
+                                        emotion_min_confidence=self.emotion_min_confidence,
+                                        triggers=self.trigger_engine)
+            if self.ai_pipeline:
+                self.ai_pipeline.shutdown()
+            self.ai_pipeline = AIPipeline(self.ai_service, sessions=self.session_manager)
+            mode = "fused" if self.ai_service.use_fused_analysis else "separate"
+            self.window.log_message(f"AI Service configured: {model} ({mode} analysis)")
             # Persist config
             self._save_config(key, base, model)
         except Exception as e:
@@ -267,7 +328,10 @@ class ServerController(QObject):
             # Force UI update with current thread stats
             self.window.update_stats(self.server_thread.msg_count, self.server_thread.ai_req_count)
         # Update token stats from session manager
-        self.window.update_token_stats(self.session_manager.get_usage())
+        self.window.update_token_stats(self.session_manager.get_usage(), self._ai_cache_stats())
+
+    def _ai_cache_stats(self):
+        return self.ai_cache.stats() if self.ai_cache else None
 
     def test_ai_connection(self, key, base, model):
         self.window.log_message(f"Testing connection to {base}...")
@@ -366,57 +430,105 @@ class ServerController(QObject):
         # Update session context
         self.session_manager.update_context(conversation_id, context_snapshot)
         
-        # Submit to thread pool
-        worker = AIWorker(self._process_ai, conversation_id, context_snapshot)
-        worker.signals.result.connect(lambda res: self._on_ai_result(user_id, res))
-        worker.signals.error.connect(lambda err: self.window.log_message(f"AI Error: {err}"))
-        
-        QThreadPool.globalInstance().start(worker)
+        # Both sides of a DM share the store key, so their requests coalesce too
+        # (stored history replaces the client snapshot when available). Each
+        # client keeps its own memories, so the shared job reports them per
+        # requester scope; one joining a running job gets its memories next time.
+        store_key = conversation_key(user_id, conversation_id)
+        scope = memory_scope(user_id, store_key)
+        # Messages routed before this request must be in the context; later traffic is not waited for
+        ticket = self.message_store.write_ticket() if self.message_store else None
+        signals = WorkerSignals()
+        self._ai_requests.add(signals)
+        # Each stage is sent to the client as soon as it finishes
+        signals.stage.connect(lambda stage: self._on_ai_stage(user_id, conversation_id, stage, scope))
+        signals.result.connect(lambda res: self._on_ai_result(user_id, conversation_id, res))
+        signals.error.connect(lambda err: self.window.log_message(f"AI Error: {err}"))
+        signals.rejected.connect(lambda reason: self._on_ai_rejected(user_id, conversation_id, reason))
+        for signal in (signals.result, signals.error, signals.rejected):
+            signal.connect(lambda _: self._ai_requests.discard(signals))
+        
+        future = self.ai_coalescer.submit(
+            store_key, (conversation_id, context_snapshot, store_key, ticket, (scope,)), on_stage=signals.stage.emit,
+            priority=priority_of(request_dict.get("priority"))
+        )
+        future.add_done_callback(lambda f: self._emit_ai_done(signals, f))
+
+    @staticmethod
+    def _emit_ai_done(signals, future):
+        # Runs on a scheduler thread; signals are queued to the main thread
+        if future.cancelled():
+            signals.error.emit("AI request cancelled")
+            return
+        error = future.exception()
+        if isinstance(error, SchedulerError):
+            signals.rejected.emit(str(error))
+        elif error is not None:
+            signals.error.emit(str(error))
+        else:
+            signals.result.emit(future.result())
 
-    def _process_ai(self, conversation_id, context_messages):
+    def _process_ai(self, conversation_id, context_messages, store_key=None, ticket=None, scopes=(), on_stage=None):
         # This runs in background thread
-        # 1. Analyze emotion
-        emotions = self.ai_service.analyze_emotion(context_messages)
-        
-        # 2. Extract memories
-        memories = self.ai_service.extract_memories(context_messages)
-        
-        # 3. Generate suggestion
-        suggestion = self.ai_service.generate_suggestion(context_messages)
+        if self.message_store and store_key:
+            self.message_store.flush(ticket)
+            stored = self.message_store.get_recent(store_key, 20)
+            if stored:
+                context_messages = stored
+        
+        # Emotion, memories and suggestion run concurrently; suggestion text is
+        # streamed to the client as SuggestionDelta events before its final stage.
+        # Conversations without a recent trigger keyword skip the suggestion.
+        wanted = STAGES
+        if store_key and not self.trigger_engine.needs_suggestion(store_key):
+            wanted = [stage for stage in STAGES if stage != "suggestion"]
+        # Memories are mined once, from messages past the lowest requester high-water mark
+        stages = self.ai_pipeline.run(context_messages, on_stage=on_stage, on_delta=on_stage, stages=wanted,
+                                      memory_scopes=scopes)
         
         return {
             "conversation_id": conversation_id,
-            "emotion": emotions,
-            "memories": memories,
-            "suggestion": suggestion
+            "latency": {name: stage.latency for name, stage in stages.items()}
         }
 
-    def _on_ai_result(self, user_id, result):
-        # Runs in Main Thread
-        cid = result["conversation_id"]
-        
-        # Send results back to client
+    def _on_ai_stage(self, user_id, cid, stage: StageResult, scope=None):
+        # Runs in Main Thread, once per finished stage or streamed suggestion delta
+        if isinstance(stage, StageResult) and stage.scope not in (None, scope):
+            return  # another requester's memories
+        if isinstance(stage, StageResult) and stage.error:
+            self.window.log_message(f"AI {stage.stage} failed: {stage.error}")
+            return
+        msg = stage_message(cid, stage)
+        if self.server_thread and msg:
+            self.server_thread.send_to_client(user_id, msg)
+
+    def _on_ai_rejected(self, user_id, cid, reason):
+        # Backpressure: tell the requester instead of leaving the client waiting
+        self.window.log_message(f"AI request from {user_id} dropped: {reason} [{self.ai_scheduler.summary()}]")
         if self.server_thread:
-            # Send Emotion
-            if result["emotion"]:
-                msg = AIEmotion(cid, result["emotion"]).to_dict()
-                self.server_thread.send_to_client(user_id, msg)
-                
-            # Send Memories
-            if result["memories"]:
-                msg = AIMemory(cid, result["memories"]).to_dict()
-                self.server_thread.send_to_client(user_id, msg)
-                
-            # Send Suggestion
-            if result["suggestion"]:
-                s = result["suggestion"]
-                msg = AISuggestion(cid, s["title"], s["content"], s.get("type", "suggestion")).to_dict()
-                self.server_thread.send_to_client(user_id, msg)
-        
+            msg = AISuggestion(cid, "AI 繁忙", "当前分析请求较多，请稍后再试。", "suggestion").to_dict()
+            self.server_thread.send_to_client(user_id, msg)
+
+    def _on_ai_result(self, user_id, cid, result):
+        # Runs in Main Thread after every stage has been sent
         # Update stats
         # self.session_manager.track_usage(cid, tokens) # Need token usage from AIService to track strictly
-        self.window.update_token_stats(self.session_manager.get_usage())
-        self.window.log_message(f"AI processed for {user_id} (Conv: {cid})")
+        self.window.update_token_stats(self.session_manager.get_usage(), self._ai_cache_stats())
+        latency = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in result["latency"].items())
+        self.window.log_message(f"AI processed for {user_id} (Conv: {cid}) [{latency}]")
+        self.window.log_message(f"AI stage latency: {self.ai_pipeline.metrics.summary()}")
+        stats = self.ai_coalescer.stats()
+        if stats["requests"] > stats["runs"]:
+            self.window.log_message(f"AI requests coalesced: {stats['requests']} requests -> {stats['runs']} runs")
+        self.window.log_message(f"AI queue: {self.ai_scheduler.summary()}")
+        if self.ai_service.emotion_mode == "hybrid":
+            stats = self.ai_service.emotion_stats
+            self.window.log_message(f"AI emotion: {stats['local']} scored locally, {stats['escalated']} sent to the model")
+        if isinstance(self.ai_service.provider, ResilientProvider):
+            stats = self.ai_service.provider.stats()
+            states = ", ".join(f"{p['name']} {p['state']}" for p in stats["providers"])
+            self.window.log_message(f"AI providers: {states} (failovers {stats['failovers']}, "
+                                    f"hedges {stats['hedges']}, fast-failed {stats['rejected']})")
 
     def _calculate_rates(self):
         if not self.server_thread: return
@@ -440,6 +552,16 @@ class ServerController(QObject):
 
     def on_close(self, event):
         self.stop_server()
+        self.ai_coalescer.shutdown()
+        self.ai_scheduler.shutdown()
+        if self.ai_pipeline:
+            self.ai_pipeline.shutdown()
+        if self.ai_service:
+            self.ai_service.close()
+        if self.message_store:
+            self.message_store.close()
+        if self.ai_cache:
+            self.ai_cache.close()
         # Save token usage if needed
         import json
         try:
@@ -19,6 +19,15 @@ import signal
 import time
 from pathlib import Path
 from core.server_core import PetChatServer, ServerCallbacks
+from core.message_store import create_message_store
+from core.ai_cache import create_ai_cache
+from core.ai_coalescer import AIRequestCoalescer, merge_scopes
+from core.ai_pipeline import AIPipeline, STAGES, StageResult, stage_message
+from core.ai_scheduler import SchedulerError, create_ai_scheduler, priority_of
+from core.ai_session_manager import AISessionManager, memory_scope
+from core.protocol import AISuggestion, conversation_key
+from core.trigger_engine import create_trigger_engine
+from config.settings import Settings
 
 # Configure logging
 logging.basicConfig(
@@ -31,8 +40,93 @@ logging.basicConfig(
 )
 logger = logging.getLogger("PetChatCLI")
 
+class CLIAIHandler:
+    """Headless AI analysis: same scheduler, coalescing and pipeline as the GUI server"""
+    def __init__(self, config, message_store, trigger_engine):
+        from core.ai_service import AIService
+        ai_cfg = config.get("ai_config", {})
+        self.message_store = message_store
+        self.trigger_engine = trigger_engine
+        self.server = None
+        self.cache = create_ai_cache(config)
+        self.scheduler = create_ai_scheduler(config)
+        self.service = AIService(api_key=ai_cfg.get("api_key"), api_base=ai_cfg.get("base_url"),
+                                 model=ai_cfg.get("model", "gpt-4o-mini"), timeout=60.0,
+                                 analysis_mode=ai_cfg.get("analysis_mode", "auto"), cache=self.cache,
+                                 http_pool_size=self.scheduler.max_workers * len(STAGES),
+                                 fallbacks=ai_cfg.get("fallbacks"), resilience=ai_cfg.get("resilience"),
+                                 emotion_mode=ai_cfg.get("emotion_mode", Settings.AI_EMOTION_MODE),
+                                 emotion_min_confidence=ai_cfg.get("emotion_min_confidence",
+                                                                   Settings.AI_EMOTION_MIN_CONFIDENCE),
+                                 triggers=trigger_engine)
+        self.sessions = AISessionManager()
+        self.pipeline = AIPipeline(self.service, sessions=self.sessions)
+        self.coalescer = AIRequestCoalescer(
+            self._process, debounce_seconds=config.get("ai_debounce_seconds", Settings.AI_DEBOUNCE_SECONDS),
+            scheduler=self.scheduler, merge=merge_scopes
+        )
+        
+    def handle(self, user_id, request):
+        """Queue an analysis; called on the client connection thread"""
+        cid = request.get("conversation_id")
+        store_key = conversation_key(user_id, cid)
+        # Shared per conversation; memories are reported per requester (see memory_scope)
+        scope = memory_scope(user_id, store_key)
+        future = self.coalescer.submit(
+            store_key, (request.get("context_snapshot", []), store_key, self.message_store.write_ticket(), (scope,)),
+            on_stage=lambda stage: self._send_stage(user_id, cid, stage, scope),
+            priority=priority_of(request.get("priority"))
+        )
+        future.add_done_callback(lambda f: self._on_done(user_id, cid, f))
+        
+    def _process(self, payload, on_stage):
+        context_messages, store_key, ticket, scopes = payload
+        # Only messages routed before the request are waited for, not later traffic
+        self.message_store.flush(ticket)
+        context_messages = self.message_store.get_recent(store_key, 20) or context_messages
+        wanted = STAGES
+        if not self.trigger_engine.needs_suggestion(store_key):
+            wanted = [stage for stage in STAGES if stage != "suggestion"]
+        return self.pipeline.run(context_messages, on_stage=on_stage, on_delta=on_stage, stages=wanted,
+                                 memory_scopes=scopes)
+    
+    def _send_stage(self, user_id, cid, stage, scope=None):
+        if isinstance(stage, StageResult) and stage.scope not in (None, scope):
+            return  # another requester's memories
+        if isinstance(stage, StageResult) and stage.error:
+            logger.error(f"AI {stage.stage} failed: {stage.error}")
+            return
+        msg = stage_message(cid, stage)
+        if msg and self.server:
+            self.server.send_to_client(user_id, msg)
+            
+    def _on_done(self, user_id, cid, future):
+        if future.cancelled():
+            return
+        error = future.exception()
+        if isinstance(error, SchedulerError):
+            logger.warning(f"AI request from {user_id} dropped: {error} [{self.scheduler.summary()}]")
+            if self.server:
+                msg = AISuggestion(cid, "AI 繁忙", "当前分析请求较多，请稍后再试。", "suggestion").to_dict()
+                self.server.send_to_client(user_id, msg)
+        elif error is not None:
+            logger.error(f"AI Error: {error}")
+        else:
+            logger.info(f"AI processed for {user_id} (Conv: {cid}) [{self.scheduler.summary()}]")
+            
+    def close(self):
+        self.coalescer.shutdown()
+        self.scheduler.shutdown()
+        self.pipeline.shutdown()
+        self.service.close()
+        if self.cache:
+            self.cache.close()
+
 class CLICallbacks(ServerCallbacks):
     """Callbacks for CLI interaction"""
+    def __init__(self, ai_handler=None):
+        self.ai_handler = ai_handler
+        
     def on_log(self, message: str):
         logger.info(message)
         
@@ -51,6 +145,10 @@ class CLICallbacks(ServerCallbacks):
         
     def on_ai_request(self, user_id, request):
         logger.info(f"AI Request from {user_id}")
+        if self.ai_handler:
+            self.ai_handler.handle(user_id, request)
+        else:
+            logger.warning("Request dropped: AI Service not configured")
 
 def load_config(path="server_config.json"):
     if Path(path).exists():
@@ -71,12 +169,29 @@ def cmd_start(args):
     
     print(f"Starting PetChat Server on port {port}...")
     
-    server = PetChatServer(port=port, callbacks=CLICallbacks())
+    message_store = create_message_store(config, Settings.SERVER_HISTORY_DB_PATH)
+    trigger_engine = create_trigger_engine(config)
+    ai_cfg = config.get("ai_config", {})
+    ai_handler = None
+    if ai_cfg.get("api_key") and ai_cfg.get("base_url"):
+        ai_handler = CLIAIHandler(config, message_store, trigger_engine)
+    else:
+        print("AI Service not configured (set ai_config.api_key and ai_config.base_url).")
+    server = PetChatServer(port=port, callbacks=CLICallbacks(ai_handler), message_store=message_store,
+                           trigger_engine=trigger_engine)
+    if ai_handler:
+        ai_handler.server = server
+    
+    def shutdown():
+        server.stop()
+        if ai_handler:
+            ai_handler.close()
+        message_store.close()
     
     # helper for graceful shutdown
     def signal_handler(sig, frame):
         print("\nStopping server...")
-        server.stop()
+        shutdown()
         sys.exit(0)
         
     signal.signal(signal.SIGINT, signal_handler)
@@ -90,7 +205,7 @@ def cmd_start(args):
         while True:
             time.sleep(1)
     except KeyboardInterrupt:
-        server.stop()
+        shutdown()
 
 def cmd_config(args):
     """Manage configuration"""
@@ -0,0 +1,83 @@
+"""
+Benchmark: separate vs fused AI analysis prompts.
+Sends the same 20-message context through AIService in "separate" mode
+(three calls, run concurrently by AIPipeline) and "fused" mode (one
+analyze_all call) against the local mock LLM endpoint, and compares requests,
+prompt/completion tokens (as counted by the mock) and end-to-end latency.
+
+Usage: python tests/bench_ai_analysis_modes.py [num_requests]
+"""
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.ai_pipeline import AIPipeline
+from core.ai_service import AIService
+from tests.mock_llm_server import MockLLMServer
+
+NUM_REQUESTS = 10
+# Fused replies are longer, so the mock answers them a little slower than the slowest single task
+DELAYS = {"emotion": 0.15, "memories": 0.35, "suggestion": 0.25, "fused": 0.45}
+MAX_PROMPT_TOKEN_RATIO = 0.6  # the separate suggestion prompt only carries the last 5 messages
+
+CONTEXT = [
+    {"sender": "Alice" if i % 2 == 0 else "Bob", "content": text}
+    for i, text in enumerate([
+        "这周末有空吗？", "有啊，怎么了", "想约你出去玩", "去哪里呢", "要不去爬山吧",
+        "好主意，哪座山", "就去城郊那座", "需要带什么", "带水和零食", "那几点出发",
+        "早上八点吧", "会不会太早", "九点也行", "那就九点", "在地铁站集合",
+        "好的", "要叫上小明吗", "可以问问他", "我明天问他", "好，周末计划就这么定了",
+    ])
+]
+
+
+def run_mode(base_url: str, mode: str, num_requests: int, server: MockLLMServer) -> dict:
+    service = AIService(api_key="bench", api_base=base_url, model="mock", analysis_mode=mode)
+    pipeline = AIPipeline(service)
+    before_requests = sum(server.requests.values())
+    before_prompt, before_completion = server.prompt_tokens, server.completion_tokens
+
+    latencies = []
+    for _ in range(num_requests):
+        start = time.perf_counter()
+        results = pipeline.run(CONTEXT)
+        latencies.append(time.perf_counter() - start)
+        assert all(r.error is None for r in results.values())
+    pipeline.shutdown()
+
+    return {
+        "mode": mode,
+        "requests": (sum(server.requests.values()) - before_requests) / num_requests,
+        "prompt_tokens": (server.prompt_tokens - before_prompt) / num_requests,
+        "completion_tokens": (server.completion_tokens - before_completion) / num_requests,
+        "latency_ms": sum(latencies) / len(latencies) * 1000,
+        "fallbacks": service.analysis_stats["fused_fallbacks"],
+    }
+
+
+def run_benchmark(num_requests: int = NUM_REQUESTS):
+    with MockLLMServer(delays=DELAYS) as server:
+        separate = run_mode(server.base_url, "separate", num_requests, server)
+        fused = run_mode(server.base_url, "fused", num_requests, server)
+
+    print("\n=== AI Analysis Mode Benchmark ===")
+    print(f"Requests: {num_requests}, context: {len(CONTEXT)} messages")
+    for r in (separate, fused):
+        print(f"{r['mode']:<9} {r['requests']:.1f} calls/request, {r['prompt_tokens']:.0f} prompt + "
+              f"{r['completion_tokens']:.0f} completion tokens/request, {r['latency_ms']:.1f} ms end-to-end, "
+              f"{r['fallbacks']} fallbacks")
+
+    ratio = fused["prompt_tokens"] / separate["prompt_tokens"]
+    print(f"Prompt token ratio (fused / separate): {ratio:.2f}")
+    print(f"Latency ratio (fused / separate): {fused['latency_ms'] / separate['latency_ms']:.2f}")
+
+    if fused["requests"] == 1 and ratio <= MAX_PROMPT_TOKEN_RATIO:
+        print(f"PASS: Fused mode uses one call and at most {MAX_PROMPT_TOKEN_RATIO:.0%} of the prompt tokens.")
+    else:
+        print("FAIL: Fused mode did not cut calls or prompt tokens enough.")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_REQUESTS)
@@ -0,0 +1,94 @@
+"""
+Benchmark for the concurrent AI pipeline.
+Runs AI requests against a local mock LLM endpoint with per-task delays,
+first with the three AIService calls made one after another (the previous
+_process_ai behaviour), then through AIPipeline, and reports end-to-end
+latency per stage.
+
+Usage: python tests/bench_ai_pipeline.py [num_requests]
+"""
+import sys
+import os
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.ai_pipeline import AIPipeline, STAGES, StageMetrics, StageResult
+from core.ai_service import AIService
+from tests.mock_llm_server import MockLLMServer
+
+NUM_REQUESTS = 20
+DELAYS = {"emotion": 0.15, "memories": 0.35, "suggestion": 0.25}
+MAX_TOTAL_RATIO = 0.6  # pipeline wall time / sequential wall time
+
+CONTEXT = [
+    {"sender": "Alice", "content": "这周末有空吗？"},
+    {"sender": "Bob", "content": "有啊，要不要明天计划一下出去玩"},
+    {"sender": "Alice", "content": "好，我们去爬山吧"},
+]
+
+
+def run_sequential(service: AIService, num_requests: int) -> StageMetrics:
+    metrics = StageMetrics()
+    calls = [service.analyze_emotion, service.extract_memories, service.generate_suggestion]
+    for _ in range(num_requests):
+        started = time.perf_counter()
+        for stage, call in zip(STAGES, calls):
+            call_started = time.perf_counter()
+            value = call(CONTEXT)
+            now = time.perf_counter()
+            metrics.record(StageResult(stage, value, now - call_started, now - started))
+    return metrics
+
+
+def run_pipeline(service: AIService, num_requests: int) -> StageMetrics:
+    pipeline = AIPipeline(service)
+    for _ in range(num_requests):
+        pipeline.run(CONTEXT)
+    pipeline.shutdown()
+    return pipeline.metrics
+
+
+def report(name: str, metrics: StageMetrics, wall_s: float):
+    print(f"{name}: {wall_s:.2f} s total")
+    for stage, stats in metrics.snapshot().items():
+        print(f"  {stage:<10} end-to-end p50 {stats['p50'] * 1000:7.1f} ms, p95 {stats['p95'] * 1000:7.1f} ms, "
+              f"call {stats['mean_duration'] * 1000:7.1f} ms, errors {stats['errors']}")
+
+
+def run_benchmark(num_requests: int = NUM_REQUESTS):
+    with MockLLMServer(delays=DELAYS) as server:
+        service = AIService(api_key="bench", api_base=server.base_url, model="mock")
+
+        start = time.perf_counter()
+        sequential = run_sequential(service, num_requests)
+        sequential_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        concurrent = run_pipeline(service, num_requests)
+        concurrent_s = time.perf_counter() - start
+
+    print("\n=== AI Pipeline Benchmark ===")
+    print(f"Requests: {num_requests}, mock delays: " + ", ".join(f"{k} {v * 1000:.0f} ms" for k, v in DELAYS.items()))
+    report("Sequential", sequential, sequential_s)
+    report("Concurrent", concurrent, concurrent_s)
+
+    ratio = concurrent_s / sequential_s
+    first = concurrent.snapshot()["emotion"]["p50"]
+    print(f"Wall time ratio (concurrent / sequential): {ratio:.2f}")
+    print(f"Emotion delivered after {first * 1000:.1f} ms (sequential: "
+          f"{sequential.snapshot()['emotion']['p50'] * 1000:.1f} ms, full result: "
+          f"{sequential.snapshot()['suggestion']['p50'] * 1000:.1f} ms)")
+
+    if ratio <= MAX_TOTAL_RATIO:
+        print(f"PASS: Concurrent pipeline finishes within {MAX_TOTAL_RATIO:.0%} of sequential time.")
+    else:
+        print("FAIL: Concurrent pipeline is not fast enough.")
+    if first < DELAYS["memories"]:
+        print("PASS: Emotion is delivered before the slowest stage completes.")
+    else:
+        print("FAIL: Emotion waited on slower stages.")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_REQUESTS)
@@ -0,0 +1,76 @@
+"""
+Benchmark: thread-per-call vs asyncio LLM requests.
+Sends NUM_REQUESTS chat completions to a slow local mock endpoint, first with
+the blocking generate_content on a thread pool of THREADS workers (each
+in-flight call pins a thread), then with agenerate_content on a single event
+loop, and compares wall time and throughput.
+
+Usage: python tests/bench_async_providers.py [num_requests]
+"""
+import sys
+import os
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.providers.openai_provider import OpenAIProvider
+from tests.mock_llm_server import MockLLMServer
+
+NUM_REQUESTS = 200
+THREADS = 16
+ENDPOINT_DELAY = 0.5  # seconds per completion
+MIN_SPEEDUP = 4.0
+
+MESSAGES = [{"role": "user", "content": "周末一起去爬山吧"}]
+
+
+def run_threaded(base_url: str, num_requests: int) -> dict:
+    provider = OpenAIProvider(api_key="bench", model="mock", base_url=base_url, pool_size=THREADS)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=THREADS) as pool:
+        replies = list(pool.map(lambda _: provider.generate_content(MESSAGES), range(num_requests)))
+    elapsed = time.perf_counter() - start
+    provider.close()
+    return {"mode": f"threads x{THREADS}", "elapsed": elapsed, "ok": sum(r == "pong" for r in replies)}
+
+
+def run_async(base_url: str, num_requests: int) -> dict:
+    provider = OpenAIProvider(api_key="bench", model="mock", base_url=base_url, async_pool_size=num_requests)
+
+    async def burst():
+        replies = await asyncio.gather(*(provider.agenerate_content(MESSAGES) for _ in range(num_requests)))
+        await provider.aclose()
+        return replies
+
+    start = time.perf_counter()
+    replies = asyncio.run(burst())
+    elapsed = time.perf_counter() - start
+    return {"mode": "asyncio x1", "elapsed": elapsed, "ok": sum(r == "pong" for r in replies)}
+
+
+def run_benchmark(num_requests: int = NUM_REQUESTS):
+    logging.getLogger("core.providers.openai_provider").setLevel(logging.WARNING)
+    with MockLLMServer(delays={"other": ENDPOINT_DELAY}, replies={"other": "pong"}) as server:
+        threaded = run_threaded(server.base_url, num_requests)
+        asynchronous = run_async(server.base_url, num_requests)
+
+    print("\n=== Async Provider Concurrency Benchmark ===")
+    print(f"Requests: {num_requests}, endpoint delay: {ENDPOINT_DELAY * 1000:.0f} ms")
+    for r in (threaded, asynchronous):
+        print(f"{r['mode']:<12} {r['elapsed']:.2f} s wall, {num_requests / r['elapsed']:.1f} req/s, "
+              f"{r['ok']}/{num_requests} ok")
+
+    speedup = threaded["elapsed"] / asynchronous["elapsed"]
+    print(f"Speedup: {speedup:.1f}x")
+
+    if asynchronous["ok"] == num_requests and speedup >= MIN_SPEEDUP:
+        print(f"PASS: One event loop beats {THREADS} threads by at least {MIN_SPEEDUP:.0f}x.")
+    else:
+        print("FAIL: Async requests did not scale past the thread pool.")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_REQUESTS)
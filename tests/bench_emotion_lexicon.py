@@ -0,0 +1,158 @@
+"""
+Benchmark: local lexicon emotion scorer vs LLM emotion analysis.
+Scores a bundled labeled sample of short conversations with EmotionLexicon
+and reports top-class accuracy (overall and on the windows confident enough
+to skip the model), per-window latency, and how many emotion calls the
+"hybrid" mode of AIService still sends to a slow local mock endpoint.
+
+Usage: python tests/bench_emotion_lexicon.py [repeats]
+"""
+import sys
+import os
+import logging
+import time
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from config.settings import Settings
+from core.ai_service import AIService
+from core.emotion_lexicon import EmotionLexicon
+from tests.mock_llm_server import MockLLMServer
+
+REPEATS = 200
+ENDPOINT_DELAY = 0.05  # seconds per emotion completion
+MIN_CONFIDENT_ACCURACY = 0.85
+MIN_LOCAL_SHARE = 0.5
+MAX_P50_US = 500
+
+# (label, conversation window oldest first)
+SAMPLE = [
+    ("happy", ["周末一起去爬山吧", "好啊哈哈，太好了🎉"]),
+    ("happy", ["我考过了！", "恭喜恭喜！太厉害了"]),
+    ("happy", ["今天的火锅好好吃", "是啊，下次还去😋", "哈哈哈必须的"]),
+    ("happy", ["生日快乐🎂", "谢谢你，好开心❤"]),
+    ("happy", ["看到你发的照片了", "好美啊，好喜欢", "嘻嘻"]),
+    ("happy", ["We won the game!", "Yay, that's awesome 🎉"]),
+    ("happy", ["Thanks for the gift", "Glad you love it"]),
+    ("happy", ["明天就放假了", "好期待啊", "我也是，好兴奋"]),
+    ("happy", ["新工作怎么样", "同事都很好，挺满意的", "那太好了"]),
+    ("happy", ["that movie was so much fun", "haha yes, amazing"]),
+    ("happy", ["终于搬进新家了", "恭喜🥳", "美滋滋"]),
+    ("happy", ["猫咪今天好乖", "哈哈好可爱😍"]),
+    ("tense", ["明天考试怎么办？？", "来不及复习了"]),
+    ("tense", ["快点，车要开了", "马上到，别催了", "来不及了😰"]),
+    ("tense", ["项目截止是今晚吗", "对，压力好大", "赶紧改吧"]),
+    ("tense", ["面试几点开始", "十点，好紧张"]),
+    ("tense", ["Deadline is in an hour", "I'm so stressed", "hurry!"]),
+    ("tense", ["are you coming?", "running late, sorry", "please hurry, it's urgent"]),
+    ("tense", ["钥匙找不到了", "完蛋，怎么办", "别慌，再找找"]),
+    ("tense", ["妈妈住院了", "很担心", "我现在就过去"]),
+    ("tense", ["航班要起飞了？！", "还在排安检，好着急"]),
+    ("tense", ["老板在催报告", "我还没写完，焦虑死了"]),
+    ("tense", ["I'm nervous about tomorrow", "you'll be fine, don't worry"]),
+    ("negative", ["你怎么又迟到了", "我也不想的...", "算了，不想理你"]),
+    ("negative", ["别烦我", "我做错什么了？", "你自己想"]),
+    ("negative", ["今天被骂了", "好难过😭"]),
+    ("negative", ["他又放我鸽子", "真让人失望", "别生气了"]),
+    ("negative", ["我们分手吧", "为什么？", "受够了"]),
+    ("negative", ["I hate this", "what happened?", "everything is terrible"]),
+    ("negative", ["I'm not happy with you", "whatever"]),
+    ("negative", ["这饭难吃死了", "垃圾餐厅", "气死了😡"]),
+    ("negative", ["昨天吵架了", "还在生气吗", "不想说话"]),
+    ("negative", ["so disappointed in the result", "me too 😞"]),
+    ("negative", ["你能不能闭嘴", "好好好，我不说了"]),
+    ("negative", ["感觉好委屈", "怎么了", "没什么，就是不开心"]),
+    ("neutral", ["在吗", "嗯，怎么了"]),
+    ("neutral", ["晚上吃饭吗", "好的，七点见"]),
+    ("neutral", ["文件收到了吗", "收到，明白"]),
+    ("neutral", ["明天几点开会", "九点半", "知道了"]),
+    ("neutral", ["ok see you at 5", "sure"]),
+    ("neutral", ["got it", "okay"]),
+    ("neutral", ["你到哪了", "在地铁上", "好的"]),
+    ("neutral", ["帮我带瓶水", "可以，没问题"]),
+    ("neutral", ["今天周几", "周三"]),
+    ("neutral", ["我在图书馆", "嗯嗯，我一会过去"]),
+    ("neutral", ["What time is it", "half past two"]),
+    ("neutral", ["快递放门口了", "收到"]),
+    ("neutral", ["下午去超市吗", "可以"]),
+    # No lexicon cues, sarcasm and mixed signals: these should be escalated
+    ("negative", ["呵呵，真棒", "你又怎么了"]),
+    ("negative", ["随便你吧", "你总是这样"]),
+    ("tense", ["还有十分钟", "我还在路上", "你先进去"]),
+    ("happy", ["升职了", "请你吃饭"]),
+    ("neutral", ["你昨天说的那本书叫什么", "《三体》"]),
+    ("negative", ["哈哈，你开心就好", "我无所谓"]),
+    ("tense", ["医生怎么说", "还在等结果"]),
+    ("happy", ["great, see you there", "can't wait"]),
+]
+
+
+def to_messages(window):
+    return [{"sender": "AB"[i % 2], "content": text} for i, text in enumerate(window)]
+
+
+def run_local(repeats: int) -> dict:
+    lexicon = EmotionLexicon()
+    estimates = [lexicon.score(to_messages(window)) for _, window in SAMPLE]
+    predicted = [max(e.scores, key=e.scores.get) for e in estimates]
+    correct = np.array([p == label for p, (label, _) in zip(predicted, SAMPLE)])
+    confidence = np.array([e.confidence for e in estimates])
+
+    timings = []
+    windows = [to_messages(window) for _, window in SAMPLE]
+    for _ in range(repeats):
+        for messages in windows:
+            start = time.perf_counter()
+            lexicon.score(messages)
+            timings.append(time.perf_counter() - start)
+    timings_us = np.array(timings) * 1e6
+    return {"correct": correct, "confidence": confidence,
+            "p50_us": float(np.percentile(timings_us, 50)), "p99_us": float(np.percentile(timings_us, 99))}
+
+
+def run_service(base_url: str, emotion_mode: str) -> dict:
+    service = AIService(api_key="bench", api_base=base_url, model="mock", emotion_mode=emotion_mode,
+                        emotion_min_confidence=Settings.AI_EMOTION_MIN_CONFIDENCE)
+    start = time.perf_counter()
+    for _, window in SAMPLE:
+        service.analyze_emotion(to_messages(window))
+    elapsed = time.perf_counter() - start
+    service.close()
+    return {"mode": emotion_mode, "elapsed": elapsed, "stats": service.emotion_stats}
+
+
+def run_benchmark(repeats: int = REPEATS):
+    logging.getLogger("core.providers.openai_provider").setLevel(logging.WARNING)
+    local = run_local(repeats)
+    with MockLLMServer(delays={"emotion": ENDPOINT_DELAY}) as server:
+        llm = run_service(server.base_url, "llm")
+        llm_calls = server.requests.get("emotion", 0)
+        hybrid = run_service(server.base_url, "hybrid")
+        hybrid_calls = server.requests.get("emotion", 0) - llm_calls
+
+    threshold = Settings.AI_EMOTION_MIN_CONFIDENCE
+    confident = local["confidence"] >= threshold
+    accuracy = local["correct"].mean()
+    confident_accuracy = local["correct"][confident].mean() if confident.any() else 0.0
+    local_share = confident.mean()
+
+    print("\n=== Local Emotion Scorer Benchmark ===")
+    print(f"Sample: {len(SAMPLE)} labeled windows, confidence threshold {threshold}")
+    print(f"Local accuracy:        {accuracy:.1%} (all windows)")
+    print(f"Confident accuracy:    {confident_accuracy:.1%} ({confident.sum()}/{len(SAMPLE)} windows answered locally)")
+    print(f"Local latency:         p50 {local['p50_us']:.1f} us, p99 {local['p99_us']:.1f} us per window")
+    print(f"LLM mode:              {llm_calls} calls, {llm['elapsed']:.2f} s "
+          f"(endpoint delay {ENDPOINT_DELAY * 1000:.0f} ms)")
+    print(f"Hybrid mode:           {hybrid_calls} calls, {hybrid['elapsed']:.2f} s, stats {hybrid['stats']}")
+
+    if (confident_accuracy >= MIN_CONFIDENT_ACCURACY and local_share >= MIN_LOCAL_SHARE
+            and local["p50_us"] <= MAX_P50_US):
+        print(f"PASS: {local_share:.0%} of windows skip the model at {confident_accuracy:.0%} accuracy.")
+    else:
+        print("FAIL: Local scorer is not accurate or fast enough to replace model calls.")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else REPEATS)
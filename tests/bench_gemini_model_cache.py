@@ -0,0 +1,83 @@
+"""
+Benchmark: per-call overhead of GeminiProvider.generate_content.
+The network layer is stubbed out (GenerativeModel.generate_content returns a
+canned response), so only client-side setup is measured: the old path built a
+GenerativeModel, a ChatSession and a GenerationConfig on every call; the
+provider now reuses a cached model per system prompt and sends the history
+as one contents list.
+
+Usage: python tests/bench_gemini_model_cache.py [num_calls]
+"""
+import sys
+import os
+import logging
+import time
+from unittest.mock import patch
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+import google.generativeai as genai
+
+from core.providers.gemini_provider import GeminiProvider
+
+NUM_CALLS = 2000
+MIN_SPEEDUP = 2.0
+
+SYSTEM_PROMPTS = ["你是一个情绪分析助手。", "你是一个信息提取助手。", "你是一个决策辅助助手。"]
+HISTORY = [
+    {"role": "user" if i % 2 == 0 else "assistant", "content": text}
+    for i, text in enumerate(["这周末有空吗？", "有啊，怎么了", "想约你出去玩", "去哪里呢", "要不去爬山吧"])
+]
+
+
+class _Response:
+    text = "ok"
+
+
+def _stub_generate_content(self, contents, **kwargs):
+    return _Response()
+
+
+def rebuild_per_call(system: str, temperature: float = 0.7, max_tokens: int = 500) -> str:
+    """Setup work the provider used to repeat for every request"""
+    history = [{"role": "model" if m["role"] == "assistant" else "user", "parts": [m["content"]]} for m in HISTORY]
+    last = history.pop()
+    model = genai.GenerativeModel(model_name="gemini-1.5-flash", system_instruction=system)
+    chat = model.start_chat(history=history)
+    config = genai.types.GenerationConfig(temperature=temperature, max_output_tokens=max_tokens)
+    return model.generate_content(chat.history + [last], generation_config=config).text
+
+
+def time_calls(call, num_calls: int) -> float:
+    start = time.perf_counter()
+    for i in range(num_calls):
+        call(SYSTEM_PROMPTS[i % len(SYSTEM_PROMPTS)])
+    return (time.perf_counter() - start) / num_calls * 1e6
+
+
+def run_benchmark(num_calls: int = NUM_CALLS):
+    logging.getLogger("core.providers.gemini_provider").setLevel(logging.WARNING)
+    provider = GeminiProvider(api_key="bench", model="gemini-1.5-flash")
+
+    def cached(system: str) -> str:
+        return provider.generate_content([{"role": "system", "content": system}] + HISTORY)
+
+    with patch.object(genai.GenerativeModel, "generate_content", _stub_generate_content):
+        baseline_us = time_calls(rebuild_per_call, num_calls)
+        cached_us = time_calls(cached, num_calls)
+
+    print("\n=== Gemini Model Cache Benchmark ===")
+    print(f"Calls: {num_calls}, system prompts: {len(SYSTEM_PROMPTS)}, history: {len(HISTORY)} turns")
+    print(f"Rebuild per call:  {baseline_us:.1f} us/call")
+    print(f"Cached model:      {cached_us:.1f} us/call")
+    speedup = baseline_us / cached_us
+    print(f"Speedup: {speedup:.1f}x")
+
+    if speedup >= MIN_SPEEDUP:
+        print(f"PASS: Cached models cut per-call overhead by at least {MIN_SPEEDUP:.0f}x.")
+    else:
+        print("FAIL: Cached models did not cut per-call overhead enough.")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_CALLS)
@@ -0,0 +1,169 @@
+"""
+Benchmark for server-side history stores.
+Appends a public-room-heavy message stream to the SQLite MessageStore and to
+the segmented MessageLog, then measures write throughput, page reads, sync
+pages served from the stored records vs decoded and re-encoded, log reopen
+time and a full client restore (compressed sync pages imported into a fresh
+client database).
+
+Usage: python tests/bench_history_store.py [num_messages]
+"""
+import sys
+import os
+import json
+import random
+import shutil
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.database import Database
+from core.message_log import MessageLog
+from core.message_store import MessageStore
+from core.protocol import client_conversation_id, HistoryPage, decode_history_messages, pack_history_records, pack_message
+
+NUM_MESSAGES = 200_000
+NUM_PAGE_READS = 2_000
+PAGE_SIZE = 50
+SEGMENT_BYTES = 4 * 1024 * 1024
+MIN_SPEEDUP = 1.0
+SYNC_PAGE = 2000
+MAX_RESTORE_S_PER_100K = 10.0
+
+USERS = [f"user-{i}" for i in range(50)]
+
+
+def make_stream(num_messages: int, rng: random.Random):
+    for i in range(num_messages):
+        sender = rng.choice(USERS)
+        if rng.random() < 0.8:
+            key = "public"
+        else:
+            a, b = sorted((sender, rng.choice(USERS)))
+            key = f"dm:{a}:{b}"
+        yield key, sender, sender.upper(), f"message {i} " + "x" * rng.randint(5, 120)
+
+
+def bench_store(name: str, store, stream) -> dict:
+    start = time.perf_counter()
+    for key, sender_id, sender, content in stream:
+        store.append(key, sender_id, sender, content)
+    store.flush()
+    write_s = time.perf_counter() - start
+
+    rng = random.Random(7)
+    newest, _ = store.get_page("public", limit=PAGE_SIZE)
+    top = newest[-1]["seq"]
+    start = time.perf_counter()
+    for _ in range(NUM_PAGE_READS):
+        store.get_page("public", before_seq=rng.randint(PAGE_SIZE, top), limit=PAGE_SIZE)
+    page_ms = (time.perf_counter() - start) / NUM_PAGE_READS * 1000
+
+    return {"name": name, "write_s": write_s, "page_ms": page_ms}
+
+
+def bench_restore(store, user_id: str, db_path: str) -> dict:
+    """Full sync as the client does it: encode page, frame, decode, bulk import"""
+    db = Database(db_path)
+    start = time.perf_counter()
+    after_seq = 0
+    imported = 0
+    wire_bytes = 0
+    while True:
+        rows, has_more = store.get_sync_page(user_id, after_seq=after_seq, limit=SYNC_PAGE)
+        for row in rows:
+            row["conversation_id"] = client_conversation_id(user_id, row.pop("conversation_key"))
+        page = HistoryPage("", rows, has_more, compress=True).to_dict()
+        wire_bytes += len(pack_message(page))
+        messages = decode_history_messages(page)
+        imported += db.import_history(messages)
+        if not has_more or not rows:
+            break
+        after_seq = rows[-1]["seq"]
+    restore_s = time.perf_counter() - start
+    db.close()
+    return {"imported": imported, "restore_s": restore_s, "wire_bytes": wire_bytes}
+
+
+def time_sync_pages(read_page, pack_page):
+    """Serve a user's whole history as sync pages; returns (seconds, messages)"""
+    elapsed = 0.0
+    after_seq = 0
+    count = 0
+    while True:
+        start = time.perf_counter()
+        page, has_more = read_page(after_seq)
+        pack_page(page, has_more)
+        elapsed += time.perf_counter() - start
+        if isinstance(page, bytes):
+            page = json.loads(page)  # only to find the resume point, not part of serving
+        count += len(page)
+        if not has_more or not page:
+            break
+        after_seq = page[-1]["seq"]
+    return elapsed, count
+
+
+def time_reopen(log_dir: str) -> float:
+    start = time.perf_counter()
+    MessageLog(log_dir, segment_max_bytes=SEGMENT_BYTES).close()
+    return time.perf_counter() - start
+
+
+def run_benchmark(num_messages: int = NUM_MESSAGES):
+    tmpdir = tempfile.mkdtemp(prefix="petchat_bench_")
+    try:
+        print(f"Appending {num_messages} messages to each store...")
+        sqlite_store = MessageStore(os.path.join(tmpdir, "server_messages.db"))
+        sqlite_result = bench_store("SQLite (WAL)", sqlite_store, make_stream(num_messages, random.Random(42)))
+        restore = bench_restore(sqlite_store, USERS[0], os.path.join(tmpdir, "petchat.db"))
+        sqlite_store.close()
+
+        log_dir = os.path.join(tmpdir, "server_history")
+        log = MessageLog(log_dir, segment_max_bytes=SEGMENT_BYTES)
+        log_result = bench_store("Segmented log", log, make_stream(num_messages, random.Random(42)))
+        raw_s, raw_count = time_sync_pages(
+            lambda after_seq: log.read_sync_records(USERS[0], after_seq=after_seq, limit=SYNC_PAGE),
+            lambda records, has_more: pack_history_records("", records, has_more)
+        )
+        decoded_s, decoded_count = time_sync_pages(
+            lambda after_seq: log.get_sync_page(USERS[0], after_seq=after_seq, limit=SYNC_PAGE),
+            lambda rows, has_more: pack_message(HistoryPage("", rows, has_more).to_dict())
+        )
+        log.close()
+        reopen_s = time_reopen(log_dir)
+        for name in os.listdir(log_dir):
+            if name.endswith(".keys"):
+                os.remove(os.path.join(log_dir, name))
+        rescan_s = time_reopen(log_dir)  # rebuilds the .keys files
+
+        print("\n=== History Store Benchmark ===")
+        for result in (sqlite_result, log_result):
+            print(f"{result['name']}: {num_messages / result['write_s']:,.0f} msg/s write, "
+                  f"{result['page_ms']:.3f} ms/page ({PAGE_SIZE} msgs)")
+        print(f"Log Sync Pages: stored records {raw_count / raw_s:,.0f} msg/s, "
+              f"decoded + re-encoded {decoded_count / decoded_s:,.0f} msg/s")
+        print(f"Log Reopen: {reopen_s * 1000:.0f} ms from index files, {rescan_s * 1000:.0f} ms rescanning "
+              f"({len([n for n in os.listdir(log_dir) if n.endswith('.log')])} segments)")
+
+        speedup = sqlite_result["write_s"] / log_result["write_s"]
+        print(f"Write Speedup (log vs SQLite): {speedup:.2f}x")
+        restore_per_100k = restore["restore_s"] / max(restore["imported"], 1) * 100_000
+        print(f"Client Restore: {restore['imported']} messages in {restore['restore_s']:.2f} s "
+              f"({restore_per_100k:.2f} s/100k, {restore['wire_bytes'] / 1024 / 1024:.1f} MB on the wire)")
+
+        if raw_count == decoded_count == restore["imported"] and speedup >= MIN_SPEEDUP:
+            print("PASS: Log store writes faster than SQLite and serves every stored record.")
+        else:
+            print("FAIL: Log store did not outperform SQLite or lost records.")
+        if restore_per_100k <= MAX_RESTORE_S_PER_100K:
+            print(f"PASS: Client restore within {MAX_RESTORE_S_PER_100K:.0f}s per 100k messages.")
+        else:
+            print("FAIL: Client restore too slow.")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_MESSAGES)
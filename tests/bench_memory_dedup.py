@@ -0,0 +1,88 @@
+"""
+Benchmark for MinHash/LSH memory near-duplicate detection.
+Indexes a large synthetic memory set and measures per-candidate query latency.
+
+Usage: python tests/bench_memory_dedup.py [num_memories]
+"""
+import sys
+import os
+import random
+import time
+import tracemalloc
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.memory_index import MinHashLSH
+
+NUM_MEMORIES = 100_000
+NUM_QUERIES = 2_000
+MAX_QUERY_MS = 1.0
+
+SUBJECTS = ["我们", "小明", "大家", "你和我", "同学们", "Alice", "Bob"]
+TIMES = ["明天", "下周一", "周末", "月底", "下午三点", "国庆", "寒假", "今晚"]
+ACTIONS = ["去爬山", "一起复习数学", "交实验报告", "聚餐", "看电影", "打羽毛球", "去图书馆", "开组会", "去海边"]
+DETAILS = ["", "记得带水", "在老地方集合", "要提前订票", "别迟到", "AA制", "带上笔记本"]
+COMMON_CJK = [chr(c) for c in range(0x4E00, 0x4E00 + 3000)]
+
+
+def make_memory(rng: random.Random) -> str:
+    """Template phrase plus a random topic so that memories are mostly distinct"""
+    topic = "".join(rng.choice(COMMON_CJK) for _ in range(rng.randint(4, 10)))
+    parts = [rng.choice(SUBJECTS), rng.choice(TIMES), rng.choice(ACTIONS), topic, rng.choice(DETAILS)]
+    return "".join(parts)
+
+
+def paraphrase(text: str, rng: random.Random) -> str:
+    pos = rng.randint(0, len(text))
+    return text[:pos] + rng.choice(["一起", "这个", "记得"]) + text[pos:]
+
+
+def run_benchmark(num_memories: int = NUM_MEMORIES):
+    rng = random.Random(42)
+    index = MinHashLSH()
+    memories = [make_memory(rng) for _ in range(num_memories)]
+
+    print(f"Indexing {num_memories} memories...")
+    tracemalloc.start()
+    start = time.perf_counter()
+    for memory_id, text in enumerate(memories):
+        index.add(memory_id, index.sketch(text))
+    build_s = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    queries = [paraphrase(rng.choice(memories), rng) for _ in range(NUM_QUERIES // 2)]
+    queries += [make_memory(rng) + "全新内容" for _ in range(NUM_QUERIES // 2)]
+
+    latencies = []
+    detected = 0
+    candidate_total = 0
+    for i, text in enumerate(queries):
+        start = time.perf_counter()
+        sketch = index.sketch(text)
+        match = index.query(sketch)
+        latencies.append((time.perf_counter() - start) * 1000)
+        candidate_total += len(index.candidates(sketch))
+        if i < NUM_QUERIES // 2 and match:
+            detected += 1
+
+    latencies.sort()
+    avg = sum(latencies) / len(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+
+    print("\n=== Memory Dedup Benchmark ===")
+    print(f"Index Build: {build_s:.2f} s ({build_s / num_memories * 1e6:.1f} us/memory)")
+    print(f"Index Peak Memory: {peak / 1024 / 1024:.1f} MB")
+    print(f"Avg Candidates/Query: {candidate_total / len(queries):.1f}")
+    print(f"Paraphrase Recall: {detected / (NUM_QUERIES // 2):.1%}")
+    print(f"Average Query Latency: {avg:.3f} ms")
+    print(f"P99 Query Latency: {p99:.3f} ms")
+
+    if avg < MAX_QUERY_MS:
+        print(f"PASS: Average query latency within {MAX_QUERY_MS}ms.")
+    else:
+        print("FAIL: Query latency too high.")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_MEMORIES)
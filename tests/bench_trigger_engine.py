@@ -0,0 +1,72 @@
+"""
+Benchmark: suggestion trigger matching, per-keyword scans vs Aho-Corasick.
+Finds every matching keyword in a stream of chat messages, first with one
+substring scan per keyword (the old check), then with the TriggerEngine
+automaton, for growing keyword dictionaries. The scan cost grows with the
+dictionary; the automaton's single pass does not.
+
+Usage: python tests/bench_trigger_engine.py [num_messages]
+"""
+import sys
+import os
+import random
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from config.settings import Settings
+from core.trigger_engine import TriggerEngine
+
+NUM_MESSAGES = 2000
+DICTIONARY_SIZES = (8, 200, 2000)
+MIN_SPEEDUP_AT_LARGEST = 5.0
+
+MESSAGES = ["在吗", "这周末有空吗？", "想约你出去玩", "去哪里呢", "要不去爬山吧", "好啊，明天计划一下",
+            "今天好累", "晚上一起聚餐吗", "我在图书馆学习", "收到"]
+CJK = "的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年同工动"
+
+
+def build_dictionary(size: int, rng: random.Random):
+    keywords = [k for words in Settings.AI_TRIGGER_INTENTS.values() for k in words]
+    while len(keywords) < size:
+        keywords.append("".join(rng.choice(CJK) for _ in range(rng.randint(2, 4))))
+    return {f"intent{i % 16}": keywords[i::16] for i in range(16)}, keywords
+
+
+def time_per_message(match, messages) -> float:
+    start = time.perf_counter()
+    for text in messages:
+        match(text)
+    return (time.perf_counter() - start) / len(messages) * 1e6
+
+
+def run_benchmark(num_messages: int = NUM_MESSAGES):
+    rng = random.Random(42)
+    messages = [rng.choice(MESSAGES) + "".join(rng.choice(CJK) for _ in range(rng.randint(0, 30)))
+                for _ in range(num_messages)]
+
+    print("\n=== Trigger Engine Benchmark ===")
+    print(f"Messages: {num_messages}")
+    speedup = 0.0
+    for size in DICTIONARY_SIZES:
+        intents, keywords = build_dictionary(size, rng)
+        engine = TriggerEngine(intents)
+        scan_us = time_per_message(lambda text: [k for k in keywords if k in text], messages)
+        automaton_us = time_per_message(engine.match, messages)
+        # Both must find the same keywords
+        for text in messages[:200]:
+            assert sorted({k for k in keywords if k in text}) == sorted(
+                {k for found in engine.match(text).values() for k in found})
+        speedup = scan_us / automaton_us
+        print(f"{size:>5} keywords: scan {scan_us:7.1f} us/msg, automaton {automaton_us:5.1f} us/msg "
+              f"({speedup:.1f}x)")
+
+    if speedup >= MIN_SPEEDUP_AT_LARGEST:
+        print(f"PASS: One automaton pass beats per-keyword scans by {speedup:.0f}x "
+              f"at {DICTIONARY_SIZES[-1]} keywords.")
+    else:
+        print("FAIL: Automaton did not beat per-keyword scans on the largest dictionary.")
+
+
+if __name__ == "__main__":
+    run_benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else NUM_MESSAGES)
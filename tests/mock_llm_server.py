@@ -0,0 +1,142 @@
+"""
+Local OpenAI-compatible /chat/completions server for AI tests and benchmarks.
+Answers each AIService task with a canned JSON reply after a configurable
+delay, chosen by the task's system prompt, and reports prompt/completion
+token usage (approximated as characters / 4). Requests with "stream": true
+get the reply as server-sent events of chunk_size characters, chunk_delay
+seconds apart; with stream_cut_after the body ends after that many events,
+without [DONE].
+
+Usage:
+    with MockLLMServer(delays={"emotion": 0.2}) as server:
+        service = AIService(api_key="test", api_base=server.base_url, model="mock")
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+
+# System-prompt keyword -> task name
+TASK_MARKERS = {
+    "对话分析": "fused",
+    "情绪分析": "emotion",
+    "信息提取": "memories",
+    "决策辅助": "suggestion",
+}
+
+REPLIES = {
+    "emotion": {"neutral": 0.2, "happy": 0.6, "tense": 0.1, "negative": 0.1},
+    "memories": [{"content": "周末一起去爬山", "category": "event"}],
+    "suggestion": {"title": "周末爬山", "content": "早上八点集合，记得带水", "type": "plan"},
+}
+REPLIES["fused"] = dict(REPLIES)
+
+
+class _HTTPServer(ThreadingHTTPServer):
+    # Concurrency benchmarks open hundreds of connections at once
+    request_queue_size = 512
+
+
+def task_of(messages) -> str:
+    system = next((m["content"] for m in messages if m.get("role") == "system"), "")
+    for marker, task in TASK_MARKERS.items():
+        if marker in system:
+            return task
+    return "other"
+
+
+class MockLLMServer:
+    """Threaded mock LLM endpoint; use as a context manager"""
+
+    def __init__(self, delays: Optional[Dict[str, float]] = None, replies: Optional[Dict[str, object]] = None,
+                 chunk_size: int = 8, chunk_delay: float = 0.0, stream_cut_after: Optional[int] = None):
+        self.delays = delays or {}
+        self.replies = dict(REPLIES, **(replies or {}))
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.stream_cut_after = stream_cut_after
+        self.requests: Dict[str, int] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+        self._httpd = _HTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._httpd.server_address[1]}/v1"
+
+    def reply_for(self, task: str, messages) -> str:
+        reply = self.replies.get(task, "null")
+        return reply if isinstance(reply, str) else json.dumps(reply, ensure_ascii=False)
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                messages = body.get("messages", [])
+                task = task_of(messages)
+                time.sleep(server.delays.get(task, 0.0))
+                content = server.reply_for(task, messages)
+                prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+                completion_tokens = len(content) // 4
+                with server._lock:
+                    server.requests[task] = server.requests.get(task, 0) + 1
+                    server.prompt_tokens += prompt_tokens
+                    server.completion_tokens += completion_tokens
+
+                if body.get("stream"):
+                    self._stream(content)
+                    return
+
+                payload = json.dumps({
+                    "choices": [{"message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def _stream(self, content: str):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                pieces = [content[i:i + server.chunk_size] for i in range(0, len(content), server.chunk_size)]
+                if server.stream_cut_after is not None:
+                    pieces = pieces[:server.stream_cut_after]
+                for i, piece in enumerate(pieces):
+                    if i:
+                        time.sleep(server.chunk_delay)
+                    event = {"choices": [{"delta": {"content": piece}, "index": 0}]}
+                    self._write_chunk(f"data: {json.dumps(event, ensure_ascii=False)}\n\n")
+                if server.stream_cut_after is None:
+                    self._write_chunk("data: [DONE]\n\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, text: str):
+                data = text.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self) -> "MockLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,74 @@
+import sys
+import os
+import tempfile
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.ai_cache import AIResultCache, cache_key
+from core.ai_service import AIService
+from core.providers.base import AIProvider
+
+
+class CountingProvider(AIProvider):
+    def __init__(self):
+        super().__init__("test", "counting")
+        self.calls = 0
+
+    def generate_content(self, messages, temperature=0.7, max_tokens=500):
+        self.calls += 1
+        return '{"happy": 1}'
+
+
+class TestAIResultCache(unittest.TestCase):
+
+    def test_key_ignores_whitespace_but_not_task_or_temperature(self):
+        a = [{"role": "user", "content": "Alice:  hi\n Bob: yo"}]
+        b = [{"role": "user", "content": "Alice: hi Bob: yo"}]
+        self.assertEqual(cache_key("emotion", "m", a, 0.3), cache_key("emotion", "m", b, 0.3))
+        self.assertNotEqual(cache_key("emotion", "m", a, 0.3), cache_key("memories", "m", a, 0.3))
+        self.assertNotEqual(cache_key("emotion", "m", a, 0.3), cache_key("emotion", "m", a, 0.5))
+
+    def test_lru_eviction_and_ttl_expiry(self):
+        cache = AIResultCache(max_entries=2, ttl_seconds=0.2)
+        cache.put("a", "1")
+        cache.put("b", "2")
+        cache.get("a")
+        cache.put("c", "3")
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), "1")
+        time.sleep(0.25)
+        self.assertIsNone(cache.get("a"))
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["evictions"]), (2, 2, 1))
+
+    def test_disk_tier_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "ai_cache.db")
+            cache = AIResultCache(db_path=path)
+            cache.put("k", "reply")
+            cache.close()
+
+            cache = AIResultCache(db_path=path)
+            self.assertEqual(cache.get("k"), "reply")
+            self.assertEqual(cache.stats()["disk_hits"], 1)
+            cache.close()
+
+    def test_service_answers_identical_requests_from_cache(self):
+        cache = AIResultCache()
+        service = AIService(api_key="test", api_base="http://127.0.0.1:9/v1", model="counting", cache=cache)
+        service.provider = CountingProvider()
+        context = [{"sender": "Alice", "content": "好开心"}]
+
+        first = service.analyze_emotion(context)
+        second = service.analyze_emotion([{"sender": "Alice", "content": "好开心 "}])
+
+        self.assertEqual(first, second)
+        self.assertEqual(service.provider.calls, 1)
+        self.assertEqual(cache.stats()["hit_rate"], 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
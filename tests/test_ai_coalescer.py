@@ -0,0 +1,92 @@
+import sys
+import os
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.ai_coalescer import AIRequestCoalescer
+
+
+class TestAIRequestCoalescer(unittest.TestCase):
+
+    def test_requests_during_a_run_share_its_result(self):
+        release = threading.Event()
+        started = threading.Event()
+        calls = []
+
+        def run(payload, on_stage):
+            calls.append(payload)
+            started.set()
+            release.wait(2)
+            return f"result:{payload}"
+
+        coalescer = AIRequestCoalescer(run)
+        first = coalescer.submit("conv", "ctx-1")
+        self.assertTrue(started.wait(2))
+        second = coalescer.submit("conv", "ctx-2")
+        other = coalescer.submit("other", "ctx-3")
+        release.set()
+
+        self.assertIs(first, second)
+        self.assertEqual(first.result(2), "result:ctx-1")
+        self.assertEqual(other.result(2), "result:ctx-3")
+        self.assertEqual(sorted(calls), ["ctx-1", "ctx-3"])
+        stats = coalescer.stats()
+        self.assertEqual((stats["requests"], stats["runs"], stats["joined_running"]), (3, 2, 1))
+        coalescer.shutdown()
+
+    def test_debounce_runs_once_on_the_latest_payload(self):
+        calls = []
+        coalescer = AIRequestCoalescer(lambda payload, on_stage: calls.append(payload) or payload,
+                                       debounce_seconds=0.2)
+        futures = [coalescer.submit("conv", f"ctx-{i}") for i in range(5)]
+
+        self.assertEqual({f.result(2) for f in futures}, {"ctx-4"})
+        self.assertEqual(calls, ["ctx-4"])
+        self.assertEqual(coalescer.stats()["debounced"], 4)
+
+        # Once finished, the next request starts a fresh run
+        self.assertEqual(coalescer.submit("conv", "ctx-5").result(2), "ctx-5")
+        self.assertEqual(len(calls), 2)
+        coalescer.shutdown()
+
+    def test_late_listener_gets_finished_stages_replayed(self):
+        emotion_sent = threading.Event()
+        release = threading.Event()
+
+        def run(payload, on_stage):
+            on_stage("emotion")
+            emotion_sent.set()
+            release.wait(2)
+            on_stage("suggestion")
+            return "done"
+
+        coalescer = AIRequestCoalescer(run)
+        early, late = [], []
+        coalescer.submit("conv", "ctx", on_stage=early.append)
+        self.assertTrue(emotion_sent.wait(2))
+        future = coalescer.submit("conv", "ctx", on_stage=late.append)
+        release.set()
+        future.result(2)
+
+        self.assertEqual(early, ["emotion", "suggestion"])
+        self.assertEqual(late, ["emotion", "suggestion"])
+        coalescer.shutdown()
+
+    def test_failure_reaches_every_requester(self):
+        def run(payload, on_stage):
+            time.sleep(0.05)
+            raise RuntimeError("model unavailable")
+
+        coalescer = AIRequestCoalescer(run, debounce_seconds=0.05)
+        futures = [coalescer.submit("conv", i) for i in range(3)]
+        for future in futures:
+            self.assertIsInstance(future.exception(2), RuntimeError)
+        self.assertEqual(coalescer.stats()["pending"], 0)
+        coalescer.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import sys
+import os
+import json
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.ai_pipeline import AIPipeline
+from core.ai_service import AIService
+from core.providers.base import AIProvider
+
+
+CONTEXT = [
+    {"sender": "Alice", "content": "周末一起去爬山吧"},
+    {"sender": "Bob", "content": "好啊，明天计划一下"},
+]
+
+
+class ScriptedProvider(AIProvider):
+    """Replies by system prompt: 'fused' for analyze_all, otherwise per task"""
+
+    def __init__(self, fused_reply: str):
+        super().__init__("test", "scripted")
+        self.fused_reply = fused_reply
+        self.calls = []
+
+    def generate_content(self, messages, temperature=0.7, max_tokens=500):
+        system = messages[0]["content"]
+        if "对话分析" in system:
+            self.calls.append("fused")
+            return self.fused_reply
+        if "情绪" in system:
+            self.calls.append("emotion")
+            return '{"neutral": 1}'
+        if "信息提取" in system:
+            self.calls.append("memories")
+            return '[{"content": "周末爬山", "category": "event"}]'
+        self.calls.append("suggestion")
+        return '{"title": "t", "content": "c", "type": "plan"}'
+
+
+def make_service(fused_reply: str) -> AIService:
+    service = AIService(api_key="test", api_base="http://127.0.0.1:9/v1", model="scripted", analysis_mode="fused")
+    service.provider = ScriptedProvider(fused_reply)
+    return service
+
+
+class TestFusedAnalysis(unittest.TestCase):
+
+    def test_single_call_parses_fenced_reply(self):
+        reply = "```json\n" + json.dumps({
+            "emotion": {"happy": 3, "neutral": 1},
+            "memories": [{"content": "周末去爬山", "category": "event"}, {"category": "broken"}],
+            "suggestion": {"title": "爬山计划", "content": "八点出发", "type": "plan"}
+        }, ensure_ascii=False) + "\n```"
+        service = make_service(reply)
+
+        result = service.analyze_all(CONTEXT)
+
+        self.assertEqual(service.provider.calls, ["fused"])
+        self.assertAlmostEqual(result["emotion"]["happy"], 0.75)
+        self.assertEqual([m["content"] for m in result["memories"]], ["周末去爬山"])
+        self.assertEqual(result["suggestion"]["title"], "爬山计划")
+
+    def test_unparseable_reply_falls_back_to_separate_calls(self):
+        service = make_service("抱歉，我无法完成。")
+
+        result = service.analyze_all(CONTEXT)
+
+        self.assertEqual(service.provider.calls, ["fused", "emotion", "memories", "suggestion"])
+        self.assertEqual(result["emotion"]["neutral"], 1.0)
+        self.assertEqual(result["suggestion"]["type"], "plan")
+        self.assertEqual(service.analysis_stats, {"fused_calls": 1, "fused_fallbacks": 1})
+
+    def test_pipeline_only_reruns_missing_sections(self):
+        service = make_service('{"emotion": {"tense": 1}, "suggestion": null}')
+        pipeline = AIPipeline(service)
+        results = pipeline.run(CONTEXT)
+        pipeline.shutdown()
+
+        self.assertEqual(service.provider.calls, ["fused", "memories"])
+        self.assertIsNone(results["suggestion"].value)
+        self.assertEqual(results["memories"].value[0]["category"], "event")
+
+    def test_auto_mode_follows_provider(self):
+        service = make_service("{}")
+        service.analysis_mode = "auto"
+        self.assertFalse(service.use_fused_analysis)
+        service.provider.supports_fused_analysis = True
+        self.assertTrue(service.use_fused_analysis)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,61 @@
+import sys
+import os
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.ai_pipeline import AIPipeline, STAGES
+from core.ai_service import AIService
+from tests.mock_llm_server import MockLLMServer
+
+
+CONTEXT = [
+    {"sender": "Alice", "content": "周末一起去爬山吧"},
+    {"sender": "Bob", "content": "好啊，明天计划一下"},
+]
+
+
+class TestAIPipeline(unittest.TestCase):
+
+    def test_stages_run_concurrently_and_stream_in_completion_order(self):
+        delays = {"emotion": 0.05, "memories": 0.4, "suggestion": 0.2}
+        with MockLLMServer(delays=delays) as server:
+            pipeline = AIPipeline(AIService(api_key="test", api_base=server.base_url, model="mock"))
+            order = []
+            start = time.perf_counter()
+            results = pipeline.run(CONTEXT, on_stage=lambda r: order.append((r.stage, time.perf_counter() - start)))
+            elapsed = time.perf_counter() - start
+            pipeline.shutdown()
+
+        self.assertEqual([stage for stage, _ in order], ["emotion", "suggestion", "memories"])
+        self.assertLess(order[0][1], delays["memories"])
+        self.assertLess(elapsed, sum(delays.values()))
+        self.assertAlmostEqual(results["emotion"].value["happy"], 0.6)
+        self.assertEqual(results["suggestion"].value["type"], "plan")
+
+    def test_failed_stage_does_not_block_the_others(self):
+        class FlakyService:
+            def analyze_emotion(self, messages):
+                return {"neutral": 1.0}
+
+            def extract_memories(self, messages):
+                raise RuntimeError("model unavailable")
+
+            def generate_suggestion(self, messages):
+                return None
+
+        pipeline = AIPipeline(FlakyService())
+        results = pipeline.run(CONTEXT)
+        pipeline.shutdown()
+
+        self.assertEqual(set(results), set(STAGES))
+        self.assertEqual(results["emotion"].value, {"neutral": 1.0})
+        self.assertIn("model unavailable", results["memories"].error)
+        stats = pipeline.metrics.snapshot()
+        self.assertEqual(stats["memories"]["errors"], 1)
+        self.assertEqual(stats["emotion"]["count"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
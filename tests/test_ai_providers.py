@@ -90,7 +90,7 @@ class TestRetryDecorator(unittest.TestCase):
 
 class TestOpenAIProvider(unittest.TestCase):
     
-    @patch('core.providers.openai_provider.requests.post')
+    @patch('core.providers.openai_provider.requests.Session.post')
     def test_successful_request(self, mock_post):
         mock_response = Mock()
         mock_response.status_code = 200
@@ -108,7 +108,7 @@ class TestOpenAIProvider(unittest.TestCase):
         self.assertEqual(result, "Hello, world!")
         mock_post.assert_called_once()
     
-    @patch('core.providers.openai_provider.requests.post')
+    @patch('core.providers.openai_provider.requests.Session.post')
     def test_retry_on_connection_error(self, mock_post):
         import requests
         
@@ -131,6 +131,188 @@ class TestOpenAIProvider(unittest.TestCase):
         self.assertEqual(mock_post.call_count, 3)
 
 
+class TestOpenAIProviderConnectionPool(unittest.TestCase):
+    
+    def test_sequential_requests_reuse_one_connection(self):
+        from core.providers.openai_provider import OpenAIProvider
+        from tests.mock_llm_server import MockLLMServer
+        
+        with MockLLMServer(replies={"other": "pong"}) as server:
+            provider = OpenAIProvider(api_key="test-key", model="mock", base_url=server.base_url)
+            for _ in range(5):
+                self.assertEqual(provider.generate_content([{"role": "user", "content": "ping"}]), "pong")
+            stats = provider.connection_stats()
+            provider.close()
+        
+        self.assertEqual(stats["requests"], 5)
+        self.assertEqual(stats["connections_opened"], 1)
+        self.assertEqual(stats["reused"], 4)
+    
+    def test_concurrent_requests_stay_within_pool_size(self):
+        from concurrent.futures import ThreadPoolExecutor
+        from core.providers.openai_provider import OpenAIProvider
+        from tests.mock_llm_server import MockLLMServer
+        
+        with MockLLMServer(delays={"other": 0.05}, replies={"other": "pong"}) as server:
+            provider = OpenAIProvider(api_key="test-key", model="mock", base_url=server.base_url, pool_size=3)
+            messages = [{"role": "user", "content": "ping"}]
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                for _ in range(4):
+                    replies = list(pool.map(lambda _: provider.generate_content(messages), range(3)))
+                    self.assertEqual(replies, ["pong"] * 3)
+            stats = provider.connection_stats()
+            provider.close()
+        
+        self.assertEqual(stats["requests"], 12)
+        self.assertLessEqual(stats["connections_opened"], 3)
+        self.assertGreaterEqual(stats["reuse_rate"], 0.75)
+
+
+class TestAsyncProviders(unittest.TestCase):
+    
+    def test_async_retry_backs_off_then_succeeds(self):
+        import asyncio
+        from core.providers.retry import async_retry_with_backoff
+        attempts = []
+        
+        @async_retry_with_backoff(max_attempts=3, base_delay=0.01)
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise ConnectionError("Connection failed")
+            return "success"
+        
+        self.assertEqual(asyncio.run(flaky()), "success")
+        self.assertEqual(len(attempts), 3)
+    
+    def test_openai_agenerate_runs_concurrently_on_one_loop(self):
+        import asyncio
+        import threading
+        from core.providers.openai_provider import OpenAIProvider
+        from tests.mock_llm_server import MockLLMServer
+        
+        with MockLLMServer(delays={"other": 0.2}, replies={"other": "pong"}) as server:
+            provider = OpenAIProvider(api_key="test-key", model="mock", base_url=server.base_url)
+            messages = [{"role": "user", "content": "ping"}]
+            
+            async def burst():
+                first = await asyncio.gather(*(provider.agenerate_content(messages) for _ in range(20)))
+                second = await asyncio.gather(*(provider.agenerate_content(messages) for _ in range(20)))
+                stats = dict(provider._async_client.stats)
+                await provider.aclose()
+                return first + second, stats
+            
+            threads_before = threading.active_count()
+            start = time.perf_counter()
+            replies, stats = asyncio.run(burst())
+            elapsed = time.perf_counter() - start
+        
+        self.assertEqual(replies, ["pong"] * 40)
+        self.assertLess(elapsed, 1.0)  # two rounds of 20 x 0.2s, not 40 x 0.2s
+        self.assertEqual(stats["requests"], 40)
+        self.assertEqual(stats["connections_opened"], 20)  # the second round reuses the first round's sockets
+        self.assertLessEqual(threading.active_count(), threads_before + 1)
+    
+    @staticmethod
+    def _serve(replies, posts=2):
+        """
+        Raw HTTP server answering the n-th request with replies[n](writer);
+        returns (coroutine making `posts` requests, request count list).
+        """
+        import asyncio
+        from core.providers.async_http import AsyncHTTPClient
+        received = []
+
+        async def handle(reader, writer):
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = int(head.lower().split(b"content-length:")[1].split(b"\r\n")[0])
+                await reader.readexactly(length)
+                received.append(1)
+                if not await replies[len(received) - 1](writer):
+                    writer.close()
+                    return
+
+        async def run():
+            server = await asyncio.start_server(handle, "127.0.0.1", 0)
+            url = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}/v1/chat"
+            client = AsyncHTTPClient()
+            results = []
+            try:
+                for _ in range(posts):
+                    try:
+                        results.append(await client.post_json(url, {"n": 1}, timeout=2))
+                    except Exception as e:
+                        results.append(type(e))
+            finally:
+                await client.aclose()
+                server.close()
+            return results, client.stats["connections_opened"]
+        return run, received
+
+    @staticmethod
+    async def _reply(writer, body=b'{"ok": 1}', keep_alive=True, length=True):
+        head = "HTTP/1.1 200 OK\r\n"
+        if length:
+            head += f"Content-Length: {len(body)}\r\n"
+        writer.write((head + "\r\n").encode() + body)
+        await writer.drain()
+        return keep_alive
+
+    def test_stale_idle_connection_is_resent_only_without_a_reply(self):
+        import asyncio
+
+        async def close_silently(writer):
+            return False
+
+        async def cut_off(writer):
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 50\r\n\r\n{")
+            await writer.drain()
+            return False
+
+        # Second request hits a connection the server drops without answering: resent on a new one
+        run, received = self._serve([self._reply, close_silently, self._reply])
+        results, opened = asyncio.run(run())
+        self.assertEqual(results, [{"ok": 1}, {"ok": 1}])
+        self.assertEqual((len(received), opened), (3, 2))
+
+        # Part of the reply arrived: the server may have acted on the POST, so it is not resent
+        run, received = self._serve([self._reply, cut_off])
+        results, opened = asyncio.run(run())
+        self.assertEqual(results, [{"ok": 1}, asyncio.IncompleteReadError])
+        self.assertEqual(len(received), 2)
+
+    def test_reply_without_length_is_read_until_close(self):
+        import asyncio
+
+        async def no_content(writer):
+            writer.write(b"HTTP/1.1 204 No Content\r\n\r\n")
+            await writer.drain()
+            return True
+
+        async def unframed(writer):
+            await self._reply(writer, length=False)
+            return False
+
+        run, received = self._serve([no_content, unframed, self._reply], posts=3)
+        start = time.perf_counter()
+        results, opened = asyncio.run(run())
+        self.assertLess(time.perf_counter() - start, 1.0)  # the 204 is not read until the timeout
+        self.assertEqual(results, [None, {"ok": 1}, {"ok": 1}])
+        self.assertEqual(opened, 2)  # reused after the 204, not after the unframed reply
+
+    def test_default_agenerate_wraps_the_blocking_call(self):
+        import asyncio
+        from core.providers.base import AIProvider
+        
+        class EchoProvider(AIProvider):
+            def generate_content(self, messages, temperature=0.7, max_tokens=500):
+                return messages[-1]["content"]
+        
+        provider = EchoProvider(api_key="k", model="echo")
+        self.assertEqual(asyncio.run(provider.agenerate_content([{"role": "user", "content": "hi"}])), "hi")
+
+
 class TestProviderFactory(unittest.TestCase):
     
     def test_auto_detect_gemini_by_model_prefix(self):
@@ -193,24 +375,64 @@ class TestGeminiProvider(unittest.TestCase):
     @patch('core.providers.gemini_provider.genai')
     def test_generate_content_success(self, mock_genai):
         mock_model = MagicMock()
-        mock_chat = MagicMock()
         mock_response = MagicMock()
         mock_response.text = "  Hello from Gemini!  "
         
         mock_genai.GenerativeModel.return_value = mock_model
-        mock_model.start_chat.return_value = mock_chat
-        mock_chat.send_message.return_value = mock_response
+        mock_model.generate_content.return_value = mock_response
         
         from core.providers.gemini_provider import GeminiProvider
         provider = GeminiProvider(api_key="test-key", model="gemini-1.5-pro")
         
         result = provider.generate_content([
             {"role": "system", "content": "You are helpful."},
+            {"role": "assistant", "content": "Hello"},
             {"role": "user", "content": "Hi"}
         ])
         
         self.assertEqual(result, "Hello from Gemini!")
         mock_genai.GenerativeModel.assert_called_once()
+        contents = mock_model.generate_content.call_args[0][0]
+        self.assertEqual(contents, [{"role": "model", "parts": ["Hello"]}, {"role": "user", "parts": ["Hi"]}])
+    
+    @patch('core.providers.gemini_provider.genai')
+    def test_models_are_cached_per_system_instruction(self, mock_genai):
+        mock_genai.GenerativeModel.side_effect = lambda **kwargs: MagicMock(
+            generate_content=MagicMock(return_value=MagicMock(text=kwargs["system_instruction"] or ""))
+        )
+        
+        from core.providers.gemini_provider import GeminiProvider
+        provider = GeminiProvider(api_key="test-key", model="gemini-1.5-pro", model_cache_size=2)
+        
+        def ask(system):
+            return provider.generate_content([
+                {"role": "system", "content": system},
+                {"role": "user", "content": "Hi"}
+            ])
+        
+        for system in ["A", "B", "A", "B", "A"]:
+            self.assertEqual(ask(system), system)
+        self.assertEqual(mock_genai.GenerativeModel.call_count, 2)
+        
+        # "C" evicts the least recently used prompt ("B")
+        ask("C")
+        ask("A")
+        ask("B")
+        self.assertEqual(mock_genai.GenerativeModel.call_count, 4)
+    
+    @patch('core.providers.gemini_provider.genai')
+    def test_stream_content_yields_chunks(self, mock_genai):
+        mock_model = MagicMock()
+        mock_model.generate_content.return_value = iter([MagicMock(text="周末"), MagicMock(text=""), MagicMock(text="爬山")])
+        mock_genai.GenerativeModel.return_value = mock_model
+        
+        from core.providers.gemini_provider import GeminiProvider
+        provider = GeminiProvider(api_key="test-key", model="gemini-1.5-pro")
+        
+        chunks = list(provider.stream_content([{"role": "user", "content": "Hi"}]))
+        
+        self.assertEqual(chunks, ["周末", "爬山"])
+        self.assertTrue(mock_model.generate_content.call_args.kwargs["stream"])
 
 
 if __name__ == "__main__":
@@ -0,0 +1,151 @@
+import sys
+import os
+import asyncio
+import logging
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.providers import AIProvider, CircuitBreaker, OpenAIProvider, ResilientProvider, create_provider
+from tests.mock_llm_server import MockLLMServer
+
+MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+class FakeProvider(AIProvider):
+    def __init__(self, model, reply="ok", delay=0.0):
+        super().__init__(api_key="test", model=model)
+        self.reply = reply
+        self.delay = delay
+        self.calls = 0
+
+    def generate_content(self, messages, temperature=0.7, max_tokens=500):
+        self.calls += 1
+        time.sleep(self.delay)
+        return self.reply
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_on_error_rate_and_recovers_through_one_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(error_rate=0.5, window_seconds=10, min_requests=4, cooldown_seconds=5, clock=clock)
+        for ok in (True, False, True):
+            breaker.record(ok)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        breaker.record(False)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow())
+
+        clock.now = 5.0
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())  # only one probe while half-open
+        breaker.record(False)
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+
+        clock.now = 10.0
+        self.assertTrue(breaker.allow())
+        breaker.record(True)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.times_opened, 2)
+
+    def test_old_failures_leave_the_window(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(error_rate=0.5, window_seconds=10, min_requests=3, clock=clock)
+        breaker.record(False)
+        breaker.record(False)
+        clock.now = 11.0
+        breaker.record(False)
+        breaker.record(True)
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+
+class TestResilientProvider(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger("core.providers.resilient").setLevel(logging.CRITICAL)
+
+    def test_fails_over_in_order_and_stops_calling_an_open_primary(self):
+        primary = FakeProvider("primary", reply=None)
+        secondary = FakeProvider("secondary", reply="from secondary")
+        chain = ResilientProvider([primary, secondary], breaker={"min_requests": 3, "cooldown_seconds": 60})
+
+        replies = [chain.generate_content(MESSAGES) for _ in range(6)]
+
+        self.assertEqual(replies, ["from secondary"] * 6)
+        self.assertEqual(primary.calls, 3)
+        self.assertEqual(secondary.calls, 6)
+        stats = chain.stats()
+        self.assertEqual(stats["failovers"], 3)
+        self.assertEqual(stats["providers"][0]["state"], CircuitBreaker.OPEN)
+
+    def test_all_circuits_open_fails_fast(self):
+        broken = FakeProvider("broken", reply=None, delay=0.05)
+        chain = ResilientProvider([broken], breaker={"min_requests": 2, "cooldown_seconds": 60})
+        chain.generate_content(MESSAGES)
+        chain.generate_content(MESSAGES)
+
+        start = time.perf_counter()
+        self.assertIsNone(chain.generate_content(MESSAGES))
+        self.assertLess(time.perf_counter() - start, 0.01)
+        self.assertEqual(broken.calls, 2)
+        self.assertEqual(chain.stats()["rejected"], 1)
+
+    def test_slow_primary_is_hedged_to_the_secondary(self):
+        primary = FakeProvider("primary", reply="slow", delay=1.0)
+        secondary = FakeProvider("secondary", reply="fast")
+        chain = ResilientProvider([primary, secondary], hedge=True, hedge_delay_seconds=0.1)
+
+        start = time.perf_counter()
+        reply = chain.generate_content(MESSAGES)
+        elapsed = time.perf_counter() - start
+        chain.close()
+
+        self.assertEqual(reply, "fast")
+        self.assertLess(elapsed, 0.5)
+        stats = chain.stats()
+        self.assertEqual((stats["hedges"], stats["hedge_wins"]), (1, 1))
+
+    def test_async_calls_fail_over(self):
+        chain = ResilientProvider([FakeProvider("primary", reply=None), FakeProvider("secondary", reply="async ok")])
+        self.assertEqual(asyncio.run(chain.agenerate_content(MESSAGES)), "async ok")
+
+
+class TestResilientFactory(unittest.TestCase):
+
+    def test_factory_builds_the_failover_chain_from_config(self):
+        logging.getLogger("core.providers.openai_provider").setLevel(logging.CRITICAL)
+        with MockLLMServer(replies={"other": "pong"}) as server:
+            provider = create_provider(
+                api_key="test", model="primary", base_url="http://127.0.0.1:9/v1", timeout=2.0,
+                fallbacks=[{"model": "backup", "base_url": server.base_url, "provider_type": "openai"}],
+                resilience={"breaker": {"min_requests": 2}}
+            )
+            self.assertIsInstance(provider, ResilientProvider)
+            self.assertEqual([p.model for p in provider.providers], ["primary", "backup"])
+            self.assertTrue(all(isinstance(p, OpenAIProvider) and p.max_attempts == 1 for p in provider.providers))
+
+            start = time.perf_counter()
+            self.assertEqual(provider.generate_content(MESSAGES), "pong")
+            # One attempt on the dead primary, no 1s/2s backoff before failing over
+            self.assertLess(time.perf_counter() - start, 1.0)
+            provider.close()
+
+    def test_factory_without_fallbacks_returns_the_plain_provider(self):
+        provider = create_provider(api_key="test", model="gpt-4o-mini", base_url="http://127.0.0.1:9/v1")
+        self.assertIsInstance(provider, OpenAIProvider)
+        self.assertEqual(provider.max_attempts, 3)
+        provider.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import sys
+import os
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.ai_coalescer import AIRequestCoalescer
+from core.ai_scheduler import (
+    AIScheduler, DeadlineExpiredError, QueueFullError, PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+)
+
+
+class TestAIScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.gate = threading.Event()
+        self.blocker_started = threading.Event()
+
+    def _block_worker(self, scheduler):
+        """Occupy the single worker so jobs queue up behind it"""
+        def blocker():
+            self.blocker_started.set()
+            self.gate.wait(2)
+        scheduler.submit(blocker, flow="blocker")
+        self.assertTrue(self.blocker_started.wait(2))
+
+    def test_interactive_runs_before_background(self):
+        scheduler = AIScheduler(max_workers=1)
+        self._block_worker(scheduler)
+        order = []
+        futures = [scheduler.submit(order.append, name, flow=name, priority=priority)
+                   for name, priority in [("bg-1", PRIORITY_BACKGROUND), ("bg-2", PRIORITY_BACKGROUND),
+                                          ("ai", PRIORITY_INTERACTIVE)]]
+        self.gate.set()
+        for future in futures:
+            future.result(2)
+        self.assertEqual(order, ["ai", "bg-1", "bg-2"])
+        scheduler.shutdown()
+
+    def test_flows_are_served_fairly(self):
+        scheduler = AIScheduler(max_workers=1)
+        self._block_worker(scheduler)
+        order = []
+        # A chatty room floods the queue before a quiet one asks once
+        futures = [scheduler.submit(order.append, "busy", flow="busy") for _ in range(5)]
+        futures.append(scheduler.submit(order.append, "quiet", flow="quiet"))
+        self.gate.set()
+        for future in futures:
+            future.result(2)
+        self.assertLessEqual(order.index("quiet"), 1)
+        scheduler.shutdown()
+
+    def test_full_queue_sheds_background_then_rejects(self):
+        scheduler = AIScheduler(max_workers=1, max_queue=2)
+        self._block_worker(scheduler)
+        background = [scheduler.submit(lambda: "bg", flow=f"bg-{i}", priority=PRIORITY_BACKGROUND)
+                      for i in range(2)]
+
+        interactive = scheduler.submit(lambda: "ai", flow="ai")
+        self.assertIsInstance(background[1].exception(1), QueueFullError)
+        with self.assertRaises(QueueFullError):
+            scheduler.submit(lambda: "bg", flow="bg-3", priority=PRIORITY_BACKGROUND)
+
+        self.gate.set()
+        self.assertEqual(interactive.result(2), "ai")
+        self.assertEqual(background[0].result(2), "bg")
+        stats = scheduler.stats()
+        self.assertEqual((stats["shed"], stats["rejected"], stats["max_depth"]), (1, 1, 2))
+        scheduler.shutdown()
+
+    def test_stale_jobs_are_dropped_at_their_deadline(self):
+        scheduler = AIScheduler(max_workers=1, deadlines={PRIORITY_BACKGROUND: 0.05})
+        self._block_worker(scheduler)
+        ran = []
+        stale = scheduler.submit(ran.append, "stale", priority=PRIORITY_BACKGROUND)
+        fresh = scheduler.submit(ran.append, "fresh", priority=PRIORITY_INTERACTIVE)
+        time.sleep(0.1)
+        self.gate.set()
+
+        self.assertIsInstance(stale.exception(2), DeadlineExpiredError)
+        fresh.result(2)
+        self.assertEqual(ran, ["fresh"])
+        stats = scheduler.stats()
+        self.assertEqual(stats["expired"], 1)
+        self.assertGreaterEqual(stats["wait_max"], 0.1)
+        scheduler.shutdown()
+
+    def test_coalescer_debounces_through_the_scheduler(self):
+        scheduler = AIScheduler(max_workers=1)
+        calls = []
+        coalescer = AIRequestCoalescer(lambda payload, on_stage: calls.append(payload) or payload,
+                                       debounce_seconds=0.1, scheduler=scheduler)
+        futures = [coalescer.submit("conv", i, priority=PRIORITY_BACKGROUND) for i in range(3)]
+        self.assertEqual({f.result(2) for f in futures}, {2})
+        self.assertEqual(calls, [2])
+        self.assertEqual(scheduler.stats()["completed"], 1)
+        scheduler.shutdown()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,127 @@
+import sys
+import os
+import json
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.ai_cache import AIResultCache
+from core.ai_pipeline import AIPipeline, StageResult, SuggestionDelta, stage_message
+from core.ai_service import AIService
+from core.ai_stream import StreamingJSONFields
+from core.providers import IncompleteStreamError, ResilientProvider
+from core.providers.openai_provider import OpenAIProvider
+from tests.mock_llm_server import MockLLMServer
+
+
+CONTEXT = [
+    {"sender": "Alice", "content": "周末一起去爬山吧"},
+    {"sender": "Bob", "content": "好啊，明天计划一下"},
+]
+
+
+class TestStreamingJSONFields(unittest.TestCase):
+
+    def test_fields_decode_incrementally_across_escapes(self):
+        suggestion = {"title": "周末\"爬山\"", "content": "第一步：集合\n第二步：出发 🏔 \\ 完成", "type": "plan"}
+        for ensure_ascii in (True, False):
+            text = json.dumps(suggestion, ensure_ascii=ensure_ascii)
+            fields = StreamingJSONFields(("title", "content"))
+            streamed = []
+            for char in text:
+                streamed.append(fields.feed(char).get("content", ""))
+            self.assertEqual("".join(streamed), suggestion["content"])
+            self.assertEqual(fields.values["title"], suggestion["title"])
+
+    def test_fields_after_marker_skip_earlier_sections(self):
+        text = json.dumps({"memories": [{"content": "记忆"}], "suggestion": {"title": "建议", "content": "内容"}},
+                          ensure_ascii=False)
+        fields = StreamingJSONFields(("title", "content"), after='"suggestion"')
+        for i in range(0, len(text), 5):
+            fields.feed(text[i:i + 5])
+        self.assertEqual(fields.values, {"title": "建议", "content": "内容"})
+
+
+class TestStreamingResponses(unittest.TestCase):
+
+    def test_openai_stream_yields_chunks_and_reuses_the_connection(self):
+        with MockLLMServer(replies={"other": "流式回复的完整内容"}, chunk_size=3) as server:
+            provider = OpenAIProvider(api_key="test-key", model="mock", base_url=server.base_url)
+            messages = [{"role": "user", "content": "ping"}]
+            chunks = list(provider.stream_content(messages))
+            again = list(provider.stream_content(messages))
+            stats = provider.connection_stats()
+            provider.close()
+
+        self.assertEqual(chunks, ["流式回", "复的完", "整内容"])
+        self.assertEqual(again, chunks)
+        self.assertEqual(stats["connections_opened"], 1)
+
+    def test_stream_without_done_is_incomplete_and_not_cached(self):
+        with MockLLMServer(chunk_size=4, stream_cut_after=2) as server:
+            provider = OpenAIProvider(api_key="test-key", model="mock", base_url=server.base_url)
+            with self.assertRaises(IncompleteStreamError):
+                list(provider.stream_content([{"role": "user", "content": "ping"}]))
+            provider.close()
+
+            cache = AIResultCache()
+            service = AIService(api_key="test", api_base=server.base_url, model="mock", cache=cache)
+            deltas = []
+            first = service.generate_suggestion(CONTEXT, on_delta=lambda title, text: deltas.append(text))
+            again = service.generate_suggestion(CONTEXT, on_delta=lambda title, text: deltas.append(text))
+            calls = server.requests["suggestion"]
+            service.close()
+
+        self.assertIsNone(first)
+        self.assertIsNone(again)
+        self.assertEqual(calls, 2)  # the cut-off reply was not cached
+        self.assertEqual(cache.stats()["entries"], 0)
+
+    def test_resilient_stream_cut_off_counts_as_a_failure(self):
+        with MockLLMServer(chunk_size=4, stream_cut_after=2) as server:
+            member = OpenAIProvider(api_key="test-key", model="mock", base_url=server.base_url)
+            chain = ResilientProvider([member])
+            with self.assertRaises(IncompleteStreamError):
+                list(chain.stream_content([{"role": "user", "content": "ping"}]))
+            stats = chain.stats()["providers"][0]
+            chain.close()
+
+        self.assertEqual((stats["calls"], stats["failures"]), (1, 1))
+
+    def test_suggestion_deltas_arrive_before_the_reply_completes(self):
+        with MockLLMServer(chunk_size=4, chunk_delay=0.05) as server:
+            service = AIService(api_key="test", api_base=server.base_url, model="mock")
+            start = time.perf_counter()
+            deltas = []
+            suggestion = service.generate_suggestion(
+                CONTEXT, on_delta=lambda title, text: deltas.append((title, text, time.perf_counter() - start))
+            )
+            elapsed = time.perf_counter() - start
+
+        self.assertEqual(suggestion["title"], "周末爬山")
+        self.assertEqual("".join(text for _, text, _ in deltas), suggestion["content"])
+        self.assertGreater(len(deltas), 1)
+        self.assertEqual(deltas[-1][0], "周末爬山")
+        # Content starts mid-reply (after the title) but well before the last chunk
+        self.assertLess(deltas[0][2], elapsed - 0.15)
+
+    def test_pipeline_streams_deltas_before_the_final_stage(self):
+        with MockLLMServer(chunk_size=4) as server:
+            pipeline = AIPipeline(AIService(api_key="test", api_base=server.base_url, model="mock",
+                                            analysis_mode="separate"))
+            events = []
+            pipeline.run(CONTEXT, on_stage=events.append, on_delta=events.append)
+            first_token = pipeline.metrics.snapshot()["suggestion"]["first_token_p50"]
+            pipeline.shutdown()
+
+        suggestion_events = [e for e in events if isinstance(e, SuggestionDelta) or e.stage == "suggestion"]
+        self.assertIsInstance(suggestion_events[0], SuggestionDelta)
+        self.assertIsInstance(suggestion_events[-1], StageResult)
+        self.assertEqual("".join(e.text for e in suggestion_events[:-1]), suggestion_events[-1].value["content"])
+        self.assertGreater(first_token, 0)
+        self.assertEqual(stage_message("public", suggestion_events[0])["type"], "ai_suggestion_delta")
+
+
+if __name__ == "__main__":
+    unittest.main()
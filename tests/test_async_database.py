@@ -0,0 +1,84 @@
+import sys
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from PyQt6.QtCore import QCoreApplication
+
+from core.async_database import AsyncDatabase
+from core.database import Database
+
+
+class TestAsyncDatabase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = QCoreApplication.instance() or QCoreApplication([])
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "petchat.db")
+        self.db = AsyncDatabase(self.db_path)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def _process_until(self, predicate, timeout: float = 5.0):
+        deadline = time.monotonic() + timeout
+        while not predicate() and time.monotonic() < deadline:
+            self.app.processEvents()
+            time.sleep(0.01)
+        self.assertTrue(predicate())
+
+    def test_queries_run_in_submission_order(self):
+        self.db.submit("add_message", "Alice", "hello", "public", "u1")
+        self.db.submit("add_message", "Bob", "hi", "public", "u2")
+        future = self.db.submit("get_recent_messages", 10, conversation_id="public")
+
+        self.assertEqual([m["content"] for m in future.result(timeout=5)], ["hello", "hi"])
+
+    def test_callbacks_and_notifications_arrive_on_the_gui_thread(self):
+        results = []
+        changes = []
+        self.db.conversation_changed.connect(lambda cid, fields: changes.append((cid, threading.current_thread())))
+        self.db.submit("add_message", "Alice", "hi", "public", "u1",
+                       callback=lambda message_id: results.append((message_id, threading.current_thread())))
+
+        self._process_until(lambda: results and changes)
+        self.assertIs(results[0][1], threading.main_thread())
+        self.assertEqual(changes[0], ("public", threading.main_thread()))
+
+    def test_failed_call_sets_exception_and_skips_callback(self):
+        called = []
+        future = self.db.submit("no_such_method", callback=called.append)
+        with self.assertRaises(AttributeError):
+            future.result(timeout=5)
+        self.app.processEvents()
+        self.assertEqual(called, [])
+
+    def test_bulk_variants_commit_once(self):
+        users = [{"id": f"u{i}", "name": f"User {i}", "is_online": True} for i in range(50)]
+        self.db.upsert_users_bulk(users).result(timeout=5)
+        added = self.db.add_memories_bulk([
+            {"content": "Alice likes green tea", "category": "preference"},
+            {"content": "Alice likes green tea", "category": "preference"},
+            {"content": "Bob's birthday is in May", "category": "fact"},
+        ]).result(timeout=5)
+        self.db.close()
+
+        db = Database(self.db_path)
+        try:
+            self.assertEqual(len([u for u in db.get_all_users() if u["is_online"]]), 50)
+            self.assertEqual(len(added), 2)
+            self.assertEqual(len(db.get_memories()), 2)
+        finally:
+            db.close()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,103 @@
+import sys
+import os
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.database import Database
+
+
+class DatabaseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "petchat.db")
+        self.db = Database(self.db_path)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+
+class TestConversationUpdates(DatabaseTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.changes = []
+        self.db.add_conversation_listener(lambda cid, fields: self.changes.append((cid, fields)))
+
+    def test_add_message_updates_preview_and_unread_in_one_call(self):
+        self.db.add_message("Alice", "hello there", "public", "u1", unread=True)
+        self.db.add_message("Alice", "again", "public", "u1", unread=True)
+
+        conv = self.db.get_conversation("public")
+        self.assertEqual(conv["unread_count"], 2)
+        self.assertEqual(conv["last_message"], "again")
+        self.assertEqual(self.changes[-1][0], "public")
+        self.assertEqual(self.changes[-1][1]["unread_count"], 2)
+        self.assertEqual(self.changes[-1][1]["last_message"], "again")
+
+    def test_read_message_does_not_increment_unread(self):
+        self.db.add_message("Me", "sent", "public", "me")
+
+        self.assertEqual(self.db.get_conversation("public")["unread_count"], 0)
+        self.assertEqual(self.changes[-1][1]["last_message"], "sent")
+
+    def test_mark_read_resets_counter_and_notifies_once(self):
+        self.db.add_message("Alice", "hi", "public", "u1", unread=True)
+        self.changes.clear()
+
+        self.db.mark_conversation_read("public")
+        self.db.mark_conversation_read("public")
+
+        self.assertEqual(self.db.get_conversation("public")["unread_count"], 0)
+        self.assertEqual(self.changes, [("public", {"unread_count": 0})])
+
+    def test_created_conversation_notifies_full_row(self):
+        self.db.get_or_create_conversation("peer-1", "p2p", "Bob")
+        self.db.get_or_create_conversation("peer-1", "p2p", "Bob")
+
+        created = [fields for cid, fields in self.changes if cid == "peer-1"]
+        self.assertEqual(len(created), 1)
+        self.assertEqual(created[0]["name"], "Bob")
+        self.assertEqual(created[0]["unread_count"], 0)
+
+    def test_message_for_unknown_conversation_sends_no_notification(self):
+        self.db.add_message("Alice", "hi", "default", "u1", unread=True)
+
+        self.assertEqual(self.changes, [])
+
+
+class TestOnlineUsers(DatabaseTestCase):
+
+    def test_snapshot_marks_missing_users_offline_in_one_pass(self):
+        self.db.upsert_user("me", "Me", is_online=True)
+        self.db.upsert_user("gone", "Gone", is_online=True)
+        self.db.apply_online_snapshot(
+            [{"id": f"u{i}", "name": f"User {i}"} for i in range(100)], keep_online="me"
+        )
+
+        online = self.db.get_online_users(exclude_user_id="me")
+        self.assertEqual(len(online), 100)
+        self.assertNotIn("gone", {u["id"] for u in online})
+        self.assertEqual(self.db.get_user("me")["is_online"], 1)
+
+    def test_startup_reset_clears_flags_and_prunes_stale_users(self):
+        self.db.upsert_user("peer", "Peer", is_online=True)
+        self.db.upsert_user("stranger", "Stranger", is_online=True)
+        self.db.upsert_user("recent", "Recent")
+        self.db.create_conversation("peer", "p2p", "Peer")
+        self.db.conn.execute("UPDATE users SET last_seen = '2000-01-01T00:00:00' WHERE id != 'recent'")
+        self.db.conn.commit()
+
+        pruned = self.db.reset_online_status(prune_after_days=30)
+
+        self.assertEqual(pruned, 1)
+        self.assertIsNone(self.db.get_user("stranger"))
+        self.assertEqual(self.db.get_online_users(), [])
+        self.assertEqual({u["id"] for u in self.db.get_all_users()}, {"peer", "recent"})
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
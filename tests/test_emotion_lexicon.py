@@ -0,0 +1,82 @@
+import sys
+import os
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.ai_service import AIService
+from core.emotion_lexicon import EmotionLexicon
+from tests.mock_llm_server import MockLLMServer
+
+
+def top(scores):
+    return max(scores, key=scores.get)
+
+
+def window(*texts):
+    return [{"sender": "AB"[i % 2], "content": text} for i, text in enumerate(texts)]
+
+
+class TestEmotionLexicon(unittest.TestCase):
+
+    def setUp(self):
+        self.lexicon = EmotionLexicon()
+
+    def test_terms_emoji_and_punctuation_pick_the_class(self):
+        self.assertEqual(top(self.lexicon.score_texts(["周末去爬山", "太好了🎉"]).scores), "happy")
+        self.assertEqual(top(self.lexicon.score_texts(["明天考试怎么办？？", "来不及了"]).scores), "tense")
+        self.assertEqual(top(self.lexicon.score_texts(["今天被骂了", "好难过😭"]).scores), "negative")
+        self.assertEqual(top(self.lexicon.score_texts(["收到", "好的"]).scores), "neutral")
+
+    def test_negated_phrases_and_whole_english_words(self):
+        self.assertEqual(top(self.lexicon.score_texts(["我不开心"]).scores), "negative")
+        self.assertEqual(top(self.lexicon.score_texts(["I am NOT happy"]).scores), "negative")
+        funeral = self.lexicon.score_texts(["the funeral is on friday"])
+        self.assertEqual(funeral.confidence, 0.0)
+
+    def test_scores_are_a_distribution_and_recent_messages_weigh_more(self):
+        estimate = self.lexicon.score_texts(["好开心", "好难过"])
+        self.assertAlmostEqual(sum(estimate.scores.values()), 1.0)
+        self.assertGreater(estimate.scores["negative"], estimate.scores["happy"])
+        empty = self.lexicon.score_texts([])
+        self.assertEqual((top(empty.scores), empty.confidence), ("neutral", 0.0))
+
+    def test_lexicon_without_literal_terms_scores_neutral(self):
+        for lexicon in ({}, {"": ("happy", 1.0)}, {"happy": ("happy", 1.0)}):
+            estimate = EmotionLexicon(lexicon).score([{"content": "好开心 哈哈"}])
+            self.assertEqual((top(estimate.scores), estimate.confidence), ("neutral", 0.0))
+        self.assertEqual(top(EmotionLexicon({"happy": ("happy", 1.0)}).score_texts(["so happy"]).scores), "happy")
+
+
+class TestEmotionModes(unittest.TestCase):
+
+    def test_hybrid_answers_confident_windows_locally_and_escalates_the_rest(self):
+        with MockLLMServer() as server:
+            service = AIService(api_key="test", api_base=server.base_url, model="mock", emotion_mode="hybrid")
+            local = service.analyze_emotion(window("周末去爬山", "好啊哈哈，太好了🎉"))
+            escalated = service.analyze_emotion(window("你昨天说的那本书叫什么", "《三体》"))
+            calls = server.requests.get("emotion", 0)
+            service.close()
+
+        self.assertGreater(local["happy"], 0.5)
+        self.assertEqual(escalated["happy"], 0.6)  # mock model reply
+        self.assertEqual(calls, 1)
+        self.assertEqual(service.emotion_stats, {"local": 1, "escalated": 1})
+
+    def test_fused_analysis_leaves_local_emotion_out_of_the_prompt(self):
+        with MockLLMServer() as server:
+            service = AIService(api_key="test", api_base=server.base_url, model="mock",
+                                analysis_mode="fused", emotion_mode="local")
+            alone = service.analyze_all(window("哈哈哈"))
+            result = service.analyze_all(window("周末好开心", "明天计划一下去哪玩"))
+            requests = dict(server.requests)
+            service.close()
+
+        self.assertEqual(top(alone["emotion"]), "happy")
+        self.assertEqual(top(result["emotion"]), "happy")
+        # The single-message window needed nothing else from the model
+        self.assertEqual(requests, {"fused": 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
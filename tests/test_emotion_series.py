@@ -0,0 +1,81 @@
+import sys
+import os
+import tempfile
+import time
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.database import Database
+from core.emotion_series import HOUR_MS, MINUTE_MS, aggregate, trend_step
+from core.retention import HistoryMaintenance
+
+
+BASE_MS = 1_700_000_000_000 - 1_700_000_000_000 % HOUR_MS
+
+
+class TestEmotionSeries(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "petchat.db")
+        self.db = Database(self.db_path)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def test_aggregate_merges_epoch_aligned_buckets(self):
+        timestamps = np.array([BASE_MS + 59_000, BASE_MS, BASE_MS + 61_000], dtype=np.int64)
+        sums = np.array([[1, 0, 0, 0], [0, 1, 0, 0], [0, 0, 1, 0]], dtype=np.float64)
+        buckets, counts, bucket_sums = aggregate(timestamps, np.ones(3, dtype=np.int64), sums, MINUTE_MS)
+
+        self.assertEqual(buckets.tolist(), [BASE_MS, BASE_MS + MINUTE_MS])
+        self.assertEqual(counts.tolist(), [2, 1])
+        self.assertEqual(bucket_sums[0].tolist(), [1, 1, 0, 0])
+
+    def test_rollups_are_maintained_incrementally(self):
+        self.db.add_emotion_samples("public", [(BASE_MS + i * 10_000, {"happy": 1.0}) for i in range(6)])
+        self.db.add_emotion_sample("public", {"tense": 1.0}, timestamp_ms=BASE_MS + 30_000 + 1)
+        self.assertFalse(self.db.add_emotion_sample("public", {"tense": 1.0}, timestamp_ms=BASE_MS))
+
+        rows = self.db.conn.execute(
+            "SELECT resolution_ms, count, happy, tense FROM emotion_rollups WHERE conversation_id = 'public' ORDER BY resolution_ms"
+        ).fetchall()
+        self.assertEqual([tuple(r) for r in rows], [(MINUTE_MS, 7, 6.0, 1.0), (HOUR_MS, 7, 6.0, 1.0)])
+
+    def test_trend_reads_from_the_coarsest_fitting_resolution(self):
+        # One sample a minute for two days, alternating happy/tense
+        samples = [(BASE_MS + i * MINUTE_MS, {"happy": 1.0} if i % 2 else {"tense": 1.0}) for i in range(2 * 24 * 60)]
+        self.db.add_emotion_samples("public", samples)
+
+        self.assertEqual(trend_step(BASE_MS, BASE_MS + 2 * 24 * HOUR_MS, 48), (HOUR_MS, HOUR_MS))
+        trend = self.db.get_emotion_trend("public", BASE_MS, BASE_MS + 2 * 24 * HOUR_MS, max_points=48)
+        self.assertEqual(trend["step_ms"], HOUR_MS)
+        self.assertEqual(len(trend["timestamps"]), 48)
+        self.assertEqual(set(trend["counts"]), {60})
+        self.assertAlmostEqual(trend["happy"][0], 0.5)
+
+        raw = self.db.get_emotion_trend("public", BASE_MS, BASE_MS + 10 * MINUTE_MS, max_points=1000)
+        self.assertEqual(len(raw["timestamps"]), 10)
+        self.assertEqual(raw["tense"][:2], [1.0, 0.0])
+
+    def test_maintenance_prunes_raw_samples_and_keeps_hour_rollups(self):
+        old_ms = int(time.time() * 1000) - 30 * 24 * HOUR_MS
+        self.db.add_emotion_samples("public", [(old_ms + i, {"neutral": 1.0}) for i in range(5)])
+        self.db.add_emotion_sample("public", {"happy": 1.0})
+
+        HistoryMaintenance(self.db_path, emotion_sample_days=7, emotion_minute_rollup_days=7).run_once()
+
+        (samples,) = self.db.conn.execute("SELECT COUNT(*) FROM emotion_samples").fetchone()
+        resolutions = [r[0] for r in self.db.conn.execute(
+            "SELECT resolution_ms FROM emotion_rollups WHERE bucket_ms < ?", (old_ms + HOUR_MS,)
+        )]
+        self.assertEqual(samples, 1)
+        self.assertEqual(resolutions, [HOUR_MS])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,99 @@
+import sys
+import os
+import csv
+import json
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.database import Database
+from core.history_export import HistoryExporter, ExportCancelled, format_for_path
+from core.retention import HistoryMaintenance, RetentionPolicy
+
+
+class TestHistoryExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "petchat.db")
+        self.db = Database(self.db_path)
+        for i in range(25):
+            self.db.add_message("Alice", f"msg{i} <b>&", "public", "u1")
+        self.db.add_message("Bob", "other room", "u2", "u2")
+        self.exporter = HistoryExporter(self.db_path, batch_size=10)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def _path(self, name):
+        return os.path.join(self.tmpdir.name, name)
+
+    def test_jsonl_includes_archived_history_in_order(self):
+        HistoryMaintenance(self.db_path, policies={"default": RetentionPolicy(max_rows=5)}).run_once()
+        progress = []
+
+        count = self.exporter.export("public", self._path("out.jsonl"),
+                                     progress_callback=lambda done, total: progress.append((done, total)))
+
+        with open(self._path("out.jsonl"), encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        self.assertEqual(count, 25)
+        self.assertEqual([r["content"] for r in rows], [f"msg{i} <b>&" for i in range(25)])
+        self.assertEqual(progress[0], (0, 25))
+        self.assertEqual(progress[-1], (25, 25))
+
+    def test_csv_and_html_escape_content(self):
+        self.exporter.export("public", self._path("out.csv"))
+        self.exporter.export("public", self._path("out.html"))
+
+        with open(self._path("out.csv"), encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], ["timestamp", "sender_id", "sender", "content"])
+        self.assertEqual(len(rows), 26)
+        with open(self._path("out.html"), encoding="utf-8") as f:
+            page = f.read()
+        self.assertIn("msg0 &lt;b&gt;&amp;", page)
+        self.assertNotIn("other room", page)
+
+    def test_cancel_removes_partial_file(self):
+        cancel = threading.Event()
+
+        def progress(done, total):
+            if done >= 10:
+                cancel.set()
+
+        with self.assertRaises(ExportCancelled):
+            self.exporter.export("public", self._path("out.txt"),
+                                 progress_callback=progress, cancel_event=cancel)
+
+        self.assertFalse([name for name in os.listdir(self.tmpdir.name) if name.startswith("out.txt")])
+
+    def test_writes_during_export_do_not_block_or_change_the_snapshot(self):
+        HistoryMaintenance(self.db_path, policies={"default": RetentionPolicy(max_rows=15)}).run_once()
+        self.db.conn.execute("PRAGMA busy_timeout = 0")  # fail at once instead of after a timeout
+
+        def progress(done, total):
+            if done == 10:  # archive exported, live table not read yet
+                self.db.add_message("Alice", "sent during export", "public", "u1")
+                # Moves live rows into the already exported archive
+                HistoryMaintenance(self.db_path, policies={"default": RetentionPolicy(max_rows=5)}).run_once()
+
+        count = self.exporter.export("public", self._path("out.jsonl"), progress_callback=progress)
+
+        with open(self._path("out.jsonl"), encoding="utf-8") as f:
+            rows = [json.loads(line)["content"] for line in f]
+        self.assertEqual(count, 25)
+        self.assertEqual(rows, [f"msg{i} <b>&" for i in range(25)])
+        self.assertEqual(self.db.get_recent_messages(1, "public")[0]["content"], "sent during export")
+
+    def test_format_from_extension(self):
+        self.assertEqual(format_for_path("a.JSONL"), "jsonl")
+        self.assertEqual(format_for_path("a.htm"), "html")
+        self.assertEqual(format_for_path("a.log"), "txt")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,125 @@
+import sys
+import os
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.database import Database
+from core.message_log import MessageLog
+from core.message_store import MessageStore
+from core.protocol import HistoryPage, client_conversation_id, conversation_key, decode_history_messages
+from core.retention import HistoryMaintenance, RetentionPolicy
+
+
+def sync_all(store, user_id, db, limit):
+    """Client sync loop against the store, through the compressed page encoding"""
+    pages = 0
+    after_seq = db.get_max_server_seq()
+    while True:
+        rows, has_more = store.get_sync_page(user_id, after_seq=after_seq, limit=limit)
+        page = HistoryPage("", rows, has_more, compress=True).to_dict()
+        messages = decode_history_messages(page)
+        for m in messages:
+            m["conversation_id"] = client_conversation_id(user_id, m.pop("conversation_key"))
+        db.import_history(messages)
+        pages += 1
+        if not has_more:
+            return pages
+        after_seq = messages[-1]["seq"]
+
+
+class TestHistorySync(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmpdir.name, "petchat.db"))
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def _fill(self, store):
+        for i in range(30):
+            store.append("public", "bob", "Bob", f"pub{i}")
+        store.append(conversation_key("alice", "bob"), "bob", "Bob", "hi alice")
+        store.append(conversation_key("alice", "alice"), "alice", "Alice", "note to self")
+        store.append(conversation_key("bob", "carol"), "carol", "Carol", "not for alice")
+        store.flush()
+
+    def test_compressed_page_round_trip(self):
+        messages = [{"seq": 1, "content": "你好" * 100}]
+
+        page = HistoryPage("public", messages, compress=True).to_dict()
+
+        self.assertNotIn("messages", page)
+        self.assertLess(len(page["data"]), len("你好" * 100 * 3))
+        self.assertEqual(decode_history_messages(page), messages)
+
+    def test_sync_pages_only_visible_conversations(self):
+        for store in (MessageStore(os.path.join(self.tmpdir.name, "s.db")),
+                      MessageLog(os.path.join(self.tmpdir.name, "log"))):
+            with self.subTest(store=type(store).__name__):
+                self._fill(store)
+                first, more = store.get_sync_page("alice", after_seq=0, limit=20)
+                rest, no_more = store.get_sync_page("alice", after_seq=first[-1]["seq"], limit=20)
+                contents = [m["content"] for m in first + rest]
+                self.assertTrue(more)
+                self.assertFalse(no_more)
+                self.assertEqual(len(contents), 32)
+                self.assertNotIn("not for alice", contents)
+            store.close()
+
+    def test_import_creates_dm_and_is_idempotent(self):
+        store = MessageStore(os.path.join(self.tmpdir.name, "s.db"))
+        self._fill(store)
+        pages = sync_all(store, "alice", self.db, limit=10)
+        again, _ = store.get_sync_page("alice", after_seq=0, limit=100)
+        for m in again:
+            m["conversation_id"] = client_conversation_id("alice", m.pop("conversation_key"))
+        reimported = self.db.import_history(again)
+        store.close()
+
+        self.assertEqual(pages, 4)
+        self.assertEqual(reimported, 0)
+        self.assertEqual(self.db.get_conversation("bob")["name"], "Bob")
+        self.assertEqual(self.db.get_conversation("alice")["last_message"], "note to self")
+        self.assertEqual(self.db.get_conversation("public")["last_message"], "pub29")
+        self.assertEqual(len(self.db.get_recent_messages(100, conversation_id="public")), 30)
+
+    def test_live_messages_are_matched_not_imported_twice(self):
+        store = MessageStore(os.path.join(self.tmpdir.name, "s.db"))
+        # Sent and received while the sync was running: stored locally with the server's timestamp
+        store.append(conversation_key("alice", "bob"), "alice", "Alice", "sent live", "2026-01-01T10:00:00")
+        store.append("public", "bob", "Bob", "received live", "2026-01-01T10:00:01")
+        store.flush()
+        self.db.add_message("Alice", "sent live", "bob", "alice", timestamp="2026-01-01T10:00:00")
+        self.db.add_message("Bob", "received live", "public", "bob", timestamp="2026-01-01T10:00:01")
+
+        sync_all(store, "alice", self.db, limit=10)
+        store.close()
+
+        self.assertEqual([m["content"] for m in self.db.get_recent_messages(10, conversation_id="bob")], ["sent live"])
+        self.assertEqual([m["content"] for m in self.db.get_recent_messages(10, conversation_id="public")],
+                         ["received live"])
+        self.assertEqual(self.db.get_max_server_seq(), 2)
+
+    def test_archived_messages_keep_server_seq(self):
+        store = MessageStore(os.path.join(self.tmpdir.name, "s.db"))
+        self._fill(store)
+        sync_all(store, "alice", self.db, limit=10)
+        HistoryMaintenance(self.db.db_path, archive_path=self.db.archive_path,
+                           policies={"default": RetentionPolicy(max_rows=5)}).run_once()
+
+        store.close()
+
+        # An interrupted sync resumes past the archived rows instead of re-importing them
+        self.assertEqual(self.db.get_max_server_seq(), 32)
+        archived = self.db.conn.execute(
+            "SELECT COUNT(*) FROM archive.messages WHERE server_seq IS NOT NULL"
+        ).fetchone()[0]
+        self.assertEqual(archived, 25)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
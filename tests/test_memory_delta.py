@@ -0,0 +1,141 @@
+import sys
+import os
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.ai_coalescer import AIRequestCoalescer, merge_scopes
+from core.ai_pipeline import AIPipeline, StageResult
+from core.ai_service import AIService
+from core.ai_session_manager import AISessionManager, memory_scope
+from tests.mock_llm_server import MockLLMServer
+
+
+def stored(*texts, start=1):
+    return [{"seq": start + i, "sender_id": "ab"[i % 2], "sender": "AB"[i % 2], "content": text,
+             "timestamp": "2026-01-01T00:00:00"} for i, text in enumerate(texts)]
+
+
+class TestMemoryDelta(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = AISessionManager()
+
+    def test_delta_covers_only_messages_past_the_mark(self):
+        first = self.sessions.memory_delta("public", stored("在吗", "周末去爬山吧"))
+        self.assertEqual((len(first.new_messages), first.base_seq, first.seq), (2, None, 2))
+        self.sessions.commit_memories("public", first, [{"content": "周末爬山", "category": "event"}])
+
+        window = stored("在吗", "周末去爬山吧", "好啊", "八点集合")
+        second = self.sessions.memory_delta("public", window)
+        self.assertEqual([m["seq"] for m in second.new_messages], [3, 4])
+        self.assertEqual(second.prior_memories, [{"content": "周末爬山", "category": "event"}])
+        # Client snapshots have no seq and cannot be tracked
+        self.assertIsNone(self.sessions.memory_delta("public", [{"sender": "A", "content": "hi"}]))
+
+    def test_commit_dedupes_and_rejects_stale_deltas(self):
+        delta = self.sessions.memory_delta("public", stored("a", "b"))
+        stale = self.sessions.memory_delta("public", stored("a", "b"))
+        accepted = self.sessions.commit_memories("public", delta, [{"content": "周末 爬山"}, {"content": "周末爬山"}])
+        self.assertEqual(accepted, [{"content": "周末 爬山"}])
+        self.assertIsNone(self.sessions.commit_memories("public", stale, [{"content": "别的"}]))
+
+        later = self.sessions.memory_delta("public", stored("a", "b", "c"))
+        self.assertEqual(self.sessions.commit_memories("public", later, [{"content": "周末爬山"}]), [])
+        self.assertEqual(self.sessions.memories["public"]["seq"], 3)
+
+
+class TestIncrementalPipeline(unittest.TestCase):
+
+    def run_pipeline(self, server, messages, sessions, analysis_mode="separate", conversation_id="public"):
+        service = AIService(api_key="test", api_base=server.base_url, model="mock", analysis_mode=analysis_mode)
+        pipeline = AIPipeline(service, sessions=sessions)
+        results = pipeline.run(messages, stages=["memories"], conversation_id=conversation_id)
+        pipeline.shutdown()
+        service.close()
+        return results["memories"]
+
+    def test_unchanged_window_skips_the_model_call(self):
+        sessions = AISessionManager()
+        window = stored("周末去爬山吧", "好啊")
+        with MockLLMServer() as server:
+            first = self.run_pipeline(server, window, sessions)
+            again = self.run_pipeline(server, window, sessions)
+            grown = self.run_pipeline(server, window + stored("八点集合", start=3), sessions)
+            calls = server.requests.get("memories", 0)
+
+        self.assertEqual(first.value, [{"content": "周末一起去爬山", "category": "event"}])
+        self.assertEqual(again.value, [])
+        self.assertEqual(grown.value, [])  # the mock repeats a known memory
+        self.assertEqual(calls, 2)
+        self.assertEqual(sessions.memories["public"]["seq"], 3)
+
+    def test_each_side_of_a_dm_gets_its_own_memories(self):
+        # Both clients store memories locally, so B still needs what A's request already mined
+        sessions = AISessionManager()
+        window = stored("周末去爬山吧", "好啊")
+        with MockLLMServer() as server:
+            alice = self.run_pipeline(server, window, sessions, conversation_id=memory_scope("a", "dm:a:b"))
+            bob = self.run_pipeline(server, window, sessions, conversation_id=memory_scope("b", "dm:a:b"))
+            alice_again = self.run_pipeline(server, window, sessions, conversation_id=memory_scope("a", "dm:a:b"))
+
+        self.assertEqual(alice.value, [{"content": "周末一起去爬山", "category": "event"}])
+        self.assertEqual(bob.value, alice.value)
+        self.assertEqual(alice_again.value, [])
+
+    def test_requesters_arriving_together_share_one_model_call(self):
+        sessions = AISessionManager()
+        window = stored("周末去爬山吧", "好啊")
+        alice, bob = memory_scope("a", "dm:a:b"), memory_scope("b", "dm:a:b")
+        with MockLLMServer() as server:
+            service = AIService(api_key="test", api_base=server.base_url, model="mock", analysis_mode="fused")
+            pipeline = AIPipeline(service, sessions=sessions)
+            pipeline.run(window[:1], stages=["memories"], memory_scopes=[alice])  # Alice mined the first message
+            coalescer = AIRequestCoalescer(
+                lambda payload, on_stage: pipeline.run(payload[0], on_stage=on_stage, memory_scopes=payload[1]),
+                debounce_seconds=0.1, merge=merge_scopes
+            )
+            calls_before = server.requests["fused"]
+            received = {alice: [], bob: []}
+            futures = [
+                coalescer.submit("dm:a:b", (window, (scope,)), on_stage=lambda stage, scope=scope: (
+                    received[scope].append(stage.value)
+                    if isinstance(stage, StageResult) and stage.scope == scope else None))
+                for scope in (alice, bob)
+            ]
+            futures[0].result(5)
+            coalescer.shutdown()
+            pipeline.shutdown()
+            service.close()
+            calls = server.requests["fused"] - calls_before
+
+        self.assertIs(futures[0], futures[1])
+        self.assertEqual(calls, 1)
+        self.assertEqual(received[bob], [[{"content": "周末一起去爬山", "category": "event"}]])
+        self.assertEqual(received[alice], [[]])  # already reported to her
+        self.assertEqual((sessions.memories[alice]["seq"], sessions.memories[bob]["seq"]), (2, 2))
+
+    def test_fused_analysis_mines_only_new_messages(self):
+        sessions = AISessionManager()
+        with MockLLMServer() as server:
+            self.run_pipeline(server, stored("在吗", "嗯"), sessions, analysis_mode="fused")
+            self.run_pipeline(server, stored("在吗", "嗯"), sessions, analysis_mode="fused")
+            requests = dict(server.requests)
+        self.assertEqual(requests, {"fused": 1})
+
+    def test_failed_extraction_leaves_the_mark(self):
+        sessions = AISessionManager()
+        window = stored("周末去爬山吧", "好啊")
+        service = AIService(api_key="test", api_base="http://127.0.0.1:9/v1", model="mock")
+        service.provider.max_attempts = 1
+        pipeline = AIPipeline(service, sessions=sessions)
+        result = pipeline.run(window, stages=["memories"], conversation_id="public")["memories"]
+        pipeline.shutdown()
+        service.close()
+
+        self.assertIsNotNone(result.error)
+        self.assertNotIn("public", sessions.memories)
+
+
+if __name__ == "__main__":
+    unittest.main()
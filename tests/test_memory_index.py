@@ -0,0 +1,123 @@
+import sys
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.memory_index import MinHashLSH, MinHashSketch
+
+
+class TestMinHashLSH(unittest.TestCase):
+
+    def setUp(self):
+        self.index = MinHashLSH(threshold=0.7)
+
+    def test_paraphrase_is_near_duplicate(self):
+        self.index.add(1, self.index.sketch("周末和小明一起去爬山，早上八点集合"))
+
+        match = self.index.query(self.index.sketch("这周末和小明一起去爬山，早上八点集合"))
+
+        self.assertIsNotNone(match)
+        self.assertEqual(match[0], 1)
+
+    def test_negated_or_contained_memory_is_not_duplicate(self):
+        self.index.add(1, self.index.sketch("喜欢猫"))
+        self.index.add(2, self.index.sketch("周末去爬山"))
+
+        self.assertIsNone(self.index.query(self.index.sketch("不喜欢猫")))
+        self.assertIsNone(self.index.query(self.index.sketch("这周末和小明一起去爬山，早上八点集合")))
+
+    def test_unrelated_memory_is_not_duplicate(self):
+        self.index.add(1, self.index.sketch("明天考试"))
+
+        self.assertIsNone(self.index.query(self.index.sketch("明天去吃饭")))
+        self.assertIsNone(self.index.query(self.index.sketch("下周三交报告")))
+
+    def test_normalization_ignores_case_and_punctuation(self):
+        self.index.add(1, self.index.sketch("Exam on Friday!"))
+
+        match = self.index.query(self.index.sketch("exam on friday"))
+
+        self.assertIsNotNone(match)
+        self.assertAlmostEqual(match[1], 1.0)
+
+    def test_remove_drops_entry_from_buckets(self):
+        sketch = self.index.sketch("周末和小明一起去爬山，早上八点集合")
+        self.index.add(1, sketch)
+        self.index.remove(1)
+
+        self.assertEqual(len(self.index), 0)
+        self.assertEqual(self.index.candidates(sketch), set())
+
+    def test_sketch_blob_roundtrip_is_deterministic(self):
+        sketch = self.index.sketch("一起准备期末考试")
+        restored = MinHashSketch.from_blob(sketch.to_blob(), sketch.size)
+
+        self.assertTrue((restored.signature == MinHashLSH().sketch("一起准备期末考试").signature).all())
+
+    def test_empty_text_is_never_indexed(self):
+        self.index.add(1, self.index.sketch("!!!"))
+
+        self.assertEqual(len(self.index), 0)
+        self.assertIsNone(self.index.query(self.index.sketch("...")))
+
+
+class TestDatabaseMemoryDedup(unittest.TestCase):
+
+    def setUp(self):
+        from core.database import Database
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "petchat.db")
+        self.db = Database(self.db_path)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def test_near_duplicate_rejected(self):
+        self.assertIsNotNone(self.db.add_memory("周末和小明一起去爬山，早上八点集合", "event"))
+        self.assertIsNone(self.db.add_memory("这周末和小明一起去爬山，早上八点集合", "event"))
+
+        self.assertEqual(len(self.db.get_memories()), 1)
+
+    def test_merge_refreshes_without_rewording(self):
+        from config.settings import Settings
+        with mock.patch.object(Settings, "MEMORY_DEDUP_MODE", "merge"):
+            self.db.add_memory("周末和小明一起去爬山，早上八点集合", None)
+            self.db.add_memory("下周三交实验报告", "event")
+            self.assertIsNone(self.db.add_memory("这周末和小明一起去爬山，早上八点集合", "event"))
+
+        newest = self.db.get_memories()[0]
+        self.assertEqual((newest["content"], newest["category"]), ("周末和小明一起去爬山，早上八点集合", "event"))
+
+    def test_reject_leaves_stored_memory_untouched(self):
+        from config.settings import Settings
+        with mock.patch.object(Settings, "MEMORY_DEDUP_MODE", "reject"):
+            self.db.add_memory("周末和小明一起去爬山，早上八点集合", None)
+            self.db.add_memory("下周三交实验报告", "event")
+            self.db.add_memory("这周末和小明一起去爬山，早上八点集合", "event")
+
+        oldest = self.db.get_memories()[-1]
+        self.assertEqual((oldest["content"], oldest["category"]), ("周末和小明一起去爬山，早上八点集合", None))
+
+    def test_index_persisted_across_reopen(self):
+        from core.database import Database
+        self.db.add_memory("周末和小明一起去爬山，早上八点集合", "event")
+        self.db.close()
+
+        self.db = Database(self.db_path)
+
+        self.assertIsNone(self.db.add_memory("这周末和小明一起去爬山，早上八点集合", "event"))
+        self.assertEqual(len(self.db.get_memories()), 1)
+
+    def test_clear_memories_resets_index(self):
+        self.db.add_memory("周末和小明一起去爬山，早上八点集合", "event")
+        self.db.clear_memories()
+
+        self.assertIsNotNone(self.db.add_memory("周末和小明一起去爬山，早上八点集合", "event"))
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,119 @@
+import sys
+import os
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.message_cache import MessageCache
+
+
+def make_messages(count, prefix="m"):
+    return [
+        {"sender_id": "u1", "sender": "Alice", "content": f"{prefix}{i}", "timestamp": f"2026-01-01T00:00:{i:02d}"}
+        for i in range(count)
+    ]
+
+
+class TestMessageCache(unittest.TestCase):
+
+    def test_hit_returns_newest_window(self):
+        cache = MessageCache()
+        cache.put("public", make_messages(10), complete=False)
+
+        result = cache.get("public", 3)
+
+        self.assertEqual([m["content"] for m in result], ["m7", "m8", "m9"])
+        self.assertEqual(cache.stats()["hits"], 1)
+
+    def test_larger_limit_misses_unless_complete(self):
+        cache = MessageCache()
+        cache.put("a", make_messages(5), complete=False)
+        cache.put("b", make_messages(5), complete=True)
+
+        self.assertIsNone(cache.get("a", 50))
+        self.assertEqual(len(cache.get("b", 50)), 5)
+        self.assertEqual(cache.stats()["misses"], 1)
+
+    def test_append_writes_through_to_cached_conversation(self):
+        cache = MessageCache()
+        cache.put("public", make_messages(2), complete=True)
+        cache.append("public", {"sender_id": "u2", "sender": "Bob", "content": "new", "timestamp": "t"})
+        cache.append("other", {"sender_id": "u2", "sender": "Bob", "content": "ignored", "timestamp": "t"})
+
+        self.assertEqual(cache.get("public", 1)[0]["content"], "new")
+        self.assertIsNone(cache.get("other", 1))
+
+    def test_append_keeps_timestamp_order(self):
+        cache = MessageCache()
+        cache.put("public", make_messages(4)[1:], complete=False)
+        cache.append("public", {"sender_id": "u2", "sender": "Bob", "content": "late",
+                                "timestamp": "2026-01-01T00:00:02.5"})
+        cache.append("public", {"sender_id": "u2", "sender": "Bob", "content": "older",
+                                "timestamp": "2026-01-01T00:00:00"})
+
+        self.assertEqual([m["content"] for m in cache.get("public", 4)], ["m1", "m2", "late", "m3"])
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        messages = make_messages(10)
+        entry_size = sum(MessageCache.estimate_size(m) for m in messages)
+        cache = MessageCache(max_bytes=entry_size * 2)
+
+        cache.put("a", messages, complete=True)
+        cache.put("b", messages, complete=True)
+        cache.get("a", 1)
+        cache.put("c", messages, complete=True)
+
+        self.assertIsNotNone(cache.get("a", 1))
+        self.assertIsNone(cache.get("b", 1))
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertLessEqual(cache.stats()["bytes"], cache.max_bytes)
+
+    def test_returned_messages_are_copies(self):
+        cache = MessageCache()
+        cache.put("public", make_messages(1), complete=True)
+
+        cache.get("public", 1)[0]["content"] = "mutated"
+
+        self.assertEqual(cache.get("public", 1)[0]["content"], "m0")
+
+
+class TestDatabaseMessageCache(unittest.TestCase):
+
+    def setUp(self):
+        from core.database import Database
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db = Database(os.path.join(self.tmpdir.name, "petchat.db"))
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def test_switching_back_is_served_from_cache(self):
+        self.db.add_message("Alice", "hello", "public", "u1")
+        self.db.add_message("Bob", "hi", "u2", "u2")
+
+        self.db.get_recent_messages(50, conversation_id="public")
+        self.db.get_recent_messages(50, conversation_id="u2")
+        second = self.db.get_recent_messages(50, conversation_id="public")
+
+        stats = self.db.get_message_cache_stats()
+        self.assertEqual(stats["misses"], 2)
+        self.assertEqual(stats["hits"], 1)
+        self.assertEqual([m["content"] for m in second], ["hello"])
+
+    def test_add_message_keeps_cache_consistent(self):
+        self.db.add_message("Alice", "first", "public", "u1")
+        self.db.get_recent_messages(50, conversation_id="public")
+
+        self.db.add_message("Bob", "second", "public", "u2")
+
+        self.assertEqual(
+            [m["content"] for m in self.db.get_recent_messages(50, conversation_id="public")],
+            ["first", "second"]
+        )
+        self.assertEqual(self.db.get_message_cache_stats()["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,139 @@
+import sys
+import os
+import json
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.message_log import MessageLog
+from core.server_core import PetChatServer
+from core.protocol import (HEADER_SIZE, MessageType, decode_history_messages, pack_history_records,
+                           unpack_header, verify_crc)
+
+
+class TestMessageLog(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.dir = os.path.join(self.tmpdir.name, "history")
+        self.log = MessageLog(self.dir, segment_max_bytes=2048, index_interval=4, flush_every=8)
+
+    def tearDown(self):
+        self.log.close()
+        self.tmpdir.cleanup()
+
+    def _fill(self, count):
+        for i in range(count):
+            key = "public" if i % 3 else "dm:a:b"
+            self.log.append(key, "u1", "Alice", f"m{i}")
+
+    def test_pages_match_sqlite_store_contract(self):
+        self._fill(60)
+
+        newest, has_more = self.log.get_page("public", limit=10)
+        older, _ = self.log.get_page("public", before_seq=newest[0]["seq"], limit=10)
+
+        public = [f"m{i}" for i in range(60) if i % 3]
+        self.assertEqual([m["content"] for m in newest], public[-10:])
+        self.assertEqual([m["content"] for m in older], public[-20:-10])
+        self.assertTrue(has_more)
+        self.assertEqual(newest[0]["sender"], "Alice")
+        self.assertGreater(len(os.listdir(self.dir)), 2)
+
+    def test_frames_use_protocol_framing(self):
+        self._fill(5)
+
+        frames, _ = self.log.read_frames("dm:a:b")
+
+        for frame in frames:
+            length, crc = unpack_header(bytes(frame[:HEADER_SIZE]))
+            self.assertEqual(length, len(frame) - HEADER_SIZE)
+            self.assertTrue(verify_crc(bytes(frame[HEADER_SIZE:]), crc))
+            self.assertEqual(json.loads(bytes(frame[HEADER_SIZE:]))["type"], MessageType.CHAT_MESSAGE.value)
+
+    def test_record_pages_are_the_stored_payloads(self):
+        self._fill(60)
+
+        records, has_more = self.log.read_records("public", limit=10)
+        frames, _ = self.log.read_frames("public", limit=10)
+
+        self.assertEqual(records, b"[" + b",".join(bytes(f[HEADER_SIZE:]) for f in frames) + b"]")
+        self.assertTrue(has_more)
+        for compress in (False, True):
+            packet = pack_history_records("public", records, has_more, compress=compress)
+            page = json.loads(packet[HEADER_SIZE:])
+            self.assertEqual(decode_history_messages(page), self.log.get_page("public", limit=10)[0])
+
+    def test_sync_records_map_to_client_conversations(self):
+        self._fill(9)
+
+        records, _ = self.log.read_sync_records("b", after_seq=3)
+        page = json.loads(pack_history_records("", records)[HEADER_SIZE:])
+
+        messages = decode_history_messages(page, "b")
+        self.assertEqual([(m["seq"], m["conversation_id"]) for m in messages],
+                         [(4, "a"), (5, "public"), (6, "public"), (7, "a"), (8, "public"), (9, "public")])
+
+    def test_server_sends_log_pages_as_stored_records(self):
+        server = PetChatServer(message_store=self.log)
+        server._handle_chat({"sender_id": "bob", "sender_name": "Bob", "target": "alice", "content": "dm"})
+        server_sock, client_sock = socket.socketpair()
+        try:
+            server._handle_history_request(server_sock, "alice", {"conversation_id": "bob", "compress": True})
+            length, _ = unpack_header(client_sock.recv(HEADER_SIZE))
+            payload = b""
+            while len(payload) < length:
+                payload += client_sock.recv(length - len(payload))
+        finally:
+            server_sock.close()
+            client_sock.close()
+
+        page = json.loads(payload)
+        self.assertEqual(page["data_format"], "records")
+        self.assertEqual([(m["sender"], m["content"], m["conversation_id"]) for m in decode_history_messages(page, "alice")],
+                         [("Bob", "dm", "bob")])
+
+    def test_reopen_loads_sealed_segments_without_scanning(self):
+        self._fill(60)
+        expected = self.log.get_page("dm:a:b", limit=100)[0]
+        self.log.close()
+
+        with mock.patch.object(MessageLog, "_scan_segment", autospec=True,
+                               side_effect=MessageLog._scan_segment) as scan:
+            self.log = MessageLog(self.dir, segment_max_bytes=2048, index_interval=4)
+
+        self.assertEqual(scan.call_count, 1)  # the active segment only
+        self.assertEqual(self.log.get_page("dm:a:b", limit=100)[0], expected)
+        self.assertEqual(self.log.append("public", "u2", "Bob", "after restart"), 61)
+
+    def test_stale_keys_file_falls_back_to_a_scan(self):
+        self._fill(60)
+        self.log.close()
+        first_keys = sorted(n for n in os.listdir(self.dir) if n.endswith(".keys"))[0]
+        with open(os.path.join(self.dir, first_keys), "w") as f:
+            json.dump({"size": 1, "count": 0, "conversations": {}}, f)
+
+        self.log = MessageLog(self.dir, segment_max_bytes=2048, index_interval=4)
+
+        self.assertEqual(len(self.log.get_page("dm:a:b", limit=100)[0]), 20)
+
+    def test_reopen_rebuilds_index_and_drops_torn_tail(self):
+        self._fill(30)
+        self.log.close()
+        last_segment = sorted(n for n in os.listdir(self.dir) if n.endswith(".log"))[-1]
+        with open(os.path.join(self.dir, last_segment), "ab") as f:
+            f.write(b"\x00\x00\x01\x00garbage")
+
+        self.log = MessageLog(self.dir, segment_max_bytes=2048, index_interval=4)
+        seq = self.log.append("public", "u2", "Bob", "after restart")
+
+        self.assertEqual(seq, 31)
+        self.assertEqual(self.log.get_recent("public", 1)[0]["content"], "after restart")
+        self.assertEqual(len(self.log.get_page("dm:a:b", limit=100)[0]), 10)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,132 @@
+import sys
+import os
+import json
+import socket
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.message_store import MessageStore
+from core.protocol import MessageType, HEADER_SIZE, conversation_key, unpack_header, decode_history_messages
+from core.server_core import PetChatServer
+
+
+class TestMessageStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = MessageStore(os.path.join(self.tmpdir.name, "server_messages.db"), batch_size=8)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def test_dm_key_is_symmetric(self):
+        self.assertEqual(conversation_key("alice", "bob"), conversation_key("bob", "alice"))
+        self.assertEqual(conversation_key("alice", "public"), "public")
+
+    def test_pages_backwards_from_newest(self):
+        for i in range(25):
+            self.store.append("public", "u1", "Alice", f"m{i}")
+        self.store.append("dm:a:b", "a", "A", "private")
+        self.store.flush()
+
+        newest, has_more = self.store.get_page("public", limit=10)
+        older, _ = self.store.get_page("public", before_seq=newest[0]["seq"], limit=10)
+        oldest, no_more = self.store.get_page("public", before_seq=older[0]["seq"], limit=10)
+
+        self.assertEqual([m["content"] for m in newest], [f"m{i}" for i in range(15, 25)])
+        self.assertEqual([m["content"] for m in older], [f"m{i}" for i in range(5, 15)])
+        self.assertEqual(len(oldest), 5)
+        self.assertTrue(has_more)
+        self.assertFalse(no_more)
+
+    def test_flush_waits_for_its_ticket_not_later_traffic(self):
+        ticket = self.store.append("public", "u1", "Alice", "before the request")
+        stop = threading.Event()
+
+        def chatter():
+            while not stop.is_set():
+                self.store.append("public", "u2", "Bob", "noise")
+
+        writer = threading.Thread(target=chatter)
+        writer.start()
+        try:
+            self.assertTrue(self.store.flush(ticket, timeout=5.0))
+        finally:
+            stop.set()
+            writer.join()
+        self.assertEqual(self.store.get_page("public", before_seq=2)[0][0]["content"], "before the request")
+        self.assertFalse(self.store.flush(self.store.write_ticket() + 1, timeout=0.05))
+
+    def test_close_persists_queued_writes(self):
+        path = self.store.db_path
+        self.store.append("public", "u1", "Alice", "last words")
+        self.store.close()
+
+        self.store = MessageStore(path)
+        self.assertEqual(self.store.get_recent("public")[0]["content"], "last words")
+
+
+class TestServerHistory(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.store = MessageStore(os.path.join(self.tmpdir.name, "server_messages.db"))
+        self.server = PetChatServer(message_store=self.store)
+
+    def tearDown(self):
+        self.store.close()
+        self.tmpdir.cleanup()
+
+    def _recv_frame(self, sock):
+        header = sock.recv(HEADER_SIZE)
+        length, _ = unpack_header(header)
+        payload = b""
+        while len(payload) < length:
+            payload += sock.recv(length - len(payload))
+        return json.loads(payload.decode("utf-8"))
+
+    def test_routed_dm_is_served_to_both_sides(self):
+        self.server._handle_chat({
+            "type": MessageType.CHAT_MESSAGE.value,
+            "sender_id": "alice", "sender_name": "Alice",
+            "target": "bob", "content": "hi bob"
+        })
+        self.store.flush()
+
+        server_sock, client_sock = socket.socketpair()
+        try:
+            self.server._handle_history_request(server_sock, "bob", {"conversation_id": "alice", "limit": 10})
+            page = self._recv_frame(client_sock)
+        finally:
+            server_sock.close()
+            client_sock.close()
+
+        self.assertEqual(page["type"], MessageType.HISTORY_PAGE.value)
+        self.assertEqual(page["conversation_id"], "alice")
+        self.assertEqual([m["content"] for m in page["messages"]], ["hi bob"])
+        self.assertFalse(page["has_more"])
+
+    def test_full_sync_page_is_compressed_and_mapped_to_client_ids(self):
+        self.server._handle_chat({"sender_id": "bob", "sender_name": "Bob", "target": "public", "content": "all"})
+        self.server._handle_chat({"sender_id": "bob", "sender_name": "Bob", "target": "alice", "content": "dm"})
+        self.store.flush()
+
+        server_sock, client_sock = socket.socketpair()
+        try:
+            self.server._handle_history_request(server_sock, "alice", {"after_seq": 0, "compress": True})
+            page = self._recv_frame(client_sock)
+        finally:
+            server_sock.close()
+            client_sock.close()
+
+        self.assertEqual(page["encoding"], "zlib")
+        messages = decode_history_messages(page)
+        self.assertEqual([(m["conversation_id"], m["content"]) for m in messages], [("public", "all"), ("bob", "dm")])
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
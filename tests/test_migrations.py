@@ -0,0 +1,88 @@
+import sys
+import os
+import sqlite3
+import tempfile
+import unittest
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core import migrations
+from core.database import Database
+from core.migrations import SCHEMA_VERSION, get_schema_version, migrate
+
+
+class TestMigrations(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "petchat.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def _legacy_db(self, message_count):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("CREATE TABLE users (name TEXT, ip TEXT)")
+        conn.execute("INSERT INTO users VALUES ('alice', '10.0.0.2')")
+        conn.execute("CREATE TABLE messages (sender TEXT, content TEXT, timestamp TEXT, session_id TEXT)")
+        conn.executemany(
+            "INSERT INTO messages VALUES (?, ?, ?, ?)",
+            [("alice", f"m{i}", f"2025-01-01T00:00:{i % 60:02d}", "s1" if i % 2 else None) for i in range(message_count)]
+        )
+        conn.commit()
+        return conn
+
+    def test_fresh_database_is_current(self):
+        db = Database(self.db_path)
+
+        self.assertEqual(get_schema_version(db.conn), SCHEMA_VERSION)
+        self.assertIsNotNone(db.get_conversation("public"))
+        self.assertEqual(migrate(db.conn), 0)
+        db.close()
+
+    def test_legacy_messages_copied_in_batches(self):
+        self._legacy_db(23).close()
+        progress = []
+
+        with patch.object(migrations, "MESSAGE_COPY_BATCH", 10):
+            db = Database(self.db_path, migration_progress=lambda *args: progress.append(args))
+
+        rows = db.conn.execute("SELECT conversation_id, content FROM messages ORDER BY id").fetchall()
+        self.assertEqual(len(rows), 23)
+        self.assertEqual((rows[0][0], rows[1][0]), ("default", "s1"))
+        copied = [(done, total) for what, done, total in progress if what == "Migrating messages"]
+        self.assertEqual([done for done, _ in copied], [10, 20, 23])
+        self.assertEqual(copied[-1][1], 23)
+        self.assertEqual(progress[-1], ("Compacting database", 1, 1))
+        db.close()
+
+    def test_incompatible_users_table_is_kept(self):
+        self._legacy_db(0).close()
+
+        db = Database(self.db_path)
+
+        legacy = db.conn.execute("SELECT name, ip FROM users_legacy").fetchall()
+        self.assertEqual([tuple(r) for r in legacy], [("alice", "10.0.0.2")])
+        self.assertIn("id", migrations._table_columns(db.conn, "users"))
+        db.close()
+
+    def test_interrupted_copy_resumes(self):
+        conn = self._legacy_db(15)
+        conn.execute(migrations.MESSAGES_DDL.format(name="messages_new"))
+        conn.execute(
+            "INSERT INTO messages_new (id, conversation_id, sender_id, sender, content, timestamp) "
+            "SELECT rowid, 'default', sender, sender, content, timestamp FROM messages WHERE rowid <= 5"
+        )
+        conn.commit()
+        conn.close()
+
+        db = Database(self.db_path)
+
+        contents = [r[0] for r in db.conn.execute("SELECT content FROM messages ORDER BY id")]
+        self.assertEqual(contents, [f"m{i}" for i in range(15)])
+        db.close()
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
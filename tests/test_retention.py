@@ -0,0 +1,113 @@
+import sys
+import os
+import sqlite3
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.database import Database
+from core.retention import HistoryMaintenance, RetentionPolicy
+
+
+class TestHistoryMaintenance(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "petchat.db")
+        self.db = Database(self.db_path)
+
+    def tearDown(self):
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def _add_messages(self, conversation_id, count, start=None):
+        start = start or datetime.now() - timedelta(minutes=count)
+        for i in range(count):
+            self.db.conn.execute(
+                "INSERT INTO messages (conversation_id, sender_id, sender, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (conversation_id, "u1", "Alice", f"msg{i}", (start + timedelta(seconds=i)).isoformat())
+            )
+        self.db.conn.commit()
+
+    def _main_count(self, conversation_id):
+        return self.db.conn.execute(
+            "SELECT COUNT(*) FROM main.messages WHERE conversation_id = ?", (conversation_id,)
+        ).fetchone()[0]
+
+    def test_max_rows_archives_oldest_in_batches(self):
+        self._add_messages("public", 25)
+        maintenance = HistoryMaintenance(
+            self.db_path, policies={"default": RetentionPolicy(max_rows=10)}, batch_size=4
+        )
+
+        archived = maintenance.run_once()
+
+        self.assertEqual(archived, {"public": 15})
+        self.assertEqual(self._main_count("public"), 10)
+
+    def test_max_age_uses_per_conversation_policy(self):
+        self._add_messages("old", 5, start=datetime.now() - timedelta(days=30))
+        self._add_messages("kept", 5, start=datetime.now() - timedelta(days=30))
+        maintenance = HistoryMaintenance(
+            self.db_path, policies={"old": RetentionPolicy(max_age_days=7)}
+        )
+
+        archived = maintenance.run_once()
+
+        self.assertEqual(archived, {"old": 5})
+        self.assertEqual(self._main_count("kept"), 5)
+
+    def test_recent_messages_span_archive(self):
+        self._add_messages("public", 12)
+        HistoryMaintenance(self.db_path, policies={"default": RetentionPolicy(max_rows=5)}).run_once()
+
+        messages = self.db.get_recent_messages(50, conversation_id="public")
+
+        self.assertEqual([m["content"] for m in messages], [f"msg{i}" for i in range(12)])
+        self.assertEqual(self._main_count("public"), 5)
+
+    def test_existing_database_switches_to_incremental_vacuum_at_startup(self):
+        legacy_path = os.path.join(self.tmpdir.name, "legacy.db")
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("PRAGMA auto_vacuum = NONE")
+        conn.execute("CREATE TABLE legacy (id INTEGER PRIMARY KEY)")
+        conn.close()
+
+        Database(legacy_path).close()
+
+        conn = sqlite3.connect(legacy_path)
+        self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 2)
+        conn.close()
+
+    def test_maintenance_never_runs_a_full_vacuum(self):
+        legacy_path = os.path.join(self.tmpdir.name, "legacy.db")
+        conn = sqlite3.connect(legacy_path)
+        conn.execute("PRAGMA auto_vacuum = NONE")
+        conn.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY, conversation_id TEXT, timestamp TEXT)")
+        conn.close()
+
+        HistoryMaintenance(legacy_path).run_once()
+
+        conn = sqlite3.connect(legacy_path)
+        self.assertEqual(conn.execute("PRAGMA auto_vacuum").fetchone()[0], 0)
+        conn.close()
+
+    def test_archiving_invalidates_cached_window(self):
+        self._add_messages("public", 12)
+        self.assertEqual(len(self.db.get_recent_messages(8, conversation_id="public")), 8)
+        maintenance = HistoryMaintenance(
+            self.db_path, policies={"default": RetentionPolicy(max_rows=5)},
+            on_archived=lambda conversation_id, count: self.db.invalidate_message_cache(conversation_id)
+        )
+
+        maintenance.run_once()
+
+        messages = self.db.get_recent_messages(8, conversation_id="public")
+        self.assertEqual([m["content"] for m in messages], [f"msg{i}" for i in range(4, 12)])
+        self.assertEqual(self.db.get_message_cache_stats()["hits"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,92 @@
+import sys
+import os
+import random
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from core.ai_pipeline import AIPipeline
+from core.protocol import MessageType, conversation_key
+from core.server_core import PetChatServer
+from core.trigger_engine import AhoCorasick, TriggerEngine, create_trigger_engine
+
+
+class TestAhoCorasick(unittest.TestCase):
+
+    def test_matches_every_occurrence_like_a_brute_force_scan(self):
+        rng = random.Random(7)
+        patterns = {"".join(rng.choice("abc") for _ in range(rng.randint(1, 4))) for _ in range(30)}
+        automaton = AhoCorasick((p, p) for p in patterns)
+        for _ in range(50):
+            text = "".join(rng.choice("abcd") for _ in range(60))
+            expected = sorted((i + len(p), p) for p in patterns
+                              for i in range(len(text)) if text.startswith(p, i))
+            found = sorted((end, pattern) for end, pattern, _ in automaton.finditer(text))
+            self.assertEqual(found, expected)
+
+
+class TestTriggerEngine(unittest.TestCase):
+
+    def test_match_groups_keywords_by_intent(self):
+        engine = TriggerEngine({"time": ["明天", "Weekend"], "plan": ["计划"], "food": ["聚餐"]})
+        self.assertEqual(engine.match("明天计划一下，this WEEKEND 也行，明天见"),
+                         {"time": ["明天", "weekend"], "plan": ["计划"]})
+        self.assertTrue(engine.triggered("周六聚餐"))
+        self.assertFalse(engine.triggered("今天吃什么"))
+
+    def test_conversations_need_a_suggestion_only_within_the_window(self):
+        engine = TriggerEngine({"plan": ["计划"]}, window=3)
+        self.assertTrue(engine.needs_suggestion("public"))  # not observed yet
+        engine.observe("public", "在吗")
+        self.assertFalse(engine.needs_suggestion("public"))
+        self.assertTrue(engine.observe("public", "周末计划一下"))
+        engine.observe("public", "好")
+        engine.observe("public", "嗯")
+        self.assertTrue(engine.needs_suggestion("public"))
+        engine.observe("public", "收到")
+        self.assertFalse(engine.needs_suggestion("public"))
+        self.assertEqual(engine.stats, {"observed": 5, "triggered": 1})
+
+    def test_config_overrides_default_intents(self):
+        engine = create_trigger_engine({"ai_triggers": {"intents": {"trip": ["旅行"]}, "window": 2}})
+        self.assertEqual((engine.intents, engine.window), ({"trip": ["旅行"]}, 2))
+        self.assertTrue(create_trigger_engine({}).triggered("明天出去玩"))
+
+    def test_server_observes_routed_chat_messages(self):
+        engine = TriggerEngine()
+        server = PetChatServer(trigger_engine=engine)
+        server._handle_chat({"type": MessageType.CHAT_MESSAGE.value, "sender_id": "alice",
+                             "target": "bob", "content": "明天去聚餐吧"})
+        server._handle_chat({"type": MessageType.CHAT_MESSAGE.value, "sender_id": "carol",
+                             "target": "public", "content": "大家好"})
+        self.assertTrue(engine.needs_suggestion(conversation_key("bob", "alice")))
+        self.assertFalse(engine.needs_suggestion("public"))
+
+
+class TestPipelineStages(unittest.TestCase):
+
+    def test_skipped_stages_are_not_run(self):
+        class Service:
+            calls = []
+
+            def analyze_emotion(self, messages):
+                self.calls.append("emotion")
+                return {"neutral": 1.0}
+
+            def extract_memories(self, messages):
+                self.calls.append("memories")
+                return []
+
+            def generate_suggestion(self, messages):
+                self.calls.append("suggestion")
+                return None
+
+        pipeline = AIPipeline(Service())
+        results = pipeline.run([{"sender": "A", "content": "hi"}], stages=["emotion", "memories"])
+        pipeline.shutdown()
+        self.assertEqual(set(results), {"emotion", "memories"})
+        self.assertNotIn("suggestion", Service.calls)
+
+
+if __name__ == "__main__":
+    unittest.main()
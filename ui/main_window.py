@@ -30,6 +30,7 @@ class MainWindow(QMainWindow):
     typing_changed = pyqtSignal(bool)
     reset_user_requested = pyqtSignal()  # Request to reset local user data
     user_selected = pyqtSignal(str, str)  # user_id, user_name for starting chat
+    export_history_requested = pyqtSignal(str)  # file path; export runs in the controller's worker thread
     
     
     def __init__(self, user_id: str, user_name: Optional[str] = None, user_avatar: Optional[str] = None, parent=None):
@@ -38,6 +39,7 @@ class MainWindow(QMainWindow):
         self.user_name = user_name if user_name else "User"
         self.user_avatar = user_avatar if user_avatar else ""
         self.message_history = []
+        self._conversation_items = {}
         self._current_is_group = False
         self._typing = False
         self._init_ui()
@@ -396,6 +398,7 @@ class MainWindow(QMainWindow):
     def load_conversations(self, conversations: list):
         """Load conversations from database into sidebar"""
         self.room_list.clear()
+        self._conversation_items = {}
         
         if not conversations:
             # No conversations yet - create default one
@@ -408,26 +411,77 @@ class MainWindow(QMainWindow):
         
         # Add each conversation to the list
         for conv in conversations:
-            conv_id = conv.get("id", "")
-            conv_name = conv.get("name", "Unknown")
-            conv_type = conv.get("type", "p2p")
-            last_msg = conv.get("last_message", "")
-            
-            # Create display text with preview
-            if last_msg:
-                display_text = f"{conv_name}\n{last_msg[:30]}..."
-            else:
-                display_text = conv_name
-            
-            item = QListWidgetItem(display_text)
-            item.setData(Qt.ItemDataRole.UserRole, conv_id)
-            item.setData(Qt.ItemDataRole.UserRole + 1, conv_type == "group")
+            item = self._create_conversation_item(conv)
             self.room_list.addItem(item)
         
         # Select first conversation
         if self.room_list.count() > 0:
             self.room_list.setCurrentRow(0)
     
+    def _create_conversation_item(self, conv: dict) -> QListWidgetItem:
+        conv_id = conv.get("id", "")
+        item = QListWidgetItem()
+        item.setData(Qt.ItemDataRole.UserRole, conv_id)
+        item.setData(Qt.ItemDataRole.UserRole + 1, conv.get("type", "p2p") == "group")
+        item.setData(Qt.ItemDataRole.UserRole + 2, dict(conv))
+        item.setText(self._conversation_display_text(conv))
+        self._conversation_items[conv_id] = item
+        return item
+    
+    def _conversation_display_text(self, conv: dict) -> str:
+        conv_name = conv.get("name") or "Unknown"
+        last_msg = conv.get("last_message") or ""
+        unread = conv.get("unread_count") or 0
+        
+        if unread:
+            conv_name = f"{conv_name} ({unread})"
+        # Create display text with preview
+        if last_msg:
+            return f"{conv_name}\n{last_msg[:30]}..."
+        return conv_name
+    
+    def update_conversation(self, conversation_id: str, changes: dict):
+        """
+        Apply a single conversation change notification to the sidebar.
+        Only the affected row is touched; rows with a newer updated_at move to the top.
+        """
+        item = self._conversation_items.get(conversation_id)
+        if item is None:
+            if "name" not in changes:
+                return
+            item = self._create_conversation_item(dict(changes, id=conversation_id))
+            self.room_list.blockSignals(True)
+            self.room_list.insertItem(0, item)
+            self.room_list.blockSignals(False)
+            return
+        
+        conv = item.data(Qt.ItemDataRole.UserRole + 2) or {}
+        moved = "updated_at" in changes and changes["updated_at"] != conv.get("updated_at")
+        conv.update(changes)
+        item.setData(Qt.ItemDataRole.UserRole + 2, conv)
+        item.setText(self._conversation_display_text(conv))
+        
+        row = self.room_list.row(item)
+        if moved and row > 0:
+            was_current = self.room_list.currentItem() is item
+            self.room_list.blockSignals(True)
+            self.room_list.takeItem(row)
+            self.room_list.insertItem(0, item)
+            if was_current:
+                self.room_list.setCurrentItem(item)
+            self.room_list.blockSignals(False)
+    
+    def select_conversation(self, conversation_id: str) -> bool:
+        """Select a conversation in the sidebar (emits conversation_selected). Returns False if not listed."""
+        item = self._conversation_items.get(conversation_id)
+        if item is None:
+            return False
+        if self.room_list.currentItem() is item:
+            self.conversation_selected.emit(conversation_id)
+        else:
+            self.room_list.setCurrentItem(item)
+        return True
+    
     def load_online_users(self, users: list):
         """Load online users from database into sidebar"""
         self.user_list.clear()
@@ -673,7 +727,7 @@ class MainWindow(QMainWindow):
         if not items:
             return
         item = items[0]
-        room_name = item.text()
+        room_name = (item.data(Qt.ItemDataRole.UserRole + 2) or {}).get("name") or item.text()
         conversation_id = item.data(Qt.ItemDataRole.UserRole) or "default"
         is_group = bool(item.data(Qt.ItemDataRole.UserRole + 1))
         self._current_is_group = is_group
@@ -730,6 +784,10 @@ class MainWindow(QMainWindow):
         """Display an AI suggestion"""
         self.suggestion_panel.show_suggestion(suggestion)
     
+    def append_suggestion_delta(self, title: str, delta: str):
+        """Extend the suggestion that is still streaming"""
+        self.suggestion_panel.append_delta(title, delta)
+    
     def update_status(self, message: str):
         """Update status bar"""
         self.statusBar().showMessage(message)
@@ -792,26 +850,16 @@ class MainWindow(QMainWindow):
     # =========== Menu Action Slots ===========
     
     def _on_export_history(self):
-        """Export chat history to a file"""
-        if not self.message_history:
-            QMessageBox.information(self, "导出聊天记录", "当前没有聊天记录可以导出。")
-            return
-        
+        """Ask for a destination and request a full export of the current conversation"""
         file_path, _ = QFileDialog.getSaveFileName(
             self,
             "导出聊天记录",
-            f"chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt",
-            "Text Files (*.txt);;JSON Files (*.json);;All Files (*)"
+            f"chat_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.jsonl",
+            "JSON Lines (*.jsonl);;CSV Files (*.csv);;HTML Files (*.html);;Text Files (*.txt);;All Files (*)"
         )
         
         if file_path:
-            try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    for msg in self.message_history:
-                        f.write(f"[{msg['timestamp']}] {msg['sender']}: {msg['content']}\n")
-                self.statusBar().showMessage(f"聊天记录已导出到: {file_path}", 5000)
-            except Exception as e:
-                QMessageBox.critical(self, "导出失败", f"无法导出聊天记录: {str(e)}")
+            self.export_history_requested.emit(file_path)
     
     def _on_close_to_tray(self):
         """Minimize window to system tray instead of closing"""
@@ -373,14 +373,19 @@ class ServerMainWindow(QMainWindow):
             f"{token_part}"
         )
 
-    def update_token_stats(self, usage_dict):
-        """Update token usage statistics"""
+    def update_token_stats(self, usage_dict, cache_stats=None):
+        """Update token usage statistics (and AI cache hit rate, if caching is on)"""
         current_text = self.stats_label.text()
         base_stats = current_text.split("\n\nToken 消耗")[0]
         
         token_text = "\n\nToken 消耗:\n"
         for model, usage in usage_dict.items():
             token_text += f"  {model}: {usage} tokens\n"
+        
+        if cache_stats:
+            lookups = cache_stats["hits"] + cache_stats["misses"]
+            token_text += (f"\nAI 缓存: 命中率 {cache_stats['hit_rate']:.0%} ({cache_stats['hits']}/{lookups})"
+                           f", 磁盘命中 {cache_stats['disk_hits']}, 条目 {cache_stats['entries']}\n")
             
         self.stats_label.setText(base_stats + token_text)
     
@@ -1,7 +1,7 @@
 """Suggestion panel for displaying AI-generated suggestions"""
 from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLabel, QPushButton, QTextEdit, QScrollArea, QGraphicsDropShadowEffect
 from PyQt6.QtCore import Qt, pyqtSignal
-from PyQt6.QtGui import QColor
+from PyQt6.QtGui import QColor, QTextCursor
 from typing import Optional, Dict
 from ui.theme import Theme, ThemeManager
 
@@ -14,6 +14,8 @@ class SuggestionPanel(QWidget):
     def __init__(self, parent=None):    
         super().__init__(parent)
         self.current_suggestion: Optional[Dict] = None
+        # Card being filled by streamed deltas (title label, content view)
+        self._streaming: Optional[tuple] = None
         self._init_ui()
     
     def _init_ui(self):
@@ -102,6 +104,42 @@ class SuggestionPanel(QWidget):
         self.suggestion_layout.addWidget(card)
         self.suggestion_layout.addStretch()
     
+    def append_delta(self, title: str, delta: str):
+        """
+        Grow the suggestion that is still being generated. The first delta
+        replaces the loading card; the final show_suggestion replaces this card.
+        """
+        if self._streaming is None:
+            self._clear_suggestions()
+            
+            card = QWidget()
+            card.setProperty("role", "card")
+            self._apply_shadow(card)
+            
+            card_layout = QVBoxLayout()
+            card_layout.setSpacing(8)
+            
+            title_label = QLabel()
+            title_label.setProperty("role", "card_title")
+            card_layout.addWidget(title_label)
+            
+            content_text = QTextEdit()
+            content_text.setReadOnly(True)
+            content_text.setMaximumHeight(150)
+            content_text.setProperty("role", "card_content")
+            card_layout.addWidget(content_text)
+            
+            card.setLayout(card_layout)
+            self.suggestion_layout.addWidget(card)
+            self.suggestion_layout.addStretch()
+            self._streaming = (title_label, content_text)
+        
+        title_label, content_text = self._streaming
+        title_label.setText(title or "建议")
+        content_text.moveCursor(QTextCursor.MoveOperation.End)
+        content_text.insertPlainText(delta)
+        content_text.ensureCursorVisible()
+    
     def show_loading(self):
         """Show loading indicator while waiting for AI response"""
         self._clear_suggestions()
@@ -125,6 +163,7 @@ class SuggestionPanel(QWidget):
     
     def _clear_suggestions(self):
         """Clear all suggestion cards"""
+        self._streaming = None
         while self.suggestion_layout.count():
             item = self.suggestion_layout.takeAt(0)
             if item.widget():